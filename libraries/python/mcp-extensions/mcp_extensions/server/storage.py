@@ -1,5 +1,7 @@
 import os
 import pathlib
+import stat
+import tempfile
 from typing import Annotated, Any, Iterator, TypeVar
 
 from pydantic import BaseModel, Field
@@ -15,14 +17,44 @@ class FileStorageSettings(BaseSettings):
 settings = FileStorageSettings()
 
 
+# the process umask, read once as reading it requires setting it, which would race with files created concurrently
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path: pathlib.Path) -> int:
+    """
+    Returns the mode to write the file with: its current mode or, for a new file, the mode of files created by
+    open(), rather than the owner-only mode of temporary files.
+    """
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
 def write_model(file_path: os.PathLike, value: BaseModel, serialization_context: dict[str, Any] | None = None) -> None:
-    """Write a pydantic model to a file."""
+    """
+    Write a pydantic model to a file, atomically: the model is written and fsynced to a temporary file in the same
+    directory, which is renamed over the file, so that readers, and crashes, see either the old or the new file.
+    """
     path = pathlib.Path(file_path)
-    if not path.parent.exists():
-        path.parent.mkdir(parents=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
 
     data_json = value.model_dump_json(context=serialization_context)
-    path.write_text(data_json, encoding="utf-8")
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as file:
+        try:
+            pathlib.Path(file.name).chmod(_file_mode(path))
+            file.write(data_json)
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            file.close()
+            pathlib.Path(file.name).unlink()
+            raise
+    pathlib.Path(file.name).replace(path)
 
 
 ModelT = TypeVar("ModelT", bound=BaseModel)
@@ -47,6 +79,9 @@ def read_models_in_dir(dir_path: os.PathLike, cls: type[ModelT]) -> Iterator[Mod
         return
 
     for file_path in path.iterdir():
+        # skip the temporary files of writes in progress
+        if file_path.name.startswith("."):
+            continue
         value = read_model(file_path, cls)
         if value is not None:
             yield value
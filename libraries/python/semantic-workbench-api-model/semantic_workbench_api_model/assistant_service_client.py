@@ -25,7 +25,7 @@ from semantic_workbench_api_model.assistant_model import (
     StatePutRequestModel,
     StateResponseModel,
 )
-from semantic_workbench_api_model.workbench_model import ConversationEvent
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventList
 
 HEADER_API_KEY = "X-API-Key"
 
@@ -139,6 +139,22 @@ class AssistantClient:
         if not http_response.is_success:
             raise AssistantResponseError(http_response)
 
+    async def post_conversation_events(self, events: list[ConversationEvent]) -> None:
+        """
+        Posts a batch of events, which may span conversations, in a single request. Events for conversations the
+        assistant is not in are ignored by the assistant service.
+        """
+        try:
+            http_response = await self._client.post(
+                "/events",
+                json=ConversationEventList(events=events).model_dump(mode="json"),
+            )
+        except httpx.RequestError as e:
+            raise AssistantConnectionError(e) from e
+
+        if not http_response.is_success:
+            raise AssistantResponseError(http_response)
+
     async def get_config(self) -> ConfigResponseModel:
         try:
             http_response = await self._client.get("/config")
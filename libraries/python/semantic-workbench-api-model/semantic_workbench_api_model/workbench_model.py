@@ -193,6 +193,22 @@ class ConversationMessageDebug(BaseModel):
 
 class ConversationMessageList(BaseModel):
     messages: list[ConversationMessage]
+    # opaque keyset cursors for fetching the pages of messages preceding and following this one
+    before_cursor: str | None = None
+    after_cursor: str | None = None
+
+
+class ConversationMessageSearchResult(BaseModel):
+    conversation_id: uuid.UUID
+    message: ConversationMessage
+    # higher scores are better matches; scores are comparable within one search only
+    score: float
+
+
+class ConversationMessageSearchResultList(BaseModel):
+    results: list[ConversationMessageSearchResult]
+    # opaque cursor for fetching the next page of results, if there are more
+    next_cursor: str | None = None
 
 
 class File(BaseModel):
@@ -458,6 +474,10 @@ class NewConversationMessage(BaseModel):
     debug_data: dict[str, Any] | None = None
 
 
+class NewConversationMessageList(BaseModel):
+    messages: list[NewConversationMessage]
+
+
 class NewConversationShare(BaseModel):
     conversation_id: uuid.UUID
     label: str
@@ -499,3 +519,7 @@ class ConversationEvent(BaseModel):
     event: ConversationEventType
     timestamp: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.UTC))
     data: dict[str, Any] = {}
+
+
+class ConversationEventList(BaseModel):
+    events: list[ConversationEvent]
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import collections
+import hashlib
 import io
 import json
 import urllib.parse
@@ -17,6 +19,9 @@ HEADER_ASSISTANT_SERVICE_ID = "X-Assistant-Service-ID"
 HEADER_ASSISTANT_ID = "X-Assistant-ID"
 HEADER_API_KEY = "X-API-Key"
 
+# the maximum number of messages the workbench service accepts in one batch
+SEND_MESSAGES_BATCH_SIZE = 100
+
 
 # HTTPX transport factory can be overridden to return an ASGI transport for testing
 def httpx_transport_factory() -> httpx.AsyncHTTPTransport:
@@ -67,16 +72,100 @@ class UserRequestHeaders:
         return {"Authorization": f"Bearer {self.token}"}
 
 
+class ConditionalRequestCache:
+    """
+    Caches the ETags and content of GET responses, so that repeated requests are sent with If-None-Match, and the
+    content of unchanged (304 Not Modified) responses is read from the cache.
+    """
+
+    def __init__(self, max_entries: int = 1_000) -> None:
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict[str, tuple[str, bytes]]()
+
+    @staticmethod
+    def _key(request: httpx.Request) -> str:
+        # responses differ by principal, so the key includes the headers that identify it
+        principal = "\n".join(
+            request.headers.get(name, "")
+            for name in (HEADER_ASSISTANT_SERVICE_ID, HEADER_ASSISTANT_ID, "Authorization")
+        )
+        return f"{request.url}\n{hashlib.sha256(principal.encode('utf-8')).hexdigest()}"
+
+    async def get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: httpx.Headers,
+        params: Mapping[str, str | bool | list[str]] | None = None,
+    ) -> httpx.Response:
+        request = client.build_request("GET", url, params=params, headers=headers)
+        key = self._key(request)
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            request.headers["If-None-Match"] = cached[0]
+
+        http_response = await client.send(request)
+
+        if http_response.status_code == httpx.codes.NOT_MODIFIED and cached is not None:
+            self._entries.move_to_end(key)
+            etag, content = cached
+            return httpx.Response(
+                status_code=httpx.codes.OK,
+                headers={"ETag": etag, "Content-Type": "application/json"},
+                content=content,
+                request=request,
+            )
+
+        etag = http_response.headers.get("ETag")
+        if not http_response.is_success or etag is None:
+            self._entries.pop(key, None)
+            return http_response
+
+        self._entries[key] = (etag, http_response.content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+        return http_response
+
+
+def _search_params(
+    query: str,
+    message_types: Iterable[workbench_model.MessageType] | None,
+    limit: int | None,
+    cursor: str | None,
+) -> dict[str, str | list[str]]:
+    params: dict[str, str | list[str]] = {"q": query}
+    if message_types:
+        params["message_type"] = [mt.value for mt in message_types]
+    if limit:
+        params["limit"] = str(limit)
+    if cursor:
+        params["cursor"] = cursor
+    return params
+
+
 class ConversationAPIClient:
     def __init__(
         self,
         conversation_id: str,
         httpx_client: httpx.AsyncClient,
         headers: httpx.Headers,
+        conditional_request_cache: ConditionalRequestCache | None = None,
     ) -> None:
         self._conversation_id = conversation_id
         self._client = httpx_client
         self._headers = headers
+        self._conditional_request_cache = conditional_request_cache
+
+    async def _get(self, url: str, params: Mapping[str, str | bool | list[str]] | None = None) -> httpx.Response:
+        """
+        GETs an endpoint that supports conditional requests, through the conditional request cache, if any.
+        """
+        if self._conditional_request_cache is None:
+            return await self._client.get(url, params=params, headers=self._headers)
+        return await self._conditional_request_cache.get(self._client, url, headers=self._headers, params=params)
 
     async def get_sse_session(self, event_source_url: str) -> AsyncIterator[dict]:
         async with self._client.stream("GET", event_source_url, headers=self._headers) as response:
@@ -128,7 +217,7 @@ class ConversationAPIClient:
         return workbench_model.ConversationImportResult.model_validate(http_response.json())
 
     async def get_conversation(self) -> workbench_model.Conversation:
-        http_response = await self._client.get(f"/conversations/{self._conversation_id}", headers=self._headers)
+        http_response = await self._get(f"/conversations/{self._conversation_id}")
         http_response.raise_for_status()
         return workbench_model.Conversation.model_validate(http_response.json())
 
@@ -154,26 +243,22 @@ class ConversationAPIClient:
         return workbench_model.Conversation.model_validate(http_response.json())
 
     async def get_participant_me(self) -> workbench_model.ConversationParticipant:
-        http_response = await self._client.get(
-            f"/conversations/{self._conversation_id}/participants/me", headers=self._headers
-        )
+        http_response = await self._get(f"/conversations/{self._conversation_id}/participants/me")
         http_response.raise_for_status()
         return workbench_model.ConversationParticipant.model_validate(http_response.json())
 
     async def get_participant(self, participant_id: str) -> workbench_model.ConversationParticipant:
-        http_response = await self._client.get(
+        http_response = await self._get(
             f"/conversations/{self._conversation_id}/participants/{participant_id}",
             params={"include_inactive": True},
-            headers=self._headers,
         )
         http_response.raise_for_status()
         return workbench_model.ConversationParticipant.model_validate(http_response.json())
 
     async def get_participants(self, *, include_inactive: bool = False) -> workbench_model.ConversationParticipantList:
-        http_response = await self._client.get(
+        http_response = await self._get(
             f"/conversations/{self._conversation_id}/participants",
             params={"include_inactive": include_inactive},
-            headers=self._headers,
         )
         if http_response.status_code == httpx.codes.NOT_FOUND:
             return workbench_model.ConversationParticipantList(participants=[])
@@ -218,6 +303,7 @@ class ConversationAPIClient:
         participant_ids: Iterable[str] | None = None,
         participant_role: workbench_model.ParticipantRole | None = None,
         limit: int | None = None,
+        cursor: str | None = None,
     ) -> workbench_model.ConversationMessageList:
         params: dict[str, str | list[str]] = {}
         if message_types:
@@ -232,30 +318,68 @@ class ConversationAPIClient:
             params["after"] = str(after)
         if limit:
             params["limit"] = str(limit)
+        if cursor:
+            params["cursor"] = cursor
+
+        http_response = await self._get(f"/conversations/{self._conversation_id}/messages", params=params)
+        http_response.raise_for_status()
+        return workbench_model.ConversationMessageList.model_validate(http_response.json())
 
+    async def search_messages(
+        self,
+        query: str,
+        message_types: Iterable[workbench_model.MessageType] | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> workbench_model.ConversationMessageSearchResultList:
         http_response = await self._client.get(
-            f"/conversations/{self._conversation_id}/messages", params=params, headers=self._headers
+            f"/conversations/{self._conversation_id}/messages/search",
+            params=_search_params(query, message_types=message_types, limit=limit, cursor=cursor),
+            headers=self._headers,
         )
         http_response.raise_for_status()
-        return workbench_model.ConversationMessageList.model_validate(http_response.json())
+        return workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json())
 
     async def send_messages(
         self,
         *messages: workbench_model.NewConversationMessage,
     ) -> workbench_model.ConversationMessageList:
+        if len(messages) <= 1:
+            return workbench_model.ConversationMessageList(
+                messages=[await self._send_message(message) for message in messages]
+            )
+
         messages_out = []
-        for message in messages:
+        for start in range(0, len(messages), SEND_MESSAGES_BATCH_SIZE):
+            batch = messages[start : start + SEND_MESSAGES_BATCH_SIZE]
             http_response = await self._client.post(
-                f"/conversations/{self._conversation_id}/messages",
-                json=message.model_dump(mode="json", exclude_unset=True, exclude_defaults=True),
+                f"/conversations/{self._conversation_id}/messages/batch",
+                json=workbench_model.NewConversationMessageList(messages=list(batch)).model_dump(
+                    mode="json", exclude_unset=True, exclude_defaults=True
+                ),
                 headers=self._headers,
             )
+            if http_response.status_code == httpx.codes.METHOD_NOT_ALLOWED:
+                # the workbench service predates the batch endpoint
+                messages_out.extend([await self._send_message(message) for message in messages[start:]])
+                break
+
             http_response.raise_for_status()
-            message_out = workbench_model.ConversationMessage.model_validate(http_response.json())
-            messages_out.append(message_out)
+            messages_out.extend(workbench_model.ConversationMessageList.model_validate(http_response.json()).messages)
 
         return workbench_model.ConversationMessageList(messages=messages_out)
 
+    async def _send_message(
+        self, message: workbench_model.NewConversationMessage
+    ) -> workbench_model.ConversationMessage:
+        http_response = await self._client.post(
+            f"/conversations/{self._conversation_id}/messages",
+            json=message.model_dump(mode="json", exclude_unset=True, exclude_defaults=True),
+            headers=self._headers,
+        )
+        http_response.raise_for_status()
+        return workbench_model.ConversationMessage.model_validate(http_response.json())
+
     async def send_conversation_state_event(
         self,
         assistant_id: str,
@@ -304,9 +428,7 @@ class ConversationAPIClient:
 
     async def get_file(self, filename: str) -> workbench_model.File | None:
         params = {"prefix": filename}
-        http_response = await self._client.get(
-            f"/conversations/{self._conversation_id}/files", params=params, headers=self._headers
-        )
+        http_response = await self._get(f"/conversations/{self._conversation_id}/files", params=params)
         http_response.raise_for_status()
 
         files_response = workbench_model.FileList.model_validate(http_response.json())
@@ -323,9 +445,7 @@ class ConversationAPIClient:
 
     async def get_files(self, prefix: str | None = None) -> workbench_model.FileList:
         params = {"prefix": prefix} if prefix else {}
-        http_response = await self._client.get(
-            f"/conversations/{self._conversation_id}/files", params=params, headers=self._headers
-        )
+        http_response = await self._get(f"/conversations/{self._conversation_id}/files", params=params)
         http_response.raise_for_status()
 
         return workbench_model.FileList.model_validate(http_response.json())
@@ -381,6 +501,21 @@ class ConversationsAPIClient:
         http_response.raise_for_status()
         return workbench_model.ConversationList.model_validate(http_response.json())
 
+    async def search_messages(
+        self,
+        query: str,
+        message_types: Iterable[workbench_model.MessageType] | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> workbench_model.ConversationMessageSearchResultList:
+        http_response = await self._client.get(
+            "/messages/search",
+            params=_search_params(query, message_types=message_types, limit=limit, cursor=cursor),
+            headers=self._headers,
+        )
+        http_response.raise_for_status()
+        return workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json())
+
     async def create_conversation(
         self,
         new_conversation: workbench_model.NewConversation,
@@ -536,6 +671,7 @@ class WorkbenchServiceClientBuilder:
         self._client = httpx_client
         self._assistant_service_id = assistant_service_id
         self._api_key = api_key
+        self._conditional_request_cache = ConditionalRequestCache()
 
     def for_service(self) -> AssistantServiceAPIClient:
         return AssistantServiceAPIClient(
@@ -569,6 +705,7 @@ class WorkbenchServiceClientBuilder:
                     ).to_headers(),
                 },
             ),
+            conditional_request_cache=self._conditional_request_cache,
         )
 
     def for_conversations(self, assistant_id: str | None = None) -> ConversationsAPIClient:
@@ -615,6 +752,7 @@ class WorkbenchServiceUserClientBuilder:
     ) -> None:
         self._base_url = base_url
         self._headers = headers
+        self._conditional_request_cache = ConditionalRequestCache()
 
     def _client(self) -> httpx.AsyncClient:
         client = httpx.AsyncClient(transport=httpx_transport_factory())
@@ -667,4 +805,5 @@ class WorkbenchServiceUserClientBuilder:
                     asgi_correlation_id.correlation_id.get() or ""
                 ),
             }),
+            conditional_request_cache=self._conditional_request_cache,
         )
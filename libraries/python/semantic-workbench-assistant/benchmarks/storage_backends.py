@@ -0,0 +1,96 @@
+"""
+Microbenchmark of the model storage backends, comparing the write and read throughput of the file backend, which
+atomically replaces a file per model, against the SQLite backend, which upserts a row per model in WAL mode.
+
+Models are written, and then read, by a number of threads, each with its own keys, in a temporary directory.
+
+usage: uv run python -m benchmarks.storage_backends [--models N] [--writes N] [--threads N] [--payload-bytes N]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import pathlib
+import tempfile
+import time
+from typing import Any
+
+from pydantic import BaseModel
+from semantic_workbench_assistant import storage
+
+
+class BenchmarkModel(BaseModel):
+    id: str
+    revision: int
+    payload: str
+
+
+def _run(backend: storage.StorageBackend, models: int, writes: int, threads: int, payload_bytes: int) -> dict[str, Any]:
+    model_storage = storage.ModelStorage(backend)
+    payload = "x" * payload_bytes
+
+    def write(thread: int) -> None:
+        for revision in range(writes):
+            for index in range(thread, models, threads):
+                model_storage.write_model(
+                    f"models/{index}.json", BenchmarkModel(id=str(index), revision=revision, payload=payload)
+                )
+
+    def read(thread: int) -> None:
+        for _ in range(writes):
+            for index in range(thread, models, threads):
+                value = model_storage.read_model(f"models/{index}.json", BenchmarkModel)
+                assert value is not None
+                assert value.revision == writes - 1
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        started_at = time.perf_counter()
+        list(executor.map(write, range(threads)))
+        write_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        list(executor.map(read, range(threads)))
+        read_seconds = time.perf_counter() - started_at
+
+    operations = models * writes
+    return {
+        "writes_per_second": round(operations / write_seconds, 1),
+        "reads_per_second": round(operations / read_seconds, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=5, help="number of times each model is written, and read")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--payload-bytes", type=int, default=1_024)
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {
+        "models": args.models,
+        "writes": args.writes,
+        "threads": args.threads,
+        "payload_bytes": args.payload_bytes,
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results["file"] = _run(
+            storage.FileStorageBackend(pathlib.Path(temp_dir) / "files"),
+            args.models,
+            args.writes,
+            args.threads,
+            args.payload_bytes,
+        )
+
+        sqlite_backend = storage.SQLiteStorageBackend(pathlib.Path(temp_dir) / "storage.db")
+        try:
+            results["sqlite"] = _run(sqlite_backend, args.models, args.writes, args.threads, args.payload_bytes)
+        finally:
+            sqlite_backend.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
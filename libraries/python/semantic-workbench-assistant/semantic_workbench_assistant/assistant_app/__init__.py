@@ -6,6 +6,8 @@ from .content_safety import (
     ContentSafetyEvaluation,
     ContentSafetyEvaluationResult,
     ContentSafetyEvaluator,
+    ContentSafetyEventPolicy,
+    ContentSafetyVerdictCache,
 )
 from .context import AssistantContext, ConversationContext, storage_directory_for_context
 from .error import BadRequestError, ConflictError, NotFoundError
@@ -37,6 +39,8 @@ __all__ = [
     "ContentSafetyEvaluation",
     "ContentSafetyEvaluationResult",
     "ContentSafetyEvaluator",
+    "ContentSafetyEventPolicy",
+    "ContentSafetyVerdictCache",
     "FileStorageAssistantDataExporter",
     "FileStorageConversationDataExporter",
     "BadRequestError",
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import logging
+import pathlib
+
+from pydantic import BaseModel, ValidationError
+
+from ..storage import read_model, write_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationState(BaseModel):
+    """
+    Model for conversation state for the AssistantService.
+    """
+
+    conversation_id: str
+    title: str
+
+
+class AssistantState(BaseModel):
+    """
+    Model for assistant state for the AssistantService.
+    """
+
+    assistant_id: str
+    assistant_name: str
+
+    template_id: str = "default"
+
+    conversations: dict[str, ConversationState] = {}
+
+
+class PersistedAssistantStates(BaseModel):
+    """
+    Model for the assistant states of the AssistantService, when persisted in one file.
+    """
+
+    assistants: dict[str, AssistantState] = {}
+
+
+def _write_atomic(path: pathlib.Path, content: str | None) -> None:
+    """
+    Replaces the file at path with the content, atomically, or deletes it if the content is None.
+    """
+    if content is None:
+        path.unlink(missing_ok=True)
+        return
+
+    write_atomic(path, content.encode("utf-8"))
+
+
+class AssistantStateStore:
+    """
+    Write-through, in-memory store of the assistant states of an AssistantService. The persisted states are read
+    once, on first use, and changes are persisted flush_delay_seconds after they are made, so that a burst of
+    changes is written once.
+
+    States are persisted in one file or, when sharded, in one file per assistant, so that a change to an assistant
+    rewrites only its own file. Files are replaced atomically.
+
+    The states are returned by reference; changes to them are persisted when put is called.
+    """
+
+    def __init__(self, root_path: pathlib.Path, flush_delay_seconds: float = 0.5, sharded: bool = False) -> None:
+        self._path = root_path / "assistant_states.json"
+        self._shards_path = root_path / "assistant_states"
+        self._flush_delay_seconds = flush_delay_seconds
+        self._sharded = sharded
+        self._states: dict[str, AssistantState] | None = None
+        self._dirty: set[str] = set()
+        self._delete_unsharded = False
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    def get(self, assistant_id: str) -> AssistantState | None:
+        return self._load().get(assistant_id)
+
+    def put(self, assistant_state: AssistantState) -> None:
+        self._load()[assistant_state.assistant_id] = assistant_state
+        self._mark_dirty(assistant_state.assistant_id)
+
+    def delete(self, assistant_id: str) -> None:
+        if self._load().pop(assistant_id, None) is not None:
+            self._mark_dirty(assistant_id)
+
+    async def flush(self) -> None:
+        """
+        Persists the changes that have not been persisted yet.
+        """
+        async with self._flush_lock:
+            if not self._dirty or self._states is None:
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            # the content is serialized on the event loop, so that it is consistent, and written in a thread
+            writes = self._serialize(dirty)
+            try:
+                await asyncio.to_thread(self._write, writes)
+            except BaseException:
+                self._dirty.update(dirty)
+                raise
+
+    async def aclose(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def _shard_path(self, assistant_id: str) -> pathlib.Path:
+        # the file name is derived from the id, rather than being the id, so that any id is a valid file name
+        return self._shards_path / f"{hashlib.sha256(assistant_id.encode('utf-8')).hexdigest()}.json"
+
+    def _load(self) -> dict[str, AssistantState]:
+        if self._states is not None:
+            return self._states
+
+        states: dict[str, AssistantState] = {}
+        try:
+            persisted = read_model(self._path, PersistedAssistantStates)
+            if persisted is not None:
+                states.update(persisted.assistants)
+        except ValidationError:
+            logger.warning("invalid assistant states, ignoring them; path: %s", self._path, exc_info=True)
+
+        if self._sharded:
+            # states persisted before sharding are moved to their shards on the first flush
+            if states:
+                self._dirty.update(states)
+                self._delete_unsharded = True
+
+            if self._shards_path.is_dir():
+                for shard_path in self._shards_path.glob("*.json"):
+                    try:
+                        assistant_state = read_model(shard_path, AssistantState)
+                    except ValidationError:
+                        logger.warning("invalid assistant state, ignoring it; path: %s", shard_path, exc_info=True)
+                        continue
+                    if assistant_state is not None:
+                        states[assistant_state.assistant_id] = assistant_state
+
+        self._states = states
+        return states
+
+    def _mark_dirty(self, assistant_id: str) -> None:
+        self._dirty.add(assistant_id)
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # outside of an event loop, changes are written through immediately
+            dirty, self._dirty = self._dirty, set()
+            self._write(self._serialize(dirty))
+            return
+
+        self._flush_task = loop.create_task(self._flush_after_delay(), name="flush_assistant_states")
+
+    async def _flush_after_delay(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self._flush_delay_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("exception persisting assistant states; path: %s", self._path)
+                return
+
+    def _serialize(self, dirty: set[str]) -> list[tuple[pathlib.Path, str | None]]:
+        states = self._states or {}
+        if not self._sharded:
+            return [(self._path, PersistedAssistantStates(assistants=states).model_dump_json(indent=2))]
+
+        writes: list[tuple[pathlib.Path, str | None]] = []
+        for assistant_id in dirty:
+            assistant_state = states.get(assistant_id)
+            writes.append((
+                self._shard_path(assistant_id),
+                assistant_state.model_dump_json(indent=2) if assistant_state is not None else None,
+            ))
+
+        if self._delete_unsharded:
+            self._delete_unsharded = False
+            writes.append((self._path, None))
+
+        return writes
+
+    @staticmethod
+    def _write(writes: list[tuple[pathlib.Path, str | None]]) -> None:
+        for path, content in writes:
+            _write_atomic(path, content)
@@ -1,6 +1,8 @@
+import collections
 import logging
 import pathlib
-from typing import Any, Generic, TypeVar
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar, cast
 
 from pydantic import (
     BaseModel,
@@ -25,41 +27,164 @@ logger = logging.getLogger(__name__)
 
 ConfigModelT = TypeVar("ConfigModelT", bound=BaseModel)
 
+FileSignature = tuple[int, int, int]
+"""
+The inode, size and modification time of a config file, which change when the file is written or replaced.
+"""
+
+
+@dataclass
+class AssistantConfigCacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    """
+    Entries discarded because their config was set, or their config file changed.
+    """
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class _ConfigCacheEntry:
+    template_cls: type[BaseModel]
+    file_signature: FileSignature | None
+    config: BaseModel
+    data_model: AssistantConfigDataModel | None = None
+    """
+    The config, with its validation errors and schemas, as returned by the config provider; set on first use.
+    """
+
+
+class AssistantConfigCache:
+    """
+    Process-level LRU cache of the validated configs of assistants, keyed by assistant id. An entry is used while
+    its config file is unchanged, so that a lookup costs a stat of the file, rather than reading and validating it.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict[str, _ConfigCacheEntry]()
+        self._metrics = AssistantConfigCacheMetrics()
+
+    def get(
+        self, assistant_id: str, template_cls: type[BaseModel], file_signature: FileSignature | None
+    ) -> _ConfigCacheEntry | None:
+        entry = self._entries.get(assistant_id)
+        if entry is not None and (entry.template_cls is not template_cls or entry.file_signature != file_signature):
+            self._metrics.invalidations += 1
+            del self._entries[assistant_id]
+            entry = None
+
+        if entry is None:
+            self._metrics.misses += 1
+            return None
+
+        self._metrics.hits += 1
+        self._entries.move_to_end(assistant_id)
+        return entry
+
+    def put(self, assistant_id: str, entry: _ConfigCacheEntry) -> None:
+        self._entries[assistant_id] = entry
+        self._entries.move_to_end(assistant_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, assistant_id: str) -> None:
+        if self._entries.pop(assistant_id, None) is not None:
+            self._metrics.invalidations += 1
+
+    def metrics(self) -> AssistantConfigCacheMetrics:
+        return self._metrics
+
+
+config_cache = AssistantConfigCache()
+"""
+The cache shared by the BaseModelAssistantConfig instances of the process.
+"""
+
 
 class BaseModelAssistantConfig(Generic[ConfigModelT]):
     """
     Assistant-config implementation that uses a BaseModel for default config.
+
+    Configs are cached in the process-level config cache. Callers get a deep copy of the cached config, so that
+    changes they make to it, at any depth, are not seen by other callers.
     """
 
     def __init__(
-        self, default_cls: type[ConfigModelT], additional_templates: dict[str, type[ConfigModelT]] = {}
+        self,
+        default_cls: type[ConfigModelT],
+        additional_templates: dict[str, type[ConfigModelT]] = {},
+        cache: AssistantConfigCache | None = None,
     ) -> None:
         self._templates = {
             "default": default_cls,
         }
-
-        if not additional_templates:
-            return
+        self._cache = cache or config_cache
 
         for template_id, template_cls in additional_templates.items():
             if template_id in self._templates:
                 raise ValueError(f"Template {template_id} already exists")
             self._templates[template_id] = template_cls
 
+        self._defaults = {
+            template_id: template_cls.model_construct() for template_id, template_cls in self._templates.items()
+        }
+
     async def get(self, assistant_context: AssistantContext) -> ConfigModelT:
-        path = self._private_path_for(assistant_context)
+        config = cast(ConfigModelT, self._get_cache_entry(assistant_context).config)
+        return config.model_copy(deep=True)
 
-        if not path.exists():
-            # if the config file hasn't been written yet, check the export/import path
-            path = self._export_import_path_for(assistant_context)
+    def _get_cache_entry(self, assistant_context: AssistantContext) -> _ConfigCacheEntry:
+        template_id = assistant_context._template_id
+        template_cls = self._templates[template_id]
+        path, file_signature = self._config_file_for(assistant_context)
+
+        entry = self._cache.get(assistant_context.id, template_cls, file_signature)
+        if entry is not None:
+            return entry
 
         config = None
+        if file_signature is not None:
+            try:
+                config = read_model(path, template_cls)
+            except ValidationError as e:
+                logger.warning("exception reading config; path: %s", path, exc_info=e)
+
+        entry = _ConfigCacheEntry(
+            template_cls=template_cls,
+            file_signature=file_signature,
+            config=config or self._defaults[template_id],
+        )
+        self._cache.put(assistant_context.id, entry)
+        return entry
+
+    def _validated_config_data_model_for(self, entry: _ConfigCacheEntry) -> AssistantConfigDataModel:
+        config = cast(ConfigModelT, entry.config)
+        errors = []
         try:
-            config = read_model(path, self._templates[assistant_context._template_id])
+            entry.template_cls.model_validate(config.model_dump())
         except ValidationError as e:
-            logger.warning("exception reading config; path: %s", path, exc_info=e)
+            for error in e.errors(include_url=False):
+                errors.append(str(error))
+
+        return self._config_data_model_for(config, errors)
 
-        return config or self._templates[assistant_context._template_id].model_construct()
+    def _config_file_for(self, assistant_context: AssistantContext) -> tuple[pathlib.Path, FileSignature | None]:
+        # if the config file hasn't been written yet, check the export/import path
+        export_import_path = self._export_import_path_for(assistant_context)
+        for path in (self._private_path_for(assistant_context), export_import_path):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            return path, (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        return export_import_path, None
 
     @property
     def provider(self) -> AssistantConfigProvider:
@@ -68,15 +193,11 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
                 self._provider = provider
 
             async def get(self, assistant_context: AssistantContext) -> AssistantConfigDataModel:
-                config = await self._provider.get(assistant_context)
-                errors = []
-                try:
-                    self._provider._templates[assistant_context._template_id].model_validate(config.model_dump())
-                except ValidationError as e:
-                    for error in e.errors(include_url=False):
-                        errors.append(str(error))
-
-                return self._provider._config_data_model_for(config, errors)
+                # the validation errors and schemas are computed once per cached config
+                entry = self._provider._get_cache_entry(assistant_context)
+                if entry.data_model is None:
+                    entry.data_model = self._provider._validated_config_data_model_for(entry)
+                return entry.data_model
 
             async def set(self, assistant_context: AssistantContext, config: dict[str, Any]) -> None:
                 try:
@@ -92,7 +213,7 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
 
             def default_for(self, template_id: str) -> AssistantConfigDataModel:
                 # return the default config for the given assistant type
-                config = self._provider._templates[template_id].model_construct()
+                config = self._provider._defaults[template_id]
                 return self._provider._config_data_model_for(config)
 
         return _ConfigProvider(self)
@@ -122,6 +243,7 @@ class BaseModelAssistantConfig(Generic[ConfigModelT]):
                 ConfigSecretStrJsonSerializationMode.serialize_as_empty
             ),
         )
+        self._cache.invalidate(assistant_context.id)
 
     ui_schema_cache: dict[type, dict[str, Any]] = {}
 
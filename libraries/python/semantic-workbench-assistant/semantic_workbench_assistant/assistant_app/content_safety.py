@@ -1,8 +1,12 @@
 # Copyright (c) Microsoft. All rights reserved.
+import asyncio
+import collections
+import hashlib
 import json
 import logging
+from dataclasses import dataclass
 from enum import StrEnum
-from typing import Any, Awaitable, Callable, Protocol
+from typing import Any, Awaitable, Callable, Mapping, Protocol
 
 import deepmerge
 from pydantic import BaseModel
@@ -100,6 +104,141 @@ class AlwaysWarnContentSafetyEvaluator:
         )
 
 
+ContentSafetyEventPolicy = Callable[[ConversationEvent], list[str]]
+"""
+Extracts the texts to evaluate from an event. Each text is evaluated independently, and concurrently.
+"""
+
+
+def _message_content(event: ConversationEvent) -> list[str]:
+    content = event.data.get("message", {}).get("content", "")
+    return [content] if content else []
+
+
+def _file_name_and_metadata(event: ConversationEvent) -> list[str]:
+    file = event.data.get("file", {})
+    texts = [file.get("filename", "")]
+    if file.get("metadata"):
+        texts.append(json.dumps(file["metadata"]))
+    return [text for text in texts if text]
+
+
+DEFAULT_EVENT_POLICIES: Mapping[ConversationEventType, ContentSafetyEventPolicy] = {
+    ConversationEventType.message_created: _message_content,
+    ConversationEventType.file_created: _file_name_and_metadata,
+    ConversationEventType.file_updated: _file_name_and_metadata,
+}
+"""
+The events evaluated by default, with the user-provided fields of each; events of other types are not evaluated.
+"""
+
+
+@dataclass
+class ContentSafetyVerdictCacheMetrics:
+    hits: int = 0
+    """
+    Evaluations served from the cache, or shared with an evaluation of the same content already in progress.
+    """
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ContentSafetyVerdictCache:
+    """
+    LRU cache of content safety evaluations, keyed by a hash of the content and of the evaluator's config, so that
+    repeated content, such as a message that is sent again, is evaluated once per evaluator config.
+
+    The config of an evaluator is its config attribute, when that is a pydantic model, as it is for the evaluators
+    in the content-safety library. Evaluators without one are keyed by their type alone.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict[str, ContentSafetyEvaluation]()
+        self._in_progress: dict[str, asyncio.Task[ContentSafetyEvaluation]] = {}
+        self._metrics = ContentSafetyVerdictCacheMetrics()
+
+    async def evaluate(self, evaluator: ContentSafetyEvaluator, content: str) -> ContentSafetyEvaluation:
+        key = self._key(evaluator, content)
+
+        evaluation = self._entries.get(key)
+        if evaluation is not None:
+            self._metrics.hits += 1
+            self._entries.move_to_end(key)
+            return evaluation.model_copy(deep=True)
+
+        # concurrent evaluations of the same content share one evaluator call, which continues if its callers are
+        # cancelled, so that its result is cached for the next caller
+        task = self._in_progress.get(key)
+        if task is None:
+            self._metrics.misses += 1
+            task = asyncio.create_task(self._evaluate(key, evaluator, content), name="evaluate_content_safety")
+            task.add_done_callback(_retrieve_exception)
+            self._in_progress[key] = task
+        else:
+            self._metrics.hits += 1
+
+        return (await asyncio.shield(task)).model_copy(deep=True)
+
+    async def _evaluate(self, key: str, evaluator: ContentSafetyEvaluator, content: str) -> ContentSafetyEvaluation:
+        try:
+            # evaluation errors are not cached, so that the content is evaluated again on the next event
+            evaluation = await evaluator.evaluate(content)
+        finally:
+            del self._in_progress[key]
+
+        self._entries[key] = evaluation
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+        return evaluation
+
+    def metrics(self) -> ContentSafetyVerdictCacheMetrics:
+        return self._metrics
+
+    @staticmethod
+    def _key(evaluator: ContentSafetyEvaluator, content: str) -> str:
+        evaluator_type = type(evaluator)
+        config = getattr(evaluator, "config", None)
+        config_json = config.model_dump_json() if isinstance(config, BaseModel) else ""
+
+        digest = hashlib.sha256()
+        for part in (evaluator_type.__module__, evaluator_type.__qualname__, config_json, content):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # avoid "exception was never retrieved" warnings when all of the callers of an evaluation were cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+def _combine_evaluations(evaluations: list[ContentSafetyEvaluation]) -> ContentSafetyEvaluation:
+    """
+    Combine the evaluations of the texts of an event into one, with the most severe result.
+    """
+    if len(evaluations) == 1:
+        return evaluations[0]
+
+    severity = [
+        ContentSafetyEvaluationResult.Pass,
+        ContentSafetyEvaluationResult.Warn,
+        ContentSafetyEvaluationResult.Fail,
+    ]
+    most_severe = max(evaluations, key=lambda evaluation: severity.index(evaluation.result))
+    return ContentSafetyEvaluation(
+        result=most_severe.result,
+        note=most_severe.note,
+        metadata={"evaluations": [evaluation.model_dump() for evaluation in evaluations]},
+    )
+
+
 class ContentSafety(ContentInterceptor):
     """
     A content safety interceptor that evaluates the safety of content. It is opinionated in that it
@@ -115,6 +254,10 @@ class ContentSafety(ContentInterceptor):
         - Add the evaluation result to the debug metadata for visibility in the workbench UI debug views.
         - Add interceptor data to the message metadata to avoid infinite loops.
 
+    Incoming events are evaluated according to event_policies, which map the evaluated event types to the texts to
+    evaluate, by default DEFAULT_EVENT_POLICIES. The texts of an event are evaluated concurrently, and evaluations
+    are cached in verdict_cache, so that repeated content is not evaluated again.
+
     **Notes**
     - Use this interceptor as an example or template for implementing content safety evaluation in an
         assistant if you want to introduce your own content safety evaluation logic or handling of
@@ -126,8 +269,15 @@ class ContentSafety(ContentInterceptor):
     def metadata_key(self) -> str:
         return "content_safety"
 
-    def __init__(self, content_evaluator_factory: ContentEvaluatorFactory) -> None:
+    def __init__(
+        self,
+        content_evaluator_factory: ContentEvaluatorFactory,
+        event_policies: Mapping[ConversationEventType, ContentSafetyEventPolicy] = DEFAULT_EVENT_POLICIES,
+        verdict_cache: ContentSafetyVerdictCache | None = None,
+    ) -> None:
         self.content_evaluator_factory = content_evaluator_factory
+        self.event_policies = event_policies
+        self.verdict_cache = verdict_cache or ContentSafetyVerdictCache()
 
     #
     # interceptor methods
@@ -149,19 +299,20 @@ class ContentSafety(ContentInterceptor):
             # return the event without further processing
             return event
 
-        # list of event types that should be evaluated
-        if event.event not in [
-            ConversationEventType.message_created,
-            ConversationEventType.file_created,
-            ConversationEventType.file_updated,
-        ]:
-            # skip evaluation for other event types
+        # skip evaluation for event types without a policy, and events without content to evaluate
+        policy = self.event_policies.get(event.event)
+        if policy is None:
+            return event
+
+        texts = policy(event)
+        if not texts:
             return event
 
-        # evaluate the content safety of the event data
+        # evaluate the content safety of the texts of the event, concurrently
         try:
             evaluator = await self.content_evaluator_factory(context)
-            evaluation = await evaluator.evaluate(json.dumps(event.data))
+            evaluations = await asyncio.gather(*[self.verdict_cache.evaluate(evaluator, text) for text in texts])
+            evaluation = _combine_evaluations(list(evaluations))
         except Exception as e:
             # if there is an error, return a fail result with the error message
             logger.exception("Content safety evaluation failed.")
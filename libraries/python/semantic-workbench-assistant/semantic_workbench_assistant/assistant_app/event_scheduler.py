@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import asgi_correlation_id
+from semantic_workbench_api_model import workbench_model
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConversationEventSchedulerMetrics:
+    pending_events: int = 0
+    max_pending_events: int = 0
+    """
+    Number of events pending for the conversation with the most pending events.
+    """
+    active_conversations: int = 0
+    """
+    Number of conversations with a worker, which are those with pending events, or with an event being handled.
+    """
+    handled_events: int = 0
+    failed_events: int = 0
+    total_wait_seconds: float = 0.0
+    """
+    Total time from events being enqueued to their handling starting, including waits for a concurrency slot.
+    """
+    max_wait_seconds: float = 0.0
+    total_handler_seconds: float = 0.0
+    max_handler_seconds: float = 0.0
+
+
+@dataclass
+class _ConversationEvents:
+    pending: collections.deque[tuple[float, workbench_model.ConversationEvent]] = field(
+        default_factory=collections.deque
+    )
+    worker: asyncio.Task | None = None
+
+
+class ConversationEventScheduler:
+    """
+    Handles the events of each conversation in order, one at a time. A worker task is started for a conversation
+    when an event is enqueued for it, and exits when the conversation has no more pending events, so that idle
+    conversations cost nothing.
+
+    Up to max_concurrency events are handled at a time, and up to max_concurrency_per_assistant for each assistant.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[str, workbench_model.ConversationEvent], Awaitable[None]],
+        max_concurrency: int,
+        max_concurrency_per_assistant: int,
+    ) -> None:
+        self._handle = handle
+        self._max_concurrency_per_assistant = max_concurrency_per_assistant
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._conversations: dict[tuple[str, str], _ConversationEvents] = {}
+        # the semaphores of assistants with active conversations, with the number of those conversations
+        self._assistant_semaphores: dict[str, tuple[asyncio.Semaphore, int]] = {}
+        self._metrics = ConversationEventSchedulerMetrics()
+
+    def enqueue(self, assistant_id: str, event: workbench_model.ConversationEvent) -> None:
+        key = (assistant_id, str(event.conversation_id))
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            conversation = _ConversationEvents()
+            self._conversations[key] = conversation
+
+        conversation.pending.append((time.monotonic(), event))
+
+        if conversation.worker is None:
+            semaphore, conversations = self._assistant_semaphores.get(
+                assistant_id, (asyncio.Semaphore(self._max_concurrency_per_assistant), 0)
+            )
+            self._assistant_semaphores[assistant_id] = (semaphore, conversations + 1)
+            conversation.worker = asyncio.create_task(
+                self._work(key, conversation, semaphore), name=f"handle_conversation_events_{key[1]}"
+            )
+
+    def metrics(self) -> ConversationEventSchedulerMetrics:
+        pending = [len(conversation.pending) for conversation in self._conversations.values()]
+        self._metrics.pending_events = sum(pending)
+        self._metrics.max_pending_events = max(pending, default=0)
+        self._metrics.active_conversations = len(self._conversations)
+        return self._metrics
+
+    async def aclose(self) -> None:
+        workers = [conversation.worker for conversation in self._conversations.values() if conversation.worker]
+        for worker in workers:
+            worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _work(
+        self, key: tuple[str, str], conversation: _ConversationEvents, assistant_semaphore: asyncio.Semaphore
+    ) -> None:
+        assistant_id, conversation_id = key
+        try:
+            # the worker exits, without awaiting, once there are no pending events, so that events enqueued
+            # after that start a new worker
+            while conversation.pending:
+                async with assistant_semaphore, self._semaphore:
+                    enqueued_at, event = conversation.pending.popleft()
+                    started_at = time.monotonic()
+                    wait_seconds = started_at - enqueued_at
+                    self._metrics.total_wait_seconds += wait_seconds
+                    self._metrics.max_wait_seconds = max(self._metrics.max_wait_seconds, wait_seconds)
+
+                    asgi_correlation_id.correlation_id.set(event.correlation_id)
+                    try:
+                        await self._handle(assistant_id, event)
+                        self._metrics.handled_events += 1
+                    except Exception:
+                        self._metrics.failed_events += 1
+                        logger.exception(
+                            "exception handling conversation event; assistant_id: %s, conversation_id: %s,"
+                            " event_id: %s",
+                            assistant_id,
+                            conversation_id,
+                            event.id,
+                        )
+
+                    handler_seconds = time.monotonic() - started_at
+                    self._metrics.total_handler_seconds += handler_seconds
+                    self._metrics.max_handler_seconds = max(self._metrics.max_handler_seconds, handler_seconds)
+
+        finally:
+            del self._conversations[key]
+            semaphore, conversations = self._assistant_semaphores[assistant_id]
+            if conversations > 1:
+                self._assistant_semaphores[assistant_id] = (semaphore, conversations - 1)
+            else:
+                del self._assistant_semaphores[assistant_id]
@@ -16,20 +16,20 @@ from typing import (
     cast,
 )
 
-import asgi_correlation_id
 import httpx
 import semantic_workbench_api_model
 import semantic_workbench_api_model.workbench_service_client
 from fastapi import HTTPException, status
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, ValidationError
+from pydantic import ValidationError
 from semantic_workbench_api_model import assistant_model, workbench_model
 
 from .. import settings
 from ..assistant_service import FastAPIAssistantService
-from ..storage import read_model, write_model
+from .assistant_states import AssistantState, AssistantStateStore, ConversationState
 from .context import AssistantContext, ConversationContext
 from .error import BadRequestError, ConflictError, NotFoundError
+from .event_scheduler import ConversationEventScheduler, ConversationEventSchedulerMetrics
 from .protocol import (
     AssistantAppProtocol,
     WriteableAssistantConversationInspectorStateProvider,
@@ -38,41 +38,6 @@ from .protocol import (
 logger = logging.getLogger(__name__)
 
 
-class _ConversationState(BaseModel):
-    """
-    Private model for conversation state for the AssistantService.
-    """
-
-    conversation_id: str
-    title: str
-
-
-class _AssistantState(BaseModel):
-    """
-    Private model for assistant state for the AssistantService.
-    """
-
-    assistant_id: str
-    assistant_name: str
-
-    template_id: str = "default"
-
-    conversations: dict[str, _ConversationState] = {}
-
-
-class _PersistedAssistantStates(BaseModel):
-    """
-    Private model for persisted assistant states for the AssistantService.
-    """
-
-    assistants: dict[str, _AssistantState] = {}
-
-
-class _Event(BaseModel):
-    assistant_id: str
-    event: workbench_model.ConversationEvent
-
-
 def translate_assistant_errors(func):
     @contextmanager
     def wrapping_logic():
@@ -136,9 +101,16 @@ class AssistantService(FastAPIAssistantService):
         )
 
         self._root_path = pathlib.Path(settings.storage.root)
-        self._assistant_states_path = self._root_path / "assistant_states.json"
-        self._event_queue_lock = asyncio.Lock()
-        self._conversation_event_queues: dict[tuple[str, str], asyncio.Queue[_Event]] = {}
+        self._assistant_states = AssistantStateStore(
+            root_path=self._root_path,
+            flush_delay_seconds=settings.assistant_states_flush_delay_seconds,
+            sharded=settings.assistant_states_sharded,
+        )
+        self._conversation_event_scheduler = ConversationEventScheduler(
+            handle=self._handle_event,
+            max_concurrency=settings.conversation_event_max_concurrency,
+            max_concurrency_per_assistant=settings.conversation_event_max_concurrency_per_assistant,
+        )
         self._conversation_event_tasks: set[asyncio.Task] = set()
         self._workbench_httpx_client = httpx.AsyncClient(
             transport=semantic_workbench_api_model.workbench_service_client.httpx_transport_factory(),
@@ -156,6 +128,8 @@ class AssistantService(FastAPIAssistantService):
         finally:
             await self._workbench_httpx_client.aclose()
             await self.assistant_app.events._on_service_shutdown_handlers(True)
+            await self._conversation_event_scheduler.aclose()
+            await self._assistant_states.aclose()
 
             for task in self._conversation_event_tasks:
                 task.cancel()
@@ -168,24 +142,6 @@ class AssistantService(FastAPIAssistantService):
                 if isinstance(result, Exception):
                     logging.exception("event handling task raised exception", exc_info=result)
 
-    def read_assistant_states(self) -> _PersistedAssistantStates:
-        states = None
-        try:
-            states = read_model(self._assistant_states_path, _PersistedAssistantStates)
-        except FileNotFoundError:
-            pass
-        except ValidationError:
-            logging.warning(
-                "invalid assistant states, returning new state; path: %s",
-                self._assistant_states_path,
-                exc_info=True,
-            )
-
-        return states or _PersistedAssistantStates()
-
-    def write_assistant_states(self, new_states: _PersistedAssistantStates) -> None:
-        write_model(self._assistant_states_path, new_states)
-
     def _build_assistant_context(self, assistant_id: str, template_id: str, assistant_name: str) -> AssistantContext:
         return AssistantContext(
             _assistant_service_id=self.service_id,
@@ -195,8 +151,7 @@ class AssistantService(FastAPIAssistantService):
         )
 
     def get_assistant_context(self, assistant_id: str) -> AssistantContext | None:
-        states = self.read_assistant_states()
-        assistant_state = states.assistants.get(assistant_id)
+        assistant_state = self._assistant_states.get(assistant_id)
         if assistant_state is None:
             return None
         return self._build_assistant_context(
@@ -206,8 +161,7 @@ class AssistantService(FastAPIAssistantService):
         )
 
     def get_conversation_context(self, assistant_id: str, conversation_id: str) -> ConversationContext | None:
-        states = self.read_assistant_states()
-        assistant_state = states.assistants.get(assistant_id)
+        assistant_state = self._assistant_states.get(assistant_id)
         if assistant_state is None:
             return None
         conversation_state = assistant_state.conversations.get(conversation_id)
@@ -277,19 +231,17 @@ class AssistantService(FastAPIAssistantService):
         assistant: assistant_model.AssistantPutRequestModel,
         from_export: IO[bytes] | None = None,
     ) -> assistant_model.AssistantResponseModel:
-        is_new = False
-        states = self.read_assistant_states()
+        existing_state = self._assistant_states.get(assistant_id)
 
-        assistant_state = states.assistants.get(assistant_id) or _AssistantState(
+        assistant_state = existing_state or AssistantState(
             assistant_id=assistant_id,
             assistant_name=assistant.assistant_name,
             template_id=assistant.template_id,
         )
         assistant_state.assistant_name = assistant.assistant_name
 
-        is_new = not from_export and assistant_id not in states.assistants
-        states.assistants[assistant_id] = assistant_state
-        self.write_assistant_states(states)
+        is_new = not from_export and existing_state is None
+        self._assistant_states.put(assistant_state)
 
         assistant_context = require_found(self.get_assistant_context(assistant_id))
         if is_new:
@@ -345,19 +297,16 @@ class AssistantService(FastAPIAssistantService):
         if assistant_context is None:
             return
 
-        states = self.read_assistant_states()
-        assistant_state = states.assistants.get(assistant_id)
+        assistant_state = self._assistant_states.get(assistant_id)
 
         if assistant_state is None:
             return
 
         # delete conversations
-        for conversation_id in assistant_state.conversations:
+        for conversation_id in list(assistant_state.conversations):
             await self.delete_conversation(assistant_id, conversation_id)
 
-        states = self.read_assistant_states()
-        states.assistants.pop(assistant_id, None)
-        self.write_assistant_states(states)
+        self._assistant_states.delete(assistant_id)
 
         await self.assistant_app.events.assistant._on_deleted_handlers(True, assistant_context)
 
@@ -390,10 +339,9 @@ class AssistantService(FastAPIAssistantService):
         conversation: assistant_model.ConversationPutRequestModel,
         from_export: IO[bytes] | None = None,
     ) -> assistant_model.ConversationResponseModel:
-        states = self.read_assistant_states()
-        assistant_state = require_found(states.assistants.get(assistant_id))
+        assistant_state = require_found(self._assistant_states.get(assistant_id))
 
-        conversation_state = assistant_state.conversations.get(conversation_id) or _ConversationState(
+        conversation_state = assistant_state.conversations.get(conversation_id) or ConversationState(
             conversation_id=conversation_id,
             title=conversation.title,
         )
@@ -402,7 +350,7 @@ class AssistantService(FastAPIAssistantService):
         conversation_state.title = conversation.title
 
         assistant_state.conversations[conversation_id] = conversation_state
-        self.write_assistant_states(states)
+        self._assistant_states.put(assistant_state)
 
         conversation_context = require_found(self.get_conversation_context(assistant_id, conversation_id))
 
@@ -444,85 +392,42 @@ class AssistantService(FastAPIAssistantService):
         if conversation_context is None:
             return None
 
-        states = self.read_assistant_states()
-        assistant_state = require_found(states.assistants.get(assistant_id))
+        assistant_state = require_found(self._assistant_states.get(assistant_id))
         if assistant_state.conversations.pop(conversation_id, None) is None:
             return
-        self.write_assistant_states(states)
+        self._assistant_states.put(assistant_state)
 
         await self.assistant_app.events.conversation._on_deleted_handlers(True, conversation_context)
 
-    async def _get_or_create_queue(self, assistant_id: str, conversation_id: str) -> asyncio.Queue[_Event]:
-        key = (assistant_id, conversation_id)
-        queue = self._conversation_event_queues.get(key)
-        if queue is not None:
-            return queue
-
-        async with self._event_queue_lock:
-            queue = self._conversation_event_queues.get(key)
-            if queue is not None:
-                return queue
-
-            queue = asyncio.Queue()
-            self._conversation_event_queues[key] = queue
-            task = asyncio.create_task(self._forward_events_from_queue(queue))
-            self._conversation_event_tasks.add(task)
-            task.add_done_callback(self._conversation_event_tasks.discard)
-            return queue
-
-    async def _forward_events_from_queue(self, queue: asyncio.Queue[_Event]) -> None:
+    def conversation_event_metrics(self) -> ConversationEventSchedulerMetrics:
         """
-        De-queues events and makes the call to process_workbench_event.
+        Returns the queue depth, wait time and handler latency metrics of the conversation event handling.
         """
-        while True:
-            try:
-                wrapper = None
-                try:
-                    async with asyncio.timeout(1):
-                        wrapper = await queue.get()
-                except asyncio.TimeoutError:
-                    continue
-
-                except RuntimeError as e:
-                    logging.exception("exception in _forward_events_from_queue loop")
-                    if e.args[0] == "Event loop is closed":
-                        break
-
-                queue.task_done()
+        return self._conversation_event_scheduler.metrics()
 
-                if wrapper is None:
-                    continue
-
-                assistant_id = wrapper.assistant_id
-                event = wrapper.event
-
-                asgi_correlation_id.correlation_id.set(event.correlation_id)
-
-                conversation_context = self.get_conversation_context(
-                    assistant_id=assistant_id,
-                    conversation_id=str(event.conversation_id),
-                )
-                if conversation_context is None:
-                    continue
-
-                timestamp_now = datetime.datetime.now(datetime.UTC)
+    async def _handle_event(self, assistant_id: str, event: workbench_model.ConversationEvent) -> None:
+        conversation_context = self.get_conversation_context(
+            assistant_id=assistant_id,
+            conversation_id=str(event.conversation_id),
+        )
+        if conversation_context is None:
+            return
 
-                start = perf_counter()
-                await self._forward_event(conversation_context, event)
-                end = perf_counter()
+        timestamp_now = datetime.datetime.now(datetime.UTC)
 
-                logger.debug(
-                    "forwarded event to event handler; assistant_id: %s, conversation_id: %s, event_id: %s, event: %s, time-since-event: %s, time-taken: %s",
-                    assistant_id,
-                    event.conversation_id,
-                    event.id,
-                    event.event,
-                    timestamp_now - event.timestamp,
-                    datetime.timedelta(seconds=end - start),
-                )
+        start = perf_counter()
+        await self._forward_event(conversation_context, event)
+        end = perf_counter()
 
-            except Exception:
-                logging.exception("exception in _forward_events_from_queue loop")
+        logger.debug(
+            "forwarded event to event handler; assistant_id: %s, conversation_id: %s, event_id: %s, event: %s, time-since-event: %s, time-taken: %s",
+            assistant_id,
+            event.conversation_id,
+            event.id,
+            event.event,
+            timestamp_now - event.timestamp,
+            datetime.timedelta(seconds=end - start),
+        )
 
     @translate_assistant_errors
     async def post_conversation_event(
@@ -537,8 +442,34 @@ class AssistantService(FastAPIAssistantService):
         """
         _ = require_found(self.get_conversation_context(assistant_id, conversation_id))
 
-        queue = await self._get_or_create_queue(assistant_id=assistant_id, conversation_id=conversation_id)
-        await queue.put(_Event(assistant_id=assistant_id, event=event))
+        self._conversation_event_scheduler.enqueue(assistant_id, event)
+
+    @translate_assistant_errors
+    async def post_conversation_events(
+        self,
+        assistant_id: str,
+        events: list[workbench_model.ConversationEvent],
+    ) -> None:
+        """
+        Receives a batch of events from semantic workbench, and buffers them in the per-conversation queues in
+        order. Events for unknown conversations are skipped.
+        """
+        assistant_state = self._assistant_states.get(assistant_id)
+        if assistant_state is None:
+            logger.debug("skipping events for assistant that was not found; assistant_id: %s", assistant_id)
+            return
+
+        for event in events:
+            conversation_id = str(event.conversation_id)
+            if conversation_id not in assistant_state.conversations:
+                logger.debug(
+                    "skipping event for conversation that was not found; assistant_id: %s, conversation_id: %s",
+                    assistant_id,
+                    conversation_id,
+                )
+                continue
+
+            self._conversation_event_scheduler.enqueue(assistant_id, event)
 
     async def _forward_event(
         self,
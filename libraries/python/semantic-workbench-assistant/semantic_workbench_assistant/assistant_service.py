@@ -260,6 +260,27 @@ class FastAPIAssistantService(ABC):
     ) -> None:
         pass
 
+    async def post_conversation_events(
+        self,
+        assistant_id: str,
+        events: list[workbench_model.ConversationEvent],
+    ) -> None:
+        """
+        Receives a batch of events, in order, for any of the assistant's conversations. Events for conversations
+        that are not found are skipped. Implementations can override this to avoid handling events one at a time.
+        """
+        for event in events:
+            try:
+                await self.post_conversation_event(assistant_id, str(event.conversation_id), event)
+            except HTTPException as e:
+                if e.status_code != status.HTTP_404_NOT_FOUND:
+                    raise
+                logger.debug(
+                    "skipping event for conversation that was not found; assistant_id: %s, conversation_id: %s",
+                    assistant_id,
+                    event.conversation_id,
+                )
+
     @abstractmethod
     async def get_conversation_state_descriptions(
         self, assistant_id: str, conversation_id: str
@@ -446,6 +467,17 @@ def _assistant_service_api(
     ) -> None:
         return await service.post_conversation_event(assistant_id, conversation_id, event)
 
+    @app.post(
+        "/{assistant_id}/events",
+        description="Notify assistant of a batch of events in its conversations",
+        status_code=status.HTTP_204_NO_CONTENT,
+    )
+    async def post_conversation_events(
+        assistant_id: str,
+        event_list: workbench_model.ConversationEventList,
+    ) -> None:
+        return await service.post_conversation_events(assistant_id, event_list.events)
+
     @app.get(
         "/{assistant_id}/conversations/{conversation_id}/states",
         description="Get the descriptions of the states available for a conversation",
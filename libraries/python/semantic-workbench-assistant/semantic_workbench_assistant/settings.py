@@ -14,6 +14,16 @@ class Settings(BaseSettings):
     storage: FileStorageSettings = FileStorageSettings(root=".data/assistants")
     logging: LoggingSettings = LoggingSettings()
 
+    # changes to assistant states are persisted after this delay, so that bursts of changes are written once; when
+    # sharded, each assistant's state is persisted in its own file
+    assistant_states_flush_delay_seconds: float = 0.5
+    assistant_states_sharded: bool = False
+
+    # the events of each conversation are handled in order; these limit the events handled at a time, across all
+    # conversations, and across the conversations of each assistant
+    conversation_event_max_concurrency: int = 256
+    conversation_event_max_concurrency_per_assistant: int = 64
+
     workbench_service_url: HttpUrl = HttpUrl("http://127.0.0.1:3000")
     workbench_service_api_key: str = ""
     workbench_service_ping_interval_seconds: float = 30.0
@@ -1,7 +1,11 @@
 import logging
 import os
 import pathlib
-from typing import Any, Iterator, TypeVar
+import sqlite3
+import stat
+import tempfile
+import threading
+from typing import Any, Iterator, Protocol, TypeVar
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -9,24 +13,69 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 logger = logging.getLogger(__name__)
 
 
+# the process umask, read once as reading it requires setting it, which would race with files created concurrently
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path: pathlib.Path) -> int:
+    """
+    Returns the mode to write the file with: its current mode or, for a new file, the mode of files created by
+    open(), rather than the owner-only mode of temporary files.
+    """
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
 class FileStorageSettings(BaseSettings):
     model_config = SettingsConfigDict(extra="allow")
 
     root: str = ".data/files"
 
 
+def write_atomic(file_path: os.PathLike | str, data: bytes) -> None:
+    """
+    Replace the file with the data, atomically: the data is written and fsynced to a temporary file in the same
+    directory, which is renamed over the file, so that readers, and crashes, see either the old or the new file.
+    """
+    path = pathlib.Path(file_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile("wb", dir=path.parent, prefix=f".{path.name}.", delete=False) as file:
+        try:
+            pathlib.Path(file.name).chmod(_file_mode(path))
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            file.close()
+            pathlib.Path(file.name).unlink()
+            raise
+    pathlib.Path(file.name).replace(path)
+
+    # persist the rename; not all platforms support opening directories
+    try:
+        directory_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_fd)
+
+
 def write_model(
     file_path: os.PathLike,
     value: BaseModel,
     serialization_context: dict[str, Any] | None = None,
 ) -> None:
-    """Write a pydantic model to a file."""
-    path = pathlib.Path(file_path)
-    if not path.parent.exists():
-        path.parent.mkdir(parents=True)
-
+    """Write a pydantic model to a file, atomically."""
     data_json = value.model_dump_json(context=serialization_context, indent=2)
-    path.write_text(data_json, encoding="utf-8")
+    write_atomic(file_path, data_json.encode("utf-8"))
 
 
 ModelT = TypeVar("ModelT", bound=BaseModel)
@@ -53,6 +102,153 @@ def read_models_in_dir(dir_path: os.PathLike, cls: type[ModelT]) -> Iterator[Mod
         return
 
     for file_path in path.iterdir():
+        # skip the temporary files of writes in progress
+        if file_path.name.startswith("."):
+            continue
         value = read_model(file_path, cls)
         if value is not None:
             yield value
+
+
+class StorageBackend(Protocol):
+    """
+    Key-value storage of serialized models. Keys are "/"-separated paths.
+    """
+
+    def read(self, key: str) -> bytes | None: ...
+
+    def write(self, key: str, data: bytes) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        """Iterate over the keys that start with the prefix."""
+        ...
+
+
+class FileStorageBackend:
+    """
+    Stores each value in a file, at the key's path under the root directory, written atomically.
+    """
+
+    def __init__(self, root: os.PathLike | str) -> None:
+        self._root = pathlib.Path(root)
+
+    def _path_for(self, key: str) -> pathlib.Path:
+        path = (self._root / key).resolve()
+        if not path.is_relative_to(self._root.resolve()):
+            raise ValueError(f"key is outside of the storage root: {key}")
+        return path
+
+    def read(self, key: str) -> bytes | None:
+        try:
+            return self._path_for(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, data: bytes) -> None:
+        write_atomic(self._path_for(key), data)
+
+    def delete(self, key: str) -> None:
+        self._path_for(key).unlink(missing_ok=True)
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        if not self._root.is_dir():
+            return
+        for path in self._root.rglob("*"):
+            # skip the temporary files of writes in progress
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            key = path.relative_to(self._root).as_posix()
+            if key.startswith(prefix):
+                yield key
+
+
+class SQLiteStorageBackend:
+    """
+    Stores values in a key-value table in a SQLite database, in WAL journal mode, so that each write is a small,
+    atomic transaction, rather than a file rewrite. Suited to assistants that persist many small models.
+
+    Instances can be shared by threads; each thread uses its own connection.
+    """
+
+    def __init__(self, database_path: os.PathLike | str) -> None:
+        self._database_path = pathlib.Path(database_path)
+        self._database_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._database_path, check_same_thread=False)
+            # in WAL mode, NORMAL synchronization is durable across application crashes
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def read(self, key: str) -> bytes | None:
+        row = self._connection().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def write(self, key: str, data: bytes) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO kv (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, data),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        # the upper bound of the prefix range lets the primary key index serve the query
+        rows = self._connection().execute(
+            "SELECT key FROM kv WHERE key >= ? AND key < ? ORDER BY key", (prefix, prefix + "\U0010ffff")
+        )
+        for (key,) in rows.fetchall():
+            yield key
+
+    def close(self) -> None:
+        """Close the connections of all threads. Connections are reopened on use."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+class ModelStorage:
+    """
+    Reads and writes pydantic models, serialized as JSON, in a storage backend.
+    """
+
+    def __init__(self, backend: StorageBackend) -> None:
+        self.backend = backend
+
+    def write_model(self, key: str, value: BaseModel, serialization_context: dict[str, Any] | None = None) -> None:
+        self.backend.write(key, value.model_dump_json(context=serialization_context).encode("utf-8"))
+
+    def read_model(self, key: str, cls: type[ModelT], strict: bool | None = None) -> ModelT | None:
+        data_json = self.backend.read(key)
+        if data_json is None:
+            return None
+        return cls.model_validate_json(data_json, strict=strict)
+
+    def read_models(self, prefix: str, cls: type[ModelT]) -> Iterator[ModelT]:
+        """Read the models whose keys start with the prefix."""
+        for key in self.backend.keys(prefix):
+            value = self.read_model(key, cls)
+            if value is not None:
+                yield value
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
@@ -36,6 +36,7 @@ from semantic_workbench_assistant.assistant_app import (
     FileStorageConversationDataExporter,
     NotFoundError,
 )
+from semantic_workbench_assistant.assistant_app.config import AssistantConfigCache
 from semantic_workbench_assistant.assistant_app.context import storage_directory_for_context
 from semantic_workbench_assistant.assistant_app.service import (
     translate_assistant_errors,
@@ -228,6 +229,90 @@ async def test_assistant_with_event_handlers(
         assert message_created_all_calls == 3
 
 
+async def test_assistant_with_batched_events(
+    monkeypatch: pytest.MonkeyPatch, storage_settings: storage.FileStorageSettings
+) -> None:
+    monkeypatch.setattr(settings, "storage", storage_settings)
+
+    app = AssistantApp(
+        assistant_service_id="assistant_id",
+        assistant_service_name="service name",
+        assistant_service_description="service description",
+    )
+
+    received_contents: list[str] = []
+
+    @app.events.conversation.message.on_created
+    async def on_message_created(
+        conversation_context: ConversationContext,
+        _: workbench_model.ConversationEvent,
+        message: workbench_model.ConversationMessage,
+    ) -> None:
+        received_contents.append(message.content)
+
+    service = app.fastapi_app()
+
+    monkeypatch.setattr(assistant_service_client, "httpx_transport_factory", lambda: httpx.ASGITransport(app=service))
+    monkeypatch.setattr(workbench_service_client, "httpx_transport_factory", lambda: AllOKTransport())
+
+    def message_event(conversation_id: uuid.UUID, content: str) -> workbench_model.ConversationEvent:
+        return workbench_model.ConversationEvent(
+            conversation_id=conversation_id,
+            event=workbench_model.ConversationEventType.message_created,
+            data={
+                "message": workbench_model.ConversationMessage(
+                    id=uuid.uuid4(),
+                    sender=workbench_model.MessageSender(
+                        participant_role=workbench_model.ParticipantRole.user, participant_id="user"
+                    ),
+                    timestamp=datetime.datetime.now(),
+                    content_type="text/plain",
+                    content=content,
+                    filenames=[],
+                    metadata={},
+                    has_debug_data=False,
+                ).model_dump(mode="json")
+            },
+        )
+
+    async with LifespanManager(service):
+        assistant_id = uuid.uuid4()
+        client_builder = assistant_service_client.AssistantServiceClientBuilder("https://fake", "")
+        instance_client = client_builder.for_assistant(assistant_id)
+
+        await client_builder.for_service().put_assistant(
+            assistant_id=assistant_id,
+            request=assistant_model.AssistantPutRequestModel(assistant_name="my assistant", template_id="default"),
+            from_export=None,
+        )
+
+        conversation_id = uuid.uuid4()
+        await instance_client.put_conversation(
+            request=assistant_model.ConversationPutRequestModel(id=str(conversation_id), title="My conversation"),
+            from_export=None,
+        )
+
+        # events for unknown conversations are skipped without failing the batch
+        await instance_client.post_conversation_events(
+            events=[
+                message_event(conversation_id, "first"),
+                message_event(uuid.uuid4(), "unknown conversation"),
+                message_event(conversation_id, "second"),
+            ]
+        )
+
+        async with asyncio.timeout(5):
+            while len(received_contents) < 2:
+                await asyncio.sleep(0.01)
+
+        assert received_contents == ["first", "second"]
+
+        # events for an unknown assistant are skipped
+        await client_builder.for_assistant(uuid.uuid4()).post_conversation_events(
+            events=[message_event(conversation_id, "unknown assistant")]
+        )
+
+
 async def test_assistant_with_inspector(
     monkeypatch: pytest.MonkeyPatch, storage_settings: storage.FileStorageSettings
 ) -> None:
@@ -501,6 +586,58 @@ async def test_assistant_with_config_provider(
         assert e.value.status_code == 400
 
 
+async def test_config_provider_caches_configs(
+    monkeypatch: pytest.MonkeyPatch, storage_settings: storage.FileStorageSettings
+) -> None:
+    monkeypatch.setattr(settings, "storage", storage_settings)
+
+    class NestedConfigModel(BaseModel):
+        items: list[str] = ["item"]
+
+    class TestConfigModel(BaseModel):
+        test_key: str = "test_value"
+        nested: NestedConfigModel = NestedConfigModel()
+
+    cache = AssistantConfigCache()
+    assistant_config = BaseModelAssistantConfig(TestConfigModel, cache=cache)
+    assistant_context = AssistantContext(
+        _assistant_service_id="assistant_service_id", _template_id="default", id="assistant_id", name="assistant"
+    )
+
+    config = await assistant_config.get(assistant_context)
+    assert config.model_dump() == TestConfigModel().model_dump()
+    assert (cache.metrics().hits, cache.metrics().misses) == (0, 1)
+
+    # callers get copies of the cached config, so their changes, at any depth, are not shared
+    assert isinstance(config, TestConfigModel)
+    config.test_key = "changed"
+    config.nested.items.append("changed")
+    config = await assistant_config.get(assistant_context)
+    assert config.model_dump() == TestConfigModel().model_dump()
+    assert (cache.metrics().hits, cache.metrics().misses) == (1, 1)
+
+    # configs are invalidated when they are set
+    await assistant_config.provider.set(assistant_context, {"test_key": "set_value"})
+    config = await assistant_config.get(assistant_context)
+    assert config.test_key == "set_value"
+
+    # the provider's validation of the config is memoized with it
+    config_data = await assistant_config.provider.get(assistant_context)
+    assert await assistant_config.provider.get(assistant_context) is config_data
+
+    # and when their files change
+    storage.write_model(
+        storage_directory_for_context(assistant_context, partition="private") / "config.json",
+        TestConfigModel(test_key="written_value"),
+    )
+    config = await assistant_config.get(assistant_context)
+    assert config.test_key == "written_value"
+
+    metrics = cache.metrics()
+    assert metrics.invalidations == 2
+    assert metrics.hit_rate == metrics.hits / (metrics.hits + metrics.misses)
+
+
 async def test_file_system_storage_state_data_provider_to_empty_dir(
     storage_settings: storage.FileStorageSettings, monkeypatch: pytest.MonkeyPatch
 ) -> None:
@@ -0,0 +1,91 @@
+import asyncio
+import pathlib
+import tempfile
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from semantic_workbench_assistant.assistant_app import assistant_states
+from semantic_workbench_assistant.assistant_app.assistant_states import (
+    AssistantState,
+    AssistantStateStore,
+    ConversationState,
+)
+
+
+@pytest.fixture
+def root_path() -> Iterator[pathlib.Path]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield pathlib.Path(temp_dir)
+
+
+def assistant_state(assistant_id: str, *conversation_ids: str) -> AssistantState:
+    return AssistantState(
+        assistant_id=assistant_id,
+        assistant_name=f"assistant {assistant_id}",
+        conversations={
+            conversation_id: ConversationState(conversation_id=conversation_id, title=conversation_id)
+            for conversation_id in conversation_ids
+        },
+    )
+
+
+async def test_assistant_state_store_debounces_writes(root_path: pathlib.Path) -> None:
+    store = AssistantStateStore(root_path=root_path, flush_delay_seconds=0.05)
+
+    with mock.patch.object(assistant_states, "_write_atomic", wraps=assistant_states._write_atomic) as write_atomic:
+        for index in range(10):
+            store.put(assistant_state(f"assistant-{index}"))
+
+        # changes are visible immediately, and persisted once after the delay
+        assert store.get("assistant-9") == assistant_state("assistant-9")
+        assert not (root_path / "assistant_states.json").exists()
+
+        await asyncio.sleep(0.1)
+        assert write_atomic.call_count == 1
+
+    reloaded = AssistantStateStore(root_path=root_path)
+    assert reloaded.get("assistant-9") == assistant_state("assistant-9")
+
+    store.delete("assistant-9")
+    await store.aclose()
+
+    reloaded = AssistantStateStore(root_path=root_path)
+    assert reloaded.get("assistant-9") is None
+    assert reloaded.get("assistant-0") == assistant_state("assistant-0")
+
+    # files are written through temporary files, which are renamed over them
+    assert [path.name for path in root_path.iterdir()] == ["assistant_states.json"]
+
+
+async def test_assistant_state_store_shards(root_path: pathlib.Path) -> None:
+    unsharded = AssistantStateStore(root_path=root_path)
+    unsharded.put(assistant_state("assistant-1", "conversation-1"))
+    unsharded.put(assistant_state("assistant-2"))
+    await unsharded.aclose()
+
+    # states persisted before sharding are moved to their shards
+    store = AssistantStateStore(root_path=root_path, flush_delay_seconds=0, sharded=True)
+    assert store.get("assistant-1") == assistant_state("assistant-1", "conversation-1")
+    await store.flush()
+
+    assert not (root_path / "assistant_states.json").exists()
+    assert len(list((root_path / "assistant_states").iterdir())) == 2
+
+    # a change rewrites only the shard of the changed assistant
+    with mock.patch.object(assistant_states, "_write_atomic", wraps=assistant_states._write_atomic) as write_atomic:
+        updated = store.get("assistant-2")
+        assert updated is not None
+        updated.conversations["conversation-2"] = ConversationState(
+            conversation_id="conversation-2", title="conversation-2"
+        )
+        store.put(updated)
+        store.delete("assistant-1")
+        await store.aclose()
+
+        assert write_atomic.call_count == 2
+
+    reloaded = AssistantStateStore(root_path=root_path, sharded=True)
+    assert reloaded.get("assistant-1") is None
+    assert reloaded.get("assistant-2") == assistant_state("assistant-2", "conversation-2")
+    assert len(list((root_path / "assistant_states").iterdir())) == 1
@@ -0,0 +1,133 @@
+import asyncio
+import uuid
+from unittest import mock
+
+from pydantic import BaseModel
+from semantic_workbench_api_model import workbench_model
+from semantic_workbench_assistant.assistant_app import (
+    AssistantContext,
+    ContentSafety,
+    ContentSafetyEvaluation,
+    ContentSafetyEvaluationResult,
+    ConversationContext,
+)
+
+
+class EvaluatorConfig(BaseModel):
+    threshold: int = 1
+
+
+class CountingEvaluator:
+    """
+    Records the content evaluated, and the number of evaluations in progress at a time. Content containing "unsafe"
+    gets a warning.
+    """
+
+    def __init__(self, config: EvaluatorConfig) -> None:
+        self.config = config
+        self.evaluated: list[str | list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def evaluate(self, content: str | list[str]) -> ContentSafetyEvaluation:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            self.evaluated.append(content)
+        finally:
+            self.in_flight -= 1
+
+        if "unsafe" in content:
+            return ContentSafetyEvaluation(result=ContentSafetyEvaluationResult.Warn, note=f"unsafe: {content}")
+        return ContentSafetyEvaluation(result=ContentSafetyEvaluationResult.Pass)
+
+
+def conversation_context() -> ConversationContext:
+    return ConversationContext(
+        id=str(uuid.uuid4()),
+        title="My conversation",
+        assistant=AssistantContext(
+            _assistant_service_id="",
+            _template_id="",
+            id=str(uuid.uuid4()),
+            name="my assistant",
+        ),
+        httpx_client=mock.ANY,
+    )
+
+
+def conversation_event(event_type: workbench_model.ConversationEventType, **data) -> workbench_model.ConversationEvent:
+    return workbench_model.ConversationEvent(conversation_id=uuid.uuid4(), event=event_type, data=data)
+
+
+def message_created(content: str) -> workbench_model.ConversationEvent:
+    return conversation_event(
+        workbench_model.ConversationEventType.message_created,
+        message={"id": str(uuid.uuid4()), "content": content, "metadata": {}},
+    )
+
+
+async def test_content_safety_caches_verdicts() -> None:
+    evaluators = {
+        1: CountingEvaluator(EvaluatorConfig(threshold=1)),
+        2: CountingEvaluator(EvaluatorConfig(threshold=2)),
+    }
+    threshold = 1
+
+    async def factory(context: ConversationContext) -> CountingEvaluator:
+        return evaluators[threshold]
+
+    content_safety = ContentSafety(factory)
+    context = conversation_context()
+
+    # repeated content is evaluated once, including when it is evaluated concurrently
+    events = await asyncio.gather(*[
+        content_safety.intercept_incoming_event(context, message_created("hello")) for _ in range(3)
+    ])
+    await content_safety.intercept_incoming_event(context, message_created("hello"))
+    assert evaluators[1].evaluated == ["hello"]
+
+    for event in events:
+        assert event is not None
+        assert event.data["content_safety"]["intercept_incoming_event"]["evaluation"]["result"] == "pass"
+
+    # event types without content are not evaluated
+    await content_safety.intercept_incoming_event(
+        context, conversation_event(workbench_model.ConversationEventType.participant_updated, participant={})
+    )
+    assert evaluators[1].evaluated == ["hello"]
+
+    # verdicts are cached per evaluator config
+    threshold = 2
+    await content_safety.intercept_incoming_event(context, message_created("hello"))
+    assert evaluators[2].evaluated == ["hello"]
+
+    metrics = content_safety.verdict_cache.metrics()
+    assert (metrics.hits, metrics.misses) == (3, 2)
+
+
+async def test_content_safety_evaluates_texts_concurrently() -> None:
+    evaluator = CountingEvaluator(EvaluatorConfig())
+
+    async def factory(context: ConversationContext) -> CountingEvaluator:
+        return evaluator
+
+    content_safety = ContentSafety(factory)
+
+    event = await content_safety.intercept_incoming_event(
+        conversation_context(),
+        conversation_event(
+            workbench_model.ConversationEventType.file_created,
+            file={"filename": "notes.txt", "metadata": {"description": "unsafe"}},
+        ),
+    )
+
+    assert sorted(evaluator.evaluated) == ["notes.txt", '{"description": "unsafe"}']
+    assert evaluator.max_in_flight == 2
+
+    # the most severe verdict applies to the event
+    assert event is not None
+    evaluation = event.data["content_safety"]["intercept_incoming_event"]["evaluation"]
+    assert evaluation["result"] == "warn"
+    assert len(evaluation["metadata"]["evaluations"]) == 2
@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+import uuid
+
+from semantic_workbench_api_model import workbench_model
+from semantic_workbench_assistant.assistant_app.event_scheduler import ConversationEventScheduler
+
+
+def conversation_event(conversation_id: uuid.UUID) -> workbench_model.ConversationEvent:
+    return workbench_model.ConversationEvent(
+        conversation_id=conversation_id,
+        event=workbench_model.ConversationEventType.message_created,
+        timestamp=datetime.datetime.now(datetime.UTC),
+        data={},
+    )
+
+
+class RecordingHandler:
+    """
+    Records the events handled, and the number handled at a time. While gate is cleared, handlers wait for it.
+    """
+
+    def __init__(self) -> None:
+        self.handled: list[tuple[str, workbench_model.ConversationEvent]] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, assistant_id: str, event: workbench_model.ConversationEvent) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self.gate.wait()
+            self.handled.append((assistant_id, event))
+        finally:
+            self.in_flight -= 1
+
+
+async def test_conversation_event_scheduler_handles_events_in_order() -> None:
+    handler = RecordingHandler()
+    scheduler = ConversationEventScheduler(handle=handler, max_concurrency=10, max_concurrency_per_assistant=10)
+
+    conversation_ids = [uuid.uuid4(), uuid.uuid4()]
+    events = [conversation_event(conversation_ids[index % 2]) for index in range(10)]
+    for event in events:
+        scheduler.enqueue("assistant", event)
+
+    assert scheduler.metrics().pending_events == 10
+    assert scheduler.metrics().active_conversations == 2
+
+    await asyncio.sleep(0.05)
+
+    for conversation_id in conversation_ids:
+        assert [event for _, event in handler.handled if event.conversation_id == conversation_id] == [
+            event for event in events if event.conversation_id == conversation_id
+        ]
+
+    # workers exit once their conversations are idle
+    metrics = scheduler.metrics()
+    assert (metrics.active_conversations, metrics.pending_events, metrics.handled_events) == (0, 0, 10)
+
+    # and are started again for new events
+    scheduler.enqueue("assistant", conversation_event(conversation_ids[0]))
+    await asyncio.sleep(0.05)
+    assert len(handler.handled) == 11
+
+    await scheduler.aclose()
+
+
+async def test_conversation_event_scheduler_limits_concurrency() -> None:
+    handler = RecordingHandler()
+    handler.gate.clear()
+    scheduler = ConversationEventScheduler(handle=handler, max_concurrency=3, max_concurrency_per_assistant=2)
+
+    for _ in range(4):
+        scheduler.enqueue("assistant-1", conversation_event(uuid.uuid4()))
+    await asyncio.sleep(0.05)
+    assert handler.in_flight == 2
+
+    for _ in range(4):
+        scheduler.enqueue("assistant-2", conversation_event(uuid.uuid4()))
+    await asyncio.sleep(0.05)
+    assert handler.in_flight == 3
+
+    handler.gate.set()
+    await asyncio.sleep(0.05)
+
+    assert len(handler.handled) == 8
+    assert handler.max_in_flight == 3
+
+    metrics = scheduler.metrics()
+    assert metrics.handled_events == 8
+    assert metrics.max_wait_seconds > 0
+    assert metrics.max_handler_seconds > 0
+
+    await scheduler.aclose()
+
+
+async def test_conversation_event_scheduler_continues_after_handler_failure() -> None:
+    handled: list[workbench_model.ConversationEvent] = []
+
+    async def handle(assistant_id: str, event: workbench_model.ConversationEvent) -> None:
+        if not handled:
+            handled.append(event)
+            raise RuntimeError("handler failed")
+        handled.append(event)
+
+    scheduler = ConversationEventScheduler(handle=handle, max_concurrency=1, max_concurrency_per_assistant=1)
+    conversation_id = uuid.uuid4()
+    scheduler.enqueue("assistant", conversation_event(conversation_id))
+    scheduler.enqueue("assistant", conversation_event(conversation_id))
+    await asyncio.sleep(0.05)
+
+    assert len(handled) == 2
+    metrics = scheduler.metrics()
+    assert (metrics.handled_events, metrics.failed_events) == (1, 1)
+
+    await scheduler.aclose()
@@ -1,3 +1,5 @@
+import os
+import stat
 import tempfile
 from pathlib import Path
 from typing import Annotated
@@ -34,6 +36,21 @@ def test_write_read_model():
         assert storage.read_model(value_path, TestModel) == value
 
 
+def test_write_atomic_keeps_file_mode():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "data.json"
+
+        # new files are created with the default mode, rather than that of the temporary files they are written to
+        storage.write_atomic(path, b"{}")
+        umask = os.umask(0)
+        os.umask(umask)
+        assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~umask
+
+        path.chmod(0o640)
+        storage.write_atomic(path, b"{}")
+        assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
 def test_write_read_updated_model():
     class TestModel(BaseModel):
         name: str
@@ -57,3 +74,63 @@ def test_write_read_updated_model():
             storage.read_model(value_path, TestModelBreaking)
 
         assert storage.read_model(value_path, TestModelSupportsOldName) == TestModelSupportsOldName(name_new="test")
+
+
+def test_write_model_replaces_file_atomically():
+    class TestModel(BaseModel):
+        name: str
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        value_path = Path(temp_dir) / "model.json"
+        storage.write_model(file_path=value_path, value=TestModel(name="first"))
+        storage.write_model(file_path=value_path, value=TestModel(name="second"))
+
+        assert storage.read_model(value_path, TestModel) == TestModel(name="second")
+        # the temporary files are renamed over the file
+        assert [path.name for path in Path(temp_dir).iterdir()] == ["model.json"]
+
+        # the temporary files of writes in progress are not read as models
+        (Path(temp_dir) / ".model.json.tmp").write_text('{"name": "partial"')
+        assert list(storage.read_models_in_dir(Path(temp_dir), TestModel)) == [TestModel(name="second")]
+
+
+@pytest.mark.parametrize("backend_type", ["file", "sqlite"])
+def test_model_storage(backend_type: str):
+    class TestModel(BaseModel):
+        name: str
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        backend = (
+            storage.FileStorageBackend(Path(temp_dir))
+            if backend_type == "file"
+            else storage.SQLiteStorageBackend(Path(temp_dir) / "storage.db")
+        )
+        model_storage = storage.ModelStorage(backend)
+
+        assert model_storage.read_model("conversations/1/state.json", TestModel) is None
+
+        model_storage.write_model("conversations/1/state.json", TestModel(name="first"))
+        model_storage.write_model("conversations/1/state.json", TestModel(name="updated"))
+        model_storage.write_model("conversations/2/state.json", TestModel(name="second"))
+        model_storage.write_model("assistant.json", TestModel(name="assistant"))
+
+        assert model_storage.read_model("conversations/1/state.json", TestModel) == TestModel(name="updated")
+        assert sorted(value.name for value in model_storage.read_models("conversations/", TestModel)) == [
+            "second",
+            "updated",
+        ]
+
+        model_storage.delete("conversations/1/state.json")
+        assert model_storage.read_model("conversations/1/state.json", TestModel) is None
+        assert sorted(backend.keys()) == ["assistant.json", "conversations/2/state.json"]
+
+        if isinstance(backend, storage.SQLiteStorageBackend):
+            backend.close()
+
+
+def test_file_storage_backend_rejects_keys_outside_of_root():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        backend = storage.FileStorageBackend(Path(temp_dir) / "root")
+
+        with pytest.raises(ValueError, match="outside of the storage root"):
+            backend.write("../outside.json", b"{}")
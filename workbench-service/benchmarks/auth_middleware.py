@@ -0,0 +1,159 @@
+"""
+Microbenchmark of the authentication middleware, comparing requests/sec of the pure ASGI middleware with its
+verified-token cache, against a BaseHTTPMiddleware that verifies the token signature on every request, as the
+middleware did previously.
+
+Requests are sent in-process, through httpx.ASGITransport, with RS256 tokens signed by a generated key.
+
+usage: uv run python -m benchmarks.auth_middleware [--requests N] [--concurrency N] [--users N]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Any
+
+import fastapi
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.responses import JSONResponse
+from jose import jwk, jwt
+from semantic_workbench_service import auth, middleware, settings
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+
+KEY_ID = "benchmark-key"
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """
+    The middleware as it was before the verified-token cache: a BaseHTTPMiddleware that verifies every token.
+    """
+
+    def __init__(self, app, api_key_source) -> None:
+        super().__init__(app)
+        self.api_key_source = api_key_source
+
+    async def dispatch(self, request: fastapi.Request, call_next: RequestResponseEndpoint) -> fastapi.Response:
+        try:
+            principal = await middleware.principal_from_request(request, api_key_source=self.api_key_source)
+            if principal is None:
+                raise fastapi.HTTPException(status_code=401, detail="Not authenticated")
+        except fastapi.HTTPException as exc:
+            return JSONResponse(content={"detail": exc.detail}, status_code=exc.status_code)
+
+        auth.authenticated_principal.set(principal)
+        return await call_next(request)
+
+
+async def no_api_keys(assistant_service_id: str) -> str | None:
+    return None
+
+
+def create_app(middleware_class: type) -> fastapi.FastAPI:
+    app = fastapi.FastAPI()
+
+    @app.get("/")
+    async def get_principal() -> dict:
+        principal = auth.authenticated_principal.get()
+        assert isinstance(principal, auth.UserPrincipal)
+        return {"user_id": principal.user_id}
+
+    app.add_middleware(middleware_class, api_key_source=no_api_keys)
+    return app
+
+
+def create_tokens(user_count: int) -> list[str]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    public_jwk: dict[str, Any] = jwk.construct(public_pem, algorithm="RS256").to_dict()
+    public_jwk["kid"] = KEY_ID
+
+    # pre-populate the key set, so that neither variant fetches keys during the benchmark
+    key_set = middleware._rs256_jwks
+    key_set._keys = {"keys": [public_jwk]}
+    key_set._key_ids = {KEY_ID}
+    key_set._fetched_at = time.monotonic()
+
+    expires_at = int(time.time()) + 60 * 60
+    return [
+        jwt.encode(
+            claims={
+                "tid": str(uuid.uuid4()),
+                "oid": str(uuid.uuid4()),
+                "name": f"user {index}",
+                "aud": settings.auth.allowed_app_id,
+                "exp": expires_at,
+            },
+            key=private_pem.decode(),
+            algorithm="RS256",
+            headers={"kid": KEY_ID},
+        )
+        for index in range(user_count)
+    ]
+
+
+async def measure(app: fastapi.FastAPI, tokens: list[str], request_count: int, concurrency: int) -> dict[str, Any]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        next_request = 0
+
+        async def worker() -> None:
+            nonlocal next_request
+            while next_request < request_count:
+                token = tokens[next_request % len(tokens)]
+                next_request += 1
+                response = await client.get("/", headers={"Authorization": f"Bearer {token}"})
+                response.raise_for_status()
+
+        # warm up
+        await client.get("/", headers={"Authorization": f"Bearer {tokens[0]}"})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+
+    return {
+        "requests": request_count,
+        "duration_seconds": round(duration, 3),
+        "requests_per_second": round(request_count / duration, 1),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50, help="number of distinct tokens to send")
+    args = parser.parse_args()
+
+    settings.auth.allowed_jwt_algorithms = {"RS256"}
+    tokens = create_tokens(args.users)
+
+    before = await measure(create_app(LegacyAuthMiddleware), tokens, args.requests, args.concurrency)
+    after = await measure(create_app(middleware.AuthMiddleware), tokens, args.requests, args.concurrency)
+
+    print(
+        json.dumps(
+            {
+                "before": before,
+                "after": after,
+                "speedup": round(after["requests_per_second"] / before["requests_per_second"], 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+A minimal assistant service for benchmarks, that accepts everything the workbench service sends it and records the
+delivery latency of the message events it receives, without responding to them.
+"""
+
+import time
+from typing import Any
+
+import fastapi
+from semantic_workbench_api_model import assistant_model, workbench_model
+
+from .latency import LatencyRecorder
+
+SENT_AT_METADATA_KEY = "benchmark_sent_at"
+"""
+Message metadata key holding the time.perf_counter() at which the benchmark sent the message.
+"""
+
+
+def message_delivery_latency(event: workbench_model.ConversationEvent) -> float | None:
+    if event.event != workbench_model.ConversationEventType.message_created:
+        return None
+    sent_at = (event.data.get("message", {}).get("metadata") or {}).get(SENT_AT_METADATA_KEY)
+    if sent_at is None:
+        return None
+    return time.perf_counter() - sent_at
+
+
+def create_app(assistant_service_id: str, event_delivery: LatencyRecorder) -> fastapi.FastAPI:
+    app = fastapi.FastAPI()
+    config = assistant_model.ConfigResponseModel(config={}, json_schema=None, ui_schema=None)
+
+    def record(events: list[workbench_model.ConversationEvent]) -> None:
+        for event in events:
+            latency = message_delivery_latency(event)
+            if latency is not None:
+                event_delivery.record(latency)
+
+    @app.get("/")
+    async def get_service_info() -> assistant_model.ServiceInfoModel:
+        return assistant_model.ServiceInfoModel(
+            assistant_service_id=assistant_service_id,
+            name="benchmark assistant service",
+            templates=[
+                assistant_model.AssistantTemplateModel(
+                    id="default", name="benchmark assistant", description="", config=config
+                )
+            ],
+        )
+
+    @app.put("/{assistant_id}")
+    async def put_assistant(assistant_id: str) -> assistant_model.AssistantResponseModel:
+        return assistant_model.AssistantResponseModel(id=assistant_id)
+
+    @app.delete("/{assistant_id}")
+    async def delete_assistant(assistant_id: str) -> None:
+        pass
+
+    @app.get("/{assistant_id}/config")
+    async def get_config(assistant_id: str) -> assistant_model.ConfigResponseModel:
+        return config
+
+    @app.put("/{assistant_id}/conversations/{conversation_id}")
+    async def put_conversation(assistant_id: str, conversation_id: str) -> assistant_model.ConversationResponseModel:
+        return assistant_model.ConversationResponseModel(id=conversation_id)
+
+    @app.delete("/{assistant_id}/conversations/{conversation_id}")
+    async def delete_conversation(assistant_id: str, conversation_id: str) -> None:
+        pass
+
+    @app.post("/{assistant_id}/conversations/{conversation_id}/events")
+    async def post_conversation_event(
+        assistant_id: str, conversation_id: str, event: workbench_model.ConversationEvent
+    ) -> dict[str, Any]:
+        record([event])
+        return {}
+
+    @app.post("/{assistant_id}/events")
+    async def post_conversation_events(
+        assistant_id: str, event_list: workbench_model.ConversationEventList
+    ) -> dict[str, Any]:
+        record(event_list.events)
+        return {}
+
+    return app
@@ -0,0 +1,64 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+class LatencyRecorder:
+    """
+    Records the latencies of the operations of a workload, and summarizes them as percentiles and throughput.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors = 0
+        self._started_at: float | None = None
+        self._stopped_at: float | None = None
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+
+    def stop(self) -> None:
+        self._stopped_at = time.perf_counter()
+
+    def record(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors += 1
+            raise
+        self.record(time.perf_counter() - start)
+
+    def summary(self) -> dict[str, Any]:
+        if self._started_at is None or self._stopped_at is None:
+            raise RuntimeError("recorder was not started and stopped")
+
+        duration = self._stopped_at - self._started_at
+        latencies = sorted(self.latencies)
+        return {
+            "count": len(latencies),
+            "errors": self.errors,
+            "duration_seconds": round(duration, 3),
+            "throughput_per_second": round(len(latencies) / duration, 1) if duration > 0 else None,
+            "latency_ms": {
+                "p50": _percentile_ms(latencies, 50),
+                "p95": _percentile_ms(latencies, 95),
+                "p99": _percentile_ms(latencies, 99),
+                "max": _percentile_ms(latencies, 100),
+            },
+        }
+
+
+def _percentile_ms(sorted_latencies: list[float], percentile: float) -> float | None:
+    """
+    Nearest-rank percentile, in milliseconds.
+    """
+    if not sorted_latencies:
+        return None
+    rank = max(math.ceil(percentile / 100 * len(sorted_latencies)), 1)
+    return round(sorted_latencies[rank - 1] * 1000, 2)
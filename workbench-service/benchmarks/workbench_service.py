@@ -0,0 +1,399 @@
+"""
+Load-generation and latency benchmark of the workbench service.
+
+The service is booted in-process from semantic_workbench_service.service.init, on a SQLite database and file
+storage in a temporary directory, and served by uvicorn on a local port, along with fake assistant services that
+record the delivery of the events the workbench sends them. The workloads are:
+
+- message_posts: concurrent message posts to conversations with assistant participants and SSE subscribers,
+  with the delivery latency of the resulting message.created events to the SSE subscribers (sse_delivery) and to
+  the assistant services (assistant_event_delivery)
+- file_uploads: concurrent file uploads
+- pagination: paging backwards, with cursors, through a long message history
+
+Latency percentiles and throughput of each workload are printed as JSON.
+
+usage: uv run python -m benchmarks.workbench_service [--messages N] [--concurrency N] [--conversations N]
+    [--assistant-services N] [--sse-subscribers N] [--file-uploads N] [--file-size BYTES]
+    [--history-messages N] [--page-size N] [--pagination-passes N]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import socket
+import tempfile
+import time
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator
+
+import fastapi
+import httpx
+import uvicorn
+from jose import jwt
+from semantic_workbench_api_model import workbench_model, workbench_service_client
+from semantic_workbench_service import service, settings
+from semantic_workbench_service.api import FastAPILifespan
+
+from . import fake_assistant_service
+from .latency import LatencyRecorder
+
+APP_ID = "benchmark-app-id"
+
+DELIVERY_TIMEOUT_SECONDS = 30
+
+
+def configure_settings(root: pathlib.Path) -> None:
+    settings.db.url = f"sqlite:///{root / 'workbench.db'}"
+    settings.db.alembic_config_path = str(pathlib.Path(__file__).parent.parent / "alembic.ini")
+    settings.storage.root = str(root / "files")
+    settings.auth.allowed_jwt_algorithms = {"HS256"}
+    settings.auth.allowed_app_id = APP_ID
+
+
+def create_workbench_app() -> fastapi.FastAPI:
+    lifespan = FastAPILifespan()
+    app = fastapi.FastAPI(lifespan=lifespan.lifespan)
+    service.init(app, register_lifespan_handler=lifespan.register_handler)
+    return app
+
+
+@asynccontextmanager
+async def serve(app: fastapi.FastAPI) -> AsyncIterator[str]:
+    """
+    Serves the app with uvicorn on a free local port, yielding its URL.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_config=None, log_level="warning", access_log=False, timeout_graceful_shutdown=5)
+    )
+    server_task = asyncio.create_task(server.serve(sockets=[sock]))
+    try:
+        while not server.started:
+            if server_task.done():
+                server_task.result()
+            await asyncio.sleep(0.01)
+
+        yield f"http://127.0.0.1:{port}"
+
+    finally:
+        server.should_exit = True
+        await server_task
+        sock.close()
+
+
+def user_headers() -> dict[str, str]:
+    user_id = str(uuid.uuid4())
+    token = jwt.encode(
+        claims={"tid": user_id, "oid": user_id, "name": "benchmark user", "appid": APP_ID},
+        key="",
+        algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def register_assistant(client: httpx.AsyncClient, assistant_service_id: str, url: str) -> uuid.UUID:
+    http_response = await client.post(
+        "/assistant-service-registrations",
+        json=workbench_model.NewAssistantServiceRegistration(
+            assistant_service_id=assistant_service_id, name="benchmark assistant service", description=""
+        ).model_dump(mode="json"),
+    )
+    http_response.raise_for_status()
+    registration = workbench_model.AssistantServiceRegistration.model_validate(http_response.json())
+
+    http_response = await client.put(
+        f"/assistant-service-registrations/{assistant_service_id}",
+        json={
+            "name": registration.name,
+            "description": registration.description,
+            "url": url,
+            "online_expires_in_seconds": 60 * 60,
+        },
+        headers=workbench_service_client.AssistantServiceRequestHeaders(
+            assistant_service_id=assistant_service_id, api_key=registration.api_key or ""
+        ).to_headers(),
+    )
+    http_response.raise_for_status()
+
+    http_response = await client.post(
+        "/assistants",
+        json=workbench_model.NewAssistant(
+            name="benchmark assistant", assistant_service_id=assistant_service_id
+        ).model_dump(mode="json"),
+    )
+    http_response.raise_for_status()
+    return workbench_model.Assistant.model_validate(http_response.json()).id
+
+
+async def create_conversation(client: httpx.AsyncClient, assistant_ids: list[uuid.UUID]) -> uuid.UUID:
+    http_response = await client.post("/conversations", json={"title": "benchmark conversation"})
+    http_response.raise_for_status()
+    conversation_id = workbench_model.Conversation.model_validate(http_response.json()).id
+
+    for assistant_id in assistant_ids:
+        http_response = await client.put(f"/conversations/{conversation_id}/participants/{assistant_id}", json={})
+        http_response.raise_for_status()
+
+    return conversation_id
+
+
+async def run_concurrently(count: int, concurrency: int, operation) -> None:
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            try:
+                await operation(index)
+            except httpx.HTTPError:
+                logging.exception("benchmark operation failed")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def wait_for_count(recorder: LatencyRecorder, count: int) -> None:
+    try:
+        async with asyncio.timeout(DELIVERY_TIMEOUT_SECONDS):
+            while len(recorder.latencies) < count:
+                await asyncio.sleep(0.01)
+    except TimeoutError:
+        recorder.errors += count - len(recorder.latencies)
+    recorder.stop()
+
+
+async def subscribe(
+    client: httpx.AsyncClient, conversation_id: uuid.UUID, connected: asyncio.Event, sse_delivery: LatencyRecorder
+) -> None:
+    async with client.stream("GET", f"/conversations/{conversation_id}/events") as http_response:
+        http_response.raise_for_status()
+        connected.set()
+
+        event_type = None
+        async for line in http_response.aiter_lines():
+            if line.startswith("event:"):
+                event_type = line.removeprefix("event:").strip()
+                continue
+
+            if not line.startswith("data:") or event_type != workbench_model.ConversationEventType.message_created:
+                continue
+
+            data = json.loads(line.removeprefix("data:"))
+            sent_at = (data["data"]["message"].get("metadata") or {}).get(fake_assistant_service.SENT_AT_METADATA_KEY)
+            if sent_at is not None:
+                sse_delivery.record(time.perf_counter() - sent_at)
+
+
+async def message_posts(
+    client: httpx.AsyncClient,
+    conversation_ids: list[uuid.UUID],
+    assistants_per_conversation: int,
+    message_count: int,
+    concurrency: int,
+    sse_subscriber_count: int,
+    assistant_event_delivery: LatencyRecorder,
+) -> dict[str, Any]:
+    posts = LatencyRecorder()
+    sse_delivery = LatencyRecorder()
+
+    sse_client = httpx.AsyncClient(
+        base_url=str(client.base_url),
+        headers=client.headers,
+        timeout=httpx.Timeout(10, read=None),
+        limits=httpx.Limits(max_connections=None),
+    )
+    subscribers_per_conversation = dict.fromkeys(conversation_ids, 0)
+    subscriber_tasks = []
+    async with sse_client:
+        for index in range(sse_subscriber_count):
+            conversation_id = conversation_ids[index % len(conversation_ids)]
+            subscribers_per_conversation[conversation_id] += 1
+            connected = asyncio.Event()
+            subscriber_tasks.append(
+                asyncio.create_task(subscribe(sse_client, conversation_id, connected, sse_delivery))
+            )
+            await connected.wait()
+
+        async def post_message(index: int) -> None:
+            conversation_id = conversation_ids[index % len(conversation_ids)]
+            with posts.measure():
+                http_response = await client.post(
+                    f"/conversations/{conversation_id}/messages",
+                    json={
+                        "content": f"benchmark message {index}",
+                        "metadata": {fake_assistant_service.SENT_AT_METADATA_KEY: time.perf_counter()},
+                    },
+                )
+                http_response.raise_for_status()
+
+        expected_sse_deliveries = sum(
+            subscribers_per_conversation[conversation_ids[index % len(conversation_ids)]]
+            for index in range(message_count)
+        )
+
+        posts.start()
+        sse_delivery.start()
+        assistant_event_delivery.start()
+        await run_concurrently(message_count, concurrency, post_message)
+        posts.stop()
+
+        await asyncio.gather(
+            wait_for_count(sse_delivery, expected_sse_deliveries),
+            wait_for_count(assistant_event_delivery, message_count * assistants_per_conversation),
+        )
+
+        for task in subscriber_tasks:
+            task.cancel()
+        await asyncio.gather(*subscriber_tasks, return_exceptions=True)
+
+    return {
+        "message_posts": posts.summary(),
+        "sse_delivery": sse_delivery.summary(),
+        "assistant_event_delivery": assistant_event_delivery.summary(),
+    }
+
+
+async def file_uploads(
+    client: httpx.AsyncClient, conversation_id: uuid.UUID, upload_count: int, file_size: int, concurrency: int
+) -> dict[str, Any]:
+    uploads = LatencyRecorder()
+
+    async def upload_file(index: int) -> None:
+        content = os.urandom(file_size)
+        with uploads.measure():
+            http_response = await client.put(
+                f"/conversations/{conversation_id}/files",
+                files=[("files", (f"benchmark-{index}.bin", content, "application/octet-stream"))],
+            )
+            http_response.raise_for_status()
+
+    uploads.start()
+    await run_concurrently(upload_count, concurrency, upload_file)
+    uploads.stop()
+
+    return {"file_uploads": uploads.summary()}
+
+
+async def pagination(
+    client: httpx.AsyncClient, history_message_count: int, page_size: int, passes: int
+) -> dict[str, Any]:
+    conversation_id = await create_conversation(client, assistant_ids=[])
+
+    batch_size = workbench_service_client.SEND_MESSAGES_BATCH_SIZE
+    for start in range(0, history_message_count, batch_size):
+        http_response = await client.post(
+            f"/conversations/{conversation_id}/messages/batch",
+            json={
+                "messages": [
+                    {"content": f"history message {index}"}
+                    for index in range(start, min(start + batch_size, history_message_count))
+                ]
+            },
+        )
+        http_response.raise_for_status()
+
+    pages = LatencyRecorder()
+    pages.start()
+    for _ in range(passes):
+        params: dict[str, Any] = {"limit": page_size}
+        while True:
+            with pages.measure():
+                http_response = await client.get(f"/conversations/{conversation_id}/messages", params=params)
+                http_response.raise_for_status()
+            page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+            if page.before_cursor is None:
+                break
+            params["cursor"] = page.before_cursor
+    pages.stop()
+
+    return {"pagination": pages.summary()}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--conversations", type=int, default=8)
+    parser.add_argument("--assistant-services", type=int, default=2, help="assistants in each conversation")
+    parser.add_argument("--sse-subscribers", type=int, default=32)
+    parser.add_argument("--file-uploads", type=int, default=200)
+    parser.add_argument("--file-size", type=int, default=64 * 1024)
+    parser.add_argument("--history-messages", type=int, default=5_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--pagination-passes", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results: dict[str, Any] = {"parameters": vars(args)}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        configure_settings(pathlib.Path(temp_dir))
+        assistant_event_delivery = LatencyRecorder()
+
+        async with AsyncExitStack() as stack:
+            workbench_url = await stack.enter_async_context(serve(create_workbench_app()))
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(
+                    base_url=workbench_url,
+                    headers=user_headers(),
+                    timeout=60,
+                    limits=httpx.Limits(max_connections=args.concurrency),
+                )
+            )
+
+            assistant_ids = []
+            for _ in range(args.assistant_services):
+                assistant_service_id = f"benchmark-{uuid.uuid4().hex}"
+                assistant_service_url = await stack.enter_async_context(
+                    serve(fake_assistant_service.create_app(assistant_service_id, assistant_event_delivery))
+                )
+                assistant_ids.append(await register_assistant(client, assistant_service_id, assistant_service_url))
+
+            conversation_ids = [
+                await create_conversation(client, assistant_ids) for _ in range(max(args.conversations, 1))
+            ]
+
+            results.update(
+                await message_posts(
+                    client,
+                    conversation_ids=conversation_ids,
+                    assistants_per_conversation=len(assistant_ids),
+                    message_count=args.messages,
+                    concurrency=args.concurrency,
+                    sse_subscriber_count=args.sse_subscribers,
+                    assistant_event_delivery=assistant_event_delivery,
+                )
+            )
+            results.update(
+                await file_uploads(
+                    client,
+                    conversation_id=conversation_ids[0],
+                    upload_count=args.file_uploads,
+                    file_size=args.file_size,
+                    concurrency=args.concurrency,
+                )
+            )
+            results.update(
+                await pagination(
+                    client,
+                    history_message_count=args.history_messages,
+                    page_size=args.page_size,
+                    passes=args.pagination_passes,
+                )
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,6 +5,8 @@ import semantic_workbench_service
 from alembic import context
 from rich.logging import RichHandler
 from semantic_workbench_service.db import (
+    MESSAGE_SEARCH_INDEX,
+    MESSAGE_SEARCH_TABLE,
     ensure_async_driver_scheme,
 )
 from sqlalchemy import pool
@@ -27,6 +29,13 @@ target_metadata = SQLModel.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names) -> bool:
+    # the message search index, including the sqlite FTS5 shadow tables, is not part of the models
+    if type_ == "table" and name is not None and name.startswith(MESSAGE_SEARCH_TABLE):
+        return False
+    return not (type_ == "index" and name == MESSAGE_SEARCH_INDEX)
+
+
 def get_db_url() -> str:
     url = semantic_workbench_service.settings.db.url
     return ensure_async_driver_scheme(url)
@@ -49,6 +58,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -58,7 +68,7 @@ def run_migrations_offline() -> None:
 
 
 def run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_name=include_name)
 
     with context.begin_transaction():
         context.run_migrations()
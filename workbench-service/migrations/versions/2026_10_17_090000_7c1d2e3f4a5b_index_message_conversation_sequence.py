@@ -0,0 +1,37 @@
+"""index message conversation_id, sequence
+
+Revision ID: 7c1d2e3f4a5b
+Revises: 503c739152f3
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1d2e3f4a5b"
+down_revision: Union[str, None] = "503c739152f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_conversationmessage_conversation_id_sequence",
+        "conversationmessage",
+        ["conversation_id", "sequence"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_conversationmessage_conversation_id_message_type_sequence",
+        "conversationmessage",
+        ["conversation_id", "message_type", "sequence"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_conversationmessage_conversation_id_message_type_sequence", table_name="conversationmessage")
+    op.drop_index("ix_conversationmessage_conversation_id_sequence", table_name="conversationmessage")
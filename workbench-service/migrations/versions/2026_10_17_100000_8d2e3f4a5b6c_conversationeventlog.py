@@ -0,0 +1,50 @@
+"""conversationeventlog
+
+Revision ID: 8d2e3f4a5b6c
+Revises: 7c1d2e3f4a5b
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel as sm
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2e3f4a5b6c"
+down_revision: Union[str, None] = "7c1d2e3f4a5b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversationeventlog",
+        sa.Column("sequence", sa.Integer(), nullable=False),
+        sa.Column("conversation_id", sa.Uuid(), nullable=False),
+        sa.Column("event_id", sm.AutoString(), nullable=False),
+        sa.Column("event", sm.AutoString(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"],
+            ["conversation.conversation_id"],
+            name="fk_conversationeventlog_conversation_id_conversation",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("sequence"),
+        sqlite_autoincrement=True,
+    )
+    op.create_index(
+        "ix_conversationeventlog_conversation_id_sequence",
+        "conversationeventlog",
+        ["conversation_id", "sequence"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_conversationeventlog_conversation_id_sequence", table_name="conversationeventlog")
+    op.drop_table("conversationeventlog")
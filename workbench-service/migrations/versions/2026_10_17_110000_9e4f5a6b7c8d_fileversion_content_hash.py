@@ -0,0 +1,32 @@
+"""fileversion content_hash
+
+Revision ID: 9e4f5a6b7c8d
+Revises: 8d2e3f4a5b6c
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9e4f5a6b7c8d"
+down_revision: Union[str, None] = "8d2e3f4a5b6c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("fileversion") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        batch_op.create_index("ix_fileversion_content_hash", ["content_hash"], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("fileversion") as batch_op:
+        batch_op.drop_index("ix_fileversion_content_hash")
+        batch_op.drop_column("content_hash")
@@ -0,0 +1,46 @@
+"""conversationlatestmessage
+
+Revision ID: af5a6b7c8d9e
+Revises: 9e4f5a6b7c8d
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel as sm
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "af5a6b7c8d9e"
+down_revision: Union[str, None] = "9e4f5a6b7c8d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversationlatestmessage",
+        sa.Column("conversation_id", sa.Uuid(), nullable=False),
+        sa.Column("message_type", sm.AutoString(), nullable=False),
+        sa.Column("message_sequence", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"],
+            ["conversation.conversation_id"],
+            name="fk_conversationlatestmessage_conversation_id_conversation",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("conversation_id", "message_type"),
+    )
+
+    # backfill from the existing messages, using the conversation_id, message_type, sequence index
+    op.execute(
+        "INSERT INTO conversationlatestmessage (conversation_id, message_type, message_sequence)"
+        " SELECT conversation_id, message_type, max(sequence) FROM conversationmessage"
+        " GROUP BY conversation_id, message_type"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("conversationlatestmessage")
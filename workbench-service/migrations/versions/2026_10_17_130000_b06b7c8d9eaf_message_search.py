@@ -0,0 +1,63 @@
+"""message search
+
+Revision ID: b06b7c8d9eaf
+Revises: af5a6b7c8d9e
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b06b7c8d9eaf"
+down_revision: Union[str, None] = "af5a6b7c8d9e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    match op.get_bind().dialect.name:
+        case "sqlite":
+            # an external content FTS5 table, indexing conversationmessage.content by sequence, kept up to date by
+            # triggers
+            op.execute(
+                "CREATE VIRTUAL TABLE conversationmessage_fts USING fts5("
+                "content, content='conversationmessage', content_rowid='sequence', tokenize='porter unicode61')"
+            )
+            op.execute(
+                "CREATE TRIGGER conversationmessage_fts_insert AFTER INSERT ON conversationmessage BEGIN"
+                " INSERT INTO conversationmessage_fts(rowid, content) VALUES (new.sequence, new.content); END"
+            )
+            op.execute(
+                "CREATE TRIGGER conversationmessage_fts_delete AFTER DELETE ON conversationmessage BEGIN"
+                " INSERT INTO conversationmessage_fts(conversationmessage_fts, rowid, content)"
+                " VALUES ('delete', old.sequence, old.content); END"
+            )
+            op.execute(
+                "CREATE TRIGGER conversationmessage_fts_update AFTER UPDATE OF content ON conversationmessage BEGIN"
+                " INSERT INTO conversationmessage_fts(conversationmessage_fts, rowid, content)"
+                " VALUES ('delete', old.sequence, old.content);"
+                " INSERT INTO conversationmessage_fts(rowid, content) VALUES (new.sequence, new.content); END"
+            )
+            # index the existing messages
+            op.execute("INSERT INTO conversationmessage_fts(conversationmessage_fts) VALUES ('rebuild')")
+
+        case "postgresql":
+            op.execute(
+                "CREATE INDEX ix_conversationmessage_content_search ON conversationmessage"
+                " USING gin (to_tsvector('english'::regconfig, content))"
+            )
+
+
+def downgrade() -> None:
+    match op.get_bind().dialect.name:
+        case "sqlite":
+            op.execute("DROP TRIGGER IF EXISTS conversationmessage_fts_update")
+            op.execute("DROP TRIGGER IF EXISTS conversationmessage_fts_delete")
+            op.execute("DROP TRIGGER IF EXISTS conversationmessage_fts_insert")
+            op.execute("DROP TABLE IF EXISTS conversationmessage_fts")
+
+        case "postgresql":
+            op.execute("DROP INDEX IF EXISTS ix_conversationmessage_content_search")
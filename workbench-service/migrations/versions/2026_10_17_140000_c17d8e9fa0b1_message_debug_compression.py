@@ -0,0 +1,33 @@
+"""message debug compression
+
+Revision ID: c17d8e9fa0b1
+Revises: b06b7c8d9eaf
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c17d8e9fa0b1"
+down_revision: Union[str, None] = "b06b7c8d9eaf"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing payloads keep the "json" encoding, and are read from the data column as before
+    with op.batch_alter_table("conversationmessagedebug") as batch_op:
+        batch_op.add_column(sa.Column("encoding", sa.String(), server_default="json", nullable=False))
+        batch_op.add_column(sa.Column("compressed_data", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    # compressed payloads cannot be represented before this revision
+    op.execute("DELETE FROM conversationmessagedebug WHERE encoding != 'json'")
+    with op.batch_alter_table("conversationmessagedebug") as batch_op:
+        batch_op.drop_column("compressed_data")
+        batch_op.drop_column("encoding")
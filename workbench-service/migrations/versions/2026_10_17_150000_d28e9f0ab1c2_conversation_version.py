@@ -0,0 +1,28 @@
+"""conversation version
+
+Revision ID: d28e9f0ab1c2
+Revises: c17d8e9fa0b1
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d28e9f0ab1c2"
+down_revision: Union[str, None] = "c17d8e9fa0b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("conversation") as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("conversation") as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,31 @@
+"""fileblob
+
+Revision ID: e39fa0b1c2d3
+Revises: d28e9f0ab1c2
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel as sm
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e39fa0b1c2d3"
+down_revision: Union[str, None] = "d28e9f0ab1c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "fileblob",
+        sa.Column("content_hash", sm.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("content_hash"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("fileblob")
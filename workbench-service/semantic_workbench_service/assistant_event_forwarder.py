@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import asgi_correlation_id
+from semantic_workbench_api_model.workbench_model import ConversationEvent
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AssistantEventQueueMetrics:
+    queue_length: int = 0
+    enqueued_events: int = 0
+    dropped_events: int = 0
+    delivered_batches: int = 0
+    delivered_events: int = 0
+    max_batch_size: int = 0
+    last_batch_latency_seconds: float = 0.0
+    """
+    Time from the oldest event in the most recent batch being enqueued, to the batch being delivered.
+    """
+    max_batch_latency_seconds: float = 0.0
+
+
+@dataclass
+class _AssistantEventQueue:
+    queue: asyncio.Queue[tuple[float, ConversationEvent]]
+    metrics: AssistantEventQueueMetrics
+    task: asyncio.Task | None = None
+
+
+class AssistantEventForwarder:
+    """
+    Forwards conversation events to assistants through a bounded queue per assistant. Each queue is drained by a
+    task that coalesces queued events into batches, so that bursts of events cost one request per batch, while
+    the next batch accumulates during the request for the current one.
+
+    When an assistant's queue is full, its oldest queued event is dropped. Queues, and their tasks, are removed
+    when they have been empty for idle_timeout_seconds, or when their assistant is removed, and are re-created by
+    the next event enqueued for the assistant.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[uuid.UUID, list[ConversationEvent]], Awaitable[None]],
+        max_queue_size: int,
+        max_batch_size: int,
+        max_batch_latency_seconds: float,
+        idle_timeout_seconds: float = 5 * 60,
+    ) -> None:
+        self._deliver = deliver
+        self._max_queue_size = max_queue_size
+        self._max_batch_size = max_batch_size
+        self._max_batch_latency_seconds = max_batch_latency_seconds
+        self._idle_timeout_seconds = idle_timeout_seconds
+        self._queues: dict[uuid.UUID, _AssistantEventQueue] = {}
+        self._removed_queue_metrics = AssistantEventQueueMetrics()
+        self._removed_tasks: set[asyncio.Task] = set()
+
+    def enqueue(self, assistant_id: uuid.UUID, event: ConversationEvent) -> None:
+        assistant_queue = self._queues.get(assistant_id)
+        if assistant_queue is None:
+            assistant_queue = _AssistantEventQueue(
+                queue=asyncio.Queue(maxsize=self._max_queue_size), metrics=AssistantEventQueueMetrics()
+            )
+            assistant_queue.task = asyncio.create_task(
+                self._forward_events(assistant_id, assistant_queue),
+                name=f"forward_events_to_{assistant_id}",
+            )
+            self._queues[assistant_id] = assistant_queue
+
+        if assistant_queue.queue.full():
+            _, dropped_event = assistant_queue.queue.get_nowait()
+            assistant_queue.metrics.dropped_events += 1
+            logger.warning(
+                "assistant event queue is full, dropping oldest event; assistant_id: %s, conversation_id: %s,"
+                " event: %s, event_id: %s",
+                assistant_id,
+                dropped_event.conversation_id,
+                dropped_event.event,
+                dropped_event.id,
+            )
+
+        assistant_queue.queue.put_nowait((time.monotonic(), event))
+        assistant_queue.metrics.enqueued_events += 1
+
+    def remove(self, assistant_id: uuid.UUID) -> None:
+        """
+        Removes the assistant's queue, dropping its queued events, as when the assistant is deleted.
+        """
+        assistant_queue = self._queues.get(assistant_id)
+        if assistant_queue is None:
+            return
+
+        self._remove_queue(assistant_id, assistant_queue)
+        if assistant_queue.task is not None and not assistant_queue.task.done():
+            assistant_queue.task.cancel()
+            self._removed_tasks.add(assistant_queue.task)
+            assistant_queue.task.add_done_callback(self._removed_tasks.discard)
+
+    def metrics(self) -> dict[uuid.UUID, AssistantEventQueueMetrics]:
+        metrics = {}
+        for assistant_id, assistant_queue in self._queues.items():
+            assistant_queue.metrics.queue_length = assistant_queue.queue.qsize()
+            metrics[assistant_id] = assistant_queue.metrics
+        return metrics
+
+    def removed_queue_metrics(self) -> AssistantEventQueueMetrics:
+        """
+        The totals of the event counts of removed queues, so that totals across all queues do not decrease as queues
+        are removed.
+        """
+        return self._removed_queue_metrics
+
+    async def aclose(self) -> None:
+        tasks = [assistant_queue.task for assistant_queue in self._queues.values() if assistant_queue.task]
+        tasks.extend(self._removed_tasks)
+        for task in tasks:
+            task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _remove_queue(self, assistant_id: uuid.UUID, assistant_queue: _AssistantEventQueue) -> None:
+        if self._queues.get(assistant_id) is not assistant_queue:
+            return
+        del self._queues[assistant_id]
+
+        removed = self._removed_queue_metrics
+        removed.enqueued_events += assistant_queue.metrics.enqueued_events
+        removed.dropped_events += assistant_queue.metrics.dropped_events + assistant_queue.queue.qsize()
+        removed.delivered_batches += assistant_queue.metrics.delivered_batches
+        removed.delivered_events += assistant_queue.metrics.delivered_events
+
+    async def _next_batch(
+        self, queue: asyncio.Queue[tuple[float, ConversationEvent]]
+    ) -> list[tuple[float, ConversationEvent]]:
+        """
+        Returns the next batch of events, or an empty batch if no event is enqueued within the idle timeout.
+        """
+        try:
+            async with asyncio.timeout(self._idle_timeout_seconds):
+                batch = [await queue.get()]
+        except TimeoutError:
+            return []
+
+        deadline = time.monotonic() + self._max_batch_latency_seconds
+
+        while len(batch) < self._max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                async with asyncio.timeout(remaining):
+                    batch.append(await queue.get())
+            except TimeoutError:
+                break
+
+        return batch
+
+    async def _forward_events(self, assistant_id: uuid.UUID, assistant_queue: _AssistantEventQueue) -> None:
+        metrics = assistant_queue.metrics
+        while True:
+            try:
+                batch = await self._next_batch(assistant_queue.queue)
+                if not batch:
+                    # an event can be enqueued as the idle timeout cancels the wait for it
+                    if not assistant_queue.queue.empty():
+                        continue
+                    # idle queues are removed, and are re-created by the next enqueue
+                    self._remove_queue(assistant_id, assistant_queue)
+                    return
+
+                events = [event for _, event in batch]
+
+                asgi_correlation_id.correlation_id.set(events[0].correlation_id)
+
+                start_time = time.monotonic()
+
+                await self._deliver(assistant_id, events)
+
+                end_time = time.monotonic()
+                latency = end_time - batch[0][0]
+                metrics.delivered_batches += 1
+                metrics.delivered_events += len(events)
+                metrics.max_batch_size = max(metrics.max_batch_size, len(events))
+                metrics.last_batch_latency_seconds = latency
+                metrics.max_batch_latency_seconds = max(metrics.max_batch_latency_seconds, latency)
+
+                logger.debug(
+                    "forwarded events to assistant; assistant_id: %s, event_count: %d, duration: %.3fs,"
+                    " batch latency: %.3fs",
+                    assistant_id,
+                    len(events),
+                    end_time - start_time,
+                    latency,
+                )
+
+            except Exception:
+                logger.exception("exception forwarding events to assistant; assistant_id: %s", assistant_id)
@@ -0,0 +1,35 @@
+import time
+
+
+class AssistantServiceLiveness:
+    """
+    Tracks, in memory, the liveness of the assistant services that send heartbeats to this service process. A
+    service is alive until its most recent heartbeat expires.
+    """
+
+    def __init__(self) -> None:
+        self._expirations: dict[str, float] = {}
+
+    def heartbeat(self, assistant_service_id: str, expires_in_seconds: float) -> None:
+        self._expirations[assistant_service_id] = time.monotonic() + expires_in_seconds
+
+    def forget(self, assistant_service_id: str) -> None:
+        self._expirations.pop(assistant_service_id, None)
+
+    def alive_ids(self) -> set[str]:
+        now = time.monotonic()
+        return {
+            assistant_service_id for assistant_service_id, expiration in self._expirations.items() if expiration > now
+        }
+
+    def pop_expired(self) -> list[str]:
+        """
+        Returns the services whose heartbeats have expired since the last call, and stops tracking them.
+        """
+        now = time.monotonic()
+        expired = [
+            assistant_service_id for assistant_service_id, expiration in self._expirations.items() if expiration <= now
+        ]
+        for assistant_service_id in expired:
+            del self._expirations[assistant_service_id]
+        return expired
@@ -0,0 +1,69 @@
+"""
+Helpers for conditional (If-None-Match) and range (Range, If-Range) requests.
+"""
+
+import hashlib
+import re
+
+_byte_range_pattern = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiableError(Exception):
+    pass
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Compares an If-None-Match header with an ETag, using the weak comparison that If-None-Match specifies.
+    """
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque_tag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque_tag for candidate in if_none_match.split(","))
+
+
+def weak_etag(version: int, *variant: str) -> str:
+    """
+    Returns a weak ETag for a version of an entity, distinguishing the representations of the same version, such as
+    those for different principals or query parameters, by the variant.
+    """
+    digest = hashlib.sha256("\n".join(variant).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def byte_range(range_header: str, if_range: str | None, etag: str, size: int) -> tuple[int, int] | None:
+    """
+    Returns the [start, stop) of the byte range requested by a Range header, or None when the full content should
+    be sent instead: for headers that are not a single byte range, which are allowed to be ignored, and for If-Range
+    conditions that do not match the ETag.
+
+    Raises RangeNotSatisfiableError when the range does not overlap the content.
+    """
+    if if_range is not None and if_range.strip() != etag:
+        return None
+
+    match = _byte_range_pattern.match(range_header.replace(" ", ""))
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    match first, last:
+        case "", "":
+            return None
+
+        case "", _:
+            # suffix range: the last N bytes
+            suffix_length = int(last)
+            if suffix_length == 0 or size == 0:
+                raise RangeNotSatisfiableError()
+            return max(size - suffix_length, 0), size
+
+        case _:
+            start = int(first)
+            if start >= size:
+                raise RangeNotSatisfiableError()
+            stop = size if last == "" else min(int(last) + 1, size)
+            if stop <= start:
+                return None
+            return start, stop
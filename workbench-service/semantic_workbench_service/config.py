@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
 from pydantic import Field, HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -14,6 +14,20 @@ class DBSettings(BaseSettings):
     postgresql_pool_size: int = 10
     alembic_config_path: str = "./alembic.ini"
 
+    # when set, read-only requests, such as conversation listings, message history and exports, are served from
+    # this read replica of the database; each user's reads are served from the primary for read_replica_pin_seconds
+    # after they write, so that they read their own writes despite replica lag, as are the reads of a conversation
+    # after its events, so that users read the writes of others that they are notified of; assistants' reads always
+    # are
+    read_replica_url: str = ""
+    read_replica_pin_seconds: float = 5.0
+
+    # when enabled, the count and latency of each distinct statement are recorded, and statements executed at least
+    # query_repeated_statement_threshold times in one request are reported as likely N+1 queries; both are
+    # available at /diagnostics/queries
+    query_instrumentation: bool = False
+    query_repeated_statement_threshold: int = 10
+
 
 class ApiKeySettings(BaseSettings):
     key_vault_url: HttpUrl | None = None
@@ -27,6 +41,13 @@ class AuthSettings(BaseSettings):
     allowed_jwt_algorithms: set[str] = {"RS256"}
     allowed_app_id: str = "d0a2fed8-abb0-4831-8a24-09f5a0b54d97"
 
+    jwks_url: str = "https://login.microsoftonline.com/common/discovery/v2.0/keys"
+    jwks_refresh_interval_seconds: float = 60 * 10
+
+    # the principals of up to verified_token_cache_size verified tokens are cached until the tokens expire, so that
+    # token signatures are not verified on every request
+    verified_token_cache_size: int = 10_000
+
 
 class AssistantIdentifiers(BaseSettings):
     assistant_service_id: str
@@ -41,10 +62,67 @@ class WebServiceSettings(BaseSettings):
 
     assistant_api_key: ApiKeySettings = ApiKeySettings()
 
-    anonymous_paths: list[str] = ["/", "/docs", "/openapi.json"]
+    anonymous_paths: list[str] = ["/", "/docs", "/openapi.json", "/metrics"]
 
+    # assistant services are online while their online lease, of the expiry declared by their heartbeats, is
+    # unexpired; heartbeats are tracked in memory, and the lease is written to the database when less than half of it
+    # remains, so that heartbeats reaching any service process keep the service online. services are marked offline,
+    # every assistant_service_online_check_interval_seconds, once their leases expire
     assistant_service_online_check_interval_seconds: float = 10.0
 
+    # the number of recent events retained per conversation for replay to reconnecting SSE clients
+    event_log_max_events_per_conversation: int = 1_000
+    # the number of conversations whose recent events are also held in memory
+    event_log_max_cached_conversations: int = 1_000
+
+    # "postgresql" delivers events to the SSE subscribers of every service process sharing the database, which is
+    # required when running multiple workers
+    event_bus: Literal["in_process", "postgresql"] = "in_process"
+    event_bus_channel: str = "workbench_events"
+
+    # events are forwarded to each assistant through a queue of up to assistant_event_queue_max_size events, dropping
+    # the oldest when full, in batches of up to assistant_event_batch_max_size events; the forwarder waits up to
+    # assistant_event_batch_max_latency_seconds for more events before sending a batch; queues are removed after
+    # assistant_event_queue_idle_timeout_seconds without events. assistant services that do not support batches are
+    # sent events individually, and are not sent batches for assistant_event_batch_unsupported_ttl_seconds
+    assistant_event_queue_max_size: int = 1_000
+    assistant_event_batch_max_size: int = 100
+    assistant_event_batch_max_latency_seconds: float = 0.01
+    assistant_event_queue_idle_timeout_seconds: float = 5 * 60
+    assistant_event_batch_unsupported_ttl_seconds: float = 10 * 60
+
+    # each SSE client is sent events through a queue of up to sse_max_queued_events events; when a client falls
+    # further behind, its events are dropped ("drop"), superseded state updates are dropped ("coalesce", falling
+    # back to "disconnect"), or it is disconnected with a resync hint to replay from the event log ("disconnect")
+    sse_max_queued_events: int = 1_000
+    sse_slow_consumer_policy: Literal["drop", "coalesce", "disconnect"] = "disconnect"
+
+    # the active participants of up to participant_cache_max_conversations conversations are cached for routing
+    # events; entries are invalidated when participants change, and expire after participant_cache_ttl_seconds
+    participant_cache_max_conversations: int = 10_000
+    participant_cache_ttl_seconds: float = 60
+
+    # conversation exports fetch the exports of up to export_max_concurrent_assistant_exports assistants, and
+    # assistant conversations, concurrently, buffering up to export_max_buffered_chunks chunks of each; exports and
+    # imports read and write database records in batches of export_import_batch_size
+    export_max_concurrent_assistant_exports: int = 4
+    export_max_buffered_chunks: int = 16
+    export_import_batch_size: int = 500
+
+    # message debug payloads are stored compressed, in the database up to message_debug_max_inline_bytes after
+    # compression, and in the file store beyond that; every message_debug_purge_interval_seconds, the payload files
+    # of deleted messages are deleted and, when message_debug_retention_days is set, the payloads of older messages
+    # are purged, in batches of message_debug_purge_batch_size
+    message_debug_max_inline_bytes: int = 64 * 1_024
+    message_debug_retention_days: float | None = None
+    message_debug_purge_interval_seconds: float = 60 * 60
+    message_debug_purge_batch_size: int = 500
+
+    # conversations are retitled conversation_retitle_debounce_seconds after their most recent chat message, so that
+    # a burst of messages is retitled once; up to conversation_retitle_max_concurrency are retitled at a time
+    conversation_retitle_debounce_seconds: float = 2.0
+    conversation_retitle_max_concurrency: int = 4
+
     azure_openai_endpoint: Annotated[str, Field(validation_alias="azure_openai_endpoint")] = ""
     azure_openai_deployment: Annotated[str, Field(validation_alias="azure_openai_deployment")] = "gpt-4o-mini"
     azure_openai_model: Annotated[str, Field(validation_alias="azure_openai_model")] = "gpt-4o-mini"
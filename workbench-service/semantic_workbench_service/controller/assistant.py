@@ -1,15 +1,17 @@
 import asyncio
+import collections
+import contextlib
 import datetime
+import functools
 import io
 import logging
-import pathlib
 import re
 import shutil
-import tempfile
 import uuid
 import zipfile
-from typing import IO, AsyncContextManager, Awaitable, BinaryIO, Callable, NamedTuple
+from typing import IO, AsyncContextManager, AsyncIterator, Awaitable, BinaryIO, Callable, NamedTuple
 
+import cachetools
 import httpx
 from pydantic import BaseModel, ConfigDict, ValidationError
 from semantic_workbench_api_model.assistant_model import (
@@ -41,6 +43,9 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import auth, db, files, query, settings
 from ..event import ConversationEventQueueItem
+from ..message_debug import MessageDebugStorage
+from ..participant_cache import ParticipantCache
+from ..zip_stream import ZipStreamWriter, prefetch_streams
 from . import convert, exceptions, export_import
 from . import participant as participant_
 from . import user as user_
@@ -51,7 +56,7 @@ logger = logging.getLogger(__name__)
 
 ExportResult = NamedTuple(
     "ExportResult",
-    [("file_path", str), ("content_type", str), ("filename", str), ("cleanup", Callable[[], None])],
+    [("content_type", str), ("filename", str), ("stream", AsyncIterator[bytes])],
 )
 
 
@@ -62,11 +67,23 @@ class AssistantController:
         notify_event: Callable[[ConversationEventQueueItem], Awaitable],
         client_pool: AssistantServiceClientPool,
         file_storage: files.Storage,
+        participant_cache: ParticipantCache,
+        message_debug_storage: MessageDebugStorage,
+        get_read_session: Callable[[], AsyncContextManager[AsyncSession]] | None = None,
     ) -> None:
         self._get_session = get_session
+        # read-only methods use read sessions, which may be served by a read replica
+        self._get_read_session = get_read_session or get_session
         self._notify_event = notify_event
         self._client_pool = client_pool
         self._file_storage = file_storage
+        self._participant_cache = participant_cache
+        self._message_debug_storage = message_debug_storage
+        # the ids of assistant services that do not support posting batches of events, which are rechecked after
+        # the ttl, as services are upgraded
+        self._batch_unsupported_services = cachetools.TTLCache[str, bool](
+            maxsize=1_000, ttl=settings.service.assistant_event_batch_unsupported_ttl_seconds
+        )
 
     async def _ensure_assistant(
         self,
@@ -129,7 +146,7 @@ class AssistantController:
             from_export=from_export,
         )
 
-    async def forward_event_to_assistant(self, assistant_id: uuid.UUID, event: ConversationEvent) -> None:
+    async def forward_events_to_assistant(self, assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
         async with self._get_session() as session:
             assistant = (
                 await session.exec(
@@ -139,16 +156,37 @@ class AssistantController:
                 )
             ).one()
 
-        try:
-            await (await self._client_pool.assistant_client(assistant)).post_conversation_event(event=event)
-        except AssistantError as e:
-            if e.status_code != httpx.codes.NOT_FOUND:
-                logger.exception(
-                    "error forwarding event to assistant; assistant_id: %s, conversation_id: %s, event: %s",
-                    assistant.assistant_id,
-                    event.conversation_id,
-                    event,
-                )
+        client = await self._client_pool.assistant_client(assistant)
+
+        if len(events) > 1 and assistant.assistant_service_id not in self._batch_unsupported_services:
+            try:
+                await client.post_conversation_events(events=events)
+                return
+
+            except AssistantError as e:
+                # assistant services that predate the batch endpoint respond with 404; fall back to posting the
+                # events individually
+                if e.status_code == httpx.codes.NOT_FOUND:
+                    self._batch_unsupported_services[assistant.assistant_service_id] = True
+                else:
+                    logger.exception(
+                        "error forwarding events to assistant; assistant_id: %s, event_count: %d",
+                        assistant.assistant_id,
+                        len(events),
+                    )
+                    return
+
+        for event in events:
+            try:
+                await client.post_conversation_event(event=event)
+            except AssistantError as e:
+                if e.status_code != httpx.codes.NOT_FOUND:
+                    logger.exception(
+                        "error forwarding event to assistant; assistant_id: %s, conversation_id: %s, event: %s",
+                        assistant.assistant_id,
+                        event.conversation_id,
+                        event,
+                    )
 
     async def _remove_assistant_from_conversation(
         self,
@@ -381,6 +419,9 @@ class AssistantController:
             await session.delete(assistant)
             await session.commit()
 
+        for conversation in conversations:
+            self._participant_cache.invalidate(conversation.conversation_id)
+
     async def get_assistants(
         self,
         user_principal: auth.UserPrincipal,
@@ -636,7 +677,7 @@ class AssistantController:
         user_principal: auth.UserPrincipal,
         assistant_id: uuid.UUID,
     ) -> ExportResult:
-        async with self._get_session() as session:
+        async with self._get_read_session() as session:
             assistant = await self._ensure_assistant(
                 session=session, assistant_id=assistant_id, principal=user_principal
             )
@@ -658,108 +699,162 @@ class AssistantController:
             )
 
             return await self._export(
-                session=session,
                 export_filename_prefix=export_file_name,
                 conversation_ids=conversation_ids,
                 assistant_ids=set((assistant_id,)),
             )
 
+    async def _import_files_as_blobs(
+        self,
+        session: AsyncSession,
+        zip_file: zipfile.ZipFile,
+        files_dir: str,
+        conversation_id: uuid.UUID,
+    ) -> None:
+        """
+        Stores the exported files of a conversation as blobs, and points the imported file versions at them.
+        """
+        entry_names = set(zip_file.namelist())
+        file_versions = (
+            await session.exec(select(db.FileVersion).join(db.File).where(db.File.conversation_id == conversation_id))
+        ).all()
+
+        staged_blobs: list[tuple[db.FileVersion, files.StagedBlob]] = []
+        try:
+            for file_version in file_versions:
+                file_path = self._file_storage.path_for(
+                    namespace=str(conversation_id), filename=file_version.storage_filename
+                )
+                entry_name = f"{files_dir}/{file_path.name}"
+                if entry_name not in entry_names:
+                    continue
+
+                with zip_file.open(entry_name) as file:
+                    staged_blobs.append((file_version, await self._file_storage.stage_blob(file)))
+
+            # the blob locks serialize storing the blobs and committing their references with blob deletions
+            await db.lock_file_blobs(session, (blob.content_hash for _, blob in staged_blobs))
+            for file_version, blob in staged_blobs:
+                await self._file_storage.store_blob(blob)
+                file_version.content_hash = blob.content_hash
+                file_version.file_size = blob.size
+                session.add(file_version)
+
+            await session.commit()
+
+        finally:
+            for _, blob in staged_blobs:
+                self._file_storage.discard_staged_blob(blob)
+
     async def _export(
         self,
         conversation_ids: set[uuid.UUID],
         assistant_ids: set[uuid.UUID],
-        session: AsyncSession,
         export_filename_prefix: str,
     ) -> ExportResult:
-        temp_dir_path = pathlib.Path(tempfile.mkdtemp())
-
-        # write all files to a temporary directory
-        export_dir_path = temp_dir_path / "export"
-        export_dir_path.mkdir()
+        return ExportResult(
+            content_type="application/zip",
+            filename=export_filename_prefix + ".zip",
+            stream=self._export_stream(conversation_ids=conversation_ids, assistant_ids=assistant_ids),
+        )
 
-        # export records from database
-        with (export_dir_path / AssistantController.EXPORT_WORKBENCH_FILENAME).open("+wb") as workbench_file:
-            async for file_bytes in export_import.export_file(
+    async def _export_stream(
+        self,
+        conversation_ids: set[uuid.UUID],
+        assistant_ids: set[uuid.UUID],
+    ) -> AsyncIterator[bytes]:
+        """
+        Streams the export as a zip archive, as it is written: the database records, then the conversation files,
+        then the assistants' data, which is fetched from the assistants concurrently.
+        """
+        zip_stream = ZipStreamWriter()
+
+        # export records from database, reading each batch in its own session
+        async for chunk in zip_stream.write_entry(
+            AssistantController.EXPORT_WORKBENCH_FILENAME,
+            export_import.export_file(
                 conversation_ids=conversation_ids,
                 assistant_ids=assistant_ids,
-                session=session,
-            ):
-                workbench_file.write(file_bytes)
+                get_session=self._get_read_session,
+                message_debug_storage=self._message_debug_storage,
+                batch_size=settings.service.export_import_batch_size,
+            ),
+        ):
+            yield chunk
 
-        # export files from storage
-        for conversation_id in conversation_ids:
-            source_dir = self._file_storage.path_for(namespace=str(conversation_id), filename="")
-            if not source_dir.is_dir():
-                continue
+        # the files and assistants to export are read up front, so that no session is held while they are streamed
+        async with self._get_read_session() as session:
+            file_versions = (
+                await session.exec(
+                    select(db.File.conversation_id, db.FileVersion.storage_filename, db.FileVersion.content_hash)
+                    .join(db.File)
+                    .where(col(db.File.conversation_id).in_(conversation_ids))
+                    .order_by(col(db.File.conversation_id).asc(), col(db.FileVersion.file_id).asc())
+                    .order_by(col(db.FileVersion.version).asc())
+                )
+            ).all()
 
-            conversation_dir = export_dir_path / "files" / str(conversation_id)
-            conversation_dir.mkdir(parents=True)
+            assistants = (
+                await session.exec(select(db.Assistant).where(col(db.Assistant.assistant_id).in_(assistant_ids)))
+            ).all()
 
-            await asyncio.to_thread(shutil.copytree, src=source_dir, dst=conversation_dir, dirs_exist_ok=True)
+            assistant_conversation_ids: dict[uuid.UUID, list[uuid.UUID]] = collections.defaultdict(list)
+            for assistant_id, conversation_id in await session.exec(
+                select(db.AssistantParticipant.assistant_id, db.AssistantParticipant.conversation_id)
+                .where(col(db.AssistantParticipant.assistant_id).in_(assistant_ids))
+                .where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids))
+            ):
+                assistant_conversation_ids[assistant_id].append(conversation_id)
+
+        # export files from storage, in the namespaced layout
+        for conversation_id, storage_filename, content_hash in file_versions:
+            if content_hash is not None:
+                content = self._file_storage.read_blob(content_hash)
+            elif self._file_storage.file_exists(namespace=str(conversation_id), filename=storage_filename):
+                content = self._file_storage.read_file_range(namespace=str(conversation_id), filename=storage_filename)
+            else:
+                continue
 
-        # enumerate assistants
-        assistants = await session.exec(select(db.Assistant).where(col(db.Assistant.assistant_id).in_(assistant_ids)))
+            file_path = self._file_storage.path_for(namespace=str(conversation_id), filename=storage_filename)
+            async for chunk in zip_stream.write_entry(f"files/{conversation_id}/{file_path.name}", content):
+                yield chunk
 
+        # enumerate assistants and their conversations
+        entries: list[tuple[str, Callable[[], AsyncContextManager[AsyncIterator[bytes]]]]] = []
         for assistant in assistants:
             assistant_client = await self._client_pool.assistant_client(assistant)
-
-            # export assistant data
-            assistant_dir = export_dir_path / "assistants" / str(assistant.assistant_id)
-            assistant_dir.mkdir(parents=True)
-
-            with (assistant_dir / AssistantController.EXPORT_ASSISTANT_DATA_FILENAME).open("wb") as assistant_file:
-                async with assistant_client.get_exported_data() as response:
-                    async for chunk in response:
-                        assistant_file.write(chunk)
-
-            # enumerate assistant conversations
-            assistant_participants = await session.exec(
-                select(db.AssistantParticipant)
-                .where(db.AssistantParticipant.assistant_id == assistant.assistant_id)
-                .where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids))
-            )
-
-            for assistant_participant in assistant_participants:
-                conversation_dir = assistant_dir / "conversations" / str(assistant_participant.conversation_id)
-                conversation_dir.mkdir(parents=True)
-
-                # export assistant conversation data
-                with (conversation_dir / AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME).open(
-                    "wb"
-                ) as conversation_file:
-                    async with assistant_client.get_exported_conversation_data(
-                        conversation_id=assistant_participant.conversation_id
-                    ) as response:
-                        async for chunk in response:
-                            conversation_file.write(chunk)
-
-        # zip the export directory
-        zip_file_path = await asyncio.to_thread(
-            shutil.make_archive,
-            base_name=str(temp_dir_path / "zip"),
-            format="zip",
-            root_dir=export_dir_path,
-            base_dir="",
-            logger=logger,
-            verbose=True,
+            assistant_dir = f"assistants/{assistant.assistant_id}"
+            entries.append((
+                f"{assistant_dir}/{AssistantController.EXPORT_ASSISTANT_DATA_FILENAME}",
+                assistant_client.get_exported_data,
+            ))
+
+            for conversation_id in assistant_conversation_ids[assistant.assistant_id]:
+                entries.append((
+                    f"{assistant_dir}/conversations/{conversation_id}/"
+                    f"{AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME}",
+                    functools.partial(assistant_client.get_exported_conversation_data, conversation_id=conversation_id),
+                ))
+
+        # export assistant data, fetching from the assistants concurrently
+        assistant_streams = prefetch_streams(
+            entries,
+            max_concurrency=settings.service.export_max_concurrent_assistant_exports,
+            max_buffered_chunks=settings.service.export_max_buffered_chunks,
         )
+        async with contextlib.aclosing(assistant_streams):
+            async for name, assistant_stream in assistant_streams:
+                async for chunk in zip_stream.write_entry(name, assistant_stream):
+                    yield chunk
 
-        def _cleanup() -> None:
-            shutil.rmtree(temp_dir_path, ignore_errors=True)
-
-        return ExportResult(
-            file_path=zip_file_path,
-            content_type="application/zip",
-            filename=export_filename_prefix + ".zip",
-            cleanup=_cleanup,
-        )
+        yield zip_stream.close()
 
     async def export_conversations(
         self,
         user_principal: auth.UserPrincipal,
         conversation_ids: set[uuid.UUID],
     ) -> ExportResult:
-        async with self._get_session() as session:
+        async with self._get_read_session() as session:
             conversations = await session.exec(
                 query.select_conversations_for(
                     principal=user_principal, include_all_owned=True, include_observer=True
@@ -784,7 +879,6 @@ class AssistantController:
             )
 
             return await self._export(
-                session=session,
                 export_filename_prefix=(
                     f"semantic_workbench_conversation_export_{datetime.datetime.now(datetime.UTC).strftime('%Y%m%d%H%M%S')}"
                 ),
@@ -798,31 +892,28 @@ class AssistantController:
         user_principal: auth.UserPrincipal,
     ) -> ConversationImportResult:
         async with self._get_session() as session:
-            with tempfile.TemporaryDirectory() as extraction_dir:
-                extraction_path = pathlib.Path(extraction_dir)
-
-                # extract the zip file to a temporary directory
-                with zipfile.ZipFile(file=from_export, mode="r") as zip_file:
-                    await asyncio.to_thread(zip_file.extractall, path=extraction_path)
-
+            # entries are read from the uploaded archive as they are imported, rather than extracted to disk
+            with zipfile.ZipFile(file=from_export, mode="r") as zip_file:
                 # import records into database
-                with (extraction_path / AssistantController.EXPORT_WORKBENCH_FILENAME).open("rb") as workbench_file:
+                with zip_file.open(AssistantController.EXPORT_WORKBENCH_FILENAME) as workbench_file:
                     import_result = await export_import.import_files(
                         session=session,
                         owner_id=user_principal.user_id,
                         files=[workbench_file],
+                        message_debug_storage=self._message_debug_storage,
+                        batch_size=settings.service.export_import_batch_size,
                     )
 
                 await session.commit()
 
                 # import files into storage
                 for old_conversation_id, new_conversation_id in import_result.conversation_id_old_to_new.items():
-                    files_path = extraction_path / "files" / str(old_conversation_id)
-                    if not files_path.is_dir():
-                        continue
-
-                    storage_path = self._file_storage.path_for(namespace=str(new_conversation_id), filename="")
-                    await asyncio.to_thread(shutil.copytree, src=files_path, dst=storage_path)
+                    await self._import_files_as_blobs(
+                        session=session,
+                        zip_file=zip_file,
+                        files_dir=f"files/{old_conversation_id}",
+                        conversation_id=new_conversation_id,
+                    )
 
                 try:
                     # enumerate assistants
@@ -846,12 +937,12 @@ class AssistantController:
                                 detail=f"assistant service id {assistant.assistant_service_id} is not valid"
                             )
 
-                        assistant_dir = extraction_path / "assistants" / str(old_assistant_id)
+                        assistant_dir = f"assistants/{old_assistant_id}"
 
                         if is_new:
                             # create the assistant from the assistant data file
-                            with (assistant_dir / AssistantController.EXPORT_ASSISTANT_DATA_FILENAME).open(
-                                "rb"
+                            with zip_file.open(
+                                f"{assistant_dir}/{AssistantController.EXPORT_ASSISTANT_DATA_FILENAME}"
                             ) as assistant_file:
                                 try:
                                     await self._put_assistant(
@@ -873,12 +964,12 @@ class AssistantController:
                                 )
                             ).one()
 
-                            conversation_dir = assistant_dir / "conversations" / str(old_conversation_id)
+                            conversation_dir = f"{assistant_dir}/conversations/{old_conversation_id}"
 
                             # create the conversation from the conversation data file
-                            with (
-                                conversation_dir / AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME
-                            ).open("rb") as conversation_file:
+                            with zip_file.open(
+                                f"{conversation_dir}/{AssistantController.EXPORT_ASSISTANT_CONVERSATION_DATA_FILENAME}"
+                            ) as conversation_file:
                                 try:
                                     await self.connect_assistant_to_conversation(
                                         conversation=new_conversation,
@@ -917,6 +1008,9 @@ class AssistantController:
 
             await session.commit()
 
+        for new_conversation_id in import_result.conversation_id_old_to_new.values():
+            self._participant_cache.invalidate(new_conversation_id)
+
         return ConversationImportResult(
             assistant_ids=[assistant_id for assistant_id, _ in import_result.assistant_id_old_to_new.values()],
             conversation_ids=list(import_result.conversation_id_old_to_new.values()),
@@ -983,11 +1077,7 @@ class AssistantController:
                     select(db.ConversationMessageDebug).where(db.ConversationMessageDebug.message_id == old_message_id)
                 )
                 for debug in message_debugs:
-                    new_debug = db.ConversationMessageDebug(
-                        **debug.model_dump(exclude={"message_id"}),
-                        message_id=new_message_id,
-                    )
-                    session.add(new_debug)
+                    session.add(await self._message_debug_storage.copy(debug, new_message_id))
 
             # Copy File entries associated with the conversation
             files = await session.exec(
@@ -1008,6 +1098,7 @@ class AssistantController:
                 session.add(new_file)
 
             # Copy FileVersion entries associated with the files
+            content_hashes: set[str] = set()
             for old_file_id, new_file_id in file_id_old_to_new.items():
                 file_versions = await session.exec(
                     select(db.FileVersion)
@@ -1020,8 +1111,15 @@ class AssistantController:
                         file_id=new_file_id,
                     )
                     session.add(new_version)
+                    if new_version.content_hash is not None:
+                        content_hashes.add(new_version.content_hash)
+
+            # the blobs are locked until the copies are committed, so that they are not deleted with the original
+            # file versions meanwhile
+            await db.lock_file_blobs(session, content_hashes)
 
-            # Copy files associated with the conversation
+            # Copy files associated with the conversation; the file versions stored as blobs are shared by
+            # reference, through the copied file version records
             original_files_path = self._file_storage.path_for(
                 namespace=str(original_conversation.conversation_id), filename=""
             )
@@ -1075,6 +1173,7 @@ class AssistantController:
                 session.add(new_user_participant)
 
             await session.commit()
+            self._participant_cache.invalidate(conversation.conversation_id)
 
             # Initialize assistant state for the new conversation
             assistant_ids = {participant.assistant_id for participant in assistant_participants}
@@ -19,7 +19,9 @@ from sqlmodel import col, or_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import assistant_api_key, auth, db, settings
+from ..assistant_service_liveness import AssistantServiceLiveness
 from ..event import ConversationEventQueueItem
+from ..participant_cache import ParticipantCache
 from . import convert, exceptions
 from . import participant as participant_
 from . import user as user_
@@ -28,6 +30,13 @@ from .assistant_service_client_pool import AssistantServiceClientPool
 logger = logging.getLogger(__name__)
 
 
+def _as_utc(value: datetime.datetime | None) -> datetime.datetime:
+    if value is None:
+        return datetime.datetime.min.replace(tzinfo=datetime.UTC)
+    # sqlite does not store the timezone
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.UTC)
+
+
 class AssistantServiceRegistrationController:
     def __init__(
         self,
@@ -35,11 +44,15 @@ class AssistantServiceRegistrationController:
         notify_event: Callable[[ConversationEventQueueItem], Awaitable],
         api_key_store: assistant_api_key.ApiKeyStore,
         client_pool: AssistantServiceClientPool,
+        participant_cache: ParticipantCache,
+        liveness: AssistantServiceLiveness,
     ) -> None:
         self._get_session = get_session
         self._notify_event = notify_event
         self._api_key_store = api_key_store
         self._client_pool = client_pool
+        self._participant_cache = participant_cache
+        self._liveness = liveness
 
     @property
     def _registration_is_secured(self) -> bool:
@@ -209,9 +222,39 @@ class AssistantServiceRegistrationController:
         assistant_service_id: str,
         update_assistant_service_url: UpdateAssistantServiceRegistrationUrl,
     ) -> tuple[AssistantServiceRegistration, Iterable]:
+        """
+        Records a heartbeat from the assistant service, registering its url. The registration is only written when
+        the url or online status changes, or its online lease needs renewing.
+        """
         if assistant_service_id != assistant_service_principal.assistant_service_id:
             raise exceptions.ForbiddenError()
 
+        if self._registration_is_secured and update_assistant_service_url.url.scheme != "https":
+            raise exceptions.InvalidArgumentError("url must be https")
+
+        now = datetime.datetime.now(datetime.UTC)
+        lease = datetime.timedelta(seconds=update_assistant_service_url.online_expires_in_seconds)
+
+        async with self._get_session() as session:
+            registration = (
+                await session.exec(
+                    select(db.AssistantServiceRegistration).where(
+                        db.AssistantServiceRegistration.assistant_service_id == assistant_service_id
+                    )
+                )
+            ).first()
+
+            if (
+                registration is not None
+                and registration.assistant_service_online
+                and registration.assistant_service_url == str(update_assistant_service_url.url)
+                and _as_utc(registration.assistant_service_online_expiration_datetime) > now + lease / 2
+            ):
+                self._liveness.heartbeat(assistant_service_id, update_assistant_service_url.online_expires_in_seconds)
+                return convert.assistant_service_registration_from_db(
+                    registration, include_api_key_name=self._registration_is_secured
+                ), ()
+
         background_task_args: Iterable = ()
         async with self._get_session() as session:
             registration = (
@@ -236,9 +279,6 @@ class AssistantServiceRegistrationController:
                     api_key_name=api_key_name,
                 )
 
-            if self._registration_is_secured and update_assistant_service_url.url.scheme != "https":
-                raise exceptions.InvalidArgumentError("url must be https")
-
             if registration.assistant_service_url != str(update_assistant_service_url.url):
                 registration.assistant_service_url = str(update_assistant_service_url.url)
                 logger.info(
@@ -247,18 +287,24 @@ class AssistantServiceRegistrationController:
                     registration.assistant_service_url,
                 )
 
-            registration.assistant_service_online_expiration_datetime = datetime.datetime.now(
-                datetime.UTC
-            ) + datetime.timedelta(seconds=update_assistant_service_url.online_expires_in_seconds)
+            # the lease marks the service offline, should its heartbeats stop reaching any service process
+            registration.assistant_service_online_expiration_datetime = now + lease
 
             if not registration.assistant_service_online:
                 registration.assistant_service_online = True
                 background_task_args = (self._update_participants, assistant_service_id)
+                logger.info("assistant service is online; assistant_service_id: %s", assistant_service_id)
 
             session.add(registration)
             await session.commit()
             await session.refresh(registration)
 
+        self._liveness.heartbeat(assistant_service_id, update_assistant_service_url.online_expires_in_seconds)
+
+        if background_task_args:
+            # the service's assistants are now online participants in their conversations
+            self._participant_cache.invalidate_all()
+
         return convert.assistant_service_registration_from_db(
             registration, include_api_key_name=self._registration_is_secured
         ), background_task_args
@@ -274,6 +320,18 @@ class AssistantServiceRegistrationController:
                 .where(db.Assistant.assistant_service_id == assistant_service_id)
             )
 
+            participants_and_assistants = participants_and_assistants.all()
+
+            # the participants' online status is derived from the assistant service registration, so the versions
+            # of their conversations are advanced explicitly
+            conn = await session.connection()
+            await conn.execute(
+                db.advance_conversation_versions(
+                    participant.conversation_id for participant, _ in participants_and_assistants
+                )
+            )
+            await session.commit()
+
             for participant, assistant in participants_and_assistants:
                 participants = await participant_.get_conversation_participants(
                     session=session, conversation_id=participant.conversation_id, include_inactive=True
@@ -318,11 +376,23 @@ class AssistantServiceRegistrationController:
         )
 
     async def check_assistant_service_online_expired(self) -> None:
+        """
+        Marks offline the services whose online leases have expired without a heartbeat reaching this process.
+
+        A service's heartbeats may reach any service process, so a heartbeat expiring in this process does not mean
+        the service is offline; the lease, which is renewed by the heartbeats reaching every process, decides.
+        """
+        # services whose heartbeats to this process expired are no longer known to be alive, and are marked offline
+        # below once their leases expire
+        self._liveness.pop_expired()
+        alive_ids = self._liveness.alive_ids()
+
         async with self._get_session() as session:
             conn = await session.connection()
             result = await conn.execute(
                 update(db.AssistantServiceRegistration)
                 .where(col(db.AssistantServiceRegistration.assistant_service_online).is_(True))
+                .where(col(db.AssistantServiceRegistration.assistant_service_id).not_in(alive_ids))
                 .where(
                     or_(
                         col(db.AssistantServiceRegistration.assistant_service_online_expiration_datetime).is_(None),
@@ -341,6 +411,10 @@ class AssistantServiceRegistrationController:
             assistant_service_ids = result.scalars().all()
             await session.commit()
 
+        logger.info("assistant services are offline; assistant_service_ids: %s", assistant_service_ids)
+
+        self._participant_cache.invalidate_all()
+
         for assistant_service_id in assistant_service_ids:
             await self._update_participants(assistant_service_id=assistant_service_id)
 
@@ -362,6 +436,8 @@ class AssistantServiceRegistrationController:
 
             await session.delete(registration)
             await session.commit()
+            self._participant_cache.invalidate_all()
+            self._liveness.forget(assistant_service_id)
 
             await self._api_key_store.delete(registration.api_key_name)
 
@@ -1,9 +1,13 @@
+import base64
+import binascii
 import datetime
+import hashlib
+import json
 import logging
 import uuid
 from typing import (
-    Annotated,
     AsyncContextManager,
+    AsyncIterator,
     Awaitable,
     Callable,
     Iterable,
@@ -12,9 +16,7 @@ from typing import (
 )
 
 import deepmerge
-import openai_client
 from openai.types.chat import ChatCompletionMessageParam
-from pydantic import BaseModel, Field, HttpUrl
 from semantic_workbench_api_model.assistant_service_client import AssistantError
 from semantic_workbench_api_model.workbench_model import (
     Conversation,
@@ -22,8 +24,8 @@ from semantic_workbench_api_model.workbench_model import (
     ConversationEventType,
     ConversationList,
     ConversationMessage,
-    ConversationMessageDebug,
     ConversationMessageList,
+    ConversationMessageSearchResultList,
     ConversationParticipant,
     ConversationParticipantList,
     MessageType,
@@ -34,11 +36,15 @@ from semantic_workbench_api_model.workbench_model import (
     UpdateParticipant,
 )
 from sqlalchemy.orm.attributes import flag_modified
-from sqlmodel import and_, col, or_, select
+from sqlmodel import and_, col, delete, or_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import auth, db, query, settings
 from ..event import ConversationEventQueueItem
+from ..message_debug import ENCODING_ZLIB_FILE, MessageDebugStorage
+from ..participant_cache import ParticipantCache
+from ..read_replica import GetReadSession
+from ..retitle_worker import TitleCompletion
 from . import assistant, convert, exceptions
 from . import participant as participant_
 from . import user as user_
@@ -46,23 +52,57 @@ from . import user as user_
 logger = logging.getLogger(__name__)
 
 
-class ConversationTitleResponse(BaseModel):
-    """Model for responses from LLM for automatic conversation re-titling."""
-
-    title: Annotated[
-        str,
-        Field(
-            description="The updated title of the conversation. If the subject matter of the conversation has changed significantly from the current title, suggest a short, but descriptive title for the conversation. Ideally 4 words or less in length. Leave it blank to keep the current title.",
-        ),
-    ]
-
-
 META_DATA_KEY_USER_SET_TITLE = "__user_set_title"
 META_DATA_KEY_AUTO_TITLE_COUNT = "__auto_title_count"
+META_DATA_KEY_AUTO_TITLE_FINGERPRINT = "__auto_title_fingerprint"
 AUTO_TITLE_COUNT_LIMIT = 3
 """
 The maximum number of times a conversation can be automatically retitled.
 """
+MAX_MESSAGES_PER_BATCH = 100
+"""
+The maximum number of messages that can be created in one request.
+"""
+
+
+def _encode_message_cursor(direction: Literal["before", "after"], sequence: int) -> str:
+    return base64.urlsafe_b64encode(f"{direction}:{sequence}".encode()).decode("ascii").rstrip("=")
+
+
+def _decode_message_cursor(cursor: str) -> tuple[Literal["before", "after"], int]:
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        direction, sequence = decoded.split(":", 1)
+        match direction:
+            case "before" | "after":
+                return direction, int(sequence)
+            case _:
+                raise ValueError(f"invalid cursor direction: {direction}")
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise exceptions.InvalidArgumentError(detail="invalid cursor") from e
+
+
+def _encode_search_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode("ascii").rstrip("=")
+
+
+def _decode_search_cursor(cursor: str) -> int:
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        kind, offset = decoded.split(":", 1)
+        if kind != "offset" or int(offset) < 0:
+            raise ValueError(f"invalid search cursor: {decoded}")
+        return int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise exceptions.InvalidArgumentError(detail="invalid cursor") from e
+
+
+def _auto_title_fingerprint(title: str, completion_messages: list[ChatCompletionMessageParam]) -> str:
+    """
+    Identifies the content a conversation is retitled from, so that it is not retitled again until it changes.
+    """
+    content = json.dumps([title, completion_messages], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
 class ConversationController:
@@ -71,10 +111,28 @@ class ConversationController:
         get_session: Callable[[], AsyncContextManager[AsyncSession]],
         notify_event: Callable[[ConversationEventQueueItem], Awaitable],
         assistant_controller: assistant.AssistantController,
+        participant_cache: ParticipantCache,
+        message_debug_storage: MessageDebugStorage,
+        request_retitle: Callable[[auth.ActorPrincipal, uuid.UUID, int], None],
+        complete_title: TitleCompletion,
+        get_read_session: GetReadSession | None = None,
+        notify_events: Callable[[list[ConversationEventQueueItem]], Awaitable] | None = None,
     ) -> None:
         self._get_session = get_session
+        # read-only methods use read sessions, which may be served by a read replica
+        self._get_read_session: GetReadSession = get_read_session or (lambda conversation_id=None: get_session())
         self._notify_event = notify_event
+        # batches of events are notified together, when supported, so that they are logged in one transaction
+        self._notify_events = notify_events or self._notify_events_individually
         self._assistant_controller = assistant_controller
+        self._participant_cache = participant_cache
+        self._message_debug_storage = message_debug_storage
+        self._request_retitle = request_retitle
+        self._complete_title = complete_title
+
+    async def _notify_events_individually(self, queue_items: list[ConversationEventQueueItem]) -> None:
+        for queue_item in queue_items:
+            await self._notify_event(queue_item)
 
     async def create_conversation(
         self,
@@ -260,7 +318,7 @@ class ConversationController:
         latest_message_types: set[MessageType],
         include_all_owned: bool = False,
     ) -> ConversationList:
-        async with self._get_session() as session:
+        async with self._get_read_session() as session:
             include_all_owned = include_all_owned and isinstance(principal, auth.UserPrincipal)
 
             conversation_projections = (
@@ -286,7 +344,7 @@ class ConversationController:
         assistant_id: uuid.UUID,
         latest_message_types: set[MessageType],
     ) -> ConversationList:
-        async with self._get_session() as session:
+        async with self._get_read_session() as session:
             assistant = (
                 await session.exec(
                     query.select_assistants_for(user_principal=user_principal).where(
@@ -321,7 +379,7 @@ class ConversationController:
         principal: auth.ActorPrincipal,
         latest_message_types: set[MessageType],
     ) -> Conversation:
-        async with self._get_session() as session:
+        async with self._get_read_session(conversation_id) as session:
             include_all_owned = isinstance(principal, auth.UserPrincipal)
 
             conversation_projection = (
@@ -362,6 +420,26 @@ class ConversationController:
                 assistants=assistants,
             )
 
+    async def get_conversation_version(self, conversation_id: uuid.UUID, principal: auth.ActorPrincipal) -> int:
+        """
+        Returns the version of the conversation, which advances when the conversation, or its messages,
+        participants or files, change.
+        """
+        async with self._get_read_session(conversation_id) as session:
+            conversation = (
+                await session.exec(
+                    query.select_conversations_for(
+                        principal=principal,
+                        include_all_owned=isinstance(principal, auth.UserPrincipal),
+                        include_observer=True,
+                    ).where(db.Conversation.conversation_id == conversation_id)
+                )
+            ).one_or_none()
+            if conversation is None:
+                raise exceptions.NotFoundError()
+
+            return conversation.version
+
     async def update_conversation(
         self,
         conversation_id: uuid.UUID,
@@ -434,7 +512,7 @@ class ConversationController:
         principal: auth.ActorPrincipal,
         include_inactive: bool = False,
     ) -> ConversationParticipantList:
-        async with self._get_session() as session:
+        async with self._get_read_session(conversation_id) as session:
             conversation = (
                 await session.exec(
                     query.select_conversations_for(
@@ -459,7 +537,7 @@ class ConversationController:
         participant_id: str,
         principal: auth.ActorPrincipal,
     ) -> ConversationParticipant:
-        async with self._get_session() as session:
+        async with self._get_read_session(conversation_id) as session:
             conversation = (
                 await session.exec(
                     query.select_conversations_for(
@@ -558,6 +636,7 @@ class ConversationController:
                 if event_type is not None:
                     session.add(participant)
                     await session.commit()
+                    self._participant_cache.invalidate(conversation.conversation_id)
                     await session.refresh(participant)
 
                 return convert.conversation_participant_from_db_user(participant), event_type
@@ -618,6 +697,7 @@ class ConversationController:
                 if event_type is not None:
                     session.add(participant)
                     await session.commit()
+                    self._participant_cache.invalidate(conversation.conversation_id)
                     await session.refresh(participant)
 
                 if active_participant_changed and participant.active_participant:
@@ -635,6 +715,7 @@ class ConversationController:
                         )
                         session.add(original_participant)
                         await session.commit()
+                        self._participant_cache.invalidate(conversation.conversation_id)
                         raise
 
                 if active_participant_changed and not participant.active_participant:
@@ -768,7 +849,7 @@ class ConversationController:
         principal: auth.ActorPrincipal,
         conversation_id: uuid.UUID,
         new_message: NewConversationMessage,
-    ) -> tuple[ConversationMessage, Iterable]:
+    ) -> ConversationMessage:
         async with self._get_session() as session:
             conversation = (
                 await session.exec(
@@ -793,61 +874,21 @@ class ConversationController:
             ):
                 raise exceptions.ConflictError(f"message with id {new_message.id} already exists")
 
-            match principal:
-                case auth.UserPrincipal():
-                    role = "user"
-                    participant_id = principal.user_id
-                case auth.AssistantServicePrincipal():
-                    # allow assistants to send messages as users, if provided
-                    if new_message.sender is not None and new_message.sender.participant_role == "user":
-                        role = "user"
-                        participant_id = new_message.sender.participant_id
-                    else:
-                        role = "assistant"
-                        participant_id = str(principal.assistant_id)
-
-            # pop "debug" from metadata, if it exists, and merge with the debug field
-            message_debug = (new_message.metadata or {}).pop("debug", None)
-            # ensure that message_debug is a dictionary, in cases like {"debug": "some message"}, or {"debug": [1,2]}
-            if message_debug and not isinstance(message_debug, dict):
-                message_debug = {"debug": message_debug}
-            message_debug = deepmerge.always_merger.merge(message_debug or {}, new_message.debug_data or {})
-
-            message = db.ConversationMessage(
-                conversation_id=conversation.conversation_id,
-                sender_participant_role=role,
-                sender_participant_id=participant_id,
-                message_type=new_message.message_type.value,
-                content=new_message.content,
-                content_type=new_message.content_type,
-                filenames=new_message.filenames or [],
-                meta_data=new_message.metadata or {},
+            message, message_debug = self._message_from_new_message(
+                principal=principal, conversation_id=conversation.conversation_id, new_message=new_message
             )
-            if new_message.id is not None:
-                message.message_id = new_message.id
 
             session.add(message)
 
             if message_debug:
-                debug = db.ConversationMessageDebug(
-                    message_id=message.message_id,
-                    data=message_debug,
-                )
-                session.add(debug)
+                session.add(await self._message_debug_storage.create(message.message_id, message_debug))
 
             await session.commit()
             await session.refresh(message)
 
-            background_task: Iterable = ()
-            if self._conversation_candidate_for_retitling(
+            retitle = self._conversation_candidate_for_retitling(
                 conversation=conversation
-            ) and self._message_candidate_for_retitling(message=message):
-                background_task = (
-                    self._retitle_conversation,
-                    principal,
-                    conversation_id,
-                    message.sequence,
-                )
+            ) and self._message_candidate_for_retitling(message=message)
 
         message_response = convert.conversation_message_from_db(message, has_debug=bool(message_debug))
 
@@ -863,7 +904,144 @@ class ConversationController:
             )
         )
 
-        return message_response, background_task
+        if retitle:
+            self._request_retitle(principal, conversation_id, message.sequence)
+
+        return message_response
+
+    async def create_conversation_messages(
+        self,
+        principal: auth.ActorPrincipal,
+        conversation_id: uuid.UUID,
+        new_messages: list[NewConversationMessage],
+    ) -> ConversationMessageList:
+        """
+        Creates the messages in one transaction, inserting them in a single multi-row INSERT that allocates their
+        sequences together.
+        """
+        if len(new_messages) > MAX_MESSAGES_PER_BATCH:
+            raise exceptions.InvalidArgumentError(
+                detail=f"message creation limited to {MAX_MESSAGES_PER_BATCH} messages at a time"
+            )
+
+        new_message_ids = [new_message.id for new_message in new_messages if new_message.id is not None]
+        if len(set(new_message_ids)) != len(new_message_ids):
+            raise exceptions.InvalidArgumentError(detail="message ids are required to be unique")
+
+        async with self._get_session() as session:
+            conversation = (
+                await session.exec(
+                    query.select_conversations_for(principal=principal).where(
+                        db.Conversation.conversation_id == conversation_id
+                    )
+                )
+            ).one_or_none()
+            if conversation is None:
+                raise exceptions.NotFoundError()
+
+            if new_message_ids:
+                existing_message_id = (
+                    await session.exec(
+                        select(db.ConversationMessage.message_id)
+                        .where(db.ConversationMessage.conversation_id == conversation_id)
+                        .where(col(db.ConversationMessage.message_id).in_(new_message_ids))
+                        .limit(1)
+                    )
+                ).first()
+                if existing_message_id is not None:
+                    raise exceptions.ConflictError(f"message with id {existing_message_id} already exists")
+
+            messages_and_debugs = [
+                self._message_from_new_message(
+                    principal=principal, conversation_id=conversation.conversation_id, new_message=new_message
+                )
+                for new_message in new_messages
+            ]
+
+            session.add_all([message for message, _ in messages_and_debugs])
+            await session.flush()
+
+            session.add_all([
+                await self._message_debug_storage.create(message.message_id, message_debug)
+                for message, message_debug in messages_and_debugs
+                if message_debug
+            ])
+
+            await session.commit()
+
+            retitling_candidates = [
+                message for message, _ in messages_and_debugs if self._message_candidate_for_retitling(message=message)
+            ]
+            if not self._conversation_candidate_for_retitling(conversation=conversation):
+                retitling_candidates = []
+
+        message_responses = [
+            convert.conversation_message_from_db(message, has_debug=bool(message_debug))
+            for message, message_debug in messages_and_debugs
+        ]
+
+        await self._notify_events([
+            ConversationEventQueueItem(
+                event=ConversationEvent(
+                    conversation_id=conversation_id,
+                    event=ConversationEventType.message_created,
+                    data={
+                        "message": message_response.model_dump(),
+                    },
+                ),
+            )
+            for message_response in message_responses
+        ])
+
+        if retitling_candidates:
+            self._request_retitle(principal, conversation_id, retitling_candidates[-1].sequence)
+
+        return ConversationMessageList(messages=message_responses)
+
+    def _message_from_new_message(
+        self,
+        principal: auth.ActorPrincipal,
+        conversation_id: uuid.UUID,
+        new_message: NewConversationMessage,
+    ) -> tuple[db.ConversationMessage, dict]:
+        match principal:
+            case auth.UserPrincipal():
+                role = "user"
+                participant_id = principal.user_id
+            case auth.AssistantServicePrincipal():
+                # allow assistants to send messages as users, if provided
+                if new_message.sender is not None and new_message.sender.participant_role == "user":
+                    role = "user"
+                    participant_id = new_message.sender.participant_id
+                else:
+                    role = "assistant"
+                    participant_id = str(principal.assistant_id)
+
+        # pop "debug" from metadata, if it exists, and merge with the debug field
+        message_debug = (new_message.metadata or {}).pop("debug", None)
+        # ensure that message_debug is a dictionary, in cases like {"debug": "some message"}, or {"debug": [1,2]}
+        if message_debug and not isinstance(message_debug, dict):
+            message_debug = {"debug": message_debug}
+        # the payloads are usually large, and usually only one of them is provided, which needs no merging
+        if message_debug and new_message.debug_data:
+            message_debug = deepmerge.always_merger.merge(message_debug, new_message.debug_data)
+        else:
+            message_debug = message_debug or new_message.debug_data or {}
+
+        message = db.ConversationMessage(
+            conversation_id=conversation_id,
+            sender_participant_role=role,
+            sender_participant_id=participant_id,
+            message_type=new_message.message_type.value,
+            content=new_message.content,
+            content_type=new_message.content_type,
+            filenames=new_message.filenames or [],
+            meta_data=new_message.metadata or {},
+        )
+        if new_message.id is not None:
+            message.message_id = new_message.id
+
+        return message, message_debug
 
     def _message_candidate_for_retitling(self, message: db.ConversationMessage) -> bool:
         """Check if the message is a candidate for retitling the conversation."""
@@ -885,13 +1063,16 @@ class ConversationController:
 
         return True
 
-    async def _retitle_conversation(
+    async def retitle_conversation(
         self,
         principal: auth.ActorPrincipal,
         conversation_id: uuid.UUID,
         latest_message_sequence: int,
     ) -> None:
-        """Retitle the conversation based on the most recent messages."""
+        """
+        Retitle the conversation based on the most recent messages, unless they, and the title, are unchanged since
+        it was last retitled.
+        """
 
         if not settings.service.azure_openai_endpoint:
             logger.warning(
@@ -908,6 +1089,12 @@ class ConversationController:
             return
 
         async with self._get_session() as session:
+            conversation = (
+                await session.exec(select(db.Conversation).where(db.Conversation.conversation_id == conversation_id))
+            ).one_or_none()
+            if conversation is None or not self._conversation_candidate_for_retitling(conversation):
+                return
+
             # Retrieve the most recent messages
             messages = list(
                 (
@@ -943,34 +1130,21 @@ class ConversationController:
                         "content": message.content,
                     })
 
+        if conversation.meta_data.get(META_DATA_KEY_AUTO_TITLE_FINGERPRINT) == _auto_title_fingerprint(
+            conversation.title, completion_messages
+        ):
+            logger.debug("conversation is unchanged since it was last retitled, skipping retitling %s", conversation_id)
+            return
+
         # Call the LLM to get a new title
         try:
-            async with openai_client.create_client(
-                openai_client.AzureOpenAIServiceConfig(
-                    auth_config=openai_client.AzureOpenAIAzureIdentityAuthConfig(),
-                    azure_openai_deployment=settings.service.azure_openai_deployment,
-                    azure_openai_endpoint=HttpUrl(settings.service.azure_openai_endpoint),
-                ),
-            ) as client:
-                response = await client.beta.chat.completions.parse(
-                    messages=[
-                        *completion_messages,
-                        {
-                            "role": "developer",
-                            "content": ("The current conversation title is: {conversation.title}"),
-                        },
-                    ],
-                    model=settings.service.azure_openai_model,
-                    # the model's description also contains instructions
-                    response_format=ConversationTitleResponse,
-                )
-
-                if not response.choices:
-                    raise RuntimeError("No choices in azure openai response")
-
-                result = response.choices[0].message.parsed
-                if result is None:
-                    raise RuntimeError("No parsed result in azure openai response")
+            title = await self._complete_title([
+                *completion_messages,
+                {
+                    "role": "developer",
+                    "content": f"The current conversation title is: {conversation.title}",
+                },
+            ])
 
         except Exception:
             logger.exception("Failed to retitle conversation %s", conversation_id)
@@ -989,12 +1163,13 @@ class ConversationController:
             if not self._conversation_candidate_for_retitling(conversation):
                 return
 
-            if result.title.strip():
-                conversation.title = result.title.strip()
+            if title.strip():
+                conversation.title = title.strip()
 
             conversation.meta_data = {
                 **conversation.meta_data,
                 META_DATA_KEY_AUTO_TITLE_COUNT: conversation.meta_data.get(META_DATA_KEY_AUTO_TITLE_COUNT, 0) + 1,
+                META_DATA_KEY_AUTO_TITLE_FINGERPRINT: _auto_title_fingerprint(conversation.title, completion_messages),
             }
 
             session.add(conversation)
@@ -1045,7 +1220,10 @@ class ConversationController:
         principal: auth.ActorPrincipal,
         conversation_id: uuid.UUID,
         message_id: uuid.UUID,
-    ) -> ConversationMessageDebug:
+    ) -> AsyncIterator[bytes]:
+        """
+        Returns the JSON of the message's ConversationMessageDebug, streaming the payload as it is decompressed.
+        """
         async with self._get_session() as session:
             message_debug = (
                 await session.exec(
@@ -1058,7 +1236,69 @@ class ConversationController:
             if message_debug is None:
                 raise exceptions.NotFoundError()
 
-        return convert.conversation_message_debug_from_db(message_debug)
+        async def stream() -> AsyncIterator[bytes]:
+            yield f'{{"message_id":{json.dumps(str(message_debug.message_id))},"debug_data":'.encode("utf-8")
+            async for chunk in self._message_debug_storage.stream(message_debug):
+                yield chunk
+            yield b"}"
+
+        return stream()
+
+    async def purge_message_debugs(self, older_than: datetime.datetime, batch_size: int = 500) -> int:
+        """
+        Deletes the debug payloads of messages created before older_than, in batches. Returns the number of payloads
+        deleted.
+        """
+        purged = 0
+        while True:
+            async with self._get_session() as session:
+                message_debugs = (
+                    await session.exec(
+                        select(db.ConversationMessageDebug.message_id, db.ConversationMessageDebug.encoding)
+                        .join(db.ConversationMessage)
+                        .where(col(db.ConversationMessage.created_datetime) < older_than)
+                        .limit(batch_size)
+                    )
+                ).all()
+                if not message_debugs:
+                    break
+
+                await session.exec(
+                    delete(db.ConversationMessageDebug).where(
+                        col(db.ConversationMessageDebug.message_id).in_([
+                            message_id for message_id, _ in message_debugs
+                        ])
+                    )
+                )
+                await session.commit()
+
+            await self._message_debug_storage.delete_files(
+                message_id for message_id, encoding in message_debugs if encoding == ENCODING_ZLIB_FILE
+            )
+            purged += len(message_debugs)
+
+        if purged:
+            logger.info("purged message debug payloads; count: %d", purged)
+        return purged
+
+    async def delete_orphaned_message_debug_files(self) -> int:
+        """
+        Deletes the payload files of messages that have been deleted, as payload files are not removed when their
+        messages, or conversations, are deleted. Returns the number of files deleted.
+        """
+        async with self._get_session() as session:
+            file_message_ids = (
+                await session.exec(
+                    select(db.ConversationMessageDebug.message_id).where(
+                        db.ConversationMessageDebug.encoding == ENCODING_ZLIB_FILE
+                    )
+                )
+            ).all()
+        orphaned = await self._message_debug_storage.delete_orphaned_files(file_message_ids, min_age_seconds=60 * 60)
+
+        if orphaned:
+            logger.info("deleted orphaned message debug payload files; count: %d", orphaned)
+        return orphaned
 
     async def get_messages(
         self,
@@ -1069,9 +1309,10 @@ class ConversationController:
         message_types: list[MessageType] | None = None,
         before: uuid.UUID | None = None,
         after: uuid.UUID | None = None,
+        cursor: str | None = None,
         limit: int = 100,
     ) -> ConversationMessageList:
-        async with self._get_session() as session:
+        async with self._get_read_session(conversation_id) as session:
             conversation = (
                 await session.exec(
                     query.select_conversations_for(principal=principal, include_observer=True).where(
@@ -1123,14 +1364,92 @@ class ConversationController:
                 if boundary is not None:
                     select_query = select_query.where(db.ConversationMessage.sequence > boundary.sequence)
 
-            messages = list(
-                (
-                    await session.exec(select_query.order_by(col(db.ConversationMessage.sequence).desc()).limit(limit))
-                ).all()
+            # cursors carry the boundary sequence, so they page through the (conversation_id, sequence) indexes
+            # without looking up the boundary message
+            cursor_direction: Literal["before", "after"] = "before"
+            if cursor is not None:
+                cursor_direction, cursor_sequence = _decode_message_cursor(cursor)
+                match cursor_direction:
+                    case "before":
+                        select_query = select_query.where(db.ConversationMessage.sequence < cursor_sequence)
+                    case "after":
+                        select_query = select_query.where(db.ConversationMessage.sequence > cursor_sequence)
+
+            match cursor_direction:
+                case "before":
+                    messages = list(
+                        (
+                            await session.exec(
+                                select_query.order_by(col(db.ConversationMessage.sequence).desc()).limit(limit)
+                            )
+                        ).all()
+                    )
+                    messages.reverse()
+
+                case "after":
+                    messages = list(
+                        (
+                            await session.exec(
+                                select_query.order_by(col(db.ConversationMessage.sequence).asc()).limit(limit)
+                            )
+                        ).all()
+                    )
+
+            before_cursor = None
+            after_cursor = None
+            if messages:
+                before_cursor = _encode_message_cursor("before", messages[0][0].sequence)
+                after_cursor = _encode_message_cursor("after", messages[-1][0].sequence)
+
+            return convert.conversation_message_list_from_db(
+                messages, before_cursor=before_cursor, after_cursor=after_cursor
             )
-            messages.reverse()
 
-            return convert.conversation_message_list_from_db(messages)
+    async def search_messages(
+        self,
+        principal: auth.ActorPrincipal,
+        search_text: str,
+        conversation_id: uuid.UUID | None = None,
+        message_types: list[MessageType] | None = None,
+        cursor: str | None = None,
+        limit: int = 20,
+    ) -> ConversationMessageSearchResultList:
+        if not search_text.strip():
+            raise exceptions.InvalidArgumentError(detail="search text is required")
+
+        offset = _decode_search_cursor(cursor) if cursor is not None else 0
+
+        async with self._get_read_session(conversation_id) as session:
+            select_query = query.select_conversation_message_search_for(principal=principal, search_text=search_text)
+
+            if conversation_id is not None:
+                conversation = (
+                    await session.exec(
+                        query.select_conversations_for(principal=principal, include_observer=True).where(
+                            db.Conversation.conversation_id == conversation_id
+                        )
+                    )
+                ).one_or_none()
+                if conversation is None:
+                    raise exceptions.NotFoundError()
+
+                select_query = select_query.where(db.ConversationMessage.conversation_id == conversation_id)
+
+            if message_types is not None:
+                select_query = select_query.where(
+                    col(db.ConversationMessage.message_type).in_([t.value for t in message_types])
+                )
+
+            # results are ranked by score, so pages are fetched by offset; one extra result is fetched to find out
+            # whether there is a next page
+            results = list((await session.exec(select_query.offset(offset).limit(limit + 1))).all())
+
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                next_cursor = _encode_search_cursor(offset + limit)
+
+            return convert.conversation_message_search_result_list_from_db(results, next_cursor=next_cursor)
 
     async def delete_message(
         self,
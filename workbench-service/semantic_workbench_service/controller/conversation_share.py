@@ -14,6 +14,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import auth, db, query
 from ..event import ConversationEventQueueItem
+from ..participant_cache import ParticipantCache
 from . import convert, exceptions
 from . import user as user_
 
@@ -25,9 +26,11 @@ class ConversationShareController:
         self,
         get_session: Callable[[], AsyncContextManager[AsyncSession]],
         notify_event: Callable[[ConversationEventQueueItem], Awaitable],
+        participant_cache: ParticipantCache,
     ) -> None:
         self._get_session = get_session
         self._notify_event = notify_event
+        self._participant_cache = participant_cache
 
     async def create_conversation_share(
         self,
@@ -220,6 +223,7 @@ class ConversationShareController:
             session.add(redemption)
 
             await session.commit()
+            self._participant_cache.invalidate(conversation_share.conversation_id)
 
             await session.refresh(redemption)
 
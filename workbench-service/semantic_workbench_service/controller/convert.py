@@ -9,8 +9,9 @@ from semantic_workbench_api_model.workbench_model import (
     Conversation,
     ConversationList,
     ConversationMessage,
-    ConversationMessageDebug,
     ConversationMessageList,
+    ConversationMessageSearchResult,
+    ConversationMessageSearchResultList,
     ConversationParticipant,
     ConversationParticipantList,
     ConversationPermission,
@@ -260,14 +261,30 @@ def conversation_message_from_db(model: db.ConversationMessage, has_debug: bool)
 
 def conversation_message_list_from_db(
     models: Iterable[tuple[db.ConversationMessage, bool]],
+    before_cursor: str | None = None,
+    after_cursor: str | None = None,
 ) -> ConversationMessageList:
-    return ConversationMessageList(messages=[conversation_message_from_db(m, debug) for m, debug in models])
+    return ConversationMessageList(
+        messages=[conversation_message_from_db(m, debug) for m, debug in models],
+        before_cursor=before_cursor,
+        after_cursor=after_cursor,
+    )
 
 
-def conversation_message_debug_from_db(model: db.ConversationMessageDebug) -> ConversationMessageDebug:
-    return ConversationMessageDebug(
-        message_id=model.message_id,
-        debug_data=model.data,
+def conversation_message_search_result_list_from_db(
+    models: Iterable[tuple[db.ConversationMessage, bool, float]],
+    next_cursor: str | None = None,
+) -> ConversationMessageSearchResultList:
+    return ConversationMessageSearchResultList(
+        results=[
+            ConversationMessageSearchResult(
+                conversation_id=m.conversation_id,
+                message=conversation_message_from_db(m, debug),
+                score=score,
+            )
+            for m, debug, score in models
+        ],
+        next_cursor=next_cursor,
     )
 
 
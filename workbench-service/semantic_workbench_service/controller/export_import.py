@@ -1,18 +1,23 @@
+import asyncio
 import collections
 import datetime
 import re
-import tempfile
 import uuid
 from operator import or_
-from typing import IO, Any, AsyncGenerator, Generator, Iterable, Iterator
+from typing import IO, Any, AsyncContextManager, AsyncGenerator, Callable, Generator, Iterable
 
 from attr import dataclass
 from pydantic import BaseModel
-from sqlalchemy import ScalarResult, func
+from sqlalchemy import func, tuple_
 from sqlmodel import SQLModel, col, select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
 from .. import db
+from ..message_debug import MessageDebugStorage
+
+# the number of bytes of lines read at a time from import files
+_READ_BATCH_HINT_BYTES = 1_024 * 1_024
 
 
 class _Record(BaseModel):
@@ -25,96 +30,125 @@ def _model_record(model: SQLModel) -> _Record:
     return _Record(type=model.__class__.__name__, data=data)
 
 
-def _lines_from(records: Iterator[_Record]) -> Generator[bytes, None, None]:
-    for record in records:
-        yield (record.model_dump_json() + "\n").encode("utf-8")
-
+async def _export_record(model: SQLModel, message_debug_storage: MessageDebugStorage) -> _Record:
+    if not isinstance(model, db.ConversationMessageDebug):
+        return _model_record(model)
 
-async def export_file(
-    conversation_ids: set[uuid.UUID],
-    assistant_ids: set[uuid.UUID],
-    session: AsyncSession,
-) -> AsyncGenerator[bytes, None]:
-    assistants = await session.exec(
-        select(db.Assistant)
-        .where(col(db.Assistant.assistant_id).in_(assistant_ids))
-        .order_by(col(db.Assistant.assistant_id).asc())
-    )
-
-    conversations = await session.exec(
-        select(db.Conversation)
-        .where(col(db.Conversation.conversation_id).in_(conversation_ids))
-        .order_by(col(db.Conversation.conversation_id).asc())
+    # debug payloads are exported uncompressed, in the format they were exported in before compression
+    return _Record(
+        type=db.ConversationMessageDebug.__name__,
+        data={"message_id": str(model.message_id), "data": await message_debug_storage.load(model)},
     )
 
-    files = await session.exec(
-        select(db.File)
-        .where(col(db.File.conversation_id).in_(conversation_ids))
-        .order_by(col(db.File.conversation_id).asc())
-        .order_by(col(db.File.created_datetime).asc())
-    )
 
-    file_versions = await session.exec(
-        select(db.FileVersion)
-        .join(db.File)
-        .where(col(db.File.conversation_id).in_(conversation_ids))
-        .order_by(col(db.File.conversation_id).asc())
-        .order_by(col(db.File.created_datetime).asc())
-        .order_by(col(db.FileVersion.version).asc())
-    )
-
-    messages = await session.exec(
-        select(db.ConversationMessage)
-        .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids))
-        .order_by(col(db.ConversationMessage.conversation_id).asc())
-        .order_by(col(db.ConversationMessage.sequence).asc())
-    )
+# the ids of the records that other exported records reference
+_REFERENCED_ID_ATTRIBUTES: dict[type[SQLModel], str] = {
+    db.Conversation: "conversation_id",
+    db.ConversationMessage: "message_id",
+    db.File: "file_id",
+}
 
-    message_debugs = await session.exec(
-        select(db.ConversationMessageDebug)
-        .join(db.ConversationMessage)
-        .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids))
-        .order_by(col(db.ConversationMessage.conversation_id).asc())
-        .order_by(col(db.ConversationMessage.sequence).asc())
-    )
 
-    user_participants = await session.exec(
-        select(db.UserParticipant)
-        .where(col(db.UserParticipant.conversation_id).in_(conversation_ids))
-        .order_by(col(db.UserParticipant.conversation_id).asc())
-        .order_by(col(db.UserParticipant.joined_datetime).asc())
-    )
+def _lines_from(records: Iterable[_Record]) -> Generator[bytes, None, None]:
+    for record in records:
+        yield (record.model_dump_json() + "\n").encode("utf-8")
 
-    assistant_participants = await session.exec(
-        select(db.AssistantParticipant)
-        .where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids))
-        .order_by(col(db.AssistantParticipant.conversation_id).asc())
-        .order_by(col(db.AssistantParticipant.joined_datetime).asc())
-    )
 
-    def _records(*sources: ScalarResult) -> Generator[_Record, None, None]:
-        for source in sources:
-            for record in source:
-                yield _model_record(record)
-
-    with tempfile.TemporaryFile() as f:
-        f.writelines(
-            _lines_from(
-                _records(
-                    assistants,
-                    conversations,
-                    messages,
-                    message_debugs,
-                    user_participants,
-                    assistant_participants,
-                    files,
-                    file_versions,
+async def export_file(
+    conversation_ids: set[uuid.UUID],
+    assistant_ids: set[uuid.UUID],
+    get_session: Callable[[], AsyncContextManager[AsyncSession]],
+    message_debug_storage: MessageDebugStorage,
+    batch_size: int = 500,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Yields the JSONL records of the assistants and conversations, in batches. Each batch is read in its own session,
+    following the key of the last record of the previous batch, so that no connection or transaction is held while
+    the export is streamed to a client.
+
+    As records can be written between batches, records are only exported with the records they reference, such as
+    the debug data of a message with its message, so that the export can be imported.
+    """
+    # each query, with the columns of its records that uniquely order them, and the attribute of the id of the
+    # exported record they reference, if any
+    queries: list[tuple[SelectOfScalar, tuple[Any, ...], str | None]] = [
+        (
+            select(db.Assistant).where(col(db.Assistant.assistant_id).in_(assistant_ids)),
+            (col(db.Assistant.assistant_id),),
+            None,
+        ),
+        (
+            select(db.Conversation).where(col(db.Conversation.conversation_id).in_(conversation_ids)),
+            (col(db.Conversation.conversation_id),),
+            None,
+        ),
+        (
+            select(db.ConversationMessage).where(col(db.ConversationMessage.conversation_id).in_(conversation_ids)),
+            (col(db.ConversationMessage.conversation_id), col(db.ConversationMessage.sequence)),
+            "conversation_id",
+        ),
+        (
+            select(db.ConversationMessageDebug)
+            .join(db.ConversationMessage)
+            .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids)),
+            (col(db.ConversationMessageDebug.message_id),),
+            "message_id",
+        ),
+        (
+            select(db.UserParticipant).where(col(db.UserParticipant.conversation_id).in_(conversation_ids)),
+            (col(db.UserParticipant.conversation_id), col(db.UserParticipant.user_id)),
+            "conversation_id",
+        ),
+        (
+            select(db.AssistantParticipant).where(col(db.AssistantParticipant.conversation_id).in_(conversation_ids)),
+            (col(db.AssistantParticipant.conversation_id), col(db.AssistantParticipant.assistant_id)),
+            "conversation_id",
+        ),
+        (
+            select(db.File).where(col(db.File.conversation_id).in_(conversation_ids)),
+            (col(db.File.conversation_id), col(db.File.file_id)),
+            "conversation_id",
+        ),
+        (
+            select(db.FileVersion).join(db.File).where(col(db.File.conversation_id).in_(conversation_ids)),
+            (col(db.FileVersion.file_id), col(db.FileVersion.version)),
+            "file_id",
+        ),
+    ]
+
+    # the ids of the exported records that other records reference, by attribute
+    exported_ids: dict[str, set[uuid.UUID]] = collections.defaultdict(set)
+
+    for query, key_columns, reference_attribute in queries:
+        query = query.order_by(*key_columns).limit(batch_size)
+        last_key: tuple[Any, ...] | None = None
+        while True:
+            batch_query = query
+            if last_key is not None:
+                batch_query = batch_query.where(tuple_(*key_columns) > last_key)
+
+            async with get_session() as session:
+                records = (await session.exec(batch_query)).all()
+
+            exported_records = [
+                record
+                for record in records
+                if reference_attribute is None
+                or getattr(record, reference_attribute) in exported_ids[reference_attribute]
+            ]
+            for record in exported_records:
+                id_attribute = _REFERENCED_ID_ATTRIBUTES.get(type(record))
+                if id_attribute is not None:
+                    exported_ids[id_attribute].add(getattr(record, id_attribute))
+
+            if exported_records:
+                yield b"".join(
+                    _lines_from([await _export_record(record, message_debug_storage) for record in exported_records])
                 )
-            )
-        )
-        f.seek(0)
-        for line in iter(lambda: f.readline(), b""):
-            yield line
+
+            if len(records) < batch_size:
+                break
+            last_key = tuple(getattr(records[-1], column.key) for column in key_columns)
 
 
 @dataclass
@@ -126,7 +160,17 @@ class ImportResult:
     file_id_old_to_new: dict[uuid.UUID, uuid.UUID]
 
 
-async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[bytes]]) -> ImportResult:
+async def import_files(
+    session: AsyncSession,
+    owner_id: str,
+    files: Iterable[IO[bytes]],
+    message_debug_storage: MessageDebugStorage,
+    batch_size: int = 500,
+) -> ImportResult:
+    """
+    Imports the JSONL records, flushing them to the database in batches, so that records of the same type are
+    inserted together. Lines are read off the event loop.
+    """
     result = ImportResult(
         assistant_id_old_to_new={},
         conversation_id_old_to_new={},
@@ -134,6 +178,7 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
         assistant_conversation_old_ids=collections.defaultdict(set),
         file_id_old_to_new={},
     )
+    pending_records = 0
 
     async def _process_record(record: _Record) -> None:
         match record.type:
@@ -271,12 +316,11 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                 session.add(message)
 
             case db.ConversationMessageDebug.__name__:
-                message_debug = db.ConversationMessageDebug.model_validate(record.data)
-                message_id = result.message_id_old_to_new.get(message_debug.message_id)
+                old_message_id = uuid.UUID(record.data["message_id"])
+                message_id = result.message_id_old_to_new.get(old_message_id)
                 if message_id is None:
-                    raise RuntimeError(f"message_id {message_debug.message_id} is not found")
-                message_debug.message_id = message_id
-                session.add(message_debug)
+                    raise RuntimeError(f"message_id {old_message_id} is not found")
+                session.add(await message_debug_storage.create(message_id, record.data.get("data") or {}))
 
             case db.File.__name__:
                 file = db.File.model_validate(record.data)
@@ -305,10 +349,19 @@ async def import_files(session: AsyncSession, owner_id: str, files: Iterable[IO[
                 session.add(file_version)
 
     for file in files:
-        for line in iter(lambda: file.readline(), b""):
-            record = _Record.model_validate_json(line.decode("utf-8"))
-            await _process_record(record)
-            await session.flush()
+        while lines := await asyncio.to_thread(file.readlines, _READ_BATCH_HINT_BYTES):
+            for line in lines:
+                record = _Record.model_validate_json(line.decode("utf-8"))
+                await _process_record(record)
+                pending_records += 1
+                if pending_records >= batch_size:
+                    await session.flush()
+                    # the flushed records are not used again, so release them rather than growing the identity map
+                    session.expunge_all()
+                    pending_records = 0
+
+    await session.flush()
+    session.expunge_all()
 
     # ensure the owner is a participant in all conversations
     for _, conversation_id in result.conversation_id_old_to_new.items():
@@ -1,11 +1,11 @@
+import asyncio
 import uuid
 from typing import (
     Any,
     AsyncContextManager,
+    AsyncIterator,
     Awaitable,
     Callable,
-    Generator,
-    Iterable,
     NamedTuple,
 )
 
@@ -16,16 +16,23 @@ from semantic_workbench_api_model.workbench_model import (
     FileList,
     FileVersions,
 )
-from sqlmodel import col, select
+from sqlmodel import col, delete, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import auth, db, files, query
 from ..event import ConversationEventQueueItem
 from . import convert, exceptions
 
-DownloadFileResult = NamedTuple(
-    "DownloadFileResult", [("filename", str), ("content_type", str), ("stream", Iterable[bytes])]
-)
+
+class DownloadFileResult(NamedTuple):
+    filename: str
+    content_type: str
+    size: int
+    etag: str
+    read: Callable[[int, int | None], AsyncIterator[bytes]]
+    """
+    Reads the bytes in [start, stop) of the file content.
+    """
 
 
 class FileController:
@@ -56,91 +63,148 @@ class FileController:
         if len(unique_filenames) != len(upload_files):
             raise exceptions.InvalidArgumentError(detail="filenames are required to be unique")
 
+        # check access before writing anything to storage
         async with self._get_session() as session:
-            conversation = (
-                await session.exec(
-                    query.select_conversations_for(principal).where(db.Conversation.conversation_id == conversation_id)
-                )
-            ).one_or_none()
-            if conversation is None:
-                raise exceptions.NotFoundError()
+            await self._get_conversation_for_upload(session, conversation_id=conversation_id, principal=principal)
+
+        # write the uploads to storage, off the event loop, before starting the transaction
+        staged_blobs: dict[str, files.StagedBlob] = {}
+        try:
+            for upload_file in upload_files:
+                if upload_file.filename:
+                    staged_blobs[upload_file.filename] = await self._file_storage.stage_blob(upload_file.file)
+
+            async with self._get_session() as session:
+                # identical content is stored once; the blob locks serialize storing the blobs and committing the
+                # file versions that reference them with the deletion of unreferenced blobs
+                await db.lock_file_blobs(session, (blob.content_hash for blob in staged_blobs.values()))
+
+                stored_hashes: set[str] = set()
+                try:
+                    for blob in staged_blobs.values():
+                        if await self._file_storage.store_blob(blob):
+                            stored_hashes.add(blob.content_hash)
+
+                    return await self._insert_file_versions(
+                        session=session,
+                        conversation_id=conversation_id,
+                        unique_filenames=unique_filenames,
+                        upload_files=upload_files,
+                        staged_blobs=staged_blobs,
+                        principal=principal,
+                        file_metadata=file_metadata,
+                    )
 
-            existing_files = (
-                await session.exec(
-                    select(db.File)
-                    .where(db.File.conversation_id == conversation_id)
-                    .where(col(db.File.filename).in_(unique_filenames))
-                    .with_for_update()
-                )
-            ).all()
+                except Exception:
+                    # blobs stored for versions that were not committed are not referenced by anything
+                    await session.rollback()
+                    await self._delete_unreferenced_blobs(session, stored_hashes)
+                    raise
+
+        finally:
+            for blob in staged_blobs.values():
+                self._file_storage.discard_staged_blob(blob)
+
+    async def _get_conversation_for_upload(
+        self, session: AsyncSession, conversation_id: uuid.UUID, principal: auth.ActorPrincipal
+    ) -> db.Conversation:
+        conversation = (
+            await session.exec(
+                query.select_conversations_for(principal).where(db.Conversation.conversation_id == conversation_id)
+            )
+        ).one_or_none()
+        if conversation is None:
+            raise exceptions.NotFoundError()
+        return conversation
 
-            file_record_and_uploads = [
-                (
-                    next(
-                        (f for f in existing_files if f.filename == upload_file.filename),
-                        db.File(
-                            conversation_id=conversation_id,
-                            filename=upload_file.filename,
-                            current_version=0,
-                        ),
-                    ),
-                    upload_file,
-                )
-                for upload_file in upload_files
-                if upload_file.filename
-            ]
-
-            match principal:
-                case auth.UserPrincipal():
-                    role = "user"
-                    participant_id = principal.user_id
-                case auth.AssistantServicePrincipal():
-                    role = "assistant"
-                    participant_id = str(principal.assistant_id)
-
-            file_record_and_versions: list[tuple[db.File, db.FileVersion]] = []
-
-            for file_record, upload_file in file_record_and_uploads:
-                file_record.current_version += 1
-                new_version = db.FileVersion(
-                    file_id=file_record.file_id,
-                    participant_role=role,
-                    participant_id=participant_id,
-                    version=file_record.current_version,
-                    content_type=upload_file.content_type or "",
-                    file_size=upload_file.size or 0,
-                    meta_data=file_metadata.get(file_record.filename, {}),
-                    storage_filename=f"{file_record.file_id.hex}_{file_record.current_version}",
-                )
-                file_record_and_versions.append((file_record, new_version))
+    async def _insert_file_versions(
+        self,
+        session: AsyncSession,
+        conversation_id: uuid.UUID,
+        unique_filenames: set[str | None],
+        upload_files: list[UploadFile],
+        staged_blobs: dict[str, files.StagedBlob],
+        principal: auth.ActorPrincipal,
+        file_metadata: dict[str, Any],
+    ) -> FileList:
+        # access is checked again, as it may have changed while the uploads were written to storage
+        await self._get_conversation_for_upload(session, conversation_id=conversation_id, principal=principal)
 
-                self._file_storage.write_file(
-                    namespace=str(conversation_id),
-                    filename=new_version.storage_filename,
-                    content=upload_file.file,
-                )
-                session.add(file_record)
-                session.add(new_version)
-
-                await self._notify_event(
-                    ConversationEventQueueItem(
-                        event=ConversationEvent(
-                            conversation_id=conversation_id,
-                            event=(
-                                ConversationEventType.file_created
-                                if new_version.version == 1
-                                else ConversationEventType.file_updated
-                            ),
-                            data={
-                                "file": convert.file_from_db((file_record, new_version)).model_dump(),
-                            },
+        existing_files = (
+            await session.exec(
+                select(db.File)
+                .where(db.File.conversation_id == conversation_id)
+                .where(col(db.File.filename).in_(unique_filenames))
+                .with_for_update()
+            )
+        ).all()
+
+        file_record_and_uploads = [
+            (
+                next(
+                    (f for f in existing_files if f.filename == upload_file.filename),
+                    db.File(
+                        conversation_id=conversation_id,
+                        filename=upload_file.filename,
+                        current_version=0,
+                    ),
+                ),
+                upload_file,
+            )
+            for upload_file in upload_files
+            if upload_file.filename
+        ]
+
+        match principal:
+            case auth.UserPrincipal():
+                role = "user"
+                participant_id = principal.user_id
+            case auth.AssistantServicePrincipal():
+                role = "assistant"
+                participant_id = str(principal.assistant_id)
+
+        file_record_and_versions: list[tuple[db.File, db.FileVersion]] = []
+
+        for file_record, upload_file in file_record_and_uploads:
+            blob = staged_blobs[file_record.filename]
+            file_record.current_version += 1
+            new_version = db.FileVersion(
+                file_id=file_record.file_id,
+                participant_role=role,
+                participant_id=participant_id,
+                version=file_record.current_version,
+                content_type=upload_file.content_type or "",
+                file_size=blob.size,
+                meta_data=file_metadata.get(file_record.filename, {}),
+                storage_filename=f"{file_record.file_id.hex}_{file_record.current_version}",
+                content_hash=blob.content_hash,
+            )
+            file_record_and_versions.append((file_record, new_version))
+
+            session.add(file_record)
+            session.add(new_version)
+
+        await session.commit()
+
+        # events are sent once the versions are committed, and the blob locks released
+        for file_record, new_version in file_record_and_versions:
+            await self._notify_event(
+                ConversationEventQueueItem(
+                    event=ConversationEvent(
+                        conversation_id=conversation_id,
+                        event=(
+                            ConversationEventType.file_created
+                            if new_version.version == 1
+                            else ConversationEventType.file_updated
                         ),
-                    )
+                        data={
+                            "file": convert.file_from_db((file_record, new_version)).model_dump(),
+                        },
+                    ),
                 )
+            )
 
-            await session.commit()
-
-            return convert.file_list_from_db(file_record_and_versions)
+        return convert.file_list_from_db(file_record_and_versions)
 
     async def list_files(
         self,
@@ -302,20 +366,33 @@ class FileController:
 
             file_record, version_record = file_records
 
-        def generator_wrapper() -> Generator[bytes, Any, None]:
-            with self._file_storage.read_file(
-                namespace=str(conversation_id),
-                filename=version_record.storage_filename,
-            ) as file:
-                for chunk in iter(lambda: file.read(100 * 1_024), b""):
-                    yield chunk
+        content_hash = version_record.content_hash
+        try:
+            if content_hash is not None:
+                size = await self._file_storage.blob_size(content_hash)
+            else:
+                size = await self._file_storage.file_size(
+                    namespace=str(conversation_id), filename=version_record.storage_filename
+                )
+        except FileNotFoundError as e:
+            raise exceptions.NotFoundError(detail="file content not found") from e
+
+        def read(start: int = 0, stop: int | None = None) -> AsyncIterator[bytes]:
+            if content_hash is not None:
+                return self._file_storage.read_blob(content_hash, start=start, stop=stop)
+            return self._file_storage.read_file_range(
+                namespace=str(conversation_id), filename=version_record.storage_filename, start=start, stop=stop
+            )
 
         filename = file_record.filename.split("/")[-1]
 
         return DownloadFileResult(
             filename=filename,
             content_type=version_record.content_type,
-            stream=generator_wrapper(),
+            size=size,
+            # versions are immutable, so the content hash, or the version's identity, is a strong validator
+            etag=f'"{content_hash or f"{version_record.file_id.hex}.{version_record.version}"}"',
+            read=read,
         )
 
     async def delete_file(
@@ -356,16 +433,22 @@ class FileController:
             ).all()
 
             for version_record in version_records:
-                self._file_storage.delete_file(
-                    namespace=str(conversation_id),
-                    filename=version_record.storage_filename,
-                )
+                if version_record.content_hash is None:
+                    await asyncio.to_thread(
+                        self._file_storage.delete_file,
+                        namespace=str(conversation_id),
+                        filename=version_record.storage_filename,
+                    )
                 await session.delete(version_record)
             await session.commit()
 
             await session.delete(file_record)
             await session.commit()
 
+            await self._delete_unreferenced_blobs(
+                session, {v.content_hash for v in version_records if v.content_hash is not None}
+            )
+
         await self._notify_event(
             ConversationEventQueueItem(
                 event=ConversationEvent(
@@ -377,3 +460,26 @@ class FileController:
                 ),
             )
         )
+
+    async def _delete_unreferenced_blobs(self, session: AsyncSession, content_hashes: set[str]) -> None:
+        if not content_hashes:
+            return
+
+        await db.lock_file_blobs(session, content_hashes)
+        referenced_hashes = set(
+            (
+                await session.exec(
+                    select(db.FileVersion.content_hash)
+                    .where(col(db.FileVersion.content_hash).in_(content_hashes))
+                    .distinct()
+                )
+            ).all()
+        )
+        unreferenced_hashes = content_hashes - referenced_hashes
+
+        # the blobs are deleted while their rows are locked, so that no upload can reference them meanwhile
+        for content_hash in unreferenced_hashes:
+            await self._file_storage.delete_blob(content_hash)
+        if unreferenced_hashes:
+            await session.exec(delete(db.FileBlob).where(col(db.FileBlob.content_hash).in_(unreferenced_hashes)))
+        await session.commit()
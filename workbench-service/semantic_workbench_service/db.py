@@ -1,18 +1,20 @@
 import datetime
+import itertools
 import logging
 import pathlib
 import uuid
 from contextlib import asynccontextmanager
-from typing import Annotated, Any, AsyncIterator
+from typing import Annotated, Any, AsyncIterator, Iterable, TypeVar
 from urllib.parse import urlparse
 
 import sqlalchemy
 import sqlalchemy.event
+import sqlalchemy.exc
 import sqlalchemy.orm
 import sqlalchemy.orm.attributes
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
-from sqlmodel import Field, Relationship, Session, SQLModel, select
+from sqlmodel import Field, Relationship, Session, SQLModel, col, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from . import service_user_principals
@@ -23,6 +25,8 @@ from .config import DBSettings
 
 logger = logging.getLogger(__name__)
 
+ModelT = TypeVar("ModelT", bound=SQLModel)
+
 
 def _date_time_nullable() -> Any:  # noqa: ANN401
     return Field(sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), nullable=True))
@@ -47,13 +51,16 @@ class User(SQLModel, table=True):
     image: str | None = None
     service_user: bool = False
 
-    def on_update(self, session: Session) -> None:
-        # update UserParticipants for this user
-        participants = session.exec(select(UserParticipant).where(UserParticipant.user_id == self.user_id))
+    @classmethod
+    def on_update(cls, session: Session, users: list["User"]) -> None:
+        # update UserParticipants for these users
+        users_by_id = {user.user_id: user for user in users}
+        participants = session.exec(select(UserParticipant).where(col(UserParticipant.user_id).in_(users_by_id)))
         for participant in participants:
-            participant.name = self.name
-            participant.image = self.image
-            participant.service_user = self.service_user
+            user = users_by_id[participant.user_id]
+            participant.name = user.name
+            participant.image = user.image
+            participant.service_user = user.service_user
             session.add(participant)
 
 
@@ -99,14 +106,17 @@ class Assistant(SQLModel, table=True):
         sa_relationship_kwargs={"lazy": "selectin"},
     )
 
-    def on_update(self, session: Session) -> None:
-        # update AssistantParticipants for this assistant
+    @classmethod
+    def on_update(cls, session: Session, assistants: list["Assistant"]) -> None:
+        # update AssistantParticipants for these assistants
+        assistants_by_id = {assistant.assistant_id: assistant for assistant in assistants}
         participants = session.exec(
-            select(AssistantParticipant).where(AssistantParticipant.assistant_id == self.assistant_id),
+            select(AssistantParticipant).where(col(AssistantParticipant.assistant_id).in_(assistants_by_id)),
         )
         for participant in participants:
-            participant.name = self.name
-            participant.image = self.image
+            assistant = assistants_by_id[participant.assistant_id]
+            participant.name = assistant.name
+            participant.image = assistant.image
             session.add(participant)
 
 
@@ -117,6 +127,9 @@ class Conversation(SQLModel, table=True):
     title: str
     meta_data: dict[str, Any] = Field(sa_column=sqlalchemy.Column("metadata", sqlalchemy.JSON), default={})
     imported_from_conversation_id: uuid.UUID | None
+    # advanced when the conversation, or its messages, participants or files change; see
+    # _advance_conversation_versions
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_owner: sqlalchemy.orm.Mapped[User] = Relationship()
@@ -212,20 +225,29 @@ class AssistantParticipant(SQLModel, table=True):
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_conversation: Conversation = Relationship()
 
-    def on_update(self, session: Session) -> None:
-        # update this participant to match the related assistant, if one exists
-        assistant = session.exec(select(Assistant).where(Assistant.assistant_id == self.assistant_id)).one_or_none()
-        if assistant is None:
-            return
+    @classmethod
+    def on_update(cls, session: Session, participants: list["AssistantParticipant"]) -> None:
+        # update these participants to match the related assistants, where they exist
+        assistants = _select_by_id(session, Assistant, Assistant.assistant_id, {p.assistant_id for p in participants})
+        for participant in participants:
+            assistant = assistants.get(participant.assistant_id)
+            if assistant is None:
+                continue
+
+            sqlalchemy.orm.attributes.set_attribute(participant, "name", assistant.name)
+            sqlalchemy.orm.attributes.set_attribute(participant, "image", assistant.image)
 
-        sqlalchemy.orm.attributes.set_attribute(self, "name", assistant.name)
-        sqlalchemy.orm.attributes.set_attribute(self, "image", assistant.image)
+    @classmethod
+    def on_insert(cls, session: Session, participants: list["AssistantParticipant"]) -> None:
+        # update these participants to match the related assistants, requiring them to exist
+        assistants = _select_by_id(session, Assistant, Assistant.assistant_id, {p.assistant_id for p in participants})
+        for participant in participants:
+            assistant = assistants.get(participant.assistant_id)
+            if assistant is None:
+                raise sqlalchemy.exc.NoResultFound(f"assistant {participant.assistant_id} not found")
 
-    def on_insert(self, session: Session) -> None:
-        # update this participant to match the related assistant, requiring one to exist
-        assistant = session.exec(select(Assistant).where(Assistant.assistant_id == self.assistant_id)).one()
-        sqlalchemy.orm.attributes.set_attribute(self, "name", assistant.name)
-        sqlalchemy.orm.attributes.set_attribute(self, "image", assistant.image)
+            sqlalchemy.orm.attributes.set_attribute(participant, "name", assistant.name)
+            sqlalchemy.orm.attributes.set_attribute(participant, "image", assistant.image)
 
 
 class UserParticipant(SQLModel, table=True):
@@ -256,23 +278,31 @@ class UserParticipant(SQLModel, table=True):
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_conversation: Conversation = Relationship()
 
-    def on_update(self, session: Session) -> None:
-        # update this participant to match the related user, if one exists
-        user = session.exec(select(User).where(User.user_id == self.user_id)).one_or_none()
-        if user is None:
-            return
-
-        sqlalchemy.orm.attributes.set_attribute(self, "name", user.name)
-        sqlalchemy.orm.attributes.set_attribute(self, "image", user.image)
-        sqlalchemy.orm.attributes.set_attribute(self, "service_user", user.service_user)
-
-    def on_insert(self, session: Session) -> None:
-        # update this participant to match the related user, requiring one to exist
-        user = session.exec(select(User).where(User.user_id == self.user_id)).one()
+    @classmethod
+    def on_update(cls, session: Session, participants: list["UserParticipant"]) -> None:
+        # update these participants to match the related users, where they exist
+        users = _select_by_id(session, User, User.user_id, {p.user_id for p in participants})
+        for participant in participants:
+            user = users.get(participant.user_id)
+            if user is None:
+                continue
+
+            sqlalchemy.orm.attributes.set_attribute(participant, "name", user.name)
+            sqlalchemy.orm.attributes.set_attribute(participant, "image", user.image)
+            sqlalchemy.orm.attributes.set_attribute(participant, "service_user", user.service_user)
+
+    @classmethod
+    def on_insert(cls, session: Session, participants: list["UserParticipant"]) -> None:
+        # update these participants to match the related users, requiring them to exist
+        users = _select_by_id(session, User, User.user_id, {p.user_id for p in participants})
+        for participant in participants:
+            user = users.get(participant.user_id)
+            if user is None:
+                raise sqlalchemy.exc.NoResultFound(f"user {participant.user_id} not found")
 
-        sqlalchemy.orm.attributes.set_attribute(self, "name", user.name)
-        sqlalchemy.orm.attributes.set_attribute(self, "image", user.image)
-        sqlalchemy.orm.attributes.set_attribute(self, "service_user", user.service_user)
+            sqlalchemy.orm.attributes.set_attribute(participant, "name", user.name)
+            sqlalchemy.orm.attributes.set_attribute(participant, "image", user.image)
+            sqlalchemy.orm.attributes.set_attribute(participant, "service_user", user.service_user)
 
 
 class ConversationMessage(SQLModel, table=True):
@@ -300,6 +330,57 @@ class ConversationMessage(SQLModel, table=True):
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_conversation: Conversation = Relationship()
 
+    __table_args__ = (
+        # support keyset pagination of message history within a conversation, with and without message_type filters
+        sqlalchemy.Index("ix_conversationmessage_conversation_id_sequence", "conversation_id", "sequence"),
+        sqlalchemy.Index(
+            "ix_conversationmessage_conversation_id_message_type_sequence",
+            "conversation_id",
+            "message_type",
+            "sequence",
+        ),
+    )
+
+
+MESSAGE_SEARCH_TABLE = "conversationmessage_fts"
+"""
+The sqlite FTS5 table indexing message content; its rowid is the message sequence.
+"""
+MESSAGE_SEARCH_INDEX = "ix_conversationmessage_content_search"
+"""
+The postgresql GIN index of the message content tsvector.
+"""
+
+# the message search index is maintained by the database, on message insert, update and delete; it is created with
+# the conversationmessage table, and is not part of the models, so is excluded from alembic's autogenerate
+MESSAGE_SEARCH_DDL: dict[str, list[str]] = {
+    "sqlite": [
+        f"CREATE VIRTUAL TABLE {MESSAGE_SEARCH_TABLE} USING fts5("
+        "content, content='conversationmessage', content_rowid='sequence', tokenize='porter unicode61')",
+        f"CREATE TRIGGER {MESSAGE_SEARCH_TABLE}_insert AFTER INSERT ON conversationmessage BEGIN"
+        f" INSERT INTO {MESSAGE_SEARCH_TABLE}(rowid, content) VALUES (new.sequence, new.content); END",
+        f"CREATE TRIGGER {MESSAGE_SEARCH_TABLE}_delete AFTER DELETE ON conversationmessage BEGIN"
+        f" INSERT INTO {MESSAGE_SEARCH_TABLE}({MESSAGE_SEARCH_TABLE}, rowid, content)"
+        " VALUES ('delete', old.sequence, old.content); END",
+        f"CREATE TRIGGER {MESSAGE_SEARCH_TABLE}_update AFTER UPDATE OF content ON conversationmessage BEGIN"
+        f" INSERT INTO {MESSAGE_SEARCH_TABLE}({MESSAGE_SEARCH_TABLE}, rowid, content)"
+        " VALUES ('delete', old.sequence, old.content);"
+        f" INSERT INTO {MESSAGE_SEARCH_TABLE}(rowid, content) VALUES (new.sequence, new.content); END",
+    ],
+    "postgresql": [
+        f"CREATE INDEX {MESSAGE_SEARCH_INDEX} ON conversationmessage"
+        " USING gin (to_tsvector('english'::regconfig, content))",
+    ],
+}
+
+for _dialect, _statements in MESSAGE_SEARCH_DDL.items():
+    for _statement in _statements:
+        sqlalchemy.event.listen(
+            SQLModel.metadata.tables["conversationmessage"],
+            "after_create",
+            sqlalchemy.DDL(_statement).execute_if(dialect=_dialect),
+        )
+
 
 class ConversationMessageDebug(SQLModel, table=True):
     message_id: uuid.UUID = Field(
@@ -313,12 +394,65 @@ class ConversationMessageDebug(SQLModel, table=True):
             primary_key=True,
         ),
     )
+    # how the payload is stored; see message_debug
+    encoding: str = Field(
+        sa_column=sqlalchemy.Column(sqlalchemy.String, server_default="json", nullable=False), default="json"
+    )
     data: dict[str, Any] = Field(sa_column=sqlalchemy.Column(sqlalchemy.JSON, nullable=False), default={})
+    compressed_data: bytes | None = Field(
+        sa_column=sqlalchemy.Column(sqlalchemy.LargeBinary, nullable=True), default=None
+    )
 
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_messag: ConversationMessage = Relationship()
 
 
+class ConversationLatestMessage(SQLModel, table=True):
+    """
+    The sequence of the latest message of each message type in each conversation, so that listing conversations
+    with their latest message does not aggregate over all messages. Maintained on flush, in the same transaction
+    as the messages it is derived from; see _maintain_latest_messages.
+    """
+
+    conversation_id: uuid.UUID = Field(
+        sa_column=sqlalchemy.Column(
+            sqlalchemy.ForeignKey(
+                "conversation.conversation_id",
+                name="fk_conversationlatestmessage_conversation_id_conversation",
+                ondelete="CASCADE",
+            ),
+            nullable=False,
+            primary_key=True,
+        ),
+    )
+    message_type: str = Field(primary_key=True)
+    message_sequence: int
+
+
+class ConversationEventLog(SQLModel, table=True):
+    sequence: int = Field(default=None, nullable=False, primary_key=True)
+    conversation_id: uuid.UUID = Field(
+        sa_column=sqlalchemy.Column(
+            sqlalchemy.ForeignKey(
+                "conversation.conversation_id",
+                name="fk_conversationeventlog_conversation_id_conversation",
+                ondelete="CASCADE",
+            ),
+            nullable=False,
+        ),
+    )
+    event_id: str
+    event: str
+    timestamp: datetime.datetime = date_time_default_to_now()
+    data: dict[str, Any] = Field(sa_column=sqlalchemy.Column(sqlalchemy.JSON, nullable=False), default={})
+
+    __table_args__ = (
+        sqlalchemy.Index("ix_conversationeventlog_conversation_id_sequence", "conversation_id", "sequence"),
+        # sequences must never be reused, as clients replay from the last sequence they received
+        {"sqlite_autoincrement": True},
+    )
+
+
 class File(SQLModel, table=True):
     file_id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     conversation_id: uuid.UUID = Field(
@@ -364,11 +498,22 @@ class FileVersion(SQLModel, table=True):
     content_type: str
     file_size: int
     storage_filename: str
+    # the sha256 of the content, which is stored as a blob; None for versions stored under storage_filename
+    content_hash: str | None = Field(default=None, index=True)
 
     # this relationship is needed to enforce correct INSERT order by SQLModel
     related_file: File = Relationship()
 
 
+class FileBlob(SQLModel, table=True):
+    """
+    A lock row for a blob. It is locked, with lock_file_blobs, while the blob is stored or deleted, and while the
+    file versions that reference the blob are committed, so that those are serialized across service processes.
+    """
+
+    content_hash: str = Field(primary_key=True)
+
+
 NAMING_CONVENTION = {
     "ix": "ix_%(column_0_label)s",
     "uq": "uq_%(table_name)s_%(column_0_N_name)s",
@@ -395,9 +540,12 @@ def set_sqlite_pragma(
 
 
 @asynccontextmanager
-async def create_engine(settings: DBSettings) -> AsyncIterator[AsyncEngine]:
+async def create_engine(settings: DBSettings, url: str | None = None) -> AsyncIterator[AsyncEngine]:
+    """
+    Creates an engine for the database at url, by default the primary database at settings.url.
+    """
     # ensure that the database url is using the async driver
-    db_url = ensure_async_driver_scheme(settings.url)
+    db_url = ensure_async_driver_scheme(url or settings.url)
     parsed_url = urlparse(db_url)
     is_sqlite = parsed_url.scheme.startswith("sqlite")
     is_postgres = parsed_url.scheme.startswith("postgresql")
@@ -427,20 +575,117 @@ async def create_engine(settings: DBSettings) -> AsyncIterator[AsyncEngine]:
     try:
         yield engine
     finally:
+        _session_makers.pop(engine, None)
         await engine.dispose()
 
 
+def _select_by_id(session: Session, model: type[ModelT], id_column: Any, ids: set[Any]) -> dict[Any, ModelT]:
+    return {getattr(obj, id_column.key): obj for obj in session.exec(select(model).where(col(id_column).in_(ids)))}
+
+
+def _group_by_type(objs: Iterable[object]) -> dict[type, list[Any]]:
+    grouped: dict[type, list[Any]] = {}
+    for obj in objs:
+        grouped.setdefault(type(obj), []).append(obj)
+    return grouped
+
+
 @sqlalchemy.event.listens_for(Session, "before_flush")
-def _session_before_flush(session: Session, flush_context, instances) -> None:  # noqa: ANN001, ARG001
-    for obj in session.dirty:
-        if not hasattr(obj, "on_update"):
+def _session_before_flush(session: Session, flush_context, instances) -> None:
+    # the hooks are called once per model, with all of its updated or inserted instances, so that each flush runs a
+    # query per model rather than per instance
+    for model, objs in _group_by_type(session.dirty).items():
+        if not hasattr(model, "on_update"):
+            continue
+        model.on_update(session, objs)
+
+    for model, objs in _group_by_type(session.new).items():
+        if not hasattr(model, "on_insert"):
             continue
-        obj.on_update(session)
+        model.on_insert(session, objs)
 
+
+@sqlalchemy.event.listens_for(Session, "after_flush")
+def _maintain_latest_messages(session: Session, flush_context) -> None:
+    inserted: dict[tuple[uuid.UUID, str], int] = {}
     for obj in session.new:
-        if not hasattr(obj, "on_insert"):
+        if not isinstance(obj, ConversationMessage):
             continue
-        obj.on_insert(session)
+        key = (obj.conversation_id, obj.message_type)
+        inserted[key] = max(inserted.get(key, obj.sequence), obj.sequence)
+
+    deleted: dict[tuple[uuid.UUID, str], int] = {}
+    for obj in session.deleted:
+        if not isinstance(obj, ConversationMessage):
+            continue
+        key = (obj.conversation_id, obj.message_type)
+        deleted[key] = max(deleted.get(key, obj.sequence), obj.sequence)
+
+    if not inserted and not deleted:
+        return
+
+    connection = session.connection()
+
+    if inserted:
+        # as with insert_if_not_exists, the postgresql ON CONFLICT clause is also supported by sqlite
+        statement = postgresql.insert(ConversationLatestMessage).values([
+            {"conversation_id": conversation_id, "message_type": message_type, "message_sequence": sequence}
+            for (conversation_id, message_type), sequence in inserted.items()
+        ])
+        # messages committed concurrently may flush out of sequence order, so only ever move the latest forward
+        statement = statement.on_conflict_do_update(
+            index_elements=["conversation_id", "message_type"],
+            set_={"message_sequence": statement.excluded.message_sequence},
+            where=col(ConversationLatestMessage.message_sequence) < statement.excluded.message_sequence,
+        )
+        connection.execute(statement)
+
+    for (conversation_id, message_type), deleted_sequence in deleted.items():
+        latest_sequence = connection.execute(
+            select(sqlalchemy.func.max(ConversationMessage.sequence)).where(
+                ConversationMessage.conversation_id == conversation_id,
+                ConversationMessage.message_type == message_type,
+            )
+        ).scalar()
+        # only a deleted latest message is replaced, leaving any newer message that was inserted concurrently
+        where_clause = sqlalchemy.and_(
+            col(ConversationLatestMessage.conversation_id) == conversation_id,
+            col(ConversationLatestMessage.message_type) == message_type,
+            col(ConversationLatestMessage.message_sequence) == deleted_sequence,
+        )
+        if latest_sequence is None:
+            connection.execute(sqlalchemy.delete(ConversationLatestMessage).where(where_clause))
+            continue
+        connection.execute(
+            sqlalchemy.update(ConversationLatestMessage).where(where_clause).values(message_sequence=latest_sequence)
+        )
+
+
+def advance_conversation_versions(conversation_ids: Iterable[uuid.UUID]) -> sqlalchemy.Update:
+    return (
+        sqlalchemy.update(Conversation)
+        .where(col(Conversation.conversation_id).in_(set(conversation_ids)))
+        .values(version=col(Conversation.version) + 1)
+    )
+
+
+# the models whose changes advance the version of their conversation
+_CONVERSATION_VERSIONED_MODELS = (Conversation, ConversationMessage, AssistantParticipant, UserParticipant, File)
+
+
+@sqlalchemy.event.listens_for(Session, "after_flush")
+def _advance_conversation_versions(session: Session, flush_context) -> None:
+    conversation_ids = {
+        obj.conversation_id
+        for obj in itertools.chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, _CONVERSATION_VERSIONED_MODELS)
+        # a new conversation starts at its initial version
+        and not (isinstance(obj, Conversation) and obj in session.new)
+    }
+    if not conversation_ids:
+        return
+
+    session.connection().execute(advance_conversation_versions(conversation_ids))
 
 
 async def bootstrap_db(engine: AsyncEngine, settings: DBSettings) -> None:
@@ -521,16 +766,27 @@ async def _create_default_data(engine: AsyncEngine) -> None:
         await session.commit()
 
 
+_session_makers: dict[AsyncEngine, async_sessionmaker[AsyncSession]] = {}
+
+
+def _session_maker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    # one session factory is shared by all of the sessions of an engine, and released when the engine is disposed
+    session_maker = _session_makers.get(engine)
+    if session_maker is None:
+        session_maker = async_sessionmaker(
+            bind=engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False,
+        )
+        _session_makers[engine] = session_maker
+    return session_maker
+
+
 @asynccontextmanager
 async def create_session(engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
-    session_maker = async_sessionmaker(
-        bind=engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-        autocommit=False,
-        autoflush=False,
-    )
-    async with session_maker() as async_session:
+    async with _session_maker(engine)() as async_session:
         yield async_session
 
 
@@ -547,4 +803,35 @@ async def insert_if_not_exists(session: AsyncSession, model: SQLModel) -> bool:
     )
     conn = await session.connection()
     result = await conn.execute(statement)
-    return result.rowcount > 0
+    inserted = result.rowcount > 0
+    if inserted and isinstance(model, _CONVERSATION_VERSIONED_MODELS) and not isinstance(model, Conversation):
+        # rows inserted by statement are not seen by _advance_conversation_versions
+        await conn.execute(advance_conversation_versions([model.conversation_id]))
+    return inserted
+
+
+async def lock_file_blobs(session: AsyncSession, content_hashes: Iterable[str]) -> None:
+    """
+    Locks the FileBlob rows of the given hashes, creating them as needed, until the session's transaction ends.
+    Rows are locked in a consistent order, so that concurrent transactions do not deadlock.
+
+    On sqlite, where FOR UPDATE is not supported, inserting the rows starts a write transaction, which serializes
+    the transaction with other writers.
+    """
+    pending = sorted(set(content_hashes))
+    while pending:
+        for content_hash in pending:
+            await insert_if_not_exists(session, FileBlob(content_hash=content_hash))
+
+        locked = set(
+            (
+                await session.exec(
+                    select(FileBlob.content_hash)
+                    .where(col(FileBlob.content_hash).in_(pending))
+                    .order_by(col(FileBlob.content_hash))
+                    .with_for_update()
+                )
+            ).all()
+        )
+        # rows deleted by a concurrent transaction, while waiting for their locks, are created again
+        pending = [content_hash for content_hash in pending if content_hash not in locked]
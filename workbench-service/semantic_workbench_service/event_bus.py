@@ -0,0 +1,259 @@
+import asyncio
+import contextlib
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, Literal, Protocol
+
+import asyncpg
+from semantic_workbench_api_model.workbench_model import ConversationEvent
+
+from .event_log import ConversationEventLog, LoggedConversationEvent
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[LoggedConversationEvent], Awaitable[None]]
+
+MAX_NOTIFY_PAYLOAD_BYTES = 7_900
+"""
+PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+"""
+
+
+class EventBus(ABC):
+    """
+    Delivers conversation events to the SSE subscribers of every workbench service process.
+    """
+
+    def __init__(self) -> None:
+        self._handler: EventHandler | None = None
+
+    def subscribe(self, handler: EventHandler) -> None:
+        self._handler = handler
+
+    async def _deliver(self, logged_event: LoggedConversationEvent) -> None:
+        if self._handler is None:
+            return
+        await self._handler(logged_event)
+
+    @abstractmethod
+    async def publish(self, logged_event: LoggedConversationEvent) -> None: ...
+
+    @asynccontextmanager
+    async def running(self) -> AsyncIterator[None]:
+        yield
+
+
+class InProcessEventBus(EventBus):
+    """
+    Delivers events to the subscribers of the current process only.
+    """
+
+    async def publish(self, logged_event: LoggedConversationEvent) -> None:
+        await self._deliver(logged_event)
+
+
+class Notifier(Protocol):
+    async def notify(self, channel: str, payload: str) -> None: ...
+
+    def listen(
+        self,
+        channel: str,
+        callback: Callable[[str], Awaitable[None]],
+        on_connect: Callable[[], None] | None = None,
+    ) -> AsyncContextManager[None]:
+        """
+        Returns an async context manager that invokes the callback with the payload of each notification on the
+        channel, in order, while entered. on_connect is invoked each time the listener is (re)connected, as
+        notifications sent while it was disconnected are lost.
+        """
+        ...
+
+
+class AsyncpgNotifier:
+    """
+    PostgreSQL LISTEN/NOTIFY over a dedicated asyncpg connection, which is re-established if it is lost.
+    """
+
+    def __init__(self, dsn: str, ssl: str, reconnect_delay_seconds: float = 1.0) -> None:
+        self._dsn = dsn
+        self._ssl = ssl
+        self._reconnect_delay_seconds = reconnect_delay_seconds
+        self._connection: asyncpg.Connection | None = None
+        self._connection_lock = asyncio.Lock()
+
+    async def notify(self, channel: str, payload: str) -> None:
+        async with self._connection_lock:
+            if self._connection is None or self._connection.is_closed():
+                raise RuntimeError("notifier is not connected")
+            await self._connection.execute("SELECT pg_notify($1, $2)", channel, payload)
+
+    @asynccontextmanager
+    async def listen(
+        self,
+        channel: str,
+        callback: Callable[[str], Awaitable[None]],
+        on_connect: Callable[[], None] | None = None,
+    ) -> AsyncIterator[None]:
+        notifications: asyncio.Queue[str] = asyncio.Queue()
+
+        def on_notification(_connection: object, _pid: int, _channel: str, payload: object) -> None:
+            notifications.put_nowait(str(payload))
+
+        async def handle_notifications() -> None:
+            while True:
+                payload = await notifications.get()
+                try:
+                    await callback(payload)
+                except Exception:
+                    logger.exception("exception in event bus notification callback; channel: %s", channel)
+
+        connected = asyncio.Event()
+
+        async def maintain_connection() -> None:
+            while True:
+                terminated = asyncio.Event()
+                try:
+                    connection: asyncpg.Connection = await asyncpg.connect(dsn=self._dsn, ssl=self._ssl)
+                    connection.add_termination_listener(lambda _, terminated=terminated: terminated.set())
+                    await connection.add_listener(channel, on_notification)
+                    async with self._connection_lock:
+                        self._connection = connection
+                    if on_connect is not None:
+                        on_connect()
+                    connected.set()
+                    logger.info("event bus listening; channel: %s", channel)
+
+                    try:
+                        await terminated.wait()
+                    finally:
+                        async with self._connection_lock:
+                            self._connection = None
+                        if not connection.is_closed():
+                            await connection.close()
+
+                    logger.warning("event bus connection lost; channel: %s", channel)
+
+                except asyncio.CancelledError:
+                    raise
+
+                except Exception:
+                    logger.exception("event bus connection failed; channel: %s", channel)
+
+                await asyncio.sleep(self._reconnect_delay_seconds)
+
+        tasks = [
+            asyncio.create_task(maintain_connection(), name="event_bus_listener"),
+            asyncio.create_task(handle_notifications(), name="event_bus_notifications"),
+        ]
+        try:
+            async with asyncio.timeout(30):
+                await connected.wait()
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class PostgresEventBus(EventBus):
+    """
+    Delivers events to the subscribers of every process connected to the same PostgreSQL database, using
+    LISTEN/NOTIFY.
+
+    Events are delivered to the subscribers of the publishing process directly. Other processes are notified of
+    the event's sequence in the event log, and read the event from the log, so that payloads are not limited by the
+    size limit on notifications. Events that could not be logged are sent in the notification, if they fit.
+
+    The in-memory buffers of the event log are discarded whenever the listener (re)connects, as they are missing
+    the events of which notifications were lost while it was disconnected.
+    """
+
+    def __init__(self, notifier: Notifier, event_log: ConversationEventLog, channel: str) -> None:
+        super().__init__()
+        self._notifier = notifier
+        self._event_log = event_log
+        self._channel = channel
+        self._process_id = uuid.uuid4().hex
+
+    async def publish(self, logged_event: LoggedConversationEvent) -> None:
+        await self._deliver(logged_event)
+
+        payload = json.dumps({"origin": self._process_id, "sequence": logged_event.sequence})
+        if logged_event.sequence is None:
+            payload = json.dumps({
+                "origin": self._process_id,
+                "event": logged_event.event.model_dump(mode="json"),
+            })
+            if len(payload.encode()) > MAX_NOTIFY_PAYLOAD_BYTES:
+                logger.warning(
+                    "event is too large to publish to other processes; conversation_id: %s, event: %s, event_id: %s",
+                    logged_event.event.conversation_id,
+                    logged_event.event.event,
+                    logged_event.event.id,
+                )
+                return
+
+        try:
+            await self._notifier.notify(self._channel, payload)
+        except Exception:
+            logger.exception(
+                "failed to publish event to other processes; conversation_id: %s, event: %s, event_id: %s",
+                logged_event.event.conversation_id,
+                logged_event.event.event,
+                logged_event.event.id,
+            )
+
+    async def _on_notification(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            if message.get("origin") == self._process_id:
+                return
+
+            sequence = message.get("sequence")
+            if sequence is not None:
+                logged_event = await self._event_log.get(sequence)
+                if logged_event is None:
+                    logger.warning("published event is no longer in the event log; sequence: %s", sequence)
+                    return
+                self._event_log.record(logged_event)
+
+            else:
+                logged_event = LoggedConversationEvent(
+                    sequence=None, event=ConversationEvent.model_validate(message["event"])
+                )
+
+            await self._deliver(logged_event)
+
+        except Exception:
+            logger.exception("failed to deliver published event; payload: %s", payload[:200])
+
+    @asynccontextmanager
+    async def running(self) -> AsyncIterator[None]:
+        async with self._notifier.listen(self._channel, self._on_notification, on_connect=self._event_log.invalidate):
+            yield
+
+
+def create(
+    backend: Literal["in_process", "postgresql"],
+    event_log: ConversationEventLog,
+    channel: str,
+    db_url: str,
+    ssl: str,
+) -> EventBus:
+    match backend:
+        case "in_process":
+            return InProcessEventBus()
+
+        case "postgresql":
+            if not db_url.startswith("postgresql"):
+                raise ValueError("the postgresql event bus requires a postgresql database")
+
+            return PostgresEventBus(
+                notifier=AsyncpgNotifier(dsn=db_url.replace("postgresql+asyncpg://", "postgresql://"), ssl=ssl),
+                event_log=event_log,
+                channel=channel,
+            )
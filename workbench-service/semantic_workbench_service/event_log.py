@@ -0,0 +1,274 @@
+import datetime
+import logging
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncContextManager, Callable, Iterable, Sequence
+
+import cachetools
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from sqlmodel import col, delete, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LoggedConversationEvent:
+    sequence: int | None
+    event: ConversationEvent
+    previous_sequence: int | None = None
+    """
+    The sequence of the preceding event in the conversation's log, if any.
+    """
+
+
+@dataclass(frozen=True)
+class Replay:
+    events: list[LoggedConversationEvent]
+    complete: bool
+    """
+    False when events after the requested sequence are no longer retained, and the client must resynchronize.
+    """
+
+
+class ConversationEventLog:
+    """
+    A bounded, sequence-numbered log of conversation events, used to replay the events missed by reconnecting
+    SSE clients. The most recent events for each conversation are held in an in-memory ring buffer, backed by
+    the conversationeventlog table, which retains the same number of events per conversation.
+
+    Sequence numbers are allocated by the database and are increasing across all conversations. Appends to the log
+    of a conversation are serialized, so that its events are committed in sequence order, and each logged event
+    carries the sequence of its predecessor, so that a buffer is only extended by the event that follows its last.
+    """
+
+    def __init__(
+        self,
+        get_session: Callable[[], AsyncContextManager[AsyncSession]],
+        max_events_per_conversation: int,
+        max_cached_conversations: int,
+    ) -> None:
+        self._get_session = get_session
+        self._max_events_per_conversation = max_events_per_conversation
+        self._buffers: cachetools.LRUCache[uuid.UUID, deque[LoggedConversationEvent]] = cachetools.LRUCache(
+            maxsize=max_cached_conversations
+        )
+
+    async def append(self, event: ConversationEvent) -> LoggedConversationEvent:
+        return (await self.append_many([event]))[0]
+
+    async def append_many(self, events: Sequence[ConversationEvent]) -> list[LoggedConversationEvent]:
+        """
+        Appends the events, in order, in one transaction.
+        """
+        if not events:
+            return []
+
+        conversation_ids = sorted({event.conversation_id for event in events})
+        logged_events: list[LoggedConversationEvent] = []
+
+        async with self._get_session() as session:
+            # locks are taken in a consistent order, so that appends to several conversations cannot deadlock
+            for conversation_id in conversation_ids:
+                await _lock_conversation_log(session, conversation_id)
+
+            last_sequences: dict[uuid.UUID, int] = {}
+            for event in events:
+                entry = db.ConversationEventLog(
+                    conversation_id=event.conversation_id,
+                    event_id=event.id,
+                    event=event.event.value,
+                    timestamp=event.timestamp,
+                    data=event.model_dump(mode="json", include={"data"})["data"],
+                )
+                session.add(entry)
+                # flushed one at a time, so that sequences are allocated in the order of the events
+                await session.flush()
+                sequence = entry.sequence
+
+                if event.conversation_id in last_sequences:
+                    previous_sequence = last_sequences[event.conversation_id]
+                else:
+                    previous_sequence = await _previous_sequence(session, event.conversation_id, sequence)
+                last_sequences[event.conversation_id] = sequence
+
+                logged_events.append(
+                    LoggedConversationEvent(sequence=sequence, event=event, previous_sequence=previous_sequence)
+                )
+
+            # trim the logs to the most recent events for the conversations
+            conn = await session.connection()
+            for conversation_id in conversation_ids:
+                oldest_retained_sequence = (
+                    select(db.ConversationEventLog.sequence)
+                    .where(db.ConversationEventLog.conversation_id == conversation_id)
+                    .order_by(col(db.ConversationEventLog.sequence).desc())
+                    .offset(self._max_events_per_conversation - 1)
+                    .limit(1)
+                    .scalar_subquery()
+                )
+                await conn.execute(
+                    delete(db.ConversationEventLog)
+                    .where(col(db.ConversationEventLog.conversation_id) == conversation_id)
+                    .where(col(db.ConversationEventLog.sequence) < oldest_retained_sequence)
+                )
+
+            await session.commit()
+
+        for logged_event in logged_events:
+            self.record(logged_event)
+        return logged_events
+
+    def record(self, logged_event: LoggedConversationEvent) -> None:
+        """
+        Adds an event that was appended to the log, possibly by another process, to the in-memory buffer.
+
+        Events can be recorded out of order, or not at all, as concurrent appends complete, and notifications from
+        other processes arrive, in any order. When the event does not follow the last event in the buffer, the
+        buffer is restarted from the event, so that it never has a gap.
+        """
+        if logged_event.sequence is None:
+            return
+
+        conversation_id = logged_event.event.conversation_id
+        buffer = self._buffers.get(conversation_id)
+        if buffer and (buffer[-1].sequence or 0) >= logged_event.sequence:
+            # already recorded, or precedes the buffer
+            return
+
+        if not buffer or buffer[-1].sequence != logged_event.previous_sequence:
+            buffer = deque(maxlen=self._max_events_per_conversation)
+            self._buffers[conversation_id] = buffer
+
+        buffer.append(logged_event)
+
+    def invalidate(self) -> None:
+        """
+        Discards the in-memory buffers, so that replays are read from the database until events are recorded again.
+        """
+        self._buffers.clear()
+
+    async def get(self, sequence: int) -> LoggedConversationEvent | None:
+        async with self._get_session() as session:
+            entry = (
+                await session.exec(select(db.ConversationEventLog).where(db.ConversationEventLog.sequence == sequence))
+            ).one_or_none()
+            if entry is None:
+                return None
+
+            previous_sequence = await _previous_sequence(session, entry.conversation_id, sequence)
+
+        return _logged_event_from_db(entry, previous_sequence=previous_sequence)
+
+    async def conversation_events_after(self, conversation_id: uuid.UUID, sequence: int) -> Replay:
+        """
+        Returns the events for the conversation that follow the sequence.
+        """
+        # the in-memory buffer holds every event for the conversation since its first entry
+        buffer = self._buffers.get(conversation_id)
+        if buffer and (buffer[0].sequence or 0) <= sequence:
+            return Replay(events=[e for e in buffer if (e.sequence or 0) > sequence], complete=True)
+
+        async with self._get_session() as session:
+            entries = (
+                await session.exec(
+                    select(db.ConversationEventLog)
+                    .where(db.ConversationEventLog.conversation_id == conversation_id)
+                    .order_by(col(db.ConversationEventLog.sequence).asc())
+                )
+            ).all()
+
+        # the log retains exactly max_events_per_conversation events once it has been trimmed, so a full log that
+        # starts after the requested sequence may have dropped events the client has not seen
+        complete = len(entries) < self._max_events_per_conversation or (
+            bool(entries) and entries[0].sequence <= sequence
+        )
+
+        return Replay(
+            events=[_logged_event_from_db(entry) for entry in entries if entry.sequence > sequence],
+            complete=complete,
+        )
+
+    async def user_events_after(
+        self,
+        user_id: str,
+        sequence: int,
+        event_types: Iterable[ConversationEventType],
+        limit: int,
+    ) -> Replay:
+        """
+        Returns the events of the given types that follow the sequence, for the conversations in which the user is
+        an active participant.
+        """
+        async with self._get_session() as session:
+            entries = (
+                await session.exec(
+                    select(db.ConversationEventLog)
+                    .join(
+                        db.UserParticipant,
+                        col(db.UserParticipant.conversation_id) == col(db.ConversationEventLog.conversation_id),
+                    )
+                    .where(db.UserParticipant.user_id == user_id)
+                    .where(col(db.UserParticipant.active_participant).is_(True))
+                    .where(col(db.ConversationEventLog.event).in_([t.value for t in event_types]))
+                    .where(db.ConversationEventLog.sequence > sequence)
+                    .order_by(col(db.ConversationEventLog.sequence).asc())
+                    .limit(limit + 1)
+                )
+            ).all()
+
+        return Replay(
+            events=[_logged_event_from_db(entry) for entry in entries[:limit]],
+            complete=len(entries) <= limit,
+        )
+
+
+async def _lock_conversation_log(session: AsyncSession, conversation_id: uuid.UUID) -> None:
+    """
+    Serializes the appends to the log of the conversation, until the end of the session's transaction. Sequences
+    are allocated on insert, so appends that are not serialized can commit out of sequence order, and replays could
+    skip events that are committed after a later event has been read.
+
+    A transaction-scoped advisory lock is used on PostgreSQL, rather than a lock on the conversation row, so that
+    appends do not wait for transactions that update the conversation. SQLite serializes all writes.
+    """
+    conn = await session.connection()
+    if conn.dialect.name != "postgresql":
+        return
+
+    lock_key = int.from_bytes(conversation_id.bytes[:8], "big", signed=True)
+    await conn.execute(select(func.pg_advisory_xact_lock(lock_key)))
+
+
+async def _previous_sequence(session: AsyncSession, conversation_id: uuid.UUID, sequence: int) -> int | None:
+    return (
+        await session.exec(
+            select(func.max(db.ConversationEventLog.sequence))
+            .where(db.ConversationEventLog.conversation_id == conversation_id)
+            .where(db.ConversationEventLog.sequence < sequence)
+        )
+    ).one()
+
+
+def _logged_event_from_db(
+    entry: db.ConversationEventLog, previous_sequence: int | None = None
+) -> LoggedConversationEvent:
+    timestamp = entry.timestamp
+    if timestamp.tzinfo is None:
+        # sqlite does not retain the timezone
+        timestamp = timestamp.replace(tzinfo=datetime.UTC)
+
+    return LoggedConversationEvent(
+        sequence=entry.sequence,
+        previous_sequence=previous_sequence,
+        event=ConversationEvent(
+            id=entry.event_id,
+            conversation_id=entry.conversation_id,
+            event=ConversationEventType(entry.event),
+            timestamp=timestamp,
+            data=entry.data,
+        ),
+    )
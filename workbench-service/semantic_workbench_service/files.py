@@ -1,19 +1,47 @@
+import asyncio
 import hashlib
 import logging
 import pathlib
+import tempfile
 from contextlib import contextmanager
-from typing import BinaryIO, Iterator
+from dataclasses import dataclass
+from typing import IO, AsyncIterator, BinaryIO, Iterator
 
 from pydantic_settings import BaseSettings
 
 logger = logging.getLogger(__name__)
 
+_CHUNK_SIZE = 256 * 1_024
+
 
 class StorageSettings(BaseSettings):
     root: str = ".data/files"
 
 
+@dataclass(frozen=True)
+class StagedBlob:
+    """
+    Content that has been written to a temporary file, and hashed, but not yet stored as a blob.
+    """
+
+    content_hash: str
+    size: int
+    path: pathlib.Path
+
+
 class Storage:
+    """
+    File storage, with two layouts:
+    - blobs: content-addressed by the sha256 of their content, so that identical content is stored once, however
+      many file versions reference it.
+    - namespaced files: stored under a namespace, by the sha256 of their filename. File versions written before
+      blobs were introduced are stored in this layout.
+
+    Blobs are not reference counted by the storage; callers delete a blob once no file version references it,
+    while holding the blob's lock, which is also held while storing the blob and committing the references to it.
+    The locks are rows in the database (see db.FileBlob), so that they are shared by all service processes.
+    """
+
     def __init__(self, settings: StorageSettings):
         self.root = pathlib.Path(settings.root)
         self._initialized = False
@@ -48,7 +76,7 @@ class Storage:
     def write_file(self, namespace: str, filename: str, content: BinaryIO) -> None:
         file_path = self._file_path(namespace, filename, mkdir=True)
         with open(file_path, "wb") as f:
-            for chunk in iter(lambda: content.read(100 * 1_024), b""):
+            for chunk in iter(lambda: content.read(_CHUNK_SIZE), b""):
                 f.write(chunk)
 
     def delete_file(self, namespace: str, filename: str) -> None:
@@ -60,3 +88,94 @@ class Storage:
         file_path = self._file_path(namespace, filename)
         with open(file_path, "rb") as f:
             yield f
+
+    async def file_size(self, namespace: str, filename: str) -> int:
+        file_path = self._file_path(namespace, filename)
+        return (await asyncio.to_thread(file_path.stat)).st_size
+
+    def read_file_range(
+        self, namespace: str, filename: str, start: int = 0, stop: int | None = None
+    ) -> AsyncIterator[bytes]:
+        return _read_range(self._file_path(namespace, filename), start=start, stop=stop)
+
+    def blob_path(self, content_hash: str) -> pathlib.Path:
+        return self.root / "blobs" / content_hash[:2] / content_hash
+
+    async def stage_blob(self, content: IO[bytes]) -> StagedBlob:
+        """
+        Writes the content to a temporary file, computing its hash, off the event loop.
+        """
+        return await asyncio.to_thread(self._stage_blob, content)
+
+    def _stage_blob(self, content: IO[bytes]) -> StagedBlob:
+        self._ensure_initialized()
+        staging_path = self.root / "blobs" / "staging"
+        staging_path.mkdir(parents=True, exist_ok=True)
+
+        content_hash = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=staging_path, delete=False) as f:
+            try:
+                for chunk in iter(lambda: content.read(_CHUNK_SIZE), b""):
+                    content_hash.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            except BaseException:
+                pathlib.Path(f.name).unlink(missing_ok=True)
+                raise
+
+        return StagedBlob(content_hash=content_hash.hexdigest(), size=size, path=pathlib.Path(f.name))
+
+    async def store_blob(self, staged: StagedBlob) -> bool:
+        """
+        Moves a staged blob into place, unless a blob with the same content is already stored. Returns True if the
+        blob was stored. Callers should hold the blob's lock.
+        """
+        return await asyncio.to_thread(self._store_blob, staged)
+
+    def _store_blob(self, staged: StagedBlob) -> bool:
+        blob_path = self.blob_path(staged.content_hash)
+        if blob_path.exists():
+            staged.path.unlink(missing_ok=True)
+            return False
+
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        staged.path.replace(blob_path)
+        return True
+
+    def discard_staged_blob(self, staged: StagedBlob) -> None:
+        staged.path.unlink(missing_ok=True)
+
+    async def delete_blob(self, content_hash: str) -> None:
+        """
+        Deletes a blob. Callers should hold the blob's lock, and have verified that no file version references it.
+        """
+        await asyncio.to_thread(self.blob_path(content_hash).unlink, missing_ok=True)
+
+    async def blob_size(self, content_hash: str) -> int:
+        return (await asyncio.to_thread(self.blob_path(content_hash).stat)).st_size
+
+    def read_blob(self, content_hash: str, start: int = 0, stop: int | None = None) -> AsyncIterator[bytes]:
+        return _read_range(self.blob_path(content_hash), start=start, stop=stop)
+
+
+async def _read_range(path: pathlib.Path, start: int, stop: int | None) -> AsyncIterator[bytes]:
+    """
+    Reads the bytes in [start, stop) of a file, off the event loop.
+    """
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        if start:
+            await asyncio.to_thread(file.seek, start)
+
+        position = start
+        while stop is None or position < stop:
+            read_size = _CHUNK_SIZE if stop is None else min(_CHUNK_SIZE, stop - position)
+            chunk = await asyncio.to_thread(file.read, read_size)
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+
+    finally:
+        await asyncio.to_thread(file.close)
@@ -0,0 +1,144 @@
+import asyncio
+import io
+import json
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Iterable
+
+from . import db, files
+
+ENCODING_JSON = "json"
+"""
+The payload is stored uncompressed, in the data column. Payloads stored before compression was introduced use
+this encoding.
+"""
+ENCODING_ZLIB = "zlib"
+"""
+The payload is stored as zlib-compressed JSON, in the compressed_data column.
+"""
+ENCODING_ZLIB_FILE = "zlib_file"
+"""
+The payload is stored as zlib-compressed JSON, in the file store, because it is larger than the inline limit.
+"""
+
+NAMESPACE = "message-debug"
+
+_CHUNK_SIZE = 256 * 1_024
+# payloads up to this size are compressed on the event loop, larger ones in a worker thread
+_MAX_COMPRESS_IN_LOOP_BYTES = 64 * 1_024
+
+
+class MessageDebugStorage:
+    """
+    Stores message debug payloads compressed, inline in the database up to max_inline_bytes after compression, and
+    in the file store beyond that.
+    """
+
+    def __init__(self, file_storage: files.Storage, max_inline_bytes: int, compression_level: int = 6) -> None:
+        self._file_storage = file_storage
+        self._max_inline_bytes = max_inline_bytes
+        self._compression_level = compression_level
+
+    async def create(self, message_id: uuid.UUID, data: dict[str, Any]) -> db.ConversationMessageDebug:
+        content = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        if len(content) > _MAX_COMPRESS_IN_LOOP_BYTES:
+            compressed = await asyncio.to_thread(zlib.compress, content, self._compression_level)
+        else:
+            compressed = zlib.compress(content, self._compression_level)
+
+        if len(compressed) <= self._max_inline_bytes:
+            return db.ConversationMessageDebug(
+                message_id=message_id, encoding=ENCODING_ZLIB, compressed_data=compressed
+            )
+
+        await asyncio.to_thread(self._file_storage.write_file, NAMESPACE, str(message_id), io.BytesIO(compressed))
+        return db.ConversationMessageDebug(message_id=message_id, encoding=ENCODING_ZLIB_FILE)
+
+    async def copy(
+        self, message_debug: db.ConversationMessageDebug, message_id: uuid.UUID
+    ) -> db.ConversationMessageDebug:
+        if message_debug.encoding == ENCODING_ZLIB_FILE:
+
+            def _copy() -> None:
+                with self._file_storage.read_file(NAMESPACE, str(message_debug.message_id)) as content:
+                    self._file_storage.write_file(NAMESPACE, str(message_id), content)
+
+            await asyncio.to_thread(_copy)
+
+        return db.ConversationMessageDebug(
+            **message_debug.model_dump(exclude={"message_id"}),
+            message_id=message_id,
+        )
+
+    async def stream(self, message_debug: db.ConversationMessageDebug) -> AsyncIterator[bytes]:
+        """
+        Yields the payload as JSON, decompressing it as it is read.
+        """
+        if message_debug.encoding == ENCODING_JSON:
+            yield json.dumps(message_debug.data).encode("utf-8")
+            return
+
+        if message_debug.encoding == ENCODING_ZLIB:
+            compressed_chunks = _chunks(message_debug.compressed_data or b"")
+        elif message_debug.encoding == ENCODING_ZLIB_FILE:
+            compressed_chunks = self._file_storage.read_file_range(NAMESPACE, str(message_debug.message_id))
+        else:
+            raise ValueError(f"unknown message debug encoding: {message_debug.encoding}")
+
+        decompressor = zlib.decompressobj()
+        async for compressed_chunk in compressed_chunks:
+            # the output of each chunk is bounded, so that highly compressed payloads are not expanded at once
+            chunk = decompressor.decompress(compressed_chunk, _CHUNK_SIZE)
+            while chunk:
+                yield chunk
+                chunk = decompressor.decompress(decompressor.unconsumed_tail, _CHUNK_SIZE)
+        if remaining := decompressor.flush():
+            yield remaining
+
+    async def load(self, message_debug: db.ConversationMessageDebug) -> dict[str, Any]:
+        if message_debug.encoding == ENCODING_JSON:
+            return message_debug.data
+        return json.loads(b"".join([chunk async for chunk in self.stream(message_debug)]))
+
+    async def delete_files(self, message_ids: Iterable[uuid.UUID]) -> None:
+        """
+        Deletes the stored payloads of messages whose payloads are in the file store.
+        """
+
+        def _delete() -> None:
+            for message_id in message_ids:
+                self._file_storage.delete_file(NAMESPACE, str(message_id))
+
+        await asyncio.to_thread(_delete)
+
+    async def delete_orphaned_files(self, referenced_message_ids: Iterable[uuid.UUID], min_age_seconds: float) -> int:
+        """
+        Deletes the payload files that are not referenced by any of the given message ids, such as those of deleted
+        messages, and that are older than min_age_seconds, so that files written for messages that are not yet
+        committed are retained. Returns the number of files deleted.
+        """
+        namespace_path = self._file_storage.path_for(NAMESPACE, "")
+        referenced_filenames = {
+            self._file_storage.path_for(NAMESPACE, str(message_id)).name for message_id in referenced_message_ids
+        }
+
+        def _delete() -> int:
+            if not namespace_path.exists():
+                return 0
+
+            deleted = 0
+            cutoff = time.time() - min_age_seconds
+            for file_path in namespace_path.iterdir():
+                if file_path.name in referenced_filenames or file_path.stat().st_mtime > cutoff:
+                    continue
+                file_path.unlink(missing_ok=True)
+                deleted += 1
+            return deleted
+
+        return await asyncio.to_thread(_delete)
+
+
+async def _chunks(content: bytes) -> AsyncIterator[bytes]:
+    for start in range(0, len(content), _CHUNK_SIZE):
+        yield content[start : start + _CHUNK_SIZE]
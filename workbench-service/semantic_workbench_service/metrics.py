@@ -0,0 +1,239 @@
+import bisect
+import contextlib
+import functools
+import inspect
+import math
+import time
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Literal, TypeVar
+
+from fastapi import Request, Response
+
+MetricType = Literal["counter", "gauge", "histogram"]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""
+The content type of the Prometheus text exposition format.
+"""
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[str, ...]
+Sample = tuple[dict[str, str], float]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_sample(name: str, labels: dict[str, str], value: float) -> str:
+    if not labels:
+        return f"{name} {_format_value(value)}"
+    formatted_labels = ",".join(f'{key}="{_escape_label_value(str(label))}"' for key, label in labels.items())
+    return f"{name}{{{formatted_labels}}} {_format_value(value)}"
+
+
+class _Metric:
+    type: MetricType
+
+    def __init__(self, name: str, help: str, label_names: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+
+    def _label_values(self, labels: dict[str, str]) -> Labels:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, label_values: Labels) -> dict[str, str]:
+        return dict(zip(self.label_names, label_values, strict=True))
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self._expose_samples()
+
+    def _expose_samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type: MetricType = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Iterable[str] = ()) -> None:
+        super().__init__(name, help, label_names)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _expose_samples(self) -> Iterator[str]:
+        for label_values, value in self._values.items():
+            yield _format_sample(self.name, self._labels(label_values), value)
+
+
+class Gauge(Counter):
+    type: MetricType = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._label_values(labels)] = value
+
+
+class Histogram(_Metric):
+    type: MetricType = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: the count of observations per bucket, with a final overflow bucket, and their sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        counts, _ = self._values.get(self._label_values(labels), ([], [0.0]))
+        return sum(counts)
+
+    def _expose_samples(self) -> Iterator[str]:
+        for label_values, (counts, total) in self._values.items():
+            labels = self._labels(label_values)
+            cumulative = 0
+            for upper_bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                yield _format_sample(f"{self.name}_bucket", {**labels, "le": _format_value(upper_bound)}, cumulative)
+            yield _format_sample(f"{self.name}_sum", labels, total[0])
+            yield _format_sample(f"{self.name}_count", labels, cumulative)
+
+
+class CallbackMetric(_Metric):
+    """
+    A counter or gauge whose samples are read from the instrumented component when the metrics are collected,
+    rather than recorded as they change.
+    """
+
+    def __init__(self, name: str, help: str, type: MetricType, collect: Callable[[], Iterable[Sample]]) -> None:
+        super().__init__(name, help)
+        self.type = type
+        self._collect = collect
+
+    def _expose_samples(self) -> Iterator[str]:
+        for labels, value in self._collect():
+            yield _format_sample(self.name, labels, value)
+
+
+MetricT = TypeVar("MetricT", bound=_Metric)
+
+
+class MetricsRegistry:
+    """
+    An in-process registry of metrics, exposed in the Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: MetricT) -> MetricT:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, label_names))
+
+    def gauge(self, name: str, help: str, label_names: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, label_names))
+
+    def histogram(
+        self, name: str, help: str, label_names: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, label_names, buckets))
+
+    def callback(
+        self, name: str, help: str, type: MetricType, collect: Callable[[], Iterable[Sample]]
+    ) -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, type, collect))
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+def instrument_methods(obj: Any, histogram: Histogram, component: str) -> None:
+    """
+    Wraps the public coroutine methods of obj, recording their durations in the histogram, with the component,
+    method and outcome ("success" or "error") labels.
+    """
+    for name, method in inspect.getmembers(obj, inspect.iscoroutinefunction):
+        if name.startswith("_"):
+            continue
+
+        def wrap(name: str, method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            @functools.wraps(method)
+            async def instrumented(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await method(*args, **kwargs)
+                    outcome = "success"
+                    return result
+                finally:
+                    histogram.observe(time.perf_counter() - start, component=component, method=name, outcome=outcome)
+
+            return instrumented
+
+        setattr(obj, name, wrap(name, method))
+
+
+def request_duration_middleware(
+    histogram: Histogram,
+) -> Callable[[Request, Callable[[Request], Awaitable[Response]]], Awaitable[Response]]:
+    """
+    Records the duration of each request, until the response starts, with the method, route and status labels.
+    """
+
+    async def middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        start = time.perf_counter()
+        status = "500"
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            # the route path template groups the requests for the same endpoint; unmatched paths are grouped together
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            histogram.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+    return middleware
@@ -1,18 +1,19 @@
+import asyncio
 import logging
 import secrets
 import time
-from collections.abc import Awaitable, Callable
-from functools import lru_cache
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
 from typing import Any
 
+import cachetools
 import httpx
 from fastapi import HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import ExpiredSignatureError, jwt
 from semantic_workbench_api_model import workbench_service_client
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from . import auth, settings
 
@@ -64,19 +65,32 @@ async def _assistant_service_principal_from_request(
     return auth.AssistantServicePrincipal(assistant_service_id=assistant_service_id)
 
 
-async def _user_principal_from_request(request: Request) -> auth.UserPrincipal | None:
-    token = await OAuth2PasswordBearer(tokenUrl="token", auto_error=False)(request)
+_bearer_token = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+
+async def _user_principal_from_request(
+    request: Request, token_cache: "VerifiedTokenCache | None" = None
+) -> auth.UserPrincipal | None:
+    token = await _bearer_token(request)
     if token is None:
         return None
 
     allowed_jwt_algorithms = settings.auth.allowed_jwt_algorithms
 
+    # the outcome of verification depends on the auth settings, as well as the token
+    cache_key = (token, settings.auth.allowed_app_id, frozenset(allowed_jwt_algorithms))
+    if token_cache is not None:
+        principal = token_cache.get(cache_key)
+        if principal is not None:
+            return principal
+
     try:
-        algorithm: str = jwt.get_unverified_header(token).get("alg") or ""
+        header = jwt.get_unverified_header(token)
+        algorithm: str = header.get("alg") or ""
 
         match algorithm:
             case "RS256":
-                keys = _get_rs256_jwks()
+                keys = await _rs256_jwks.get(kid=header.get("kid"))
             case _:
                 keys = ""
 
@@ -93,6 +107,7 @@ async def _user_principal_from_request(request: Request) -> auth.UserPrincipal |
         oid: str = decoded.get("oid", "")
         sub: str = decoded.get("sub", "")
         name: str = decoded.get("name", "")
+        expires_at = decoded.get("exp")
 
         # For Entra ID tokens: use tid.oid
         # For MSA tokens: use sub (since tid/oid are not present)
@@ -121,25 +136,38 @@ async def _user_principal_from_request(request: Request) -> auth.UserPrincipal |
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid app. App ID must match in client and server."
         )
 
-    return auth.UserPrincipal(user_id=user_id, name=name)
+    principal = auth.UserPrincipal(user_id=user_id, name=name)
+    if token_cache is not None:
+        token_cache.set(cache_key, principal, expires_at=expires_at)
+
+    return principal
 
 
 async def principal_from_request(
     request: Request,
     api_key_source: Callable[[str], Awaitable[str | None]],
+    token_cache: "VerifiedTokenCache | None" = None,
 ) -> auth.Principal | None:
     assistant_principal = await _assistant_service_principal_from_request(request, api_key_source=api_key_source)
     if assistant_principal is not None:
         return assistant_principal
 
-    user_principal = await _user_principal_from_request(request)
+    user_principal = await _user_principal_from_request(request, token_cache=token_cache)
     if user_principal is not None:
         return user_principal
 
     return None
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
+class AuthMiddleware:
+    """
+    Authenticates requests, setting the authenticated principal for the request handlers.
+
+    Implemented as a pure ASGI middleware, rather than with BaseHTTPMiddleware, so that requests and streaming
+    responses are passed straight through to the app, without the per-request task and stream wrapping that
+    BaseHTTPMiddleware adds.
+    """
+
     def __init__(
         self,
         app: ASGIApp,
@@ -147,54 +175,143 @@ class AuthMiddleware(BaseHTTPMiddleware):
         exclude_methods: set[str] = set(),
         exclude_paths: set[str] = set(),
     ) -> None:
-        super().__init__(app)
+        self.app = app
         self.exclude_methods = exclude_methods
         self.exclude_routes = exclude_paths
         self.api_key_source = api_key_source
+        self.token_cache = VerifiedTokenCache(
+            maxsize=settings.auth.verified_token_cache_size,
+            max_age_seconds=settings.auth.jwks_refresh_interval_seconds,
+        )
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        if request.method in self.exclude_methods:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        if request.url.path in self.exclude_routes:
-            return await call_next(request)
+        request = Request(scope)
+
+        if request.method in self.exclude_methods or request.url.path in self.exclude_routes:
+            await self.app(scope, receive, send)
+            return
 
         try:
-            principal = await principal_from_request(request, api_key_source=self.api_key_source)
+            principal = await principal_from_request(
+                request, api_key_source=self.api_key_source, token_cache=self.token_cache
+            )
 
             if principal is None:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
         except HTTPException as exc:
             # if the authorization header is invalid, return the error response
-            return JSONResponse(content={"detail": exc.detail}, status_code=exc.status_code)
+            response = JSONResponse(content={"detail": exc.detail}, status_code=exc.status_code)
+            await response(scope, receive, send)
+            return
+
         except Exception:
             logger.exception("error validating authorization header")
             # return a generic error response
-            return Response(status_code=500)
+            await Response(status_code=500)(scope, receive, send)
+            return
+
+        context_token = auth.authenticated_principal.set(principal)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            auth.authenticated_principal.reset(context_token)
 
-        auth.authenticated_principal.set(principal)
-        return await call_next(request)
 
+@dataclass(frozen=True)
+class _VerifiedToken:
+    principal: auth.UserPrincipal
+    expires_at: float
 
-def ttl_lru_cache(seconds_to_live: int, maxsize: int = 128):
+
+class VerifiedTokenCache:
     """
-    Time aware lru caching
+    LRU cache of the principals of verified tokens, so that the signatures of tokens that are presented repeatedly
+    are verified once. Entries expire with the token's 'exp' claim, and at the latest after max_age_seconds, so that
+    tokens signed by keys that have since been removed from the key set are verified again.
     """
 
-    def wrapper(func):
-        @lru_cache(maxsize)
-        def inner(__ttl, *args, **kwargs):
-            # Note that __ttl is not passed down to func,
-            # as it's only used to trigger cache miss after some time
-            return func(*args, **kwargs)
+    def __init__(self, maxsize: int, max_age_seconds: float) -> None:
+        self._cache = cachetools.LRUCache[Hashable, _VerifiedToken](maxsize=maxsize)
+        self._max_age_seconds = max_age_seconds
+
+    def get(self, key: Hashable) -> auth.UserPrincipal | None:
+        verified = self._cache.get(key)
+        if verified is None:
+            return None
+
+        if time.time() >= verified.expires_at:
+            self._cache.pop(key, None)
+            return None
+
+        return verified.principal
 
-        return lambda *args, **kwargs: inner(time.time() // seconds_to_live, *args, **kwargs)
+    def set(self, key: Hashable, principal: auth.UserPrincipal, expires_at: Any = None) -> None:
+        max_expires_at = time.time() + self._max_age_seconds
+        if isinstance(expires_at, int | float):
+            max_expires_at = min(max_expires_at, expires_at)
 
-    return wrapper
+        self._cache[key] = _VerifiedToken(principal=principal, expires_at=max_expires_at)
 
 
-@ttl_lru_cache(seconds_to_live=60 * 10)
-def _get_rs256_jwks() -> dict[str, Any]:
-    response = httpx.Client().get("https://login.microsoftonline.com/common/discovery/v2.0/keys")
-    return response.json()
+class JsonWebKeySet:
+    """
+    Caches a JSON Web Key Set. Once the cached key set is older than the refresh interval, it is refreshed in the
+    background, while requests continue to be verified with the cached keys. Requests only wait for the key set when
+    it has not been fetched yet, or when a token references a key id that is not in the cached set, such as after a
+    key rotation; the latter is limited to one fetch per min_fetch_interval_seconds.
+    """
+
+    def __init__(self, url: str, refresh_interval_seconds: float, min_fetch_interval_seconds: float = 60) -> None:
+        self._url = url
+        self._refresh_interval_seconds = refresh_interval_seconds
+        self._min_fetch_interval_seconds = min_fetch_interval_seconds
+        self._keys: dict[str, Any] | None = None
+        self._key_ids: set[str] = set()
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def get(self, kid: str | None = None) -> dict[str, Any]:
+        now = time.monotonic()
+        age = now - self._fetched_at
+
+        if self._keys is None or (kid and kid not in self._key_ids and age >= self._min_fetch_interval_seconds):
+            return await self._fetch(requested_at=now)
+
+        if age >= self._refresh_interval_seconds and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh(), name="refresh_json_web_key_set")
+
+        return self._keys
+
+    async def _refresh(self) -> None:
+        try:
+            await self._fetch(requested_at=time.monotonic())
+        except Exception:
+            logger.exception("error refreshing json web key set; url: %s", self._url)
+
+    async def _fetch(self, requested_at: float) -> dict[str, Any]:
+        async with self._lock:
+            # the key set may have been fetched by another request while waiting for the lock
+            if self._keys is not None and self._fetched_at >= requested_at:
+                return self._keys
+
+            async with httpx.AsyncClient() as client:
+                response = await client.get(self._url)
+                response.raise_for_status()
+
+            keys = response.json()
+            self._keys = keys
+            self._key_ids = {key["kid"] for key in keys.get("keys", []) if "kid" in key}
+            self._fetched_at = time.monotonic()
+            return keys
+
+
+_rs256_jwks = JsonWebKeySet(
+    url=settings.auth.jwks_url,
+    refresh_interval_seconds=settings.auth.jwks_refresh_interval_seconds,
+)
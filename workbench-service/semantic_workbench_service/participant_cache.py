@@ -0,0 +1,97 @@
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import AsyncContextManager, Callable
+
+import cachetools
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConversationParticipants:
+    assistant_ids: frozenset[uuid.UUID]
+    """
+    The active assistant participants whose assistant service is online.
+    """
+    user_ids: frozenset[str]
+    """
+    The active user participants.
+    """
+
+
+class ParticipantCache:
+    """
+    Caches the active participants of conversations, for routing conversation events to assistants and user SSE
+    streams without querying the database for each event.
+
+    Controllers invalidate a conversation's entry when they change its participants, and invalidate all entries
+    when a change, such as an assistant service going offline, affects many conversations. Entries also expire
+    after the TTL, bounding the staleness of any change that is not invalidated.
+    """
+
+    def __init__(
+        self,
+        get_session: Callable[[], AsyncContextManager[AsyncSession]],
+        max_conversations: int,
+        ttl_seconds: float,
+    ) -> None:
+        self._get_session = get_session
+        self._cache = cachetools.TTLCache[uuid.UUID, ConversationParticipants](
+            maxsize=max_conversations, ttl=ttl_seconds
+        )
+        # incremented on every invalidation, so that a read that overlaps an invalidation is not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, conversation_id: uuid.UUID) -> ConversationParticipants:
+        participants = self._cache.get(conversation_id)
+        if participants is not None:
+            self.hits += 1
+            return participants
+
+        self.misses += 1
+        generation = self._generation
+
+        async with self._get_session() as session:
+            assistant_ids = (
+                await session.exec(
+                    select(db.Assistant.assistant_id)
+                    .join(
+                        db.AssistantParticipant,
+                        col(db.Assistant.assistant_id) == col(db.AssistantParticipant.assistant_id),
+                    )
+                    .join(db.AssistantServiceRegistration)
+                    .where(col(db.AssistantServiceRegistration.assistant_service_online).is_(True))
+                    .where(col(db.AssistantParticipant.active_participant).is_(True))
+                    .where(db.AssistantParticipant.conversation_id == conversation_id)
+                )
+            ).all()
+
+            user_ids = (
+                await session.exec(
+                    select(db.UserParticipant.user_id).where(
+                        col(db.UserParticipant.active_participant).is_(True),
+                        db.UserParticipant.conversation_id == conversation_id,
+                    )
+                )
+            ).all()
+
+        participants = ConversationParticipants(assistant_ids=frozenset(assistant_ids), user_ids=frozenset(user_ids))
+        if generation == self._generation:
+            self._cache[conversation_id] = participants
+
+        return participants
+
+    def invalidate(self, conversation_id: uuid.UUID) -> None:
+        self._generation += 1
+        self._cache.pop(conversation_id, None)
+
+    def invalidate_all(self) -> None:
+        self._generation += 1
+        self._cache.clear()
@@ -1,7 +1,7 @@
 from typing import Any, TypeVar
 
 from semantic_workbench_api_model.workbench_model import MessageType
-from sqlalchemy import Function
+from sqlalchemy import Float, Function, column, literal_column, table
 from sqlmodel import and_, col, func, literal, or_, select
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
@@ -131,37 +131,25 @@ def select_conversation_projections_for(
         select_query=select_query,
     )
 
-    latest_message_subquery = (
-        select(
-            db.ConversationMessage.conversation_id,
-            func.max(db.ConversationMessage.sequence).label("latest_message_sequence"),
-        )
-        .where(col(db.ConversationMessage.message_type).in_(latest_message_types))
-        .group_by(col(db.ConversationMessage.conversation_id))
-        .subquery()
+    # the latest message of the requested types is looked up from the per-type latest messages of each conversation,
+    # so the cost is proportional to the number of conversations listed, rather than the number of messages
+    latest_message_sequence = (
+        select(func.max(db.ConversationLatestMessage.message_sequence))
+        .where(db.ConversationLatestMessage.conversation_id == db.Conversation.conversation_id)
+        .where(col(db.ConversationLatestMessage.message_type).in_(latest_message_types))
+        .correlate(db.Conversation)
+        .scalar_subquery()
     )
 
-    return (
-        query.join_from(
-            db.Conversation,
-            latest_message_subquery,
-            onclause=col(db.Conversation.conversation_id) == col(latest_message_subquery.c.conversation_id),
-            isouter=True,
-        )
-        .join_from(
-            db.Conversation,
-            db.ConversationMessage,
-            onclause=and_(
-                col(db.Conversation.conversation_id) == col(db.ConversationMessage.conversation_id),
-                col(db.ConversationMessage.sequence) == col(latest_message_subquery.c.latest_message_sequence),
-            ),
-            isouter=True,
-        )
-        .join_from(
-            db.ConversationMessage,
-            db.ConversationMessageDebug,
-            isouter=True,
-        )
+    return query.join_from(
+        db.Conversation,
+        db.ConversationMessage,
+        onclause=col(db.ConversationMessage.sequence) == latest_message_sequence,
+        isouter=True,
+    ).join_from(
+        db.ConversationMessage,
+        db.ConversationMessageDebug,
+        isouter=True,
     )
 
 
@@ -200,6 +188,59 @@ def select_conversation_message_projections_for(
     )
 
 
+def _message_search_terms(search_text: str) -> str:
+    # each term is quoted as an FTS5 string, so that the search text is matched as words, rather than parsed as a
+    # query, and the terms are implicitly AND-ed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in search_text.split())
+
+
+def select_conversation_message_search_for(
+    principal: auth.ActorPrincipal,
+    search_text: str,
+) -> Select[db.ConversationMessage, bool, float]:
+    """
+    Selects the messages, in the conversations the principal can read, that match the search text, with a score
+    that ranks the better matches higher.
+    """
+    conversation_ids = _select_conversations_for(
+        principal=principal,
+        select_query=select(db.Conversation.conversation_id),
+        include_observer=True,
+    )
+
+    if settings.db.url.startswith("sqlite"):
+        search_table = table(db.MESSAGE_SEARCH_TABLE, column("rowid"))
+        search_column = literal_column(db.MESSAGE_SEARCH_TABLE)
+        # bm25 is lower for better matches
+        score = (-func.bm25(search_column, type_=Float)).label("score")
+        query = (
+            select(db.ConversationMessage, col(db.ConversationMessageDebug.message_id).is_not(None), score)
+            .join_from(
+                db.ConversationMessage,
+                search_table,
+                onclause=search_table.c.rowid == db.ConversationMessage.sequence,
+            )
+            .where(search_column.op("MATCH")(_message_search_terms(search_text)))
+        )
+
+    else:
+        # the expression must match the expression of the GIN index for the index to be used
+        regconfig = literal_column("'english'::regconfig")
+        document = func.to_tsvector(regconfig, db.ConversationMessage.content)
+        # the search text is matched as words that are AND-ed, as on sqlite, rather than parsed as a query
+        search_query = func.plainto_tsquery(regconfig, search_text)
+        score = func.ts_rank(document, search_query, type_=Float).label("score")
+        query = select(db.ConversationMessage, col(db.ConversationMessageDebug.message_id).is_not(None), score).where(
+            document.op("@@")(search_query)
+        )
+
+    return (
+        query.join_from(db.ConversationMessage, db.ConversationMessageDebug, isouter=True)
+        .where(col(db.ConversationMessage.conversation_id).in_(conversation_ids))
+        .order_by(score.desc(), col(db.ConversationMessage.sequence).desc())
+    )
+
+
 def select_conversation_message_debugs_for(
     principal: auth.ActorPrincipal,
 ) -> SelectOfScalar[db.ConversationMessageDebug]:
@@ -0,0 +1,174 @@
+import bisect
+import collections
+import contextlib
+import contextvars
+import logging
+import re
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterator
+
+import sqlalchemy.event
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (1.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1_000.0, 2_500.0)
+"""
+The upper bounds of the latency histogram buckets; a final bucket counts the statements slower than all of them.
+"""
+
+OTHER_STATEMENTS = "<other>"
+
+# runs of bind parameters, such as those of expanded IN clauses, are collapsed so that a statement is counted as one,
+# whatever the number of values it was executed with
+_BIND_PARAMETER = r"(?:\?|\$\d+|%\(\w+\)s|:\w+)"
+_BIND_PARAMETER_LIST = re.compile(rf"\(\s*{_BIND_PARAMETER}(?:\s*,\s*{_BIND_PARAMETER})+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    return _BIND_PARAMETER_LIST.sub("(?, ...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class StatementStats(BaseModel):
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    # the number of executions per latency bucket, in the order of latency_buckets_ms, followed by the overflow bucket
+    histogram: list[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+class RepeatedStatement(BaseModel):
+    request: str
+    statement: str
+    count: int
+
+
+class QueryDiagnostics(BaseModel):
+    enabled: bool
+    latency_buckets_ms: list[float] = list(LATENCY_BUCKETS_MS)
+    # sorted by total time, descending
+    statements: list[StatementStats] = []
+    # the most recent requests that executed the same statement repeatedly, which usually indicates an N+1 query
+    repeated_statements: list[RepeatedStatement] = []
+
+
+class QueryInstrumentation:
+    """
+    Records the count and latency of each distinct SQL statement executed through the attached engines, and reports
+    requests that execute the same statement repeatedly.
+    """
+
+    def __init__(
+        self,
+        repeated_statement_threshold: int,
+        max_statements: int = 1_000,
+        max_repeated_statements: int = 100,
+    ) -> None:
+        self._repeated_statement_threshold = repeated_statement_threshold
+        self._max_statements = max_statements
+        self._statements: dict[str, StatementStats] = {}
+        self._repeated_statements = collections.deque[RepeatedStatement](maxlen=max_repeated_statements)
+        self._request_statements = contextvars.ContextVar[collections.Counter[str] | None](
+            "request_statements", default=None
+        )
+
+    def attach(self, engine: AsyncEngine) -> None:
+        sqlalchemy.event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        sqlalchemy.event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def detach(self, engine: AsyncEngine) -> None:
+        sqlalchemy.event.remove(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        sqlalchemy.event.remove(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn: sqlalchemy.Connection, *args: Any) -> None:
+        conn.info.setdefault("query_instrumentation_start_times", []).append(perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: sqlalchemy.Connection,
+        cursor: Any,
+        statement: str,
+        *args: Any,
+    ) -> None:
+        elapsed_ms = (perf_counter() - conn.info["query_instrumentation_start_times"].pop()) * 1000
+        self.record(statement, elapsed_ms)
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        normalized = normalize_statement(statement)
+
+        stats = self._statements.get(normalized)
+        if stats is None:
+            if len(self._statements) >= self._max_statements:
+                normalized = OTHER_STATEMENTS
+            stats = self._statements.setdefault(normalized, StatementStats(statement=normalized))
+
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+        request_statements = self._request_statements.get()
+        if request_statements is not None:
+            request_statements[normalized] += 1
+
+    @contextlib.contextmanager
+    def request_scope(self, describe_request: Callable[[], str]) -> Iterator[None]:
+        """
+        Counts the statements executed within the scope, reporting those executed repeatedly, as described by
+        describe_request, when the scope exits.
+        """
+        request_statements = collections.Counter[str]()
+        token = self._request_statements.set(request_statements)
+        try:
+            yield
+        finally:
+            self._request_statements.reset(token)
+
+            repeated = [
+                (statement, count)
+                for statement, count in request_statements.items()
+                if count >= self._repeated_statement_threshold
+            ]
+            if repeated:
+                request = describe_request()
+                for statement, count in repeated:
+                    logger.warning(
+                        "statement executed repeatedly in one request; request: %s, count: %d, statement: %s",
+                        request,
+                        count,
+                        statement,
+                    )
+                    self._repeated_statements.append(
+                        RepeatedStatement(request=request, statement=statement, count=count)
+                    )
+
+    def middleware(self) -> Callable[[Request, Callable[[Request], Awaitable[Response]]], Awaitable[Response]]:
+        async def middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+            def describe_request() -> str:
+                # the route path template groups the requests for the same endpoint
+                route = request.scope.get("route")
+                return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+            with self.request_scope(describe_request):
+                return await call_next(request)
+
+        return middleware
+
+    def diagnostics(self) -> QueryDiagnostics:
+        return QueryDiagnostics(
+            enabled=True,
+            statements=sorted(
+                (stats.model_copy(deep=True) for stats in self._statements.values()),
+                key=lambda stats: stats.total_ms,
+                reverse=True,
+            ),
+            repeated_statements=list(self._repeated_statements),
+        )
+
+    def reset(self) -> None:
+        self._statements.clear()
+        self._repeated_statements.clear()
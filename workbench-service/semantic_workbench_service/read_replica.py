@@ -0,0 +1,123 @@
+import collections
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncContextManager, AsyncIterator, Callable, Generic, Protocol, TypeVar
+
+import sqlalchemy.event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import auth, db
+
+K = TypeVar("K")
+
+
+@dataclass
+class ReadReplicaRouterMetrics:
+    replica_reads: int = 0
+    primary_reads: int = 0
+    """
+    Reads routed to the primary while a replica is configured, because the user wrote recently, or the conversation
+    read was written to recently, or because they were made on behalf of an assistant, or of no principal.
+    """
+
+
+class GetReadSession(Protocol):
+    def __call__(self, conversation_id: uuid.UUID | None = None) -> AsyncContextManager[AsyncSession]: ...
+
+
+class ReadReplicaRouter:
+    """
+    Creates the sessions of the controllers. Sessions for writes, and for reads that must be consistent with them,
+    use the primary engine. Sessions for read-only controller methods use the replica engine, if there is one.
+
+    So that users read their own writes, despite the replica lagging the primary, the reads of a user are routed to
+    the primary for pin_seconds after they commit a write. So that users also read the writes of others, which they
+    refetch in response to the conversation's events, the reads of a conversation are routed to the primary for
+    pin_seconds after an event of the conversation. Assistants always read from the primary, as they read
+    conversations in response to the events of writes by other principals, such as the messages they respond to.
+    Reads made outside of requests, which have no principal, also use the primary.
+    """
+
+    def __init__(
+        self,
+        get_primary_engine: Callable[[], AsyncEngine],
+        get_replica_engine: Callable[[], AsyncEngine | None],
+        pin_seconds: float,
+        max_pinned_users: int = 10_000,
+        max_pinned_conversations: int = 10_000,
+    ) -> None:
+        self._get_primary_engine = get_primary_engine
+        self._get_replica_engine = get_replica_engine
+        self._pinned_users = _Pins[str](pin_seconds=pin_seconds, max_size=max_pinned_users)
+        self._pinned_conversations = _Pins[uuid.UUID](pin_seconds=pin_seconds, max_size=max_pinned_conversations)
+        self._metrics = ReadReplicaRouterMetrics()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        async with db.create_session(self._get_primary_engine()) as session:
+            principal = auth.authenticated_principal.get()
+            if isinstance(principal, auth.UserPrincipal) and self._get_replica_engine() is not None:
+                user_id = principal.user_id
+                sqlalchemy.event.listen(session.sync_session, "after_commit", lambda _: self._pinned_users.pin(user_id))
+            yield session
+
+    def read_session(self, conversation_id: uuid.UUID | None = None) -> AsyncContextManager[AsyncSession]:
+        """
+        Returns a session for reads, of the given conversation if any.
+        """
+        replica_engine = self._get_replica_engine()
+        if replica_engine is None:
+            return self.session()
+
+        principal = auth.authenticated_principal.get()
+        if (
+            not isinstance(principal, auth.UserPrincipal)
+            or self._pinned_users.is_pinned(principal.user_id)
+            or (conversation_id is not None and self._pinned_conversations.is_pinned(conversation_id))
+        ):
+            self._metrics.primary_reads += 1
+            return self.session()
+
+        self._metrics.replica_reads += 1
+        return db.create_session(replica_engine)
+
+    def pin_conversation(self, conversation_id: uuid.UUID) -> None:
+        """
+        Routes the reads of the conversation to the primary for pin_seconds, as after an event of a write to it.
+        """
+        if self._get_replica_engine() is None:
+            return
+        self._pinned_conversations.pin(conversation_id)
+
+    def metrics(self) -> ReadReplicaRouterMetrics:
+        return self._metrics
+
+
+class _Pins(Generic[K]):
+    """
+    The keys pinned to the primary, each until pin_seconds after it was last pinned, evicting the least recently
+    pinned keys beyond max_size.
+    """
+
+    def __init__(self, pin_seconds: float, max_size: int) -> None:
+        self._pin_seconds = pin_seconds
+        self._max_size = max_size
+        self._pinned_until = collections.OrderedDict[K, float]()
+
+    def pin(self, key: K) -> None:
+        self._pinned_until[key] = time.monotonic() + self._pin_seconds
+        self._pinned_until.move_to_end(key)
+        while len(self._pinned_until) > self._max_size:
+            self._pinned_until.popitem(last=False)
+
+    def is_pinned(self, key: K) -> bool:
+        pinned_until = self._pinned_until.get(key)
+        if pinned_until is None:
+            return False
+        if pinned_until > time.monotonic():
+            return True
+        del self._pinned_until[key]
+        return False
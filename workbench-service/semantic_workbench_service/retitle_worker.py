@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Annotated, Awaitable, Callable
+
+import openai_client
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel, Field, HttpUrl
+
+from . import auth, settings
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationTitleResponse(BaseModel):
+    """Model for responses from LLM for automatic conversation re-titling."""
+
+    title: Annotated[
+        str,
+        Field(
+            description=(
+                "The updated title of the conversation. If the subject matter of the conversation has changed"
+                " significantly from the current title, suggest a short, but descriptive title for the conversation."
+                " Ideally 4 words or less in length. Leave it blank to keep the current title."
+            ),
+        ),
+    ]
+
+
+TitleCompletion = Callable[[list[ChatCompletionMessageParam]], Awaitable[str]]
+"""
+Completes a title for the conversation in the messages; returns an empty string to keep the current title.
+"""
+
+
+class AzureOpenAITitleCompletion:
+    """
+    Completes conversation titles through one Azure OpenAI client, created on first use, so that all completions
+    share its connection pool.
+    """
+
+    def __init__(self) -> None:
+        self._client: AsyncOpenAI | None = None
+
+    def _get_client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = openai_client.create_client(
+                openai_client.AzureOpenAIServiceConfig(
+                    auth_config=openai_client.AzureOpenAIAzureIdentityAuthConfig(),
+                    azure_openai_deployment=settings.service.azure_openai_deployment,
+                    azure_openai_endpoint=HttpUrl(settings.service.azure_openai_endpoint),
+                ),
+            )
+        return self._client
+
+    async def __call__(self, messages: list[ChatCompletionMessageParam]) -> str:
+        response = await self._get_client().beta.chat.completions.parse(
+            messages=messages,
+            model=settings.service.azure_openai_model,
+            # the model's description also contains instructions
+            response_format=ConversationTitleResponse,
+        )
+
+        if not response.choices:
+            raise RuntimeError("No choices in azure openai response")
+
+        result = response.choices[0].message.parsed
+        if result is None:
+            raise RuntimeError("No parsed result in azure openai response")
+
+        return result.title
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+@dataclass
+class RetitleWorkerMetrics:
+    pending_conversations: int = 0
+    requested: int = 0
+    coalesced: int = 0
+    """
+    Requests that were merged into a retitle already pending for the same conversation.
+    """
+    retitled: int = 0
+    failed: int = 0
+
+
+@dataclass
+class _PendingRetitle:
+    principal: auth.ActorPrincipal
+    latest_message_sequence: int
+    deadline: float
+    requested: bool = True
+    task: asyncio.Task | None = None
+
+
+class RetitleWorker:
+    """
+    Retitles conversations in the background. Each conversation is retitled debounce_seconds after the most recent
+    request for it, so that a burst of messages is coalesced into one retitle, with the latest of their sequences.
+    Requests made while a conversation is being retitled are coalesced into one more retitle, after it completes.
+
+    Up to max_concurrency conversations are retitled at a time.
+    """
+
+    def __init__(
+        self,
+        retitle: Callable[[auth.ActorPrincipal, uuid.UUID, int], Awaitable[None]],
+        debounce_seconds: float,
+        max_concurrency: int,
+    ) -> None:
+        self._retitle = retitle
+        self._debounce_seconds = debounce_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: dict[uuid.UUID, _PendingRetitle] = {}
+        self._metrics = RetitleWorkerMetrics()
+
+    def request(self, principal: auth.ActorPrincipal, conversation_id: uuid.UUID, latest_message_sequence: int) -> None:
+        self._metrics.requested += 1
+        deadline = time.monotonic() + self._debounce_seconds
+
+        pending = self._pending.get(conversation_id)
+        if pending is None:
+            pending = _PendingRetitle(
+                principal=principal, latest_message_sequence=latest_message_sequence, deadline=deadline
+            )
+            pending.task = asyncio.create_task(
+                self._run(conversation_id, pending), name=f"retitle_conversation_{conversation_id}"
+            )
+            self._pending[conversation_id] = pending
+            return
+
+        self._metrics.coalesced += 1
+        pending.principal = principal
+        pending.latest_message_sequence = max(pending.latest_message_sequence, latest_message_sequence)
+        pending.deadline = deadline
+        pending.requested = True
+
+    def metrics(self) -> RetitleWorkerMetrics:
+        self._metrics.pending_conversations = len(self._pending)
+        return self._metrics
+
+    async def aclose(self) -> None:
+        tasks = [pending.task for pending in self._pending.values() if pending.task]
+        for task in tasks:
+            task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, conversation_id: uuid.UUID, pending: _PendingRetitle) -> None:
+        try:
+            while pending.requested:
+                while (delay := pending.deadline - time.monotonic()) > 0:
+                    await asyncio.sleep(delay)
+
+                async with self._semaphore:
+                    # requests made from here on are retitled in the next iteration
+                    pending.requested = False
+                    try:
+                        await self._retitle(pending.principal, conversation_id, pending.latest_message_sequence)
+                        self._metrics.retitled += 1
+
+                    except Exception:
+                        self._metrics.failed += 1
+                        logger.exception("exception retitling conversation; conversation_id: %s", conversation_id)
+
+        finally:
+            self._pending.pop(conversation_id, None)
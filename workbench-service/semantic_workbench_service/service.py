@@ -3,9 +3,9 @@ import contextlib
 import datetime
 import json
 import logging
+import time
 import urllib.parse
 import uuid
-from collections import defaultdict
 from contextlib import asynccontextmanager
 from typing import (
     Annotated,
@@ -16,11 +16,11 @@ from typing import (
     NoReturn,
 )
 
-import asgi_correlation_id
-import starlette.background
+import sqlalchemy.pool
 from asgi_correlation_id import CorrelationIdMiddleware
 from fastapi import (
     BackgroundTasks,
+    Depends,
     FastAPI,
     File,
     Form,
@@ -32,7 +32,7 @@ from fastapi import (
     status,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from semantic_workbench_api_model.assistant_model import (
     ConfigPutRequestModel,
     ConfigResponseModel,
@@ -56,6 +56,7 @@ from semantic_workbench_api_model.workbench_model import (
     ConversationMessage,
     ConversationMessageDebug,
     ConversationMessageList,
+    ConversationMessageSearchResultList,
     ConversationParticipant,
     ConversationParticipantList,
     ConversationShare,
@@ -69,6 +70,7 @@ from semantic_workbench_api_model.workbench_model import (
     NewAssistantServiceRegistration,
     NewConversation,
     NewConversationMessage,
+    NewConversationMessageList,
     NewConversationShare,
     ParticipantRole,
     UpdateAssistant,
@@ -81,15 +83,57 @@ from semantic_workbench_api_model.workbench_model import (
     User,
     UserList,
 )
-from sqlmodel import col, select
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sse_starlette import EventSourceResponse, ServerSentEvent
 
 from semantic_workbench_service import azure_speech
 from semantic_workbench_service.logging_config import log_request_middleware
 
-from . import assistant_api_key, auth, controller, db, files, middleware, settings
+from . import (
+    assistant_api_key,
+    auth,
+    conditional_requests,
+    controller,
+    db,
+    event_bus,
+    files,
+    metrics,
+    middleware,
+    query_instrumentation,
+    settings,
+    sse_fan_out,
+)
+from .assistant_event_forwarder import AssistantEventForwarder, AssistantEventQueueMetrics
+from .assistant_service_liveness import AssistantServiceLiveness
 from .event import ConversationEventQueueItem
+from .event_log import ConversationEventLog, LoggedConversationEvent
+from .message_debug import MessageDebugStorage
+from .participant_cache import ParticipantCache
+from .read_replica import ReadReplicaRouter
+from .retitle_worker import AzureOpenAITitleCompletion, RetitleWorker, RetitleWorkerMetrics
+from .sse_fan_out import EncodedEvent, SseFanOut, SubscriberGroupMetrics
+
+RESYNC_EVENT = "resync"
+"""
+SSE event sent to reconnecting clients when the events they missed are no longer retained.
+"""
+
+USER_EVENT_TYPES = [
+    ConversationEventType.message_created,
+    ConversationEventType.message_deleted,
+    ConversationEventType.conversation_updated,
+    ConversationEventType.participant_created,
+    ConversationEventType.participant_updated,
+]
+"""
+The conversation event types that are also sent to the user SSE stream of each active user participant.
+"""
+
+PARTICIPANT_EVENT_TYPES = [
+    ConversationEventType.participant_created,
+    ConversationEventType.participant_updated,
+]
 
 logger = logging.getLogger(__name__)
 
@@ -101,118 +145,137 @@ def init(
     api_key_store = assistant_api_key.get_store()
     stop_signal: asyncio.Event = asyncio.Event()
 
-    conversation_sse_queues_lock = asyncio.Lock()
-    conversation_sse_queues: dict[uuid.UUID, set[asyncio.Queue[ConversationEvent]]] = defaultdict(set)
-
-    user_sse_queues_lock = asyncio.Lock()
-    user_sse_queues: dict[str, set[asyncio.Queue[ConversationEvent]]] = defaultdict(set)
-
-    assistant_event_queues: dict[uuid.UUID, asyncio.Queue[ConversationEvent]] = {}
+    conversation_sse = SseFanOut[uuid.UUID](
+        max_queue_size=settings.service.sse_max_queued_events,
+        policy=settings.service.sse_slow_consumer_policy,
+    )
+    user_sse = SseFanOut[str](
+        max_queue_size=settings.service.sse_max_queued_events,
+        policy=settings.service.sse_slow_consumer_policy,
+    )
 
     background_tasks: set[asyncio.Task] = set()
 
-    def _controller_get_session() -> AsyncContextManager[AsyncSession]:
-        return db.create_session(app.state.db_engine)
-
-    async def _forward_events_to_assistant(
-        assistant_id: uuid.UUID, event_queue: asyncio.Queue[ConversationEvent]
-    ) -> NoReturn:
-        while True:
-            try:
-                event = await event_queue.get()
-                event_queue.task_done()
+    read_replica_router = ReadReplicaRouter(
+        get_primary_engine=lambda: app.state.db_engine,
+        get_replica_engine=lambda: getattr(app.state, "db_read_engine", None),
+        pin_seconds=settings.db.read_replica_pin_seconds,
+    )
 
-                asgi_correlation_id.correlation_id.set(event.correlation_id)
+    def _controller_get_session() -> AsyncContextManager[AsyncSession]:
+        return read_replica_router.session()
 
-                start_time = datetime.datetime.now(datetime.UTC)
+    def _controller_get_read_session(conversation_id: uuid.UUID | None = None) -> AsyncContextManager[AsyncSession]:
+        return read_replica_router.read_session(conversation_id)
 
-                await assistant_controller.forward_event_to_assistant(assistant_id=assistant_id, event=event)
+    event_log = ConversationEventLog(
+        get_session=_controller_get_session,
+        max_events_per_conversation=settings.service.event_log_max_events_per_conversation,
+        max_cached_conversations=settings.service.event_log_max_cached_conversations,
+    )
 
-                end_time = datetime.datetime.now(datetime.UTC)
-                logger.debug(
-                    "forwarded event to assistant; assistant_id: %s, conversation_id: %s, event_id: %s,"
-                    " duration: %s, time since event: %s",
-                    assistant_id,
-                    event.conversation_id,
-                    event.id,
-                    end_time - start_time,
-                    end_time - event.timestamp,
-                )
+    participant_cache = ParticipantCache(
+        get_session=_controller_get_session,
+        max_conversations=settings.service.participant_cache_max_conversations,
+        ttl_seconds=settings.service.participant_cache_ttl_seconds,
+    )
 
-            except Exception:
-                logger.exception("exception in _forward_events_to_assistant")
+    conversation_event_bus = event_bus.create(
+        backend=settings.service.event_bus,
+        event_log=event_log,
+        channel=settings.service.event_bus_channel,
+        db_url=settings.db.url,
+        ssl=settings.db.postgresql_ssl_mode,
+    )
 
-    async def _notify_event(queue_item: ConversationEventQueueItem) -> None:
-        if stop_signal.is_set():
-            logger.warning(
-                "ignoring event due to stop signal; conversation_id: %s, event: %s, id: %s",
-                queue_item.event.conversation_id,
-                queue_item.event.event,
-                queue_item.event.id,
+    async def _log_events(events: list[ConversationEvent]) -> list[LoggedConversationEvent]:
+        try:
+            return await event_log.append_many(events)
+        except Exception:
+            # the events are still delivered to connected clients, but cannot be replayed
+            logger.exception(
+                "failed to append events to event log; conversation_ids: %s, event_ids: %s",
+                sorted({str(event.conversation_id) for event in events}),
+                [event.id for event in events],
             )
-            return
+            return [LoggedConversationEvent(sequence=None, event=event) for event in events]
 
-        logger.debug(
-            "received event to notify; conversation_id: %s, event: %s, event_id: %s, audience: %s",
-            queue_item.event.conversation_id,
-            queue_item.event.event,
-            queue_item.event.id,
-            queue_item.event_audience,
+    def _last_event_sequence(request: Request) -> int | None:
+        last_event_id = request.headers.get("last-event-id")
+        if not last_event_id:
+            return None
+        try:
+            return int(last_event_id)
+        except ValueError:
+            return None
+
+    def _server_sent_event_id(logged_event: LoggedConversationEvent) -> str:
+        if logged_event.sequence is None:
+            return logged_event.event.id
+        return str(logged_event.sequence)
+
+    def _encode_conversation_event(logged_event: LoggedConversationEvent) -> EncodedEvent:
+        return EncodedEvent(
+            sequence=logged_event.sequence,
+            data=ServerSentEvent(
+                id=_server_sent_event_id(logged_event),
+                event=logged_event.event.event.value,
+                data=logged_event.event.model_dump_json(include={"timestamp", "data"}),
+                retry=1000,
+            ).encode(),
+            coalesce_key=sse_fan_out.coalesce_key(logged_event.event),
         )
 
-        if "user" in queue_item.event_audience:
-            enqueued_count = 0
-            async with conversation_sse_queues_lock:
-                for queue in conversation_sse_queues.get(queue_item.event.conversation_id, {}):
-                    enqueued_count += 1
-                    await queue.put(queue_item.event)
+    def _encode_user_event(logged_event: LoggedConversationEvent) -> EncodedEvent:
+        return EncodedEvent(
+            sequence=logged_event.sequence,
+            data=ServerSentEvent(
+                id=_server_sent_event_id(logged_event),
+                event=logged_event.event.event.value,
+                data=json.dumps({
+                    **logged_event.event.model_dump(mode="json", include={"timestamp", "data"}),
+                    "conversation_id": str(logged_event.event.conversation_id),
+                }),
+                retry=1000,
+            ).encode(),
+            coalesce_key=sse_fan_out.coalesce_key(logged_event.event),
+        )
 
+    async def _notify_events(queue_items: list[ConversationEventQueueItem]) -> None:
+        """
+        Notifies the events, in order. The events for users are appended to the event log in one transaction.
+        """
+        if stop_signal.is_set():
+            for queue_item in queue_items:
+                logger.warning(
+                    "ignoring event due to stop signal; conversation_id: %s, event: %s, id: %s",
+                    queue_item.event.conversation_id,
+                    queue_item.event.event,
+                    queue_item.event.id,
+                )
+            return
+
+        for queue_item in queue_items:
             logger.debug(
-                "enqueued event for SSE; count: %d, conversation_id: %s, event: %s, event_id: %s",
-                enqueued_count,
+                "received event to notify; conversation_id: %s, event: %s, event_id: %s, audience: %s",
                 queue_item.event.conversation_id,
                 queue_item.event.event,
                 queue_item.event.id,
+                queue_item.event_audience,
             )
 
-            if queue_item.event.event in [
-                ConversationEventType.message_created,
-                ConversationEventType.message_deleted,
-                ConversationEventType.conversation_updated,
-                ConversationEventType.participant_created,
-                ConversationEventType.participant_updated,
-            ]:
-                task = asyncio.create_task(_notify_user_event(queue_item.event), name="notify_user_event")
-                background_tasks.add(task)
-                task.add_done_callback(background_tasks.discard)
-
-        if "assistant" in queue_item.event_audience:
-            async with _controller_get_session() as session:
-                assistant_ids = (
-                    await session.exec(
-                        select(db.Assistant.assistant_id)
-                        .join(
-                            db.AssistantParticipant,
-                            col(db.Assistant.assistant_id) == col(db.AssistantParticipant.assistant_id),
-                        )
-                        .join(db.AssistantServiceRegistration)
-                        .where(col(db.AssistantServiceRegistration.assistant_service_online).is_(True))
-                        .where(col(db.AssistantParticipant.active_participant).is_(True))
-                        .where(db.AssistantParticipant.conversation_id == queue_item.event.conversation_id)
-                    )
-                ).all()
-
-            for assistant_id in assistant_ids:
-                if assistant_id not in assistant_event_queues:
-                    queue = asyncio.Queue()
-                    assistant_event_queues[assistant_id] = queue
-                    task = asyncio.create_task(
-                        _forward_events_to_assistant(assistant_id, queue),
-                        name=f"forward_events_to_{assistant_id}",
-                    )
-                    background_tasks.add(task)
-
-                await assistant_event_queues[assistant_id].put(queue_item.event)
+        user_events = [queue_item.event for queue_item in queue_items if "user" in queue_item.event_audience]
+        if user_events:
+            for logged_event in await _log_events(user_events):
+                await conversation_event_bus.publish(logged_event)
+
+        # events are forwarded to assistants only by the process in which they occur
+        for queue_item in queue_items:
+            if "assistant" not in queue_item.event_audience:
+                continue
+            participants = await participant_cache.get(queue_item.event.conversation_id)
+            for assistant_id in participants.assistant_ids:
+                assistant_event_forwarder.enqueue(assistant_id, queue_item.event)
                 logger.debug(
                     "enqueued event for assistant; conversation_id: %s, event: %s, event_id: %s, assistant_id: %s",
                     queue_item.event.conversation_id,
@@ -221,29 +284,56 @@ def init(
                     assistant_id,
                 )
 
-    async def _notify_user_event(event: ConversationEvent) -> None:
-        listening_user_ids = set(user_sse_queues.keys())
-        async with _controller_get_session() as session:
-            active_user_participants = (
-                await session.exec(
-                    select(db.UserParticipant.user_id).where(
-                        col(db.UserParticipant.active_participant).is_(True),
-                        db.UserParticipant.conversation_id == event.conversation_id,
-                        col(db.UserParticipant.user_id).in_(listening_user_ids),
-                    )
-                )
-            ).all()
+    async def _notify_event(queue_item: ConversationEventQueueItem) -> None:
+        await _notify_events([queue_item])
+
+    async def _fan_out_event(logged_event: LoggedConversationEvent) -> None:
+        event = logged_event.event
+
+        # subscribers refetch the conversation in response to its events, which must not be served by a replica that
+        # has yet to receive the write
+        read_replica_router.pin_conversation(event.conversation_id)
+
+        # participant events published by other processes invalidate this process's cached participants
+        if event.event in PARTICIPANT_EVENT_TYPES:
+            participant_cache.invalidate(event.conversation_id)
+
+        enqueued_count = 0
+        if conversation_sse.has_subscribers(event.conversation_id):
+            # encoded once, for all of the conversation's subscribers
+            enqueued_count = conversation_sse.publish(event.conversation_id, _encode_conversation_event(logged_event))
+
+        logger.debug(
+            "enqueued event for SSE; count: %d, conversation_id: %s, event: %s, event_id: %s",
+            enqueued_count,
+            event.conversation_id,
+            event.event,
+            event.id,
+        )
 
+        if event.event in USER_EVENT_TYPES:
+            task = asyncio.create_task(_notify_user_event(logged_event), name="notify_user_event")
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+    conversation_event_bus.subscribe(_fan_out_event)
+
+    async def _notify_user_event(logged_event: LoggedConversationEvent) -> None:
+        event = logged_event.event
+        if not user_sse.keys():
+            return
+
+        participants = await participant_cache.get(event.conversation_id)
+        active_user_participants = participants.user_ids.intersection(user_sse.keys())
         if not active_user_participants:
             return
 
-        async with user_sse_queues_lock:
-            for user_id in active_user_participants:
-                for queue in user_sse_queues.get(user_id, {}):
-                    await queue.put(event)
-                    logger.debug(
-                        "enqueued event for user SSE; user_id: %s, conversation_id: %s", user_id, event.conversation_id
-                    )
+        encoded_event = _encode_user_event(logged_event)
+        for user_id in active_user_participants:
+            user_sse.publish(user_id, encoded_event)
+            logger.debug(
+                "enqueued event for user SSE; user_id: %s, conversation_id: %s", user_id, event.conversation_id
+            )
 
     assistant_client_pool = controller.AssistantServiceClientPool(api_key_store=api_key_store)
 
@@ -252,6 +342,8 @@ def init(
         notify_event=_notify_event,
         api_key_store=api_key_store,
         client_pool=assistant_client_pool,
+        participant_cache=participant_cache,
+        liveness=AssistantServiceLiveness(),
     )
 
     app.add_middleware(
@@ -272,44 +364,165 @@ def init(
 
     app.middleware("http")(log_request_middleware())
 
+    metrics_registry = metrics.MetricsRegistry()
+    app.middleware("http")(
+        metrics.request_duration_middleware(
+            metrics_registry.histogram(
+                "workbench_http_request_duration_seconds",
+                "Duration of HTTP requests, until the response starts.",
+                label_names=("method", "route", "status"),
+            )
+        )
+    )
+
+    statement_instrumentation: query_instrumentation.QueryInstrumentation | None = None
+    if settings.db.query_instrumentation:
+        statement_instrumentation = query_instrumentation.QueryInstrumentation(
+            repeated_statement_threshold=settings.db.query_repeated_statement_threshold,
+        )
+        app.middleware("http")(statement_instrumentation.middleware())
+
+    file_storage = files.Storage(settings.storage)
+    message_debug_storage = MessageDebugStorage(
+        file_storage=file_storage, max_inline_bytes=settings.service.message_debug_max_inline_bytes
+    )
+
     user_controller = controller.UserController(get_session=_controller_get_session)
     assistant_controller = controller.AssistantController(
         get_session=_controller_get_session,
         notify_event=_notify_event,
         client_pool=assistant_client_pool,
-        file_storage=files.Storage(settings.storage),
+        file_storage=file_storage,
+        participant_cache=participant_cache,
+        message_debug_storage=message_debug_storage,
+        get_read_session=_controller_get_read_session,
+    )
+    assistant_forward_duration = metrics_registry.histogram(
+        "workbench_assistant_event_forward_duration_seconds",
+        "Duration of requests forwarding batches of events to assistants.",
+        label_names=("outcome",),
     )
+    assistant_forward_batch_size = metrics_registry.histogram(
+        "workbench_assistant_event_forward_batch_size",
+        "Number of events in the batches forwarded to assistants.",
+        buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+    )
+
+    async def _forward_events_to_assistant(assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
+        assistant_forward_batch_size.observe(len(events))
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            await assistant_controller.forward_events_to_assistant(assistant_id=assistant_id, events=events)
+            outcome = "success"
+        finally:
+            assistant_forward_duration.observe(time.perf_counter() - start_time, outcome=outcome)
+
+    assistant_event_forwarder = AssistantEventForwarder(
+        deliver=_forward_events_to_assistant,
+        max_queue_size=settings.service.assistant_event_queue_max_size,
+        max_batch_size=settings.service.assistant_event_batch_max_size,
+        max_batch_latency_seconds=settings.service.assistant_event_batch_max_latency_seconds,
+        idle_timeout_seconds=settings.service.assistant_event_queue_idle_timeout_seconds,
+    )
+
+    title_completion = AzureOpenAITitleCompletion()
+
+    def _request_retitle(
+        principal: auth.ActorPrincipal, conversation_id: uuid.UUID, latest_message_sequence: int
+    ) -> None:
+        retitle_worker.request(principal, conversation_id, latest_message_sequence)
+
     conversation_controller = controller.ConversationController(
         get_session=_controller_get_session,
         notify_event=_notify_event,
+        notify_events=_notify_events,
         assistant_controller=assistant_controller,
+        participant_cache=participant_cache,
+        message_debug_storage=message_debug_storage,
+        request_retitle=_request_retitle,
+        complete_title=title_completion,
+        get_read_session=_controller_get_read_session,
     )
     conversation_share_controller = controller.ConversationShareController(
         get_session=_controller_get_session,
         notify_event=_notify_event,
+        participant_cache=participant_cache,
+    )
+
+    async def _retitle_conversation(
+        principal: auth.ActorPrincipal, conversation_id: uuid.UUID, latest_message_sequence: int
+    ) -> None:
+        await conversation_controller.retitle_conversation(
+            principal=principal, conversation_id=conversation_id, latest_message_sequence=latest_message_sequence
+        )
+
+    retitle_worker = RetitleWorker(
+        retitle=_retitle_conversation,
+        debounce_seconds=settings.service.conversation_retitle_debounce_seconds,
+        max_concurrency=settings.service.conversation_retitle_max_concurrency,
     )
 
     file_controller = controller.FileController(
         get_session=_controller_get_session,
         notify_event=_notify_event,
-        file_storage=files.Storage(settings.storage),
+        file_storage=file_storage,
+    )
+
+    controller_duration = metrics_registry.histogram(
+        "workbench_controller_call_duration_seconds",
+        "Duration of controller calls.",
+        label_names=("component", "method", "outcome"),
+    )
+    for component, instrumented_controller in {
+        "user": user_controller,
+        "assistant_service_registration": assistant_service_registration_controller,
+        "assistant": assistant_controller,
+        "conversation": conversation_controller,
+        "conversation_share": conversation_share_controller,
+        "file": file_controller,
+    }.items():
+        metrics.instrument_methods(instrumented_controller, controller_duration, component=component)
+
+    _register_collected_metrics(
+        metrics_registry,
+        sse_fan_outs={"conversation": conversation_sse, "user": user_sse},
+        assistant_event_forwarder=assistant_event_forwarder,
+        retitle_worker=retitle_worker,
+        read_replica_router=read_replica_router,
+        get_db_engine=lambda: getattr(app.state, "db_engine", None),
     )
 
     @asynccontextmanager
     async def _lifespan() -> AsyncIterator[None]:
-        async with db.create_engine(settings.db) as engine:
+        async with db.create_engine(settings.db) as engine, contextlib.AsyncExitStack() as read_engine_stack:
             await db.bootstrap_db(engine, settings=settings.db)
 
             app.state.db_engine = engine
+            if statement_instrumentation is not None:
+                statement_instrumentation.attach(engine)
+
+            app.state.db_read_engine = None
+            if settings.db.read_replica_url:
+                read_engine = await read_engine_stack.enter_async_context(
+                    db.create_engine(settings.db, url=settings.db.read_replica_url)
+                )
+                app.state.db_read_engine = read_engine
+                if statement_instrumentation is not None:
+                    statement_instrumentation.attach(read_engine)
 
             background_tasks.add(
                 asyncio.create_task(
                     _update_assistant_service_online_status(), name="update_assistant_service_online_status"
                 ),
             )
+            background_tasks.add(
+                asyncio.create_task(_purge_message_debugs(), name="purge_message_debugs"),
+            )
 
             try:
-                yield
+                async with conversation_event_bus.running():
+                    yield
 
             finally:
                 stop_signal.set()
@@ -320,6 +533,10 @@ def init(
                 with contextlib.suppress(asyncio.CancelledError):
                     await asyncio.gather(*background_tasks, return_exceptions=True)
 
+                await assistant_event_forwarder.aclose()
+                await retitle_worker.aclose()
+                await title_completion.aclose()
+
     register_lifespan_handler(_lifespan)
 
     async def _update_assistant_service_online_status() -> NoReturn:
@@ -331,10 +548,63 @@ def init(
             except Exception:
                 logger.exception("exception in _update_assistant_service_online_status")
 
+    async def _purge_message_debugs() -> NoReturn:
+        while True:
+            try:
+                if settings.service.message_debug_retention_days is not None:
+                    retention = datetime.timedelta(days=settings.service.message_debug_retention_days)
+                    await conversation_controller.purge_message_debugs(
+                        older_than=datetime.datetime.now(datetime.UTC) - retention,
+                        batch_size=settings.service.message_debug_purge_batch_size,
+                    )
+
+                await conversation_controller.delete_orphaned_message_debug_files()
+
+            except Exception:
+                logger.exception("exception in _purge_message_debugs")
+
+            await asyncio.sleep(settings.service.message_debug_purge_interval_seconds)
+
+    async def _conversation_etag(
+        conversation_id: uuid.UUID,
+        principal: auth.DependsActorPrincipal,
+        request: Request,
+        response: Response,
+    ) -> None:
+        """
+        Sets a weak ETag, derived from the conversation's version, on the response, and responds with 304 Not
+        Modified, without running the endpoint, when it matches the request's If-None-Match header.
+        """
+        version = await conversation_controller.get_conversation_version(
+            conversation_id=conversation_id, principal=principal
+        )
+        # the representations of the same version differ by principal, endpoint and query parameters
+        etag = conditional_requests.weak_etag(version, str(principal), request.url.path, request.url.query)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and conditional_requests.etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+
+    conversation_etag = [Depends(_conversation_etag)]
+
     @app.get("/")
     async def root() -> Response:
         return Response(status_code=status.HTTP_200_OK, content="")
 
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics() -> PlainTextResponse:
+        return PlainTextResponse(content=metrics_registry.expose(), media_type=metrics.CONTENT_TYPE)
+
+    @app.get("/diagnostics/queries")
+    async def get_query_diagnostics(
+        user_principal: auth.DependsUserPrincipal,
+    ) -> query_instrumentation.QueryDiagnostics:
+        if statement_instrumentation is None:
+            return query_instrumentation.QueryDiagnostics(enabled=False)
+        return statement_instrumentation.diagnostics()
+
     @app.get("/users")
     async def list_users(
         user_ids: list[str] = Query(alias="id"),
@@ -489,14 +759,13 @@ def init(
     async def export_assistant(
         user_principal: auth.DependsUserPrincipal,
         assistant_id: uuid.UUID,
-    ) -> FileResponse:
+    ) -> StreamingResponse:
         result = await assistant_controller.export_assistant(user_principal=user_principal, assistant_id=assistant_id)
 
-        return FileResponse(
-            path=result.file_path,
+        return StreamingResponse(
+            result.stream,
             media_type=result.content_type,
-            filename=result.filename,
-            background=starlette.background.BackgroundTask(result.cleanup),
+            headers={"Content-Disposition": f'attachment; filename="{urllib.parse.quote(result.filename)}"'},
         )
 
     @app.get(
@@ -506,16 +775,15 @@ def init(
     async def export_conversations(
         user_principal: auth.DependsUserPrincipal,
         conversation_ids: list[uuid.UUID] = Query(alias="id"),
-    ) -> FileResponse:
+    ) -> StreamingResponse:
         result = await assistant_controller.export_conversations(
             user_principal=user_principal, conversation_ids=set(conversation_ids)
         )
 
-        return FileResponse(
-            path=result.file_path,
+        return StreamingResponse(
+            result.stream,
             media_type=result.content_type,
-            filename=result.filename,
-            background=starlette.background.BackgroundTask(result.cleanup),
+            headers={"Content-Disposition": f'attachment; filename="{urllib.parse.quote(result.filename)}"'},
         )
 
     @app.post("/conversations/import")
@@ -614,6 +882,7 @@ def init(
             user_principal=user_principal,
             assistant_id=assistant_id,
         )
+        assistant_event_forwarder.remove(assistant_id)
 
     @app.get("/assistants/{assistant_id}/conversations")
     async def get_assistant_conversations(
@@ -647,14 +916,31 @@ def init(
             principal_id,
             conversation_id,
         )
-        event_queue = asyncio.Queue[ConversationEvent]()
+        subscriber = conversation_sse.subscribe(conversation_id)
 
-        async with conversation_sse_queues_lock:
-            queues = conversation_sse_queues[conversation_id]
-            queues.add(event_queue)
+        last_sequence = _last_event_sequence(request)
 
-        async def event_generator() -> AsyncIterator[ServerSentEvent]:
+        async def event_generator() -> AsyncIterator[ServerSentEvent | bytes]:
+            nonlocal last_sequence
             try:
+                if last_sequence is not None:
+                    # the subscriber queue is registered before the replay is read, so events logged in between
+                    # are received twice; those are skipped by sequence below
+                    replay = await event_log.conversation_events_after(conversation_id, last_sequence)
+                    logger.debug(
+                        "replaying events to sse client; conversation_id: %s, last_sequence: %d, count: %d,"
+                        " complete: %s",
+                        conversation_id,
+                        last_sequence,
+                        len(replay.events),
+                        replay.complete,
+                    )
+                    if not replay.complete:
+                        yield ServerSentEvent(event=RESYNC_EVENT, data="{}", retry=1000)
+                    for logged_event in replay.events:
+                        yield _encode_conversation_event(logged_event).data
+                        last_sequence = logged_event.sequence or last_sequence
+
                 while True:
                     if stop_signal.is_set():
                         logger.debug("sse stopping due to signal; conversation_id: %s", conversation_id)
@@ -671,39 +957,37 @@ def init(
                         break
 
                     try:
-                        try:
-                            async with asyncio.timeout(1):
-                                conversation_event = await event_queue.get()
-                        except asyncio.TimeoutError:
+                        encoded_event = await subscriber.get(timeout=1)
+
+                        if subscriber.disconnected:
+                            # the client reconnects, replaying the events it missed from the event log
+                            yield ServerSentEvent(event=RESYNC_EVENT, data="{}", retry=1000)
+                            break
+
+                        if encoded_event is None:
                             continue
 
-                        server_sent_event = ServerSentEvent(
-                            id=conversation_event.id,
-                            event=conversation_event.event.value,
-                            data=conversation_event.model_dump_json(include={"timestamp", "data"}),
-                            retry=1000,
-                        )
-                        yield server_sent_event
+                        if (
+                            encoded_event.sequence is not None
+                            and last_sequence is not None
+                            and encoded_event.sequence <= last_sequence
+                        ):
+                            continue
+
+                        yield encoded_event.data
                         logger.debug(
-                            "sent event to sse client; %s: %s, conversation_id: %s, event: %s, id: %s, time since"
-                            " event: %s",
+                            "sent event to sse client; %s: %s, conversation_id: %s, sequence: %s",
                             principal_id_type,
                             principal_id,
                             conversation_id,
-                            conversation_event.event,
-                            conversation_event.id,
-                            datetime.datetime.now(datetime.UTC) - conversation_event.timestamp,
+                            encoded_event.sequence,
                         )
 
                     except Exception:
                         logger.exception("error sending event to sse client; conversation_id: %s", conversation_id)
 
             finally:
-                queues.discard(event_queue)
-                if len(queues) == 0:
-                    async with conversation_sse_queues_lock:
-                        if len(queues) == 0:
-                            conversation_sse_queues.pop(conversation_id, None)
+                conversation_sse.unsubscribe(conversation_id, subscriber)
 
         return EventSourceResponse(event_generator(), sep="\n")
 
@@ -713,14 +997,36 @@ def init(
     ) -> EventSourceResponse:
         logger.debug("client connected to user events sse; user_id: %s", user_principal.user_id)
 
-        event_queue = asyncio.Queue[ConversationEvent]()
+        subscriber = user_sse.subscribe(user_principal.user_id)
 
-        async with user_sse_queues_lock:
-            queues = user_sse_queues[user_principal.user_id]
-            queues.add(event_queue)
+        last_sequence = _last_event_sequence(request)
 
-        async def event_generator() -> AsyncIterator[ServerSentEvent]:
+        async def event_generator() -> AsyncIterator[ServerSentEvent | bytes]:
+            # sequences are global, but only serialized per conversation, so events of other conversations can be
+            # received after the replay with lower sequences than the replayed events; only those replayed are skipped
+            replayed_sequences: set[int] = set()
             try:
+                if last_sequence is not None:
+                    replay = await event_log.user_events_after(
+                        user_id=user_principal.user_id,
+                        sequence=last_sequence,
+                        event_types=USER_EVENT_TYPES,
+                        limit=settings.service.event_log_max_events_per_conversation,
+                    )
+                    logger.debug(
+                        "replaying events to user sse client; user_id: %s, last_sequence: %d, count: %d, complete: %s",
+                        user_principal.user_id,
+                        last_sequence,
+                        len(replay.events),
+                        replay.complete,
+                    )
+                    if not replay.complete:
+                        yield ServerSentEvent(event=RESYNC_EVENT, data="{}", retry=1000)
+                    for logged_event in replay.events:
+                        yield _encode_user_event(logged_event).data
+                        if logged_event.sequence is not None:
+                            replayed_sequences.add(logged_event.sequence)
+
                 while True:
                     if stop_signal.is_set():
                         logger.debug("sse stopping due to signal; user_id: %s", user_principal.user_id)
@@ -737,37 +1043,32 @@ def init(
                         break
 
                     try:
-                        try:
-                            async with asyncio.timeout(1):
-                                conversation_event = await event_queue.get()
-                        except asyncio.TimeoutError:
+                        encoded_event = await subscriber.get(timeout=1)
+
+                        if subscriber.disconnected:
+                            # the client reconnects, replaying the events it missed from the event log
+                            yield ServerSentEvent(event=RESYNC_EVENT, data="{}", retry=1000)
+                            break
+
+                        if encoded_event is None:
                             continue
 
-                        server_sent_event = ServerSentEvent(
-                            id=conversation_event.id,
-                            event=conversation_event.event.value,
-                            data=json.dumps({
-                                **conversation_event.model_dump(mode="json", include={"timestamp", "data"}),
-                                "conversation_id": str(conversation_event.conversation_id),
-                            }),
-                            retry=1000,
-                        )
-                        yield server_sent_event
+                        if encoded_event.sequence in replayed_sequences:
+                            replayed_sequences.discard(encoded_event.sequence)
+                            continue
+
+                        yield encoded_event.data
                         logger.debug(
-                            "sent event to user sse client; user_id: %s, event: %s",
+                            "sent event to user sse client; user_id: %s, sequence: %s",
                             user_principal.user_id,
-                            server_sent_event.event,
+                            encoded_event.sequence,
                         )
 
                     except Exception:
                         logger.exception("error sending event to sse client; user_id: %s", user_principal.user_id)
 
             finally:
-                queues.discard(event_queue)
-                if len(queues) == 0:
-                    async with conversation_sse_queues_lock:
-                        if len(queues) == 0:
-                            user_sse_queues.pop(user_principal.user_id, None)
+                user_sse.unsubscribe(user_principal.user_id, subscriber)
 
         return EventSourceResponse(event_generator(), sep="\n")
 
@@ -815,7 +1116,7 @@ def init(
             latest_message_types=set(latest_message_types),
         )
 
-    @app.get("/conversations/{conversation_id}")
+    @app.get("/conversations/{conversation_id}", dependencies=conversation_etag)
     async def get_conversation(
         conversation_id: uuid.UUID,
         principal: auth.DependsActorPrincipal,
@@ -839,7 +1140,7 @@ def init(
             update_conversation=update_conversation,
         )
 
-    @app.get("/conversations/{conversation_id}/participants")
+    @app.get("/conversations/{conversation_id}/participants", dependencies=conversation_etag)
     async def list_conversation_participants(
         conversation_id: uuid.UUID,
         principal: auth.DependsActorPrincipal,
@@ -861,7 +1162,7 @@ def init(
             case auth.AssistantPrincipal():
                 return str(principal.assistant_id)
 
-    @app.get("/conversations/{conversation_id}/participants/{participant_id}")
+    @app.get("/conversations/{conversation_id}/participants/{participant_id}", dependencies=conversation_etag)
     async def get_conversation_participant(
         conversation_id: uuid.UUID,
         participant_id: str,
@@ -892,7 +1193,7 @@ def init(
             principal=principal,
         )
 
-    @app.get("/conversations/{conversation_id}/messages")
+    @app.get("/conversations/{conversation_id}/messages", dependencies=conversation_etag)
     async def list_conversation_messages(
         conversation_id: uuid.UUID,
         principal: auth.DependsActorPrincipal,
@@ -901,6 +1202,7 @@ def init(
         message_types: Annotated[list[MessageType] | None, Query(alias="message_type")] = None,
         before: Annotated[uuid.UUID | None, Query()] = None,
         after: Annotated[uuid.UUID | None, Query()] = None,
+        cursor: Annotated[str | None, Query()] = None,
         limit: Annotated[int, Query(lte=500)] = 100,
     ) -> ConversationMessageList:
         return await conversation_controller.get_messages(
@@ -911,6 +1213,41 @@ def init(
             message_types=message_types,
             before=before,
             after=after,
+            cursor=cursor,
+            limit=limit,
+        )
+
+    @app.get("/conversations/{conversation_id}/messages/search")
+    async def search_conversation_messages(
+        conversation_id: uuid.UUID,
+        principal: auth.DependsActorPrincipal,
+        q: Annotated[str, Query(min_length=1)],
+        message_types: Annotated[list[MessageType] | None, Query(alias="message_type")] = None,
+        cursor: Annotated[str | None, Query()] = None,
+        limit: Annotated[int, Query(gt=0, lte=100)] = 20,
+    ) -> ConversationMessageSearchResultList:
+        return await conversation_controller.search_messages(
+            principal=principal,
+            search_text=q,
+            conversation_id=conversation_id,
+            message_types=message_types,
+            cursor=cursor,
+            limit=limit,
+        )
+
+    @app.get("/messages/search")
+    async def search_messages(
+        principal: auth.DependsActorPrincipal,
+        q: Annotated[str, Query(min_length=1)],
+        message_types: Annotated[list[MessageType] | None, Query(alias="message_type")] = None,
+        cursor: Annotated[str | None, Query()] = None,
+        limit: Annotated[int, Query(gt=0, lte=100)] = 20,
+    ) -> ConversationMessageSearchResultList:
+        return await conversation_controller.search_messages(
+            principal=principal,
+            search_text=q,
+            message_types=message_types,
+            cursor=cursor,
             limit=limit,
         )
 
@@ -919,16 +1256,24 @@ def init(
         conversation_id: uuid.UUID,
         new_message: NewConversationMessage,
         principal: auth.DependsActorPrincipal,
-        background_tasks: BackgroundTasks,
     ) -> ConversationMessage:
-        response, task_args = await conversation_controller.create_conversation_message(
+        return await conversation_controller.create_conversation_message(
             conversation_id=conversation_id,
             new_message=new_message,
             principal=principal,
         )
-        if task_args:
-            background_tasks.add_task(*task_args)
-        return response
+
+    @app.post("/conversations/{conversation_id}/messages/batch")
+    async def create_conversation_messages(
+        conversation_id: uuid.UUID,
+        new_messages: NewConversationMessageList,
+        principal: auth.DependsActorPrincipal,
+    ) -> ConversationMessageList:
+        return await conversation_controller.create_conversation_messages(
+            conversation_id=conversation_id,
+            new_messages=new_messages.messages,
+            principal=principal,
+        )
 
     @app.get(
         "/conversations/{conversation_id}/messages/{message_id}",
@@ -946,17 +1291,20 @@ def init(
 
     @app.get(
         "/conversations/{conversation_id}/messages/{message_id}/debug_data",
+        response_model=ConversationMessageDebug,
     )
     async def get_message_debug_data(
         conversation_id: uuid.UUID,
         message_id: uuid.UUID,
         principal: auth.DependsActorPrincipal,
-    ) -> ConversationMessageDebug:
-        return await conversation_controller.get_message_debug(
+    ) -> StreamingResponse:
+        # debug payloads can be large, and are streamed as they are decompressed
+        content = await conversation_controller.get_message_debug(
             conversation_id=conversation_id,
             message_id=message_id,
             principal=principal,
         )
+        return StreamingResponse(content=content, media_type="application/json")
 
     @app.delete(
         "/conversations/{conversation_id}/messages/{message_id}",
@@ -997,7 +1345,7 @@ def init(
             file_metadata=file_metadata,
         )
 
-    @app.get("/conversations/{conversation_id}/files")
+    @app.get("/conversations/{conversation_id}/files", dependencies=conversation_etag)
     async def list_files(
         conversation_id: uuid.UUID,
         principal: auth.DependsActorPrincipal,
@@ -1021,8 +1369,9 @@ def init(
         conversation_id: uuid.UUID,
         filename: str,
         principal: auth.DependsActorPrincipal,
+        request: Request,
         version: int | None = None,
-    ) -> StreamingResponse:
+    ) -> Response:
         result = await file_controller.download_file(
             conversation_id=conversation_id,
             filename=filename,
@@ -1030,10 +1379,46 @@ def init(
             version=version,
         )
 
+        headers = {
+            "Content-Disposition": f'attachment; filename="{urllib.parse.quote(result.filename)}"',
+            "ETag": result.etag,
+            "Accept-Ranges": "bytes",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and conditional_requests.etag_matches(if_none_match, result.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        byte_range = None
+        range_header = request.headers.get("range")
+        if range_header is not None:
+            try:
+                byte_range = conditional_requests.byte_range(
+                    range_header, if_range=request.headers.get("if-range"), etag=result.etag, size=result.size
+                )
+            except conditional_requests.RangeNotSatisfiableError:
+                return Response(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "Content-Range": f"bytes */{result.size}"},
+                )
+
+        if byte_range is None:
+            return StreamingResponse(
+                result.read(0, None),
+                media_type=result.content_type,
+                headers={**headers, "Content-Length": str(result.size)},
+            )
+
+        start, stop = byte_range
         return StreamingResponse(
-            result.stream,
+            result.read(start, stop),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
             media_type=result.content_type,
-            headers={"Content-Disposition": f'attachment; filename="{urllib.parse.quote(result.filename)}"'},
+            headers={
+                **headers,
+                "Content-Length": str(stop - start),
+                "Content-Range": f"bytes {start}-{stop - 1}/{result.size}",
+            },
         )
 
     @app.patch("/conversations/{conversation_id}/files/{filename:path}")
@@ -1146,3 +1531,172 @@ def init(
     @app.get("/azure-speech/token")
     async def get_azure_speech_token() -> dict[str, str]:
         return azure_speech.get_token()
+
+
+def _register_collected_metrics(
+    registry: metrics.MetricsRegistry,
+    sse_fan_outs: dict[str, SseFanOut],
+    assistant_event_forwarder: AssistantEventForwarder,
+    retitle_worker: RetitleWorker,
+    read_replica_router: ReadReplicaRouter,
+    get_db_engine: Callable[[], AsyncEngine | None],
+) -> None:
+    """
+    Registers the metrics that are read from the service's queues and connection pool when they are scraped.
+    """
+
+    def sse_samples(value: Callable[[list[SubscriberGroupMetrics]], float]) -> Callable[[], list[metrics.Sample]]:
+        return lambda: [
+            ({"stream": stream}, value(list(fan_out.metrics().values()))) for stream, fan_out in sse_fan_outs.items()
+        ]
+
+    registry.callback(
+        "workbench_sse_subscribers",
+        "Number of connected SSE subscribers.",
+        "gauge",
+        sse_samples(lambda groups: sum(group.subscribers for group in groups)),
+    )
+    registry.callback(
+        "workbench_sse_queued_events",
+        "Number of events queued for SSE subscribers.",
+        "gauge",
+        sse_samples(lambda groups: sum(group.queue_depth for group in groups)),
+    )
+    registry.callback(
+        "workbench_sse_max_queued_events",
+        "Number of events queued for the most backlogged SSE subscriber.",
+        "gauge",
+        sse_samples(lambda groups: max((group.max_queue_depth for group in groups), default=0)),
+    )
+    registry.callback(
+        "workbench_sse_slow_consumer_events_total",
+        "Number of events dropped or coalesced for SSE subscribers that fell behind.",
+        "counter",
+        lambda: [
+            sample
+            for stream, fan_out in sse_fan_outs.items()
+            for sample in (
+                ({"stream": stream, "action": "dropped"}, fan_out.slow_consumer_metrics.dropped_events),
+                ({"stream": stream, "action": "coalesced"}, fan_out.slow_consumer_metrics.coalesced_events),
+            )
+        ],
+    )
+    registry.callback(
+        "workbench_sse_disconnected_subscribers_total",
+        "Number of SSE subscribers disconnected for falling behind.",
+        "counter",
+        lambda: [
+            ({"stream": stream}, fan_out.slow_consumer_metrics.disconnected_subscribers)
+            for stream, fan_out in sse_fan_outs.items()
+        ],
+    )
+
+    def assistant_queue_samples(
+        value: Callable[[list[AssistantEventQueueMetrics]], float],
+    ) -> Callable[[], list[metrics.Sample]]:
+        return lambda: [({}, value(list(assistant_event_forwarder.metrics().values())))]
+
+    registry.callback(
+        "workbench_assistant_event_queues",
+        "Number of assistant event queues.",
+        "gauge",
+        assistant_queue_samples(len),
+    )
+    registry.callback(
+        "workbench_assistant_event_queued_events",
+        "Number of events queued for forwarding to assistants.",
+        "gauge",
+        assistant_queue_samples(lambda queues: sum(queue.queue_length for queue in queues)),
+    )
+    registry.callback(
+        "workbench_assistant_event_max_queued_events",
+        "Number of events queued for the most backlogged assistant.",
+        "gauge",
+        assistant_queue_samples(lambda queues: max((queue.queue_length for queue in queues), default=0)),
+    )
+
+    def assistant_event_samples() -> list[metrics.Sample]:
+        queues = [*assistant_event_forwarder.metrics().values(), assistant_event_forwarder.removed_queue_metrics()]
+        return [
+            ({"action": action}, sum(getattr(queue, f"{action}_events") for queue in queues))
+            for action in ("enqueued", "dropped", "delivered")
+        ]
+
+    registry.callback(
+        "workbench_assistant_events_total",
+        "Number of events enqueued, dropped and delivered for forwarding to assistants.",
+        "counter",
+        assistant_event_samples,
+    )
+    registry.callback(
+        "workbench_assistant_event_max_batch_latency_seconds",
+        "Longest time from an event being enqueued to its batch being delivered to an assistant.",
+        "gauge",
+        assistant_queue_samples(lambda queues: max((queue.max_batch_latency_seconds for queue in queues), default=0)),
+    )
+
+    def retitle_samples(value: Callable[[RetitleWorkerMetrics], float]) -> Callable[[], list[metrics.Sample]]:
+        return lambda: [({}, value(retitle_worker.metrics()))]
+
+    registry.callback(
+        "workbench_conversation_retitles_pending",
+        "Number of conversations waiting to be, or being, retitled.",
+        "gauge",
+        retitle_samples(lambda worker_metrics: worker_metrics.pending_conversations),
+    )
+    registry.callback(
+        "workbench_conversation_retitle_requests_total",
+        "Number of conversation retitle requests, and of those coalesced into a pending retitle.",
+        "counter",
+        lambda: [
+            ({"action": "requested"}, retitle_worker.metrics().requested),
+            ({"action": "coalesced"}, retitle_worker.metrics().coalesced),
+        ],
+    )
+    registry.callback(
+        "workbench_conversation_retitles_total",
+        "Number of conversation retitles, by outcome.",
+        "counter",
+        lambda: [
+            ({"outcome": "success"}, retitle_worker.metrics().retitled),
+            ({"outcome": "error"}, retitle_worker.metrics().failed),
+        ],
+    )
+
+    registry.callback(
+        "workbench_db_routed_reads_total",
+        "Number of read-only sessions routed to the read replica, and to the primary while a replica is configured.",
+        "counter",
+        lambda: [
+            ({"target": "replica"}, read_replica_router.metrics().replica_reads),
+            ({"target": "primary"}, read_replica_router.metrics().primary_reads),
+        ],
+    )
+
+    def db_pool_samples(value: Callable[[sqlalchemy.pool.QueuePool], float]) -> Callable[[], list[metrics.Sample]]:
+        def collect() -> list[metrics.Sample]:
+            engine = get_db_engine()
+            if engine is None or not isinstance(engine.pool, sqlalchemy.pool.QueuePool):
+                return []
+            return [({}, value(engine.pool))]
+
+        return collect
+
+    registry.callback(
+        "workbench_db_pool_size",
+        "Number of connections the pool holds open.",
+        "gauge",
+        db_pool_samples(lambda p: p.size()),
+    )
+    registry.callback(
+        "workbench_db_pool_checked_out_connections",
+        "Number of pooled connections in use.",
+        "gauge",
+        db_pool_samples(lambda p: p.checkedout()),
+    )
+    registry.callback(
+        "workbench_db_pool_overflow_connections",
+        "Number of connections open beyond the pool size; negative while the pool is not yet full.",
+        "gauge",
+        db_pool_samples(lambda p: p.overflow()),
+    )
@@ -0,0 +1,197 @@
+import asyncio
+import collections
+import logging
+from dataclasses import dataclass
+from typing import Generic, Hashable, Literal, TypeVar
+
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+
+logger = logging.getLogger(__name__)
+
+SlowConsumerPolicy = Literal["drop", "coalesce", "disconnect"]
+"""
+What happens when an event is published to a subscriber whose queue is full:
+- drop: the oldest queued event is dropped
+- coalesce: a queued event that the new event supersedes, such as an earlier update of the same conversation,
+  participant or assistant state, is dropped; if there is none, the subscriber is disconnected
+- disconnect: the subscriber is disconnected, and sent a resync hint, so that it reconnects and replays the events
+  it missed from the event log
+"""
+
+
+@dataclass(frozen=True)
+class EncodedEvent:
+    """
+    An event encoded once, as the bytes of a server-sent event, for all of the subscribers it is published to.
+    """
+
+    sequence: int | None
+    data: bytes
+    coalesce_key: Hashable | None = None
+
+
+def coalesce_key(event: ConversationEvent) -> Hashable | None:
+    """
+    Returns a key shared by the events that carry the latest state of the same thing, where an event supersedes
+    the earlier events with the same key, or None for events that must each be delivered.
+    """
+    match event.event:
+        case ConversationEventType.conversation_updated:
+            return (event.event, event.conversation_id)
+        case ConversationEventType.participant_updated:
+            return (event.event, event.conversation_id, (event.data.get("participant") or {}).get("id"))
+        case ConversationEventType.assistant_state_updated:
+            return (event.event, event.conversation_id, event.data.get("assistant_id"), event.data.get("state_id"))
+    return None
+
+
+@dataclass
+class SubscriberGroupMetrics:
+    subscribers: int = 0
+    queue_depth: int = 0
+    """
+    The total number of events queued for the group's subscribers.
+    """
+    max_queue_depth: int = 0
+    """
+    The number of events queued for the group's most backlogged subscriber.
+    """
+
+
+@dataclass
+class SlowConsumerMetrics:
+    dropped_events: int = 0
+    coalesced_events: int = 0
+    disconnected_subscribers: int = 0
+
+
+class SseSubscriber:
+    """
+    A bounded queue of the encoded events for one SSE client.
+    """
+
+    def __init__(self, max_queue_size: int, policy: SlowConsumerPolicy, metrics: SlowConsumerMetrics) -> None:
+        self._max_queue_size = max_queue_size
+        self._policy: SlowConsumerPolicy = policy
+        self._metrics = metrics
+        self._queue = collections.deque[EncodedEvent]()
+        self._ready = asyncio.Event()
+        self.disconnected = False
+        """
+        Set when the subscriber fell too far behind, after which it receives no more events, and should be sent a
+        resync hint and closed.
+        """
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def put(self, event: EncodedEvent) -> None:
+        if self.disconnected:
+            return
+
+        if len(self._queue) >= self._max_queue_size and not self._make_room(event):
+            logger.warning(
+                "SSE subscriber queue is full, disconnecting subscriber; policy: %s, queue_depth: %d",
+                self._policy,
+                len(self._queue),
+            )
+            self._queue.clear()
+            self.disconnected = True
+            self._metrics.disconnected_subscribers += 1
+            self._ready.set()
+            return
+
+        self._queue.append(event)
+        self._ready.set()
+
+    def _make_room(self, event: EncodedEvent) -> bool:
+        match self._policy:
+            case "drop":
+                self._queue.popleft()
+                self._metrics.dropped_events += 1
+                return True
+
+            case "coalesce":
+                if event.coalesce_key is None:
+                    return False
+                for index, queued in enumerate(self._queue):
+                    if queued.coalesce_key == event.coalesce_key:
+                        del self._queue[index]
+                        self._metrics.coalesced_events += 1
+                        return True
+
+        return False
+
+    async def get(self, timeout: float) -> EncodedEvent | None:
+        """
+        Returns the next event, or None if there is none within the timeout, or the subscriber is disconnected.
+        """
+        if not self._queue:
+            self._ready.clear()
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._ready.wait()
+            except TimeoutError:
+                return None
+
+        if not self._queue:
+            return None
+        return self._queue.popleft()
+
+
+KeyT = TypeVar("KeyT", bound=Hashable)
+
+
+class SseFanOut(Generic[KeyT]):
+    """
+    Publishes encoded events to the SSE subscribers of a key, such as a conversation or user, without waiting on
+    any of them; each subscriber has a bounded queue, and falls behind according to the slow-consumer policy.
+    """
+
+    def __init__(self, max_queue_size: int, policy: SlowConsumerPolicy) -> None:
+        self._max_queue_size = max_queue_size
+        self._policy: SlowConsumerPolicy = policy
+        self._subscribers: dict[KeyT, set[SseSubscriber]] = {}
+        self.slow_consumer_metrics = SlowConsumerMetrics()
+
+    def subscribe(self, key: KeyT) -> SseSubscriber:
+        subscriber = SseSubscriber(
+            max_queue_size=self._max_queue_size, policy=self._policy, metrics=self.slow_consumer_metrics
+        )
+        self._subscribers.setdefault(key, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, key: KeyT, subscriber: SseSubscriber) -> None:
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[key]
+
+    def has_subscribers(self, key: KeyT) -> bool:
+        return key in self._subscribers
+
+    def keys(self) -> set[KeyT]:
+        return set(self._subscribers.keys())
+
+    def publish(self, key: KeyT, event: EncodedEvent) -> int:
+        """
+        Enqueues the event for each subscriber of the key, returning the number of subscribers.
+        """
+        subscribers = self._subscribers.get(key, set())
+        for subscriber in subscribers:
+            subscriber.put(event)
+        return len(subscribers)
+
+    def metrics(self) -> dict[KeyT, SubscriberGroupMetrics]:
+        metrics = {}
+        for key, subscribers in self._subscribers.items():
+            queue_depths = [subscriber.queue_depth for subscriber in subscribers]
+            metrics[key] = SubscriberGroupMetrics(
+                subscribers=len(queue_depths),
+                queue_depth=sum(queue_depths),
+                max_queue_depth=max(queue_depths, default=0),
+            )
+        return metrics
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import zipfile
+from typing import AsyncContextManager, AsyncGenerator, AsyncIterable, AsyncIterator, Callable, Sequence, TypeVar
+
+NameT = TypeVar("NameT")
+
+
+class _UnseekableBuffer(io.RawIOBase):
+    """
+    A write-only, unseekable stream that buffers the bytes written to it until they are taken. ZipFile writes
+    data descriptors after each entry to unseekable streams, rather than seeking back to update the entry headers.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:  # type: ignore[override]
+        self._buffer += b
+        self._position += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ZipStreamWriter:
+    """
+    Writes a zip archive incrementally, yielding the archive's bytes as each entry is written, so that the archive
+    can be streamed in a response without being written to disk. Compression runs off the event loop.
+    """
+
+    def __init__(self) -> None:
+        self._output = _UnseekableBuffer()
+        self._zip_file = zipfile.ZipFile(self._output, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    async def write_entry(self, name: str, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        entry = self._zip_file.open(name, mode="w", force_zip64=True)
+        async for chunk in chunks:
+            await asyncio.to_thread(entry.write, chunk)
+            data = self._output.take()
+            if data:
+                yield data
+
+        entry.close()
+        data = self._output.take()
+        if data:
+            yield data
+
+    def close(self) -> bytes:
+        self._zip_file.close()
+        return self._output.take()
+
+
+async def prefetch_streams(
+    sources: Sequence[tuple[NameT, Callable[[], AsyncContextManager[AsyncIterable[bytes]]]]],
+    max_concurrency: int,
+    max_buffered_chunks: int,
+) -> AsyncGenerator[tuple[NameT, AsyncIterator[bytes]], None]:
+    """
+    Yields the name and stream of each of the sources, in order, while fetching up to max_concurrency of them
+    concurrently. Each stream buffers up to max_buffered_chunks chunks ahead of the consumer, bounding memory use.
+    Each yielded stream must be consumed before the next.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    queues = [asyncio.Queue[bytes | Exception | None](maxsize=max_buffered_chunks) for _ in sources]
+
+    async def fetch(source: Callable[[], AsyncContextManager[AsyncIterable[bytes]]], queue: asyncio.Queue) -> None:
+        try:
+            async with semaphore, source() as chunks:
+                async for chunk in chunks:
+                    await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+
+        await queue.put(None)
+
+    async def drain(queue: asyncio.Queue[bytes | Exception | None]) -> AsyncIterator[bytes]:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    # semaphore waiters are woken in order, so the stream being consumed is always among those being fetched
+    tasks = [asyncio.create_task(fetch(source, queue)) for (_, source), queue in zip(sources, queues, strict=True)]
+    try:
+        for (name, _), queue in zip(sources, queues, strict=True):
+            yield name, drain(queue)
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
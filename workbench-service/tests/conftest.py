@@ -3,7 +3,7 @@ import os
 import pathlib
 import tempfile
 import uuid
-from typing import AsyncGenerator, Iterator
+from typing import AsyncGenerator, AsyncIterator, Iterator
 
 import asyncpg
 import dotenv
@@ -20,10 +20,11 @@ from semantic_workbench_api_model import (
     assistant_service_client,
     workbench_service_client,
 )
-from semantic_workbench_service import files, settings
+from semantic_workbench_service import db, files, settings
 from semantic_workbench_service import service as workbenchservice
 from semantic_workbench_service.api import FastAPILifespan
 from semantic_workbench_service.config import DBSettings
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 from tests.types import MockUser
 
@@ -160,6 +161,13 @@ async def db_settings(db_type: str, echo_sql: bool, request: pytest.FixtureReque
                 await admin_connection.close()
 
 
+@pytest.fixture
+async def db_engine(db_settings: DBSettings) -> AsyncIterator[AsyncEngine]:
+    async with db.create_engine(db_settings) as engine:
+        await db.bootstrap_db(engine, settings=db_settings)
+        yield engine
+
+
 @pytest.fixture
 def storage_settings() -> Iterator[files.StorageSettings]:
     storage_settings = semantic_workbench_service.settings.storage.model_copy()
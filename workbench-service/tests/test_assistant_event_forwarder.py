@@ -0,0 +1,194 @@
+import asyncio
+import uuid
+
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service.assistant_event_forwarder import AssistantEventForwarder
+
+
+def conversation_event() -> ConversationEvent:
+    return ConversationEvent(conversation_id=uuid.uuid4(), event=ConversationEventType.message_created)
+
+
+async def test_assistant_event_forwarder_coalesces_events_into_batches() -> None:
+    delivered: list[list[ConversationEvent]] = []
+    first_delivery_started = asyncio.Event()
+    release_first_delivery = asyncio.Event()
+
+    async def deliver(assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
+        delivered.append(events)
+        first_delivery_started.set()
+        await release_first_delivery.wait()
+
+    forwarder = AssistantEventForwarder(
+        deliver=deliver, max_queue_size=100, max_batch_size=3, max_batch_latency_seconds=0
+    )
+    assistant_id = uuid.uuid4()
+    events = [conversation_event() for _ in range(6)]
+
+    try:
+        forwarder.enqueue(assistant_id, events[0])
+        await first_delivery_started.wait()
+
+        # events queued while a batch is in flight are sent together, up to the max batch size
+        for event in events[1:]:
+            forwarder.enqueue(assistant_id, event)
+        assert forwarder.metrics()[assistant_id].queue_length == 5
+
+        release_first_delivery.set()
+        async with asyncio.timeout(5):
+            while len(delivered) < 3:
+                await asyncio.sleep(0.01)
+
+    finally:
+        await forwarder.aclose()
+
+    assert delivered == [events[0:1], events[1:4], events[4:6]]
+
+    metrics = forwarder.metrics()[assistant_id]
+    assert metrics.queue_length == 0
+    assert metrics.enqueued_events == 6
+    assert metrics.delivered_events == 6
+    assert metrics.delivered_batches == 3
+    assert metrics.max_batch_size == 3
+    assert metrics.dropped_events == 0
+    assert metrics.max_batch_latency_seconds >= metrics.last_batch_latency_seconds > 0
+
+
+async def test_assistant_event_forwarder_waits_for_batch_latency() -> None:
+    delivered: list[list[ConversationEvent]] = []
+
+    async def deliver(assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
+        delivered.append(events)
+
+    forwarder = AssistantEventForwarder(
+        deliver=deliver, max_queue_size=100, max_batch_size=10, max_batch_latency_seconds=0.2
+    )
+    assistant_id = uuid.uuid4()
+    events = [conversation_event() for _ in range(2)]
+
+    try:
+        forwarder.enqueue(assistant_id, events[0])
+        await asyncio.sleep(0.05)
+        forwarder.enqueue(assistant_id, events[1])
+
+        async with asyncio.timeout(5):
+            while not delivered:
+                await asyncio.sleep(0.01)
+
+    finally:
+        await forwarder.aclose()
+
+    assert delivered == [events]
+
+
+async def test_assistant_event_forwarder_drops_oldest_events_when_full() -> None:
+    delivered: list[list[ConversationEvent]] = []
+    release_delivery = asyncio.Event()
+
+    async def deliver(assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
+        await release_delivery.wait()
+        delivered.append(events)
+
+    forwarder = AssistantEventForwarder(
+        deliver=deliver, max_queue_size=2, max_batch_size=10, max_batch_latency_seconds=0
+    )
+    assistant_id = uuid.uuid4()
+    events = [conversation_event() for _ in range(5)]
+
+    try:
+        forwarder.enqueue(assistant_id, events[0])
+        # let the forwarder take the first event, which is then held in delivery
+        await asyncio.sleep(0.01)
+
+        for event in events[1:]:
+            forwarder.enqueue(assistant_id, event)
+
+        release_delivery.set()
+        async with asyncio.timeout(5):
+            while len(delivered) < 2:
+                await asyncio.sleep(0.01)
+
+    finally:
+        await forwarder.aclose()
+
+    assert delivered == [events[0:1], events[3:5]]
+    assert forwarder.metrics()[assistant_id].dropped_events == 2
+
+
+async def test_assistant_event_forwarder_removes_idle_and_removed_queues() -> None:
+    delivered: list[list[ConversationEvent]] = []
+    release_delivery = asyncio.Event()
+
+    async def deliver(assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
+        delivered.append(events)
+        await release_delivery.wait()
+
+    forwarder = AssistantEventForwarder(
+        deliver=deliver, max_queue_size=100, max_batch_size=10, max_batch_latency_seconds=0, idle_timeout_seconds=0.05
+    )
+    idle_assistant_id, removed_assistant_id = uuid.uuid4(), uuid.uuid4()
+    events = [conversation_event() for _ in range(3)]
+
+    try:
+        forwarder.enqueue(idle_assistant_id, events[0])
+        forwarder.enqueue(removed_assistant_id, events[1])
+        await asyncio.sleep(0.01)
+        # the removed assistant's queue is removed while its delivery is in flight, with its queued event
+        forwarder.enqueue(removed_assistant_id, events[2])
+        forwarder.remove(removed_assistant_id)
+        assert list(forwarder.metrics()) == [idle_assistant_id]
+
+        release_delivery.set()
+        async with asyncio.timeout(5):
+            while forwarder.metrics():
+                await asyncio.sleep(0.01)
+
+        # queues are re-created by the next enqueue
+        forwarder.enqueue(idle_assistant_id, events[0])
+        assert list(forwarder.metrics()) == [idle_assistant_id]
+
+    finally:
+        await forwarder.aclose()
+
+    assert delivered[:2] == [events[0:1], events[1:2]]
+    removed = forwarder.removed_queue_metrics()
+    assert (removed.enqueued_events, removed.delivered_events, removed.dropped_events) == (3, 1, 1)
+
+
+async def test_assistant_event_forwarder_keeps_queues_with_events_enqueued_at_the_idle_timeout() -> None:
+    delivered: list[list[ConversationEvent]] = []
+
+    async def deliver(assistant_id: uuid.UUID, events: list[ConversationEvent]) -> None:
+        delivered.append(events)
+
+    forwarder = AssistantEventForwarder(
+        deliver=deliver, max_queue_size=100, max_batch_size=10, max_batch_latency_seconds=0, idle_timeout_seconds=5
+    )
+    assistant_id = uuid.uuid4()
+    event = conversation_event()
+    next_batch = forwarder._next_batch
+    timed_out = False
+
+    async def next_batch_timing_out_as_an_event_is_enqueued(
+        queue: asyncio.Queue,
+    ) -> list:
+        nonlocal timed_out
+        if timed_out:
+            return await next_batch(queue)
+        timed_out = True
+        forwarder.enqueue(assistant_id, event)
+        return []
+
+    forwarder._next_batch = next_batch_timing_out_as_an_event_is_enqueued
+
+    try:
+        forwarder.enqueue(assistant_id, conversation_event())
+        async with asyncio.timeout(5):
+            while len(delivered) < 1:
+                await asyncio.sleep(0.01)
+
+    finally:
+        await forwarder.aclose()
+
+    assert delivered[0][-1] == event
+    assert forwarder.removed_queue_metrics().dropped_events == 0
@@ -0,0 +1,22 @@
+import time
+
+from semantic_workbench_service.assistant_service_liveness import AssistantServiceLiveness
+
+
+def test_assistant_service_liveness() -> None:
+    liveness = AssistantServiceLiveness()
+
+    liveness.heartbeat("alive", expires_in_seconds=60)
+    liveness.heartbeat("expired", expires_in_seconds=0)
+    liveness.heartbeat("forgotten", expires_in_seconds=60)
+    liveness.forget("forgotten")
+
+    assert liveness.alive_ids() == {"alive"}
+    assert liveness.pop_expired() == ["expired"]
+    assert liveness.pop_expired() == []
+
+    # a heartbeat extends the expiration
+    liveness.heartbeat("alive", expires_in_seconds=0.05)
+    time.sleep(0.1)
+    assert liveness.alive_ids() == set()
+    assert liveness.pop_expired() == ["alive"]
@@ -0,0 +1,153 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+import pytest
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service import event_bus
+from semantic_workbench_service.event_log import ConversationEventLog, LoggedConversationEvent
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .test_event_log import create_conversation, create_event_log, message_event
+
+
+class FakeNotifier:
+    """
+    An in-memory stand-in for PostgreSQL LISTEN/NOTIFY, shared by the event buses of simulated processes.
+    """
+
+    def __init__(self) -> None:
+        self.listeners: dict[str, list[Callable[[str], Awaitable[None]]]] = {}
+        self.connect_callbacks: list[Callable[[], None]] = []
+        self.payloads: list[str] = []
+
+    async def notify(self, channel: str, payload: str) -> None:
+        self.payloads.append(payload)
+        for callback in list(self.listeners.get(channel, [])):
+            await callback(payload)
+
+    def reconnect(self) -> None:
+        for on_connect in list(self.connect_callbacks):
+            on_connect()
+
+    @asynccontextmanager
+    async def listen(
+        self,
+        channel: str,
+        callback: Callable[[str], Awaitable[None]],
+        on_connect: Callable[[], None] | None = None,
+    ) -> AsyncIterator[None]:
+        self.listeners.setdefault(channel, []).append(callback)
+        if on_connect is not None:
+            self.connect_callbacks.append(on_connect)
+            on_connect()
+        try:
+            yield
+        finally:
+            self.listeners[channel].remove(callback)
+            if on_connect is not None:
+                self.connect_callbacks.remove(on_connect)
+
+
+def collector() -> tuple[list[LoggedConversationEvent], Callable[[LoggedConversationEvent], Awaitable[None]]]:
+    delivered: list[LoggedConversationEvent] = []
+
+    async def handler(logged_event: LoggedConversationEvent) -> None:
+        delivered.append(logged_event)
+
+    return delivered, handler
+
+
+async def test_in_process_event_bus_delivers_to_subscriber(db_engine: AsyncEngine) -> None:
+    bus = event_bus.InProcessEventBus()
+    delivered, handler = collector()
+    bus.subscribe(handler)
+
+    logged_event = LoggedConversationEvent(sequence=1, event=message_event(uuid.uuid4(), 0))
+    async with bus.running():
+        await bus.publish(logged_event)
+
+    assert delivered == [logged_event]
+
+
+async def test_postgres_event_bus_delivers_across_processes(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    notifier = FakeNotifier()
+
+    # two simulated service processes, each with its own in-memory event log buffer
+    event_logs: list[ConversationEventLog] = [create_event_log(db_engine), create_event_log(db_engine)]
+    buses = [event_bus.PostgresEventBus(notifier=notifier, event_log=log, channel="test") for log in event_logs]
+    deliveries = []
+    for bus in buses:
+        delivered, handler = collector()
+        bus.subscribe(handler)
+        deliveries.append(delivered)
+
+    async with buses[0].running(), buses[1].running():
+        logged_event = await event_logs[0].append(message_event(conversation_id, 0))
+        await buses[0].publish(logged_event)
+
+    # each process delivers the event exactly once
+    assert [e.sequence for e in deliveries[0]] == [logged_event.sequence]
+    assert [e.sequence for e in deliveries[1]] == [logged_event.sequence]
+    assert deliveries[1][0].event.id == logged_event.event.id
+    assert deliveries[1][0].event.data == logged_event.event.model_dump(mode="json")["data"]
+
+    # only the sequence is published, and the receiving process can replay the event from memory
+    assert "message 0" not in notifier.payloads[0]
+    replay = await event_logs[1].conversation_events_after(conversation_id, (logged_event.sequence or 0) - 1)
+    assert [e.event.id for e in replay.events] == [logged_event.event.id]
+
+
+async def test_postgres_event_bus_replays_from_db_after_reconnect(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    notifier = FakeNotifier()
+    event_logs: list[ConversationEventLog] = [create_event_log(db_engine), create_event_log(db_engine)]
+    buses = [event_bus.PostgresEventBus(notifier=notifier, event_log=log, channel="test") for log in event_logs]
+
+    async with buses[0].running(), buses[1].running():
+        first = await event_logs[0].append(message_event(conversation_id, 0))
+        await buses[0].publish(first)
+
+        # the notification of the second event is lost while the listener is disconnected
+        second = await event_logs[0].append(message_event(conversation_id, 1))
+        notifier.reconnect()
+
+        replay = await event_logs[1].conversation_events_after(conversation_id, first.sequence or 0)
+
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [second.event.id]
+
+
+async def test_postgres_event_bus_publishes_unlogged_events_inline(db_engine: AsyncEngine) -> None:
+    notifier = FakeNotifier()
+    event_log = create_event_log(db_engine)
+    publisher = event_bus.PostgresEventBus(notifier=notifier, event_log=event_log, channel="test")
+    receiver = event_bus.PostgresEventBus(notifier=notifier, event_log=event_log, channel="test")
+    delivered, handler = collector()
+    receiver.subscribe(handler)
+
+    event = ConversationEvent(conversation_id=uuid.uuid4(), event=ConversationEventType.conversation_updated)
+    async with receiver.running():
+        await publisher.publish(LoggedConversationEvent(sequence=None, event=event))
+
+        # events that are too large for a notification are only delivered locally
+        too_large = message_event(uuid.uuid4(), 0)
+        too_large.data["message"]["content"] = "x" * event_bus.MAX_NOTIFY_PAYLOAD_BYTES
+        await publisher.publish(LoggedConversationEvent(sequence=None, event=too_large))
+
+    await asyncio.sleep(0)
+    assert [e.event.id for e in delivered] == [event.id]
+    assert delivered[0].sequence is None
+
+
+async def test_create_postgres_event_bus_requires_postgresql(db_engine: AsyncEngine) -> None:
+    event_log = create_event_log(db_engine)
+    with pytest.raises(ValueError, match="requires a postgresql database"):
+        event_bus.create(backend="postgresql", event_log=event_log, channel="test", db_url="sqlite:///x.db", ssl="")
+
+    bus = event_bus.create(
+        backend="postgresql", event_log=event_log, channel="test", db_url="postgresql+asyncpg:///x", ssl=""
+    )
+    assert isinstance(bus, event_bus.PostgresEventBus)
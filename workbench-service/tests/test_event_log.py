@@ -0,0 +1,165 @@
+import uuid
+
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service import db, service_user_principals
+from semantic_workbench_service.event_log import ConversationEventLog
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+async def create_conversation(engine: AsyncEngine, user_id: str | None = None) -> uuid.UUID:
+    async with db.create_session(engine) as session:
+        conversation = db.Conversation(
+            owner_id=service_user_principals.semantic_workbench.user_id,
+            title="test",
+            imported_from_conversation_id=None,
+        )
+        session.add(conversation)
+        if user_id is not None:
+            await db.insert_if_not_exists(session, db.User(user_id=user_id, name=user_id))
+            session.add(
+                db.UserParticipant(
+                    conversation_id=conversation.conversation_id,
+                    user_id=user_id,
+                    conversation_permission="read_write",
+                )
+            )
+        await session.commit()
+        return conversation.conversation_id
+
+
+def create_event_log(engine: AsyncEngine, max_events_per_conversation: int = 5) -> ConversationEventLog:
+    return ConversationEventLog(
+        get_session=lambda: db.create_session(engine),
+        max_events_per_conversation=max_events_per_conversation,
+        max_cached_conversations=10,
+    )
+
+
+def message_event(conversation_id: uuid.UUID, index: int) -> ConversationEvent:
+    return ConversationEvent(
+        conversation_id=conversation_id,
+        event=ConversationEventType.message_created,
+        data={"message": {"id": uuid.uuid4(), "content": f"message {index}"}},
+    )
+
+
+async def test_event_log_sequences_and_replay_from_memory(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    event_log = create_event_log(db_engine)
+
+    logged_events = [await event_log.append(message_event(conversation_id, i)) for i in range(3)]
+    sequences = [e.sequence or 0 for e in logged_events]
+    assert all(sequences)
+    assert sequences == sorted(sequences)
+
+    replay = await event_log.conversation_events_after(conversation_id, logged_events[0].sequence or 0)
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events[1:]]
+
+
+async def test_event_log_replay_from_db(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    logged_events = [await create_event_log(db_engine).append(message_event(conversation_id, i)) for i in range(3)]
+
+    # a new event log has nothing in memory, as after a restart
+    event_log = create_event_log(db_engine)
+    replay = await event_log.conversation_events_after(conversation_id, logged_events[0].sequence or 0)
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events[1:]]
+    assert replay.events[0].event.data == logged_events[1].event.model_dump(mode="json")["data"]
+    assert replay.events[0].event.timestamp == logged_events[1].event.timestamp
+
+
+async def test_event_log_is_bounded(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    event_log = create_event_log(db_engine, max_events_per_conversation=3)
+    logged_events = [await event_log.append(message_event(conversation_id, i)) for i in range(6)]
+
+    # the replay is incomplete when the events following the requested sequence have been trimmed
+    replay = await create_event_log(db_engine, max_events_per_conversation=3).conversation_events_after(
+        conversation_id, logged_events[1].sequence or 0
+    )
+    assert not replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events[3:]]
+
+    replay = await create_event_log(db_engine, max_events_per_conversation=3).conversation_events_after(
+        conversation_id, logged_events[3].sequence or 0
+    )
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events[4:]]
+
+    replay = await event_log.conversation_events_after(conversation_id, logged_events[4].sequence or 0)
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [logged_events[5].event.id]
+
+
+async def test_event_log_user_replay(db_engine: AsyncEngine) -> None:
+    user_id = f"user-{uuid.uuid4().hex}"
+    conversation_id = await create_conversation(db_engine, user_id=user_id)
+    other_conversation_id = await create_conversation(db_engine)
+    event_log = create_event_log(db_engine)
+
+    first = await event_log.append(message_event(conversation_id, 0))
+    await event_log.append(message_event(other_conversation_id, 1))
+    second = await event_log.append(message_event(conversation_id, 2))
+    await event_log.append(ConversationEvent(conversation_id=conversation_id, event=ConversationEventType.file_created))
+
+    replay = await event_log.user_events_after(
+        user_id=user_id,
+        sequence=first.sequence or 0,
+        event_types=[ConversationEventType.message_created],
+        limit=10,
+    )
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [second.event.id]
+
+    replay = await event_log.user_events_after(
+        user_id=user_id,
+        sequence=0,
+        event_types=[ConversationEventType.message_created],
+        limit=1,
+    )
+    assert not replay.complete
+    assert [e.event.id for e in replay.events] == [first.event.id]
+
+
+async def test_event_log_replay_from_db_when_buffer_has_gap(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    logged_events = [await create_event_log(db_engine).append(message_event(conversation_id, i)) for i in range(3)]
+
+    # events appended by another process are recorded in the order in which their notifications arrive, and the
+    # notification of the second event has not arrived yet
+    event_log = create_event_log(db_engine)
+    for logged_event in (logged_events[0], logged_events[2]):
+        notified_event = await event_log.get(logged_event.sequence or 0)
+        assert notified_event is not None
+        assert notified_event.previous_sequence == logged_event.previous_sequence
+        event_log.record(notified_event)
+
+    replay = await event_log.conversation_events_after(conversation_id, logged_events[0].sequence or 0)
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events[1:]]
+
+    replay = await event_log.conversation_events_after(conversation_id, logged_events[2].sequence or 0)
+    assert replay.complete
+    assert replay.events == []
+
+
+async def test_event_log_append_many(db_engine: AsyncEngine) -> None:
+    conversation_id = await create_conversation(db_engine)
+    event_log = create_event_log(db_engine)
+    first = await event_log.append(message_event(conversation_id, 0))
+
+    logged_events = await event_log.append_many([message_event(conversation_id, i) for i in range(1, 4)])
+    sequences = [e.sequence or 0 for e in logged_events]
+    assert sequences == sorted(sequences)
+    assert [e.previous_sequence for e in logged_events] == [first.sequence, *sequences[:-1]]
+    assert await event_log.append_many([]) == []
+
+    replay = await event_log.conversation_events_after(conversation_id, first.sequence or 0)
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events]
+
+    replay = await create_event_log(db_engine).conversation_events_after(conversation_id, first.sequence or 0)
+    assert replay.complete
+    assert [e.event.id for e in replay.events] == [e.event.id for e in logged_events]
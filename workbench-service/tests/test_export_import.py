@@ -0,0 +1,75 @@
+import io
+import json
+import uuid
+
+from semantic_workbench_service import db, files, service_user_principals
+from semantic_workbench_service.controller import export_import
+from semantic_workbench_service.message_debug import MessageDebugStorage
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .test_event_log import create_conversation
+
+
+async def create_message_with_debug(
+    engine: AsyncEngine,
+    message_debug_storage: MessageDebugStorage,
+    conversation_id: uuid.UUID,
+    message_id: uuid.UUID,
+) -> None:
+    async with db.create_session(engine) as session:
+        session.add(
+            db.ConversationMessage(
+                message_id=message_id,
+                conversation_id=conversation_id,
+                sender_participant_id=service_user_principals.semantic_workbench.user_id,
+                sender_participant_role="service",
+                message_type="chat",
+                content="hello",
+                content_type="text/plain",
+            )
+        )
+        await session.flush()
+        session.add(await message_debug_storage.create(message_id, {"debug": "data"}))
+        await session.commit()
+
+
+async def test_export_file_exports_records_with_the_records_they_reference(
+    db_engine: AsyncEngine, storage_settings: files.StorageSettings
+) -> None:
+    message_debug_storage = MessageDebugStorage(files.Storage(settings=storage_settings), max_inline_bytes=1_024)
+    conversation_id = await create_conversation(db_engine)
+    message_id = uuid.uuid4()
+    await create_message_with_debug(db_engine, message_debug_storage, conversation_id, message_id)
+
+    # a message written once the messages are exported, whose debug data follows the exported debug data
+    late_message_id = uuid.UUID(int=(1 << 128) - 1)
+
+    chunks: list[bytes] = []
+    late_message_written = False
+    async for chunk in export_import.export_file(
+        conversation_ids={conversation_id},
+        assistant_ids=set(),
+        get_session=lambda: db.create_session(db_engine),
+        message_debug_storage=message_debug_storage,
+        batch_size=1,
+    ):
+        chunks.append(chunk)
+        if b'"type":"ConversationMessageDebug"' in chunk and not late_message_written:
+            await create_message_with_debug(db_engine, message_debug_storage, conversation_id, late_message_id)
+            late_message_written = True
+
+    records = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert [record["data"]["message_id"] for record in records if record["type"] == "ConversationMessageDebug"] == [
+        str(message_id)
+    ]
+
+    async with db.create_session(db_engine) as session:
+        result = await export_import.import_files(
+            session,
+            owner_id=service_user_principals.semantic_workbench.user_id,
+            files=[io.BytesIO(b"".join(chunks))],
+            message_debug_storage=message_debug_storage,
+        )
+        await session.commit()
+
+    assert list(result.message_id_old_to_new) == [message_id]
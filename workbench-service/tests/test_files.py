@@ -1,9 +1,9 @@
+import hashlib
 import io
 import uuid
 
 import pytest
-
-from semantic_workbench_service import files
+from semantic_workbench_service import conditional_requests, files
 
 
 def test_read_file_not_found(storage_settings: files.StorageSettings) -> None:
@@ -42,3 +42,59 @@ def test_write_read_delete_file(storage_settings: files.StorageSettings) -> None
 
     with pytest.raises(FileNotFoundError), file_storage.read_file(namespace=conversation_id, filename=filename) as f:
         pass
+
+
+async def test_blobs_are_stored_once_and_read_by_range(storage_settings: files.StorageSettings) -> None:
+    file_storage = files.Storage(settings=storage_settings)
+    content = bytes(range(256)) * 1_024
+
+    staged = [await file_storage.stage_blob(io.BytesIO(content)) for _ in range(2)]
+    assert staged[0].content_hash == staged[1].content_hash == hashlib.sha256(content).hexdigest()
+    assert staged[0].size == len(content)
+
+    assert [await file_storage.store_blob(blob) for blob in staged] == [True, False]
+
+    content_hash = staged[0].content_hash
+    assert not any(blob.path.exists() for blob in staged)
+    assert await file_storage.blob_size(content_hash) == len(content)
+
+    assert b"".join([chunk async for chunk in file_storage.read_blob(content_hash)]) == content
+    partial_content = b"".join([chunk async for chunk in file_storage.read_blob(content_hash, start=100, stop=300_000)])
+    assert partial_content == content[100:300_000]
+
+    await file_storage.delete_blob(content_hash)
+    with pytest.raises(FileNotFoundError):
+        await file_storage.blob_size(content_hash)
+
+
+@pytest.mark.parametrize(
+    ("range_header", "if_range", "expected"),
+    [
+        ("bytes=0-9", None, (0, 10)),
+        ("bytes=90-", None, (90, 100)),
+        ("bytes=90-200", None, (90, 100)),
+        ("bytes=-10", None, (90, 100)),
+        ("bytes=-200", None, (0, 100)),
+        ("bytes=0-9", '"etag"', (0, 10)),
+        # the full content is sent for stale If-Range conditions, and ranges that are not supported
+        ("bytes=0-9", '"other"', None),
+        ("bytes=0-9,20-29", None, None),
+        ("bytes=9-0", None, None),
+        ("items=0-9", None, None),
+    ],
+)
+def test_byte_range(range_header: str, if_range: str | None, expected: tuple[int, int] | None) -> None:
+    assert conditional_requests.byte_range(range_header, if_range=if_range, etag='"etag"', size=100) == expected
+
+
+@pytest.mark.parametrize("range_header", ["bytes=100-", "bytes=-0"])
+def test_byte_range_not_satisfiable(range_header: str) -> None:
+    with pytest.raises(conditional_requests.RangeNotSatisfiableError):
+        conditional_requests.byte_range(range_header, if_range=None, etag='"etag"', size=100)
+
+
+def test_etag_matches() -> None:
+    assert conditional_requests.etag_matches('"a"', '"a"')
+    assert conditional_requests.etag_matches('"b", W/"a"', '"a"')
+    assert conditional_requests.etag_matches("*", '"a"')
+    assert not conditional_requests.etag_matches('"b"', '"a"')
@@ -301,8 +301,8 @@ async def test_flow_create_assistant_send_message_receive_resp_export_import_ass
         resp.raise_for_status()
 
         assert resp.headers["content-type"] == "application/zip"
-        assert "content-length" in resp.headers
-        assert int(resp.headers["content-length"]) > 0
+        # exports are streamed, so the content length is not known up front
+        assert len(resp.content) > 0
 
         logging.info("response: %s", resp.content)
 
@@ -408,8 +408,8 @@ async def test_flow_create_assistant_send_message_receive_resp_export_import_con
         resp.raise_for_status()
 
         assert resp.headers["content-type"] == "application/zip"
-        assert "content-length" in resp.headers
-        assert int(resp.headers["content-length"]) > 0
+        # exports are streamed, so the content length is not known up front
+        assert len(resp.content) > 0
 
         logging.info("response: %s", resp.content)
 
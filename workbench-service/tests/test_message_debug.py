@@ -0,0 +1,64 @@
+import os
+import time
+import uuid
+
+from semantic_workbench_service import files, message_debug
+from semantic_workbench_service.message_debug import MessageDebugStorage
+
+
+async def test_message_debug_inline(storage_settings: files.StorageSettings) -> None:
+    storage = MessageDebugStorage(files.Storage(settings=storage_settings), max_inline_bytes=1_024)
+    message_id = uuid.uuid4()
+    data = {"key": "value " * 1_000}
+
+    debug = await storage.create(message_id, data)
+
+    assert debug.encoding == message_debug.ENCODING_ZLIB
+    assert debug.compressed_data is not None
+    assert len(debug.compressed_data) < 1_024
+    assert await storage.load(debug) == data
+
+
+async def test_message_debug_file(storage_settings: files.StorageSettings) -> None:
+    file_storage = files.Storage(settings=storage_settings)
+    storage = MessageDebugStorage(file_storage, max_inline_bytes=16)
+    message_id = uuid.uuid4()
+    # random content does not compress, so is streamed in several chunks
+    data = {"key": os.urandom(400_000).hex()}
+
+    debug = await storage.create(message_id, data)
+
+    assert debug.encoding == message_debug.ENCODING_ZLIB_FILE
+    assert debug.compressed_data is None
+    assert file_storage.file_exists(message_debug.NAMESPACE, str(message_id))
+    chunks = [chunk async for chunk in storage.stream(debug)]
+    assert len(chunks) > 1
+    assert await storage.load(debug) == data
+
+    copied_message_id = uuid.uuid4()
+    copied = await storage.copy(debug, copied_message_id)
+    assert copied.message_id == copied_message_id
+    assert await storage.load(copied) == data
+
+    await storage.delete_files([message_id])
+    assert not file_storage.file_exists(message_debug.NAMESPACE, str(message_id))
+    assert file_storage.file_exists(message_debug.NAMESPACE, str(copied_message_id))
+
+
+async def test_message_debug_delete_orphaned_files(storage_settings: files.StorageSettings) -> None:
+    file_storage = files.Storage(settings=storage_settings)
+    storage = MessageDebugStorage(file_storage, max_inline_bytes=0)
+    referenced_message_id, orphaned_message_id, recent_message_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    for message_id in (referenced_message_id, orphaned_message_id, recent_message_id):
+        await storage.create(message_id, {"key": "value"})
+
+    an_hour_ago = time.time() - 3_600
+    for message_id in (referenced_message_id, orphaned_message_id):
+        os.utime(file_storage.path_for(message_debug.NAMESPACE, str(message_id)), (an_hour_ago, an_hour_ago))
+
+    deleted = await storage.delete_orphaned_files([referenced_message_id], min_age_seconds=60)
+
+    assert deleted == 1
+    assert file_storage.file_exists(message_debug.NAMESPACE, str(referenced_message_id))
+    assert not file_storage.file_exists(message_debug.NAMESPACE, str(orphaned_message_id))
+    assert file_storage.file_exists(message_debug.NAMESPACE, str(recent_message_id))
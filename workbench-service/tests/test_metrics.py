@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from semantic_workbench_service import metrics
+
+
+def test_metrics_registry_exposition() -> None:
+    registry = metrics.MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", label_names=("method",))
+    in_flight = registry.gauge("in_flight", "In flight.")
+    duration = registry.histogram("duration_seconds", "Duration.", label_names=("route",), buckets=(0.1, 1.0))
+    registry.callback("queued", "Queued.", "gauge", lambda: [({"stream": 'a"b'}, 3)])
+
+    requests.inc(method="GET")
+    requests.inc(2, method="GET")
+    in_flight.set(4)
+    for value in (0.05, 0.5, 5.0):
+        duration.observe(value, route="/")
+
+    assert registry.expose().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{method="GET"} 3.0',
+        "# HELP in_flight In flight.",
+        "# TYPE in_flight gauge",
+        "in_flight 4.0",
+        "# HELP duration_seconds Duration.",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{route="/",le="0.1"} 1.0',
+        'duration_seconds_bucket{route="/",le="1.0"} 2.0',
+        'duration_seconds_bucket{route="/",le="+Inf"} 3.0',
+        'duration_seconds_sum{route="/"} 5.55',
+        'duration_seconds_count{route="/"} 3.0',
+        "# HELP queued Queued.",
+        "# TYPE queued gauge",
+        'queued{stream="a\\"b"} 3.0',
+    ]
+
+    with pytest.raises(ValueError, match="expects labels"):
+        requests.inc(route="/")
+
+    with pytest.raises(ValueError, match="already registered"):
+        registry.gauge("in_flight", "In flight.")
+
+
+async def test_instrument_methods() -> None:
+    class Controller:
+        async def succeed(self) -> int:
+            await asyncio.sleep(0)
+            return 1
+
+        async def fail(self) -> None:
+            raise RuntimeError()
+
+    registry = metrics.MetricsRegistry()
+    duration = registry.histogram("duration_seconds", "Duration.", label_names=("component", "method", "outcome"))
+    controller = Controller()
+    metrics.instrument_methods(controller, duration, component="test")
+
+    assert await controller.succeed() == 1
+    with pytest.raises(RuntimeError):
+        await controller.fail()
+
+    assert duration.count(component="test", method="succeed", outcome="success") == 1
+    assert duration.count(component="test", method="fail", outcome="error") == 1
@@ -1,10 +1,13 @@
+import asyncio
+import time
 import uuid
 
 import fastapi
 import pytest
 from fastapi.testclient import TestClient
 from jose import jwt
-from semantic_workbench_service import assistant_api_key, middleware, settings
+from pytest_httpx import HTTPXMock
+from semantic_workbench_service import assistant_api_key, auth, middleware, settings
 
 from .types import MockUser
 
@@ -184,3 +187,111 @@ def test_auth_middleware_allows_anonymous_excluded_paths():
         http_response = client.get("/")
 
         assert http_response.status_code == 200
+
+
+def test_auth_middleware_caches_verified_tokens(test_user: MockUser, monkeypatch: pytest.MonkeyPatch):
+    decode_count = 0
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        nonlocal decode_count
+        decode_count += 1
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(middleware.jwt, "decode", counting_decode)
+
+    app = fastapi.FastAPI()
+
+    @app.get("/")
+    def get_principal() -> dict:
+        principal = auth.authenticated_principal.get()
+        assert isinstance(principal, auth.UserPrincipal)
+        return {"user_id": principal.user_id}
+
+    app.add_middleware(middleware.AuthMiddleware, api_key_source=mock_api_key_source())
+
+    with TestClient(app) as client:
+        for _ in range(3):
+            http_response = client.get("/", headers=test_user.authorization_headers)
+            assert http_response.status_code == 200
+            assert http_response.json() == {"user_id": test_user.id}
+
+        assert decode_count == 1
+
+        # the cache is keyed on the auth settings, as well as the token
+        monkeypatch.setattr(settings.auth, "allowed_app_id", "other-app-id")
+        http_response = client.get("/", headers=test_user.authorization_headers)
+        assert http_response.status_code == 401
+        assert decode_count == 2
+
+
+def test_auth_middleware_rejects_expired_token(test_user: MockUser):
+    token = jwt.encode(
+        claims={
+            "tid": test_user.tenant_id,
+            "oid": test_user.object_id,
+            "appid": test_user.app_id,
+            "exp": int(time.time()) - 60,
+        },
+        key="",
+        algorithm=test_user.token_algo,
+    )
+
+    app = fastapi.FastAPI()
+    app.add_middleware(middleware.AuthMiddleware, api_key_source=mock_api_key_source())
+
+    with TestClient(app) as client:
+        http_response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+
+        assert http_response.status_code == 401
+        assert http_response.json()["detail"].lower() == "expired token"
+
+
+def test_verified_token_cache_expires_entries() -> None:
+    principal = auth.UserPrincipal(user_id="user", name="user")
+    cache = middleware.VerifiedTokenCache(maxsize=2, max_age_seconds=60)
+
+    cache.set("valid", principal, expires_at=time.time() + 60)
+    cache.set("expired", principal, expires_at=time.time() - 1)
+    assert cache.get("valid") == principal
+    assert cache.get("expired") is None
+
+    # tokens without an expiry are cached for at most max_age_seconds
+    cache = middleware.VerifiedTokenCache(maxsize=2, max_age_seconds=0)
+    cache.set("no-exp", principal)
+    assert cache.get("no-exp") is None
+
+    # the least recently used entry is evicted when the cache is full
+    cache = middleware.VerifiedTokenCache(maxsize=2, max_age_seconds=60)
+    for key in ["a", "b", "c"]:
+        cache.set(key, principal)
+    assert cache.get("a") is None
+    assert cache.get("c") == principal
+
+
+async def test_json_web_key_set_refreshes_keys(httpx_mock: HTTPXMock) -> None:
+    url = "https://jwks.example.com/keys"
+    httpx_mock.add_response(url=url, json={"keys": [{"kid": "1"}]})
+    httpx_mock.add_response(url=url, json={"keys": [{"kid": "1"}, {"kid": "2"}]})
+    httpx_mock.add_response(url=url, json={"keys": [{"kid": "3"}]})
+
+    key_set = middleware.JsonWebKeySet(url=url, refresh_interval_seconds=60, min_fetch_interval_seconds=0)
+
+    # the first request waits for the key set, after which it is cached
+    assert await key_set.get(kid="1") == {"keys": [{"kid": "1"}]}
+    assert await key_set.get(kid="1") == {"keys": [{"kid": "1"}]}
+    assert len(httpx_mock.get_requests()) == 1
+
+    # an unknown key id fetches the key set again, as the keys may have been rotated
+    assert await key_set.get(kid="2") == {"keys": [{"kid": "1"}, {"kid": "2"}]}
+    assert len(httpx_mock.get_requests()) == 2
+
+    # a stale key set is returned, while it is refreshed in the background
+    key_set._refresh_interval_seconds = 0
+    assert await key_set.get(kid="1") == {"keys": [{"kid": "1"}, {"kid": "2"}]}
+    key_set._refresh_interval_seconds = 60
+    assert key_set._refresh_task is not None
+    async with asyncio.timeout(5):
+        await key_set._refresh_task
+    assert await key_set.get(kid="3") == {"keys": [{"kid": "3"}]}
+    assert len(httpx_mock.get_requests()) == 3
@@ -1,9 +1,17 @@
+import asyncio
+import datetime
+import uuid
+
 import pytest
 import semantic_workbench_service
+import sqlalchemy
 from alembic import command
 from alembic.config import Config
 from semantic_workbench_service import db
 from semantic_workbench_service.config import DBSettings
+from sqlmodel import col, select
+
+from . import test_event_log
 
 
 @pytest.fixture
@@ -36,3 +44,57 @@ def test_migration_cycle(alembic_config: Config) -> None:
     command.check(
         alembic_config,
     )
+
+
+async def insert_messages(db_settings: DBSettings, conversation_id: uuid.UUID, message_types: list[str]) -> None:
+    # inserted without the ORM, as the latest message projection does not exist before its migration
+    async with db.create_engine(db_settings) as engine, engine.begin() as connection:
+        for message_type in message_types:
+            await connection.execute(
+                sqlalchemy.insert(db.ConversationMessage).values(
+                    message_id=uuid.uuid4(),
+                    conversation_id=conversation_id,
+                    created_datetime=datetime.datetime.now(datetime.UTC),
+                    sender_participant_id="user",
+                    sender_participant_role="user",
+                    message_type=message_type,
+                    content="",
+                    content_type="text/plain",
+                    meta_data={},
+                    filenames=[],
+                )
+            )
+
+
+def test_conversation_latest_message_backfill(alembic_config: Config, bootstrapped_db_settings: DBSettings) -> None:
+    async def create_conversation() -> uuid.UUID:
+        async with db.create_engine(bootstrapped_db_settings) as engine:
+            return await test_event_log.create_conversation(engine)
+
+    conversation_id = asyncio.run(create_conversation())
+
+    command.downgrade(alembic_config, "9e4f5a6b7c8d")
+    asyncio.run(insert_messages(bootstrapped_db_settings, conversation_id, ["chat", "log", "chat", "note"]))
+
+    command.upgrade(alembic_config, "head")
+
+    async def latest_sequences() -> dict[str, int]:
+        async with db.create_engine(bootstrapped_db_settings) as engine, db.create_session(engine) as session:
+            latest_messages = (
+                await session.exec(
+                    select(db.ConversationLatestMessage).where(
+                        db.ConversationLatestMessage.conversation_id == conversation_id
+                    )
+                )
+            ).all()
+            sequences = (
+                await session.exec(
+                    select(db.ConversationMessage.sequence)
+                    .where(db.ConversationMessage.conversation_id == conversation_id)
+                    .order_by(col(db.ConversationMessage.sequence))
+                )
+            ).all()
+            return {latest.message_type: sequences.index(latest.message_sequence) for latest in latest_messages}
+
+    # the latest message of each type, by position in the conversation
+    assert asyncio.run(latest_sequences()) == {"chat": 2, "log": 1, "note": 3}
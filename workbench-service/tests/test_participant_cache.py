@@ -0,0 +1,98 @@
+import uuid
+
+from semantic_workbench_service import db, service_user_principals
+from semantic_workbench_service.participant_cache import ParticipantCache
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+
+from .test_event_log import create_conversation
+
+
+async def add_assistant_participant(engine: AsyncEngine, conversation_id: uuid.UUID, online: bool) -> uuid.UUID:
+    owner_id = service_user_principals.semantic_workbench.user_id
+    async with db.create_session(engine) as session:
+        registration = db.AssistantServiceRegistration(
+            assistant_service_id=f"service-{uuid.uuid4().hex}",
+            created_by_user_id=owner_id,
+            name="test",
+            description="test",
+            api_key_name="test",
+            assistant_service_online=online,
+        )
+        assistant = db.Assistant(
+            owner_id=owner_id,
+            assistant_service_id=registration.assistant_service_id,
+            template_id="default",
+            imported_from_assistant_id=None,
+            name="test",
+        )
+        session.add(registration)
+        session.add(assistant)
+        await session.flush()
+        session.add(db.AssistantParticipant(conversation_id=conversation_id, assistant_id=assistant.assistant_id))
+        await session.commit()
+        return assistant.assistant_id
+
+
+async def set_user_participant_active(
+    engine: AsyncEngine, conversation_id: uuid.UUID, user_id: str, active: bool
+) -> None:
+    async with db.create_session(engine) as session:
+        participant = (
+            await session.exec(
+                select(db.UserParticipant)
+                .where(db.UserParticipant.conversation_id == conversation_id)
+                .where(db.UserParticipant.user_id == user_id)
+            )
+        ).one()
+        participant.active_participant = active
+        session.add(participant)
+        await session.commit()
+
+
+async def test_participant_cache(db_engine: AsyncEngine) -> None:
+    user_id = f"user-{uuid.uuid4().hex}"
+    conversation_id = await create_conversation(db_engine, user_id=user_id)
+    online_assistant_id = await add_assistant_participant(db_engine, conversation_id, online=True)
+    await add_assistant_participant(db_engine, conversation_id, online=False)
+
+    cache = ParticipantCache(get_session=lambda: db.create_session(db_engine), max_conversations=10, ttl_seconds=60)
+
+    participants = await cache.get(conversation_id)
+    assert participants.assistant_ids == {online_assistant_id}
+    assert participants.user_ids == {user_id}
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    assert await cache.get(conversation_id) == participants
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # changes are not visible until the conversation is invalidated
+    await set_user_participant_active(db_engine, conversation_id, user_id, active=False)
+    assert (await cache.get(conversation_id)).user_ids == {user_id}
+
+    cache.invalidate(conversation_id)
+    assert (await cache.get(conversation_id)).user_ids == set()
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    await set_user_participant_active(db_engine, conversation_id, user_id, active=True)
+    cache.invalidate_all()
+    assert (await cache.get(conversation_id)).user_ids == {user_id}
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+async def test_participant_cache_does_not_cache_reads_that_overlap_invalidation(db_engine: AsyncEngine) -> None:
+    user_id = f"user-{uuid.uuid4().hex}"
+    conversation_id = await create_conversation(db_engine, user_id=user_id)
+
+    cache: ParticipantCache
+
+    def get_session():
+        # simulates a participant change, and its invalidation, while the participants are being read
+        cache.invalidate(conversation_id)
+        return db.create_session(db_engine)
+
+    cache = ParticipantCache(get_session=get_session, max_conversations=10, ttl_seconds=60)
+
+    await cache.get(conversation_id)
+    await cache.get(conversation_id)
+    assert (cache.hits, cache.misses) == (0, 2)
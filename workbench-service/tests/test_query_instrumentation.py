@@ -0,0 +1,59 @@
+import uuid
+
+from semantic_workbench_service import db, query_instrumentation
+from semantic_workbench_service.query_instrumentation import QueryInstrumentation
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, select
+
+from .test_event_log import create_conversation
+
+
+def test_normalize_statement() -> None:
+    assert query_instrumentation.normalize_statement(
+        "SELECT *\n  FROM user WHERE user_id IN (?, ?, ?) AND name = ?"
+    ) == query_instrumentation.normalize_statement("SELECT * FROM user WHERE user_id IN ($1, $2) AND name = ?")
+
+
+async def test_query_instrumentation(db_engine: AsyncEngine) -> None:
+    instrumentation = QueryInstrumentation(repeated_statement_threshold=3)
+    instrumentation.attach(db_engine)
+    try:
+        conversation_ids = [await create_conversation(db_engine, user_id=f"user-{uuid.uuid4().hex}") for _ in range(3)]
+        instrumentation.reset()
+
+        with instrumentation.request_scope(lambda: "GET /conversations"):
+            async with db.create_session(db_engine) as session:
+                # one query per conversation
+                for conversation_id in conversation_ids:
+                    (
+                        await session.exec(
+                            select(db.Conversation).where(db.Conversation.conversation_id == conversation_id)
+                        )
+                    ).one()
+
+                # one query for all of the conversations
+                (
+                    await session.exec(
+                        select(db.UserParticipant).where(col(db.UserParticipant.conversation_id).in_(conversation_ids))
+                    )
+                ).all()
+
+    finally:
+        instrumentation.detach(db_engine)
+
+    diagnostics = instrumentation.diagnostics()
+    assert diagnostics.enabled
+    counts = {stats.statement.split(" FROM ")[1].split()[0]: stats.count for stats in diagnostics.statements}
+    assert counts == {"conversation": 3, "userparticipant": 1}
+    assert all(sum(stats.histogram) == stats.count for stats in diagnostics.statements)
+
+    assert len(diagnostics.repeated_statements) == 1
+    repeated = diagnostics.repeated_statements[0]
+    assert (repeated.request, repeated.count) == ("GET /conversations", 3)
+    assert "FROM conversation" in repeated.statement
+
+    # statements outside of a request scope are recorded, but not reported
+    instrumentation.record("SELECT 1", 1.0)
+    instrumentation.record("SELECT 1", 1.0)
+    instrumentation.record("SELECT 1", 1.0)
+    assert len(instrumentation.diagnostics().repeated_statements) == 1
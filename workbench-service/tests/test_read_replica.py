@@ -0,0 +1,190 @@
+import asyncio
+import pathlib
+import sqlite3
+import time
+import uuid
+from typing import AsyncIterator
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from semantic_workbench_service import auth, db
+from semantic_workbench_service.config import DBSettings
+from semantic_workbench_service.read_replica import ReadReplicaRouter
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+
+from .test_event_log import create_conversation
+from .types import MockUser
+
+
+class LaggingReplica:
+    """
+    Simulates a read replica of a SQLite database with a second SQLite file, which receives the writes made to the
+    primary only when replicate is called.
+    """
+
+    def __init__(self, primary_url: str) -> None:
+        self.primary_path = pathlib.Path(primary_url.removeprefix("sqlite:///"))
+        self.path = self.primary_path.with_name(f"replica-{self.primary_path.name}")
+        self.url = f"sqlite:///{self.path}"
+
+    def replicate(self) -> None:
+        with sqlite3.connect(self.primary_path) as primary, sqlite3.connect(self.path) as replica:
+            primary.backup(replica)
+
+
+@pytest.fixture
+def lagging_replica(db_type: str, db_settings: DBSettings) -> LaggingReplica:
+    if db_type != "sqlite":
+        pytest.skip("the lagging replica is simulated with sqlite files")
+
+    replica = LaggingReplica(db_settings.url)
+    db_settings.read_replica_url = replica.url
+    db_settings.read_replica_pin_seconds = 0.2
+    return replica
+
+
+@pytest.fixture
+async def replica_engine(
+    lagging_replica: LaggingReplica, db_settings: DBSettings, db_engine: AsyncEngine
+) -> AsyncIterator[AsyncEngine]:
+    lagging_replica.replicate()
+    async with db.create_engine(db_settings, url=lagging_replica.url) as engine:
+        yield engine
+
+
+async def conversation_exists(router: ReadReplicaRouter, conversation_id: uuid.UUID) -> bool:
+    async with router.read_session() as session:
+        return (
+            await session.exec(select(db.Conversation).where(db.Conversation.conversation_id == conversation_id))
+        ).one_or_none() is not None
+
+
+async def test_read_replica_router_pins_writers_to_primary(
+    lagging_replica: LaggingReplica, db_engine: AsyncEngine, replica_engine: AsyncEngine
+) -> None:
+    router = ReadReplicaRouter(
+        get_primary_engine=lambda: db_engine,
+        get_replica_engine=lambda: replica_engine,
+        pin_seconds=0.2,
+    )
+    writer = auth.UserPrincipal(user_id="writer", name="writer")
+    reader = auth.UserPrincipal(user_id="reader", name="reader")
+
+    writer_token = auth.authenticated_principal.set(writer)
+    try:
+        async with router.session() as session:
+            conversation = db.Conversation(owner_id="writer", title="test", imported_from_conversation_id=None)
+            session.add(conversation)
+            await session.commit()
+
+        # the writer reads its write from the primary
+        assert await conversation_exists(router, conversation.conversation_id)
+    finally:
+        auth.authenticated_principal.reset(writer_token)
+
+    reader_token = auth.authenticated_principal.set(reader)
+    try:
+        # other principals read from the replica, which has not received the write yet
+        assert not await conversation_exists(router, conversation.conversation_id)
+        lagging_replica.replicate()
+        assert await conversation_exists(router, conversation.conversation_id)
+    finally:
+        auth.authenticated_principal.reset(reader_token)
+
+    # reads outside of requests use the primary
+    other_conversation_id = await create_conversation(db_engine)
+    assert await conversation_exists(router, other_conversation_id)
+
+    # as do assistants, which read the writes of other principals in response to their events
+    assistant_token = auth.authenticated_principal.set(
+        auth.AssistantPrincipal(assistant_service_id="assistant-service", assistant_id=uuid.uuid4())
+    )
+    try:
+        assert await conversation_exists(router, other_conversation_id)
+    finally:
+        auth.authenticated_principal.reset(assistant_token)
+
+    writer_token = auth.authenticated_principal.set(writer)
+    try:
+        # once the pin expires, the writer reads from the replica again
+        await asyncio.sleep(0.25)
+        assert not await conversation_exists(router, other_conversation_id)
+    finally:
+        auth.authenticated_principal.reset(writer_token)
+
+    metrics = router.metrics()
+    assert (metrics.replica_reads, metrics.primary_reads) == (3, 3)
+
+
+def test_service_reads_from_replica(
+    lagging_replica: LaggingReplica, workbench_service: FastAPI, test_user: MockUser
+) -> None:
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        lagging_replica.replicate()
+
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = http_response.json()["id"]
+
+        # the user reads their own write, while pinned to the primary
+        http_response = client.get("/conversations")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert [conversation["id"] for conversation in http_response.json()["conversations"]] == [conversation_id]
+
+        time.sleep(0.25)
+
+        http_response = client.get("/conversations")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert http_response.json()["conversations"] == []
+
+        lagging_replica.replicate()
+
+        http_response = client.get("/conversations")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert [conversation["id"] for conversation in http_response.json()["conversations"]] == [conversation_id]
+
+
+def test_service_reads_conversations_written_by_others_from_primary(
+    lagging_replica: LaggingReplica, workbench_service: FastAPI, test_user: MockUser, test_user_2: MockUser
+) -> None:
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = http_response.json()["id"]
+
+        http_response = client.post(
+            "/conversation-shares",
+            json={"conversation_id": conversation_id, "label": "share", "conversation_permission": "read"},
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        http_response = client.post(
+            f"/conversation-shares/{http_response.json()['id']}/redemptions",
+            headers=test_user_2.authorization_headers,
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+
+        time.sleep(0.25)
+        lagging_replica.replicate()
+
+        def messages_read_by_second_user() -> list[str]:
+            http_response = client.get(
+                f"/conversations/{conversation_id}/messages", headers=test_user_2.authorization_headers
+            )
+            assert httpx.codes.is_success(http_response.status_code)
+            return [message["content"] for message in http_response.json()["messages"]]
+
+        http_response = client.post(f"/conversations/{conversation_id}/messages", json={"content": "hello"})
+        assert httpx.codes.is_success(http_response.status_code)
+
+        # the second user refetches the conversation in response to the message's event, from the primary
+        assert messages_read_by_second_user() == ["hello"]
+
+        # once the pin expires, the conversation is read from the replica again
+        time.sleep(0.25)
+        assert messages_read_by_second_user() == []
+
+        lagging_replica.replicate()
+        assert messages_read_by_second_user() == ["hello"]
@@ -0,0 +1,152 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+import semantic_workbench_service
+from openai.types.chat import ChatCompletionMessageParam
+from semantic_workbench_service import auth, controller, db
+from semantic_workbench_service.retitle_worker import RetitleWorker
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .test_event_log import create_conversation
+
+
+class FakeTitleCompletion:
+    """
+    Completes titles without calling a model, recording the calls. While gate is cleared, completions wait for it
+    to be set.
+    """
+
+    def __init__(self, title: str = "A sweet title") -> None:
+        self.title = title
+        self.calls: list[list[ChatCompletionMessageParam]] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, messages: list[ChatCompletionMessageParam]) -> str:
+        self.calls.append(messages)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self.gate.wait()
+            return self.title
+        finally:
+            self.in_flight -= 1
+
+
+principal = auth.UserPrincipal(user_id="user", name="user")
+
+
+async def test_retitle_worker_coalesces_requests() -> None:
+    completion = FakeTitleCompletion()
+    retitled: list[tuple[uuid.UUID, int]] = []
+
+    async def retitle(principal: auth.ActorPrincipal, conversation_id: uuid.UUID, sequence: int) -> None:
+        retitled.append((conversation_id, sequence))
+        await completion([])
+
+    worker = RetitleWorker(retitle=retitle, debounce_seconds=0.05, max_concurrency=4)
+    conversation_id = uuid.uuid4()
+
+    for sequence in range(1, 6):
+        worker.request(principal, conversation_id, sequence)
+    await asyncio.sleep(0.2)
+
+    assert retitled == [(conversation_id, 5)]
+
+    # requests made while retitling are coalesced into one more retitle, after it completes
+    completion.gate.clear()
+    worker.request(principal, conversation_id, 6)
+    await asyncio.sleep(0.1)
+    assert completion.in_flight == 1
+
+    worker.request(principal, conversation_id, 7)
+    worker.request(principal, conversation_id, 8)
+    completion.gate.set()
+    await asyncio.sleep(0.2)
+
+    assert retitled == [(conversation_id, 5), (conversation_id, 6), (conversation_id, 8)]
+    metrics = worker.metrics()
+    assert (metrics.requested, metrics.coalesced, metrics.retitled, metrics.pending_conversations) == (8, 6, 3, 0)
+
+    await worker.aclose()
+
+
+async def test_retitle_worker_bounds_concurrency() -> None:
+    completion = FakeTitleCompletion()
+    completion.gate.clear()
+
+    async def retitle(principal: auth.ActorPrincipal, conversation_id: uuid.UUID, sequence: int) -> None:
+        await completion([])
+
+    worker = RetitleWorker(retitle=retitle, debounce_seconds=0, max_concurrency=2)
+    for _ in range(5):
+        worker.request(principal, uuid.uuid4(), 1)
+    await asyncio.sleep(0.05)
+
+    assert completion.in_flight == 2
+    assert worker.metrics().pending_conversations == 5
+
+    completion.gate.set()
+    await asyncio.sleep(0.05)
+
+    assert len(completion.calls) == 5
+    assert completion.max_in_flight == 2
+    assert worker.metrics().pending_conversations == 0
+
+    await worker.aclose()
+
+
+async def test_retitle_skips_unchanged_conversations(db_engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "azure_openai_endpoint", "https://something/")
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "azure_openai_deployment", "something")
+
+    user_id = f"user-{uuid.uuid4().hex}"
+    user_principal = auth.UserPrincipal(user_id=user_id, name=user_id)
+    conversation_id = await create_conversation(db_engine, user_id=user_id)
+
+    async def add_message(content: str) -> int:
+        async with db.create_session(db_engine) as session:
+            message = db.ConversationMessage(
+                conversation_id=conversation_id,
+                sender_participant_id=user_id,
+                sender_participant_role="user",
+                message_type="chat",
+                content=content,
+                content_type="text/plain",
+            )
+            session.add(message)
+            await session.commit()
+            return message.sequence
+
+    completion = FakeTitleCompletion()
+    notify_event = AsyncMock()
+    conversation_controller = controller.ConversationController(
+        get_session=lambda: db.create_session(db_engine),
+        notify_event=notify_event,
+        assistant_controller=Mock(),
+        participant_cache=Mock(),
+        message_debug_storage=Mock(),
+        request_retitle=Mock(),
+        complete_title=completion,
+    )
+
+    sequence = await add_message("hi")
+    await conversation_controller.retitle_conversation(user_principal, conversation_id, sequence)
+    await conversation_controller.retitle_conversation(user_principal, conversation_id, sequence)
+
+    assert len(completion.calls) == 1
+    assert completion.calls[0][-1] == {"role": "developer", "content": "The current conversation title is: test"}
+    assert notify_event.await_count == 1
+
+    sequence = await add_message("let's talk about something else")
+    await conversation_controller.retitle_conversation(user_principal, conversation_id, sequence)
+
+    assert len(completion.calls) == 2
+    assert completion.calls[1][-1] == {
+        "role": "developer",
+        "content": "The current conversation title is: A sweet title",
+    }
@@ -0,0 +1,103 @@
+import uuid
+
+from semantic_workbench_api_model.workbench_model import ConversationEvent, ConversationEventType
+from semantic_workbench_service import sse_fan_out
+from semantic_workbench_service.sse_fan_out import EncodedEvent, SseFanOut
+
+
+def encoded(sequence: int, coalesce_key: str | None = None) -> EncodedEvent:
+    return EncodedEvent(sequence=sequence, data=f"id: {sequence}\n\n".encode(), coalesce_key=coalesce_key)
+
+
+async def drain(subscriber: sse_fan_out.SseSubscriber) -> list[int | None]:
+    sequences = []
+    while (event := await subscriber.get(timeout=0)) is not None:
+        sequences.append(event.sequence)
+    return sequences
+
+
+async def test_sse_fan_out_shares_encoded_events() -> None:
+    fan_out = SseFanOut[str](max_queue_size=10, policy="disconnect")
+    subscribers = [fan_out.subscribe("a") for _ in range(3)]
+    other = fan_out.subscribe("b")
+
+    event = encoded(1)
+    assert fan_out.publish("a", event) == 3
+    assert fan_out.publish("c", encoded(2)) == 0
+
+    for subscriber in subscribers:
+        assert await subscriber.get(timeout=0) is event
+    assert await other.get(timeout=0) is None
+
+    metrics = fan_out.metrics()
+    assert (metrics["a"].subscribers, metrics["a"].queue_depth) == (3, 0)
+
+    for subscriber in subscribers:
+        fan_out.unsubscribe("a", subscriber)
+    assert fan_out.keys() == {"b"}
+
+
+async def test_sse_fan_out_drop_policy() -> None:
+    fan_out = SseFanOut[str](max_queue_size=3, policy="drop")
+    subscriber = fan_out.subscribe("a")
+
+    for sequence in range(5):
+        fan_out.publish("a", encoded(sequence))
+
+    assert fan_out.metrics()["a"].max_queue_depth == 3
+    assert await drain(subscriber) == [2, 3, 4]
+    assert not subscriber.disconnected
+    assert fan_out.slow_consumer_metrics.dropped_events == 2
+
+
+async def test_sse_fan_out_coalesce_policy() -> None:
+    fan_out = SseFanOut[str](max_queue_size=3, policy="coalesce")
+    subscriber = fan_out.subscribe("a")
+
+    fan_out.publish("a", encoded(1))
+    fan_out.publish("a", encoded(2, coalesce_key="conversation"))
+    fan_out.publish("a", encoded(3))
+    # the queue is full, and the update supersedes the queued update of the same conversation
+    fan_out.publish("a", encoded(4, coalesce_key="conversation"))
+    assert await drain(subscriber) == [1, 3, 4]
+    assert fan_out.slow_consumer_metrics.coalesced_events == 1
+
+    # events that cannot be coalesced disconnect the subscriber
+    for sequence in range(5, 9):
+        fan_out.publish("a", encoded(sequence))
+    assert subscriber.disconnected
+    assert await drain(subscriber) == []
+    assert fan_out.slow_consumer_metrics.disconnected_subscribers == 1
+
+
+async def test_sse_fan_out_disconnect_policy() -> None:
+    fan_out = SseFanOut[str](max_queue_size=2, policy="disconnect")
+    slow = fan_out.subscribe("a")
+    fast = fan_out.subscribe("a")
+
+    for sequence in range(3):
+        fan_out.publish("a", encoded(sequence))
+        assert (await fast.get(timeout=0)) is not None
+
+    assert slow.disconnected
+    assert not fast.disconnected
+    assert await slow.get(timeout=1) is None
+
+    # disconnected subscribers are sent nothing more
+    fan_out.publish("a", encoded(3))
+    assert slow.queue_depth == 0
+
+
+def test_coalesce_key() -> None:
+    conversation_id = uuid.uuid4()
+
+    def event(event_type: ConversationEventType, **data) -> ConversationEvent:
+        return ConversationEvent(conversation_id=conversation_id, event=event_type, data=data)
+
+    assert sse_fan_out.coalesce_key(event(ConversationEventType.conversation_updated)) == sse_fan_out.coalesce_key(
+        event(ConversationEventType.conversation_updated)
+    )
+    assert sse_fan_out.coalesce_key(
+        event(ConversationEventType.participant_updated, participant={"id": "1"})
+    ) != sse_fan_out.coalesce_key(event(ConversationEventType.participant_updated, participant={"id": "2"}))
+    assert sse_fan_out.coalesce_key(event(ConversationEventType.message_created)) is None
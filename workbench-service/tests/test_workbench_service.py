@@ -1,8 +1,10 @@
 import asyncio
 import datetime
+import functools
 import io
 import json
 import logging
+import pathlib
 import re
 import time
 import uuid
@@ -13,11 +15,16 @@ import openai_client
 import pytest
 import semantic_workbench_api_model.assistant_model as api_model
 import semantic_workbench_service
+import semantic_workbench_service.files
 from fastapi import FastAPI
+from fastapi.routing import APIRoute
 from fastapi.testclient import TestClient
 from pydantic import HttpUrl
 from pytest_httpx import HTTPXMock
 from semantic_workbench_api_model import workbench_model, workbench_service_client
+from semantic_workbench_service import auth
+from semantic_workbench_service import query_instrumentation as query_instrumentation_
+from semantic_workbench_service.config import DBSettings
 
 from .types import MockUser
 
@@ -27,6 +34,49 @@ def test_service_init(workbench_service: FastAPI):
         pass
 
 
+@pytest.fixture
+def query_instrumentation(db_settings: DBSettings) -> None:
+    db_settings.query_instrumentation = True
+    db_settings.query_repeated_statement_threshold = 2
+
+
+def test_query_diagnostics(query_instrumentation: None, workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get("/diagnostics/queries")
+        assert httpx.codes.is_success(http_response.status_code)
+        diagnostics = query_instrumentation_.QueryDiagnostics.model_validate(http_response.json())
+        assert diagnostics.enabled
+        assert any("INSERT INTO conversation " in stats.statement for stats in diagnostics.statements)
+        assert all(sum(stats.histogram) == stats.count for stats in diagnostics.statements)
+
+
+def test_metrics(workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+
+        # metrics are scraped without authentication
+        http_response = client.get("/metrics", headers={"Authorization": ""})
+        assert httpx.codes.is_success(http_response.status_code)
+        assert http_response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+        samples = http_response.text.splitlines()
+        assert (
+            'workbench_http_request_duration_seconds_count{method="POST",route="/conversations",status="200"} 1.0'
+            in (samples)
+        )
+        assert (
+            'workbench_controller_call_duration_seconds_count{component="conversation",method="create_conversation",'
+            'outcome="success"} 1.0'
+        ) in samples
+        assert 'workbench_sse_subscribers{stream="conversation"} 0.0' in samples
+        assert "workbench_assistant_event_queued_events 0.0" in samples
+        assert "# TYPE workbench_db_pool_checked_out_connections gauge" in samples
+
+
 id_segment = "[0-9a-f-]+"
 
 
@@ -153,23 +203,15 @@ def test_create_conversation(workbench_service: FastAPI, test_user: MockUser):
         assert exclude_system_keys(get_conversation_response.metadata) == new_conversation.metadata
 
 
-class AsyncContextManagerMock:
-    def __init__(self, mock: Mock) -> None:
-        self.mock = mock
-
-    async def __aenter__(self):
-        """Enter async context manager."""
-        return self.mock
-
-    async def __aexit__(self, exc_type, exc, tb):
-        """Exit async context manager."""
-        pass
+@pytest.fixture
+def retitle_without_debounce(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "conversation_retitle_debounce_seconds", 0.0)
 
 
 def test_create_conversation_and_retitle(
-    workbench_service: FastAPI, test_user: MockUser, monkeypatch: pytest.MonkeyPatch
+    retitle_without_debounce: None, workbench_service: FastAPI, test_user: MockUser, monkeypatch: pytest.MonkeyPatch
 ):
-    from semantic_workbench_service.controller.conversation import ConversationTitleResponse
+    from semantic_workbench_service.retitle_worker import ConversationTitleResponse
 
     mock_parsed_choice = Mock()
     mock_parsed_choice.message.parsed = ConversationTitleResponse(title="A sweet title")
@@ -180,9 +222,10 @@ def test_create_conversation_and_retitle(
     mock_client = Mock()
     mock_client.beta.chat.completions.parse = AsyncMock()
     mock_client.beta.chat.completions.parse.return_value = mock_parsed_completion
+    mock_client.close = AsyncMock()
 
     mock_create_client = Mock(spec=openai_client.create_client)
-    mock_create_client.return_value = AsyncContextManagerMock(mock_client)
+    mock_create_client.return_value = mock_client
 
     monkeypatch.setattr(openai_client, "create_client", mock_create_client)
 
@@ -190,36 +233,42 @@ def test_create_conversation_and_retitle(
     monkeypatch.setattr(semantic_workbench_service.settings.service, "azure_openai_deployment", "something")
 
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
-        new_conversation = workbench_model.NewConversation(metadata={"test": "value"})
-        http_response = client.post("/conversations", json=new_conversation.model_dump(mode="json"))
-        assert httpx.codes.is_success(http_response.status_code)
-
-        conversation_response = workbench_model.Conversation.model_validate(http_response.json())
-        assert conversation_response.title == "New Conversation"
+        for _ in range(2):
+            new_conversation = workbench_model.NewConversation(metadata={"test": "value"})
+            http_response = client.post("/conversations", json=new_conversation.model_dump(mode="json"))
+            assert httpx.codes.is_success(http_response.status_code)
 
-        http_response = client.get(f"/conversations/{conversation_response.id}")
-        assert httpx.codes.is_success(http_response.status_code)
+            conversation_response = workbench_model.Conversation.model_validate(http_response.json())
+            assert conversation_response.title == "New Conversation"
 
-        get_conversation_response = workbench_model.Conversation.model_validate(http_response.json())
-        assert get_conversation_response.title == new_conversation.title
+            http_response = client.get(f"/conversations/{conversation_response.id}")
+            assert httpx.codes.is_success(http_response.status_code)
 
-        new_message = workbench_model.NewConversationMessage(content="hi")
-        http_response = client.post(
-            f"/conversations/{conversation_response.id}/messages", json=new_message.model_dump(mode="json")
-        )
-        assert httpx.codes.is_success(http_response.status_code)
+            get_conversation_response = workbench_model.Conversation.model_validate(http_response.json())
+            assert get_conversation_response.title == new_conversation.title
 
-        for _ in range(10):
-            http_response = client.get(f"/conversations/{conversation_response.id}")
+            new_message = workbench_model.NewConversationMessage(content="hi")
+            http_response = client.post(
+                f"/conversations/{conversation_response.id}/messages", json=new_message.model_dump(mode="json")
+            )
             assert httpx.codes.is_success(http_response.status_code)
 
+            for _ in range(10):
+                http_response = client.get(f"/conversations/{conversation_response.id}")
+                assert httpx.codes.is_success(http_response.status_code)
+
+                get_conversation_response = workbench_model.Conversation.model_validate(http_response.json())
+                if get_conversation_response.title != "New Conversation":
+                    break
+                time.sleep(0.1)
+
             get_conversation_response = workbench_model.Conversation.model_validate(http_response.json())
-            if get_conversation_response.title != "New Conversation":
-                break
-            time.sleep(0.1)
+            assert get_conversation_response.title == "A sweet title"
 
-        get_conversation_response = workbench_model.Conversation.model_validate(http_response.json())
-        assert get_conversation_response.title == "A sweet title"
+    # the conversations are retitled through one client
+    assert mock_create_client.call_count == 1
+    assert mock_client.beta.chat.completions.parse.call_count == 2
+    mock_client.close.assert_awaited_once()
 
 
 def test_create_update_conversation(workbench_service: FastAPI, test_user: MockUser):
@@ -249,6 +298,75 @@ def test_create_update_conversation(workbench_service: FastAPI, test_user: MockU
         assert exclude_system_keys(get_conversation_response.metadata) == updated_metadata
 
 
+def test_conversation_reads_support_conditional_requests(workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = http_response.json()["id"]
+
+        urls = [
+            f"/conversations/{conversation_id}",
+            f"/conversations/{conversation_id}/participants",
+            f"/conversations/{conversation_id}/messages",
+            f"/conversations/{conversation_id}/files",
+        ]
+
+        etags = {}
+        for url in urls:
+            http_response = client.get(url)
+            assert httpx.codes.is_success(http_response.status_code)
+            etags[url] = http_response.headers["ETag"]
+            assert etags[url].startswith('W/"')
+
+            http_response = client.get(url, headers={"If-None-Match": etags[url]})
+            assert http_response.status_code == httpx.codes.NOT_MODIFIED
+            assert http_response.headers["ETag"] == etags[url]
+            assert http_response.content == b""
+
+        # different representations of the same conversation have different tags
+        http_response = client.get(urls[2], params={"limit": 1})
+        assert http_response.headers["ETag"] != etags[urls[2]]
+
+        http_response = client.post(
+            f"/conversations/{conversation_id}/messages",
+            json=workbench_model.NewConversationMessage(content="hello").model_dump(mode="json"),
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+
+        # changes to the conversation invalidate the tags of all of its reads
+        for url in urls:
+            http_response = client.get(url, headers={"If-None-Match": etags[url]})
+            assert http_response.status_code == httpx.codes.OK
+            assert http_response.headers["ETag"] != etags[url]
+
+
+async def test_conditional_request_cache() -> None:
+    etag = 'W/"1-abc"'
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(httpx.codes.NOT_MODIFIED, headers={"ETag": etag})
+        return httpx.Response(httpx.codes.OK, headers={"ETag": etag}, json={"id": "conversation"})
+
+    cache = workbench_service_client.ConditionalRequestCache()
+    headers = httpx.Headers({"Authorization": "Bearer one"})
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://workbench") as client:
+        for _ in range(2):
+            http_response = await cache.get(client, "/conversations/1", headers=headers)
+            assert http_response.status_code == httpx.codes.OK
+            assert http_response.json() == {"id": "conversation"}
+
+        # responses are cached per principal
+        http_response = await cache.get(
+            client, "/conversations/1", headers=httpx.Headers({"Authorization": "Bearer two"})
+        )
+        assert http_response.json() == {"id": "conversation"}
+
+    assert [request.headers.get("If-None-Match") for request in requests] == [None, etag, None]
+
+
 def test_create_assistant_add_to_conversation(
     workbench_service: FastAPI,
     httpx_mock: HTTPXMock,
@@ -280,6 +398,14 @@ def test_create_assistant_add_to_conversation(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
 
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
@@ -348,6 +474,14 @@ def test_create_assistant_add_to_conversation_delete_assistant_retains_participa
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
 
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
@@ -574,6 +708,14 @@ def test_create_delete_assistant(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}"),
@@ -655,6 +797,14 @@ def test_create_assistant_update_participant(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
 
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
@@ -888,8 +1038,233 @@ def test_create_conversation_send_user_message(workbench_service: FastAPI, test_
         assert conversation.latest_message is not None
         assert conversation.latest_message.id == message_log_id
 
+        # deleting the latest message makes the preceding message of the same type the latest
+        http_response = client.delete(f"/conversations/{conversation_id}/messages/{message_two_id}")
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get("/conversations")
+        assert httpx.codes.is_success(http_response.status_code)
+        conversations = workbench_model.ConversationList.model_validate(http_response.json())
+        assert len(conversations.conversations) == 1
+        assert conversations.conversations[0].latest_message is not None
+        assert conversations.conversations[0].latest_message.id == message_id
+
+        http_response = client.delete(f"/conversations/{conversation_id}/messages/{message_log_id}")
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(f"/conversations/{conversation_id}", params={"latest_message_type": ["log"]})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+        assert conversation.latest_message is None
+
+
+def test_conversation_messages_cursor_pagination(workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation = workbench_model.Conversation.model_validate(http_response.json())
+        conversation_id = conversation.id
+
+        message_ids = []
+        for index in range(7):
+            payload = {"content": f"message {index}", "message_type": "log" if index % 2 else "chat"}
+            http_response = client.post(f"/conversations/{conversation_id}/messages", json=payload)
+            assert httpx.codes.is_success(http_response.status_code)
+            message_ids.append(workbench_model.ConversationMessage.model_validate(http_response.json()).id)
+
+        # page backwards from the latest messages
+        http_response = client.get(f"/conversations/{conversation_id}/messages", params={"limit": 3})
+        assert httpx.codes.is_success(http_response.status_code)
+        page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in page.messages] == message_ids[4:]
+        assert page.before_cursor is not None
+
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages", params={"limit": 3, "cursor": page.before_cursor}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in page.messages] == message_ids[1:4]
+        assert page.before_cursor is not None
+
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages", params={"limit": 3, "cursor": page.before_cursor}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in page.messages] == message_ids[:1]
+        assert page.after_cursor is not None
+
+        # page forwards from the oldest page
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages", params={"limit": 3, "cursor": page.after_cursor}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in page.messages] == message_ids[1:4]
+
+        # cursors combine with message type filters
+        http_response = client.get(
+            f"/conversations/{conversation_id}/messages",
+            params={"limit": 2, "cursor": page.after_cursor, "message_type": "chat"},
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [m.id for m in page.messages] == [message_ids[4], message_ids[6]]
+
+        # no more messages
+        http_response = client.get(f"/conversations/{conversation_id}/messages", params={"cursor": page.after_cursor})
+        assert httpx.codes.is_success(http_response.status_code)
+        page = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert page.messages == []
+        assert page.before_cursor is None
+        assert page.after_cursor is None
+
+        http_response = client.get(f"/conversations/{conversation_id}/messages", params={"cursor": "not-a-cursor"})
+        assert http_response.status_code == httpx.codes.BAD_REQUEST
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+def test_create_conversation_send_message_batch(workbench_service: FastAPI, test_user: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = workbench_model.Conversation.model_validate(http_response.json()).id
+
+        message_ids = [uuid.uuid4() for _ in range(3)]
+        payload = {
+            "messages": [
+                {"id": str(message_ids[0]), "content": "one"},
+                {"id": str(message_ids[1]), "content": "two", "debug_data": {"key": "value"}},
+                {"id": str(message_ids[2]), "content": "three", "message_type": "log"},
+            ]
+        }
+        http_response = client.post(f"/conversations/{conversation_id}/messages/batch", json=payload)
+        assert httpx.codes.is_success(http_response.status_code)
+        created = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [message.id for message in created.messages] == message_ids
+        assert [message.has_debug_data for message in created.messages] == [False, True, False]
+        assert all(message.sender.participant_id == test_user.id for message in created.messages)
+
+        http_response = client.get(f"/conversations/{conversation_id}/messages")
+        assert httpx.codes.is_success(http_response.status_code)
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert [message.content for message in messages.messages] == ["one", "two", "three"]
+
+        http_response = client.get(f"/conversations/{conversation_id}/messages/{message_ids[1]}/debug_data")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert workbench_model.ConversationMessageDebug.model_validate(http_response.json()).debug_data == {
+            "key": "value"
+        }
+
+        # no message in the batch is created if any of them conflict
+        payload = {"messages": [{"content": "four"}, {"id": str(message_ids[0]), "content": "one"}]}
+        http_response = client.post(f"/conversations/{conversation_id}/messages/batch", json=payload)
+        assert http_response.status_code == httpx.codes.CONFLICT
+
+        payload = {"messages": [{"id": str(message_ids[0]), "content": "five"}] * 2}
+        http_response = client.post(f"/conversations/{conversation_id}/messages/batch", json=payload)
+        assert http_response.status_code == httpx.codes.BAD_REQUEST
+
+        payload = {"messages": [{"content": "too many"}] * 101}
+        http_response = client.post(f"/conversations/{conversation_id}/messages/batch", json=payload)
+        assert http_response.status_code == httpx.codes.BAD_REQUEST
+
+        http_response = client.get(f"/conversations/{conversation_id}/messages")
+        messages = workbench_model.ConversationMessageList.model_validate(http_response.json())
+        assert len(messages.messages) == 3
+
 
 @pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+def test_search_conversation_messages(workbench_service: FastAPI, test_user: MockUser, test_user_2: MockUser):
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        conversation_ids = []
+        for title in ["first", "second"]:
+            http_response = client.post("/conversations", json={"title": title})
+            assert httpx.codes.is_success(http_response.status_code)
+            conversation_ids.append(workbench_model.Conversation.model_validate(http_response.json()).id)
+
+        message_ids = [uuid.uuid4() for _ in range(4)]
+        payload = {
+            "messages": [
+                {"id": str(message_ids[0]), "content": "the deployment pipeline failed again"},
+                {"id": str(message_ids[1]), "content": "deployment deployment deployment"},
+                {"id": str(message_ids[2]), "content": "nothing to see here", "message_type": "note"},
+            ]
+        }
+        http_response = client.post(f"/conversations/{conversation_ids[0]}/messages/batch", json=payload)
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.post(
+            f"/conversations/{conversation_ids[1]}/messages",
+            json={"id": str(message_ids[3]), "content": "a deployment in another conversation"},
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(f"/conversations/{conversation_ids[0]}/messages/search", params={"q": "deployments"})
+        assert httpx.codes.is_success(http_response.status_code)
+        results = workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json())
+        # the message that mentions the term most often ranks first
+        assert [result.message.id for result in results.results] == [message_ids[1], message_ids[0]]
+        assert results.results[0].score >= results.results[1].score
+        assert all(result.conversation_id == conversation_ids[0] for result in results.results)
+        assert results.next_cursor is None
+
+        # search text is matched as words, not parsed as a query
+        http_response = client.get(
+            f"/conversations/{conversation_ids[0]}/messages/search", params={"q": 'pipeline" OR "nothing'}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(
+            f"/conversations/{conversation_ids[0]}/messages/search", params={"q": "nothing", "message_type": "chat"}
+        )
+        assert workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json()).results == []
+
+        http_response = client.get("/messages/search", params={"q": "deployment", "limit": 2})
+        assert httpx.codes.is_success(http_response.status_code)
+        first_page = workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json())
+        assert len(first_page.results) == 2
+        assert first_page.next_cursor is not None
+
+        http_response = client.get(
+            "/messages/search", params={"q": "deployment", "limit": 2, "cursor": first_page.next_cursor}
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        second_page = workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json())
+        assert second_page.next_cursor is None
+        assert {result.message.id for result in first_page.results + second_page.results} == {
+            message_ids[0],
+            message_ids[1],
+            message_ids[3],
+        }
+
+        http_response = client.get("/messages/search", params={"q": "deployment", "cursor": "invalid"})
+        assert http_response.status_code == httpx.codes.BAD_REQUEST
+
+        # deleted messages are removed from the index
+        http_response = client.delete(f"/conversations/{conversation_ids[1]}/messages/{message_ids[3]}")
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get("/messages/search", params={"q": "deployment"})
+        results = workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json())
+        assert {result.message.id for result in results.results} == {message_ids[0], message_ids[1]}
+
+        # other users' conversations are not searched
+        http_response = client.get(
+            "/messages/search", params={"q": "deployment"}, headers=test_user_2.authorization_headers
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        assert workbench_model.ConversationMessageSearchResultList.model_validate(http_response.json()).results == []
+
+        http_response = client.get(
+            f"/conversations/{conversation_ids[0]}/messages/search",
+            params={"q": "deployment"},
+            headers=test_user_2.authorization_headers,
+        )
+        assert http_response.status_code == httpx.codes.NOT_FOUND
+
+
 def test_create_assistant_send_assistant_message(
     workbench_service: FastAPI,
     httpx_mock: HTTPXMock,
@@ -921,6 +1296,14 @@ def test_create_assistant_send_assistant_message(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
 
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
@@ -1076,6 +1459,150 @@ def test_create_conversation_write_read_delete_file(
         assert http_response.status_code == httpx.codes.NOT_FOUND
 
 
+def test_conversation_files_are_deduplicated_and_support_conditional_requests(
+    workbench_service: FastAPI,
+    storage_settings: semantic_workbench_service.files.StorageSettings,
+    test_user: MockUser,
+):
+    content = bytes(range(256)) * 4
+    blobs_path = pathlib.Path(storage_settings.root) / "blobs"
+
+    def stored_blobs() -> list[pathlib.Path]:
+        return [path for path in blobs_path.glob("*/*") if path.parent.name != "staging"]
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        conversation_ids = []
+        for _ in range(2):
+            http_response = client.post("/conversations", json={"title": "test-conversation"})
+            assert httpx.codes.is_success(http_response.status_code)
+            conversation_ids.append(http_response.json()["id"])
+
+        # identical content, uploaded to two conversations, is stored once
+        for conversation_id in conversation_ids:
+            payload = [("files", ("test.bin", content, "application/octet-stream"))]
+            http_response = client.put(f"/conversations/{conversation_id}/files", files=payload)
+            assert httpx.codes.is_success(http_response.status_code)
+            assert http_response.json()["files"][0]["file_size"] == len(content)
+
+        assert len(stored_blobs()) == 1
+
+        url = f"/conversations/{conversation_ids[0]}/files/test.bin"
+        http_response = client.get(url)
+        assert http_response.status_code == httpx.codes.OK
+        assert http_response.content == content
+        assert http_response.headers["accept-ranges"] == "bytes"
+        etag = http_response.headers["etag"]
+
+        http_response = client.get(url, headers={"If-None-Match": etag})
+        assert http_response.status_code == httpx.codes.NOT_MODIFIED
+        assert http_response.content == b""
+
+        http_response = client.get(url, headers={"Range": "bytes=10-19"})
+        assert http_response.status_code == httpx.codes.PARTIAL_CONTENT
+        assert http_response.content == content[10:20]
+        assert http_response.headers["content-range"] == f"bytes 10-19/{len(content)}"
+
+        http_response = client.get(url, headers={"Range": "bytes=-16"})
+        assert http_response.status_code == httpx.codes.PARTIAL_CONTENT
+        assert http_response.content == content[-16:]
+
+        http_response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert http_response.status_code == httpx.codes.OK
+        assert http_response.content == content
+
+        http_response = client.get(url, headers={"Range": f"bytes={len(content)}-"})
+        assert http_response.status_code == httpx.codes.REQUESTED_RANGE_NOT_SATISFIABLE
+        assert http_response.headers["content-range"] == f"bytes */{len(content)}"
+
+        # the blob is deleted with the last file version that references it
+        http_response = client.delete(url)
+        assert httpx.codes.is_success(http_response.status_code)
+        assert len(stored_blobs()) == 1
+
+        http_response = client.get(f"/conversations/{conversation_ids[1]}/files/test.bin")
+        assert http_response.content == content
+
+        http_response = client.delete(f"/conversations/{conversation_ids[1]}/files/test.bin")
+        assert httpx.codes.is_success(http_response.status_code)
+        assert stored_blobs() == []
+
+
+def test_duplicated_conversation_files_outlive_the_original_files(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+):
+    content = b"shared content"
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = http_response.json()["id"]
+
+        payload = [("files", ("test.bin", content, "application/octet-stream"))]
+        http_response = client.put(f"/conversations/{conversation_id}/files", files=payload)
+        assert httpx.codes.is_success(http_response.status_code)
+
+        # the duplicate route is shadowed by the create-with-owner route, so its endpoint is called directly
+        duplicate_conversation = next(
+            route.endpoint
+            for route in workbench_service.routes
+            if isinstance(route, APIRoute) and route.name == "duplicate_conversation"
+        )
+        assert client.portal is not None
+        result = client.portal.call(
+            functools.partial(
+                duplicate_conversation,
+                conversation_id=uuid.UUID(conversation_id),
+                principal=auth.UserPrincipal(user_id=f"{test_user.tenant_id}.{test_user.object_id}", name="user"),
+                new_conversation=workbench_model.NewConversation(title="duplicate"),
+            )
+        )
+        duplicate_id = result.conversation_ids[0]
+
+        # the duplicate's file version shares the blob, which is kept while the duplicate references it
+        http_response = client.delete(f"/conversations/{conversation_id}/files/test.bin")
+        assert httpx.codes.is_success(http_response.status_code)
+
+        http_response = client.get(f"/conversations/{duplicate_id}/files/test.bin")
+        assert http_response.status_code == httpx.codes.OK
+        assert http_response.content == content
+
+
+def test_conversation_file_uploads_leave_no_unreferenced_blobs(
+    workbench_service: FastAPI,
+    storage_settings: semantic_workbench_service.files.StorageSettings,
+    test_user: MockUser,
+    test_user_2: MockUser,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    blobs_path = pathlib.Path(storage_settings.root) / "blobs"
+
+    def stored_blobs() -> list[pathlib.Path]:
+        return [path for path in blobs_path.glob("*/*") if path.parent.name != "staging"]
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        http_response = client.post("/conversations", json={"title": "test-conversation"})
+        assert httpx.codes.is_success(http_response.status_code)
+        conversation_id = http_response.json()["id"]
+        payload = [("files", ("test.bin", b"content", "application/octet-stream"))]
+
+        # uploads to conversations without access are rejected before their content is stored
+        http_response = client.put(
+            f"/conversations/{conversation_id}/files", files=payload, headers=test_user_2.authorization_headers
+        )
+        assert http_response.status_code == httpx.codes.NOT_FOUND
+        assert stored_blobs() == []
+
+        # blobs stored for uploads that fail to commit are deleted
+        async def fail(*args, **kwargs):
+            raise RuntimeError("insert failed")
+
+        monkeypatch.setattr("semantic_workbench_service.controller.file.FileController._insert_file_versions", fail)
+        with pytest.raises(RuntimeError):
+            client.put(f"/conversations/{conversation_id}/files", files=payload)
+        assert stored_blobs() == []
+
+
 @pytest.mark.httpx_mock(can_send_already_matched_responses=True)
 def test_create_assistant_export_import_data(
     workbench_service: FastAPI,
@@ -1113,6 +1640,14 @@ def test_create_assistant_export_import_data(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/export-data"),
@@ -1152,8 +1687,8 @@ def test_create_assistant_export_import_data(
         assert httpx.codes.is_success(http_response.status_code)
 
         assert http_response.headers["content-type"] == "application/zip"
-        assert "content-length" in http_response.headers
-        assert int(http_response.headers["content-length"]) > 0
+        # exports are streamed, so the content length is not known up front
+        assert len(http_response.content) > 0
 
         logging.info("response: %s", http_response.content)
 
@@ -1213,6 +1748,14 @@ def test_create_assistant_conversations_export_import_conversations(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/export-data"),
@@ -1280,8 +1823,8 @@ def test_create_assistant_conversations_export_import_conversations(
         assert httpx.codes.is_success(http_response.status_code)
 
         assert http_response.headers["content-type"] == "application/zip"
-        assert "content-length" in http_response.headers
-        assert int(http_response.headers["content-length"]) > 0
+        # exports are streamed, so the content length is not known up front
+        assert len(http_response.content) > 0
 
         logging.info("response: %s", http_response.content)
 
@@ -1346,7 +1889,11 @@ def test_create_assistant_conversations_export_import_conversations(
 def test_export_import_conversations_with_files(
     workbench_service: FastAPI,
     test_user: MockUser,
+    monkeypatch: pytest.MonkeyPatch,
 ) -> None:
+    # records are exported in batches smaller than the number of files
+    monkeypatch.setattr(semantic_workbench_service.settings.service, "export_import_batch_size", 2)
+
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
         http_response = client.post("/conversations", json={"title": "test-conversation-1"})
         assert httpx.codes.is_success(http_response.status_code)
@@ -1438,6 +1985,14 @@ def test_create_conversations_get_participants(
     httpx_mock.add_response(
         url=re.compile(f"http://testassistantservice/{id_segment}/conversations/{id_segment}/events"),
         method="POST",
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        url=re.compile(f"http://testassistantservice/{id_segment}/events"),
+        method="POST",
+        is_optional=True,
+        is_reusable=True,
     )
 
     with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
@@ -1808,6 +2363,88 @@ async def test_create_update_assistant_service_registration_url(
         assert retrieved_assistant_service.assistant_service_online is False
 
 
+async def test_assistant_service_stays_online_until_its_lease_expires(
+    workbench_service: FastAPI,
+    test_user: MockUser,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        semantic_workbench_service.settings.service,
+        "assistant_service_online_check_interval_seconds",
+        0.1,
+    )
+
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        registration = register_assistant_service(client)
+
+        # the second heartbeat expires in this process, but the online lease, renewed by the heartbeats reaching
+        # any service process, has not
+        for online_expires_in_seconds in (60, 0):
+            http_response = client.put(
+                f"/assistant-service-registrations/{registration.assistant_service_id}",
+                json=workbench_model.UpdateAssistantServiceRegistrationUrl(
+                    name=registration.name,
+                    description=registration.description,
+                    url=HttpUrl("http://testassistantservice"),
+                    online_expires_in_seconds=online_expires_in_seconds,
+                ).model_dump(mode="json"),
+                headers=workbench_service_client.AssistantServiceRequestHeaders(
+                    assistant_service_id=registration.assistant_service_id,
+                    api_key=registration.api_key or "",
+                ).to_headers(),
+            )
+            assert httpx.codes.is_success(http_response.status_code)
+
+        await asyncio.sleep(0.5)
+
+        http_response = client.get(f"/assistant-service-registrations/{registration.assistant_service_id}")
+        assert httpx.codes.is_success(http_response.status_code)
+        retrieved = workbench_model.AssistantServiceRegistration.model_validate(http_response.json())
+        assert retrieved.assistant_service_online is True
+
+
+def test_assistant_service_heartbeats(workbench_service: FastAPI, test_user: MockUser) -> None:
+    with TestClient(app=workbench_service, headers=test_user.authorization_headers) as client:
+        registration = register_assistant_service(client)
+
+        update_with_url = workbench_model.UpdateAssistantServiceRegistrationUrl(
+            name=registration.name,
+            description=registration.description,
+            url=HttpUrl("http://testassistantservice"),
+            online_expires_in_seconds=60,
+        )
+        headers = workbench_service_client.AssistantServiceRequestHeaders(
+            assistant_service_id=registration.assistant_service_id,
+            api_key=registration.api_key or "",
+        ).to_headers()
+
+        expiration_datetimes = set()
+        for _ in range(3):
+            http_response = client.put(
+                f"/assistant-service-registrations/{registration.assistant_service_id}",
+                json=update_with_url.model_dump(mode="json"),
+                headers=headers,
+            )
+            assert httpx.codes.is_success(http_response.status_code)
+            heartbeat_response = workbench_model.AssistantServiceRegistration.model_validate(http_response.json())
+            assert heartbeat_response.assistant_service_online is True
+            expiration_datetimes.add(heartbeat_response.assistant_service_online_expiration_datetime)
+
+        # heartbeats within the online lease are recorded in memory, without updating the registration
+        assert len(expiration_datetimes) == 1
+
+        # a url change is written
+        update_with_url.url = HttpUrl("http://testassistantservice2")
+        http_response = client.put(
+            f"/assistant-service-registrations/{registration.assistant_service_id}",
+            json=update_with_url.model_dump(mode="json"),
+            headers=headers,
+        )
+        assert httpx.codes.is_success(http_response.status_code)
+        heartbeat_response = workbench_model.AssistantServiceRegistration.model_validate(http_response.json())
+        assert heartbeat_response.assistant_service_url == "http://testassistantservice2/"
+
+
 @pytest.mark.parametrize(
     ("permission"),
     [
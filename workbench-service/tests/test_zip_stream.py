@@ -0,0 +1,58 @@
+import asyncio
+import contextlib
+import io
+import zipfile
+from typing import AsyncIterator
+
+from semantic_workbench_service.zip_stream import ZipStreamWriter, prefetch_streams
+
+
+async def chunks_of(*chunks: bytes) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_zip_stream_writer_writes_valid_archive() -> None:
+    writer = ZipStreamWriter()
+    output = io.BytesIO()
+
+    async for data in writer.write_entry("a.txt", chunks_of(b"hello ", b"world")):
+        output.write(data)
+    async for data in writer.write_entry("dir/b.bin", chunks_of(bytes(range(256)) * 1_000)):
+        output.write(data)
+    output.write(writer.close())
+
+    with zipfile.ZipFile(output) as zip_file:
+        assert zip_file.namelist() == ["a.txt", "dir/b.bin"]
+        assert zip_file.read("a.txt") == b"hello world"
+        assert zip_file.read("dir/b.bin") == bytes(range(256)) * 1_000
+        assert zip_file.testzip() is None
+
+
+async def test_prefetch_streams_yields_in_order_with_bounded_concurrency() -> None:
+    active = 0
+    max_active = 0
+
+    def source(index: int):
+        @contextlib.asynccontextmanager
+        async def open_stream() -> AsyncIterator[AsyncIterator[bytes]]:
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            try:
+                # later sources finish first, but are yielded in order
+                await asyncio.sleep(0.01 * (5 - index))
+                yield chunks_of(f"{index}-1".encode(), f"{index}-2".encode())
+            finally:
+                active -= 1
+
+        return open_stream
+
+    results = []
+    async for name, stream in prefetch_streams(
+        [(index, source(index)) for index in range(5)], max_concurrency=2, max_buffered_chunks=1
+    ):
+        results.append((name, [chunk async for chunk in stream]))
+
+    assert results == [(index, [f"{index}-1".encode(), f"{index}-2".encode()]) for index in range(5)]
+    assert max_active == 2